@@ -0,0 +1,171 @@
+"""
+Context Assembler - Monta o prompt do call_model dentro de um orçamento de tokens.
+
+Ordem de prioridade (o que tem menos valor é cortado primeiro):
+1. Núcleo do sistema + contexto do usuário + mensagens do turno atual (sempre entram).
+2. Módulos do prompt (Estrategista de Roteiros, Defesa em Crise): só quando a
+   mensagem toca no assunto (ou o tier do roteador força) e ainda há orçamento.
+3. Trechos do RAG, do maior para o menor score (abaixo de CONTEXT_RAG_MIN_SCORE não entram),
+   até CONTEXT_RAG_MAX_TOKENS.
+4. Histórico, do mais novo para o mais antigo, até CONTEXT_HISTORY_MAX_TOKENS; mensagens
+   antigas longas (respostas, saídas de tools) são resumidas pelo começo.
+
+Tokens são contados com tiktoken (encoding do modelo); sem o arquivo de encoding
+(ambiente offline) cai para a estimativa de ~4 caracteres por token.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence
+from loguru import logger
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from app.config import settings
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Papel + delimitadores de cada mensagem no formato de chat
+TRUNCATION_MARKER = "\n[... resumido ...]"
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"⚠️ tiktoken indisponível ({e}). Usando estimativa de 4 caracteres por token.")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Mantém o começo do texto (até `max_tokens`) e marca o corte."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[: max_tokens * 4] + TRUNCATION_MARKER
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]) + TRUNCATION_MARKER
+
+
+def message_tokens(message: BaseMessage, model: str = "gpt-4o-mini") -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tokens = count_tokens(content, model) + MESSAGE_OVERHEAD_TOKENS
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        tokens += count_tokens(str(tool_calls), model)
+    return tokens
+
+
+def _current_turn_start(messages: Sequence[BaseMessage]) -> int:
+    """Índice da última mensagem humana (o turno atual vai dela até o fim)."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return i
+    return 0
+
+
+def _compact(message: BaseMessage, max_tokens: int, model: str) -> BaseMessage:
+    if not isinstance(message.content, str) or count_tokens(message.content, model) <= max_tokens:
+        return message
+    return message.model_copy(update={"content": truncate_to_tokens(message.content, max_tokens, model)})
+
+
+def assemble_context(
+    core_prompt: str,
+    context_block: str,
+    messages: Sequence[BaseMessage],
+    user_message: str = "",
+    modules: Sequence[Dict[str, Any]] = (),
+    rag_hits: Sequence[Dict[str, Any]] = (),
+    format_hit=None,
+    model: str = "gpt-4o-mini",
+) -> Dict[str, Any]:
+    """
+    Monta [SystemMessage] + histórico dentro do orçamento.
+    `modules`: [{"name", "text", "keywords", "always"?}]; `rag_hits`: hits do RAG com "score".
+    Retorna {"messages": [...], "breakdown": {...}} (breakdown em tokens).
+    """
+    budget = settings.CONTEXT_MAX_INPUT_TOKENS
+    text_lower = (user_message or "").lower()
+
+    # 1. Obrigatório
+    turn_start = _current_turn_start(messages)
+    current_turn = list(messages[turn_start:])
+    core_tokens = count_tokens(core_prompt, model) + count_tokens(context_block, model) + MESSAGE_OVERHEAD_TOKENS
+    turn_tokens = sum(message_tokens(m, model) for m in current_turn)
+    remaining = budget - core_tokens - turn_tokens
+
+    # 2. Módulos relevantes
+    module_parts, module_names, module_tokens = [], [], 0
+    for module in modules:
+        if not module.get("always") and not any(kw in text_lower for kw in module["keywords"]):
+            continue
+        tokens = count_tokens(module["text"], model)
+        if tokens > remaining:
+            logger.info(f"✂️ Módulo '{module['name']}' fora do orçamento ({tokens} tokens)")
+            continue
+        module_parts.append(module["text"])
+        module_names.append(module["name"])
+        module_tokens += tokens
+        remaining -= tokens
+
+    # 3. Trechos do RAG por score
+    rag_parts, rag_tokens = [], 0
+    rag_budget = min(settings.CONTEXT_RAG_MAX_TOKENS, max(remaining, 0))
+    relevant = [h for h in rag_hits if h.get("score", 0.0) >= settings.CONTEXT_RAG_MIN_SCORE]
+    for hit in sorted(relevant, key=lambda h: h.get("score", 0.0), reverse=True):
+        chunk = format_hit(hit) if format_hit else hit["text"]
+        tokens = count_tokens(chunk, model)
+        if rag_tokens + tokens > rag_budget:
+            continue  # Um trecho menor e com score mais baixo ainda pode caber
+        rag_parts.append(chunk)
+        rag_tokens += tokens
+    remaining -= rag_tokens
+
+    # 4. Histórico, do mais novo para o mais antigo
+    history_budget = min(settings.CONTEXT_HISTORY_MAX_TOKENS, max(remaining, 0))
+    history: List[BaseMessage] = []
+    history_tokens = 0
+    for message in reversed(messages[:turn_start]):
+        compacted = _compact(message, settings.CONTEXT_OLD_MESSAGE_MAX_TOKENS, model)
+        tokens = message_tokens(compacted, model)
+        if history_tokens + tokens > history_budget:
+            break
+        history.insert(0, compacted)
+        history_tokens += tokens
+    # Não começa o histórico com resposta de tool órfã (a chamada que a originou ficou de fora)
+    while history and isinstance(history[0], ToolMessage):
+        history_tokens -= message_tokens(history.pop(0), model)
+
+    system_prompt = core_prompt
+    if module_parts:
+        system_prompt += "\n\n" + "\n\n".join(module_parts)
+    system_prompt += context_block
+    if rag_parts:
+        system_prompt += "\n\n📄 DOCUMENTOS DA VIAGEM (use estas informações para responder):\n" + "\n---\n".join(rag_parts)
+
+    breakdown = {
+        "system": core_tokens,
+        "modules": module_tokens,
+        "module_names": module_names,
+        "rag": rag_tokens,
+        "rag_chunks": f"{len(rag_parts)}/{len(rag_hits)}",
+        "history": history_tokens,
+        "history_messages": f"{len(history)}/{turn_start}",
+        "current_turn": turn_tokens,
+        "total": core_tokens + module_tokens + rag_tokens + history_tokens + turn_tokens,
+        "budget": budget,
+    }
+    return {
+        "messages": [SystemMessage(content=system_prompt)] + history + current_turn,
+        "breakdown": breakdown,
+    }
@@ -0,0 +1,223 @@
+"""
+Intent Router - Pré-classificador local que escolhe o "tier" de cada mensagem.
+
+Roda antes de qualquer embedding ou chamada ao LLM. Cada tier define:
+- prompt: "compact" (persona + regras de ações pendentes) ou "full" (núcleo completo);
+- tools: subconjunto de ferramentas vinculadas ao modelo (None = todas);
+- rag_k: trechos buscados no RAG (0 = nenhuma busca/embedding);
+- modules: módulos longos do prompt liberados ("always" força a inclusão).
+
+Classificação: regras de palavras-chave (sem custo) e, se inconclusivas, um modelo
+local opcional (INTENT_ROUTER_MODEL_PATH, pipeline scikit-learn salvo com joblib,
+com `predict_proba`). Sem confiança suficiente a mensagem cai no tier "general",
+que mantém o comportamento completo.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from app.config import settings
+
+# Respostas curtas a ações pendentes ("sim", "pode substituir") precisam destas tools em qualquer tier
+PENDING_ACTION_TOOLS = [
+    "confirm_document_replacement",
+    "confirm_irrelevancy_inclusion",
+    "approve_pending_access_request",
+    "discard_pending_action",
+]
+
+# O prompt completo manda buscar preços e reservar ("SYSTEM OVERRIDE"): todo tier "full" vincula estas tools
+SEARCH_TOOLS = ["search_flights", "search_hotels", "book_flight", "search_real_travel_tips"]
+
+TIERS: Dict[str, Dict[str, Any]] = {
+    "chit_chat": {
+        "prompt": "compact",
+        "tools": PENDING_ACTION_TOOLS,
+        "rag_k": 0,
+        "modules": {},
+    },
+    "document_lookup": {
+        "prompt": "full",
+        "tools": PENDING_ACTION_TOOLS + SEARCH_TOOLS + [
+            "query_travel_documents", "list_travel_documents", "diagnostic_rag", "list_trip_participants",
+            "link_with_partner_trip", "manage_trip_sharing", "invite_family_member", "configure_trip_drive_folder",
+            "generate_interactive_trip_map", "manual_create_trip",
+        ],
+        "rag_k": 10,
+        "modules": {"legal_defender": "keywords"},
+    },
+    "live_data": {
+        "prompt": "full",
+        "tools": PENDING_ACTION_TOOLS + SEARCH_TOOLS + [
+            "query_travel_documents", "get_current_weather", "get_flight_status", "find_nearby_places",
+            "get_directions", "provide_visual_navigation_map", "convert_currency", "get_park_live_status",
+            "get_event_venue_details", "get_local_emergency_numbers", "search_government_notices",
+            "get_internet_options", "register_data_plan", "get_data_usage_status",
+            "register_expense",
+        ],
+        "rag_k": 4,
+        "modules": {"legal_defender": "keywords"},
+    },
+    "planning": {
+        "prompt": "full",
+        "tools": None,
+        "rag_k": 10,
+        "modules": {"itinerary_strategist": "always", "legal_defender": "keywords"},
+    },
+    "general": {
+        "prompt": "full",
+        "tools": None,
+        "rag_k": 10,
+        "modules": {"itinerary_strategist": "keywords", "legal_defender": "keywords"},
+    },
+}
+
+CHIT_CHAT_WORDS = {
+    "oi", "ola", "oie", "opa", "eai", "e", "ai", "bom", "boa", "dia", "tarde", "noite", "tudo", "bem", "bom?",
+    "obrigado", "obrigada", "obg", "brigado", "valeu", "vlw", "show", "top", "legal", "massa", "otimo", "otima",
+    "entendi", "maravilha", "muito", "tchau", "ate", "mais", "abraco", "kk", "kkk", "kkkk", "haha", "rs",
+    "por", "favor", "gracas", "thanks", "hello", "hi",
+}
+
+# Respostas curtas a uma pergunta do agente ("Quer que eu crie a viagem / busque os voos?"):
+# precisam do tier completo para executar a ação que estava pendente
+CONFIRMATION_WORDS = {
+    "sim", "nao", "s", "n", "claro", "pode", "isso", "certo", "combinado", "ok", "okay", "beleza", "blz",
+    "perfeito", "bora", "quero", "manda", "faz", "fechado", "yes", "no",
+}
+
+# Palavras-chave casam por palavra inteira; "*" no fim casa qualquer continuação ("planej*" = planejar, planejamento)
+# Preço, compra e busca ("quanto tá a passagem", "reservar um hotel", "achar um hotel") vão direto para "general"
+TRANSACTION_KEYWORDS = [
+    "quanto", "preco*", "valor", "custa", "custo", "tarifa*", "barat*", "promoc*", "cotar", "orcamento",
+    "reservar", "reserve", "reserva pra mim", "compra", "comprar", "compre", "emitir", "emite",
+    "busca", "buscar", "busque", "procur*", "acha", "achar", "ache", "pesquis*",
+]
+
+KEYWORDS: Dict[str, List[str]] = {
+    "planning": [
+        "roteiro", "itinerario", "planej*", "sugest*", "o que fazer", "passeio*", "programacao", "dicas de",
+        "vale a pena", "quantos dias", "monta", "organiza",
+    ],
+    "live_data": [
+        "clima", "previsao", "chuva", "chover", "temperatura", "esteira", "portao", "atrasad*", "status do voo",
+        "pousou", "fila*", "espera", "parque*", "cotacao", "dolar", "euro", "cambio", "converte", "como chegar",
+        "rota", "perto", "proximo", "restaurante*", "farmacia", "hospital", "emergencia", "policia", "socorro",
+        "evento*", "show", "internet", "chip", "esim", "dados moveis", "mapa", "uber", "transporte", "gastei",
+        "despesa*",
+    ],
+    "document_lookup": [
+        "documento*", "reserva", "reservas", "voucher", "passagem", "passagens", "localizador", "seguro viagem",
+        "seguro-viagem", "seguro de viagem", "apolice", "check-in", "checkin", "ingresso*", "passaporte", "pdf",
+        "enviei", "meu voo", "meu hotel", "qual hotel", "qual voo", "horario do voo", "aluguel", "locadora",
+        "participantes", "compartilh*", "drive",
+    ],
+}
+
+
+def _keyword_pattern(keyword: str) -> re.Pattern:
+    prefix = keyword.endswith("*")
+    return re.compile(r"\b" + re.escape(keyword.rstrip("*")) + ("" if prefix else r"\b"))
+
+
+TRANSACTION_PATTERNS = [_keyword_pattern(kw) for kw in TRANSACTION_KEYWORDS]
+KEYWORD_PATTERNS: Dict[str, List[re.Pattern]] = {
+    tier: [_keyword_pattern(kw) for kw in kws] for tier, kws in KEYWORDS.items()
+}
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class IntentRouter:
+    """Classificador único por processo (modelo explícito cria instância independente, p/ testes)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, model: Any = None):
+        if model is not None:
+            instance = super(IntentRouter, cls).__new__(cls)
+            instance._initialized = False
+            return instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(IntentRouter, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, model: Any = None):
+        if self._initialized:
+            return
+        self.model = model if model is not None else self._load_model(settings.INTENT_ROUTER_MODEL_PATH)
+        self.min_confidence = settings.INTENT_ROUTER_MIN_CONFIDENCE
+        self.stats: Dict[str, int] = {tier: 0 for tier in TIERS}
+        self.stats["model_decisions"] = 0
+        self._initialized = True
+
+    @staticmethod
+    def _load_model(path: Optional[str]):
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            import joblib
+            model = joblib.load(path)
+            logger.info(f"🧭 Modelo local do roteador de intenção carregado: {path}")
+            return model
+        except Exception as e:
+            logger.warning(f"⚠️ Modelo do roteador indisponível ({e}). Usando só regras.")
+            return None
+
+    def _rules(self, text: str) -> Optional[str]:
+        words = [w.rstrip("?") for w in re.findall(r"[\w?]+", text)]
+        if words and len(words) <= 6 and all(w in CHIT_CHAT_WORDS or w in CONFIRMATION_WORDS for w in words):
+            return "general" if any(w in CONFIRMATION_WORDS for w in words) else "chit_chat"
+        if any(p.search(text) for p in TRANSACTION_PATTERNS):
+            return "general"
+        scores = {tier: sum(1 for p in patterns if p.search(text)) for tier, patterns in KEYWORD_PATTERNS.items()}
+        best = max(scores.values())
+        if best == 0:
+            return None
+        winners = [tier for tier, score in scores.items() if score == best]
+        return winners[0] if len(winners) == 1 else None
+
+    def _predict(self, text: str) -> Optional[str]:
+        if self.model is None:
+            return None
+        try:
+            probabilities = self.model.predict_proba([text])[0]
+            best = int(probabilities.argmax())
+            label = str(self.model.classes_[best])
+            if probabilities[best] >= self.min_confidence and label in TIERS:
+                self.stats["model_decisions"] += 1
+                return label
+        except Exception as e:
+            logger.warning(f"⚠️ Falha no modelo do roteador: {e}")
+        return None
+
+    def classify(self, message: str) -> str:
+        """Tier da mensagem. Instruções internas ("[PRIMEIRA MENSAGEM...]", guias proativos) e textos longos vão para "general"."""
+        raw = (message or "").strip()
+        if not raw or raw.startswith("[") or len(raw) > settings.INTENT_ROUTER_MAX_CHARS:
+            tier = "general"
+        else:
+            text = normalize(raw)
+            tier = self._rules(text) or self._predict(text) or "general"
+        self.stats[tier] += 1
+        return tier
+
+    def route(self, message: str) -> Dict[str, Any]:
+        tier = self.classify(message)
+        return {"tier": tier, **TIERS[tier]}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "model_loaded": self.model is not None}
+
+
+def get_intent_router() -> IntentRouter:
+    return IntentRouter()
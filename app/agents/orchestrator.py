@@ -2,9 +2,16 @@
 Orchestrator - Orquestração de agentes com LangGraph
 """
 
-from typing import TypedDict, Annotated, Literal
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, TypedDict, Annotated, Literal
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 
@@ -13,6 +20,9 @@ from app.config import settings
 from loguru import logger
 from app.services.n8n_service import N8nService
 from app.agents.tools import ALL_TOOLS, provide_visual_navigation_map
+from app.agents.context_assembler import assemble_context
+from app.agents.intent_router import get_intent_router
+from app.agents.reply_streamer import ReplyStreamer
 
 # 🛡️ DEFESA: Versões do LangGraph para add_messages
 try:
@@ -28,39 +38,121 @@ class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
     needs_gemini_review: bool
 
+# ============================================================
+# RUNTIME DO AGENTE (UM POR PROCESSO)
+# ============================================================
+# O grafo é compilado uma única vez, os clientes LLM com tools já vinculadas
+# ficam em cache por (modelo, temperatura) e o checkpointer é compartilhado:
+# criar um TravelAgent para uma mensagem proativa não custa nada.
+
+class _RuntimeMetrics:
+    """Contadores e latências do runtime (expostos em /api/shield/metrics)"""
+
+    def __init__(self):
+        self.counters = {
+            "graph_compiles": 0, "llm_clients_built": 0, "agents_created": 0, "turns": 0, "turn_errors": 0,
+            "reviews": 0, "reviews_changed": 0, "reviews_early_return": 0, "review_followups": 0,
+            "streamed_turns": 0, "streamed_messages": 0, "stream_corrections": 0,
+            "stream_tool_preambles_sent": 0,
+        }
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name: str, value_ms: float):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=512)).append(value_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self.counters)
+            for name, samples in self._samples.items():
+                ordered = sorted(samples)
+                out[name] = {
+                    "p50": round(ordered[len(ordered) // 2], 1),
+                    "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 1),
+                    "samples": len(ordered),
+                }
+        return out
+
+
+_runtime_metrics = _RuntimeMetrics()
+_runtime_lock = threading.RLock()
+_llm_clients: Dict[tuple, Any] = {}
+_checkpointer = None
+_graph = None
+_agent = None
+
+
+def get_llm(model: str = "gpt-4o-mini", temperature: float = 0.1, tools: Optional[Sequence[str]] = None):
+    """
+    Cliente ChatOpenAI com tools vinculadas, reaproveitado por (modelo, temperatura, tools).
+    `tools` = nomes do subconjunto (tier do roteador); None = ALL_TOOLS.
+    """
+    key = (model, float(temperature), tuple(tools) if tools is not None else None)
+    client = _llm_clients.get(key)
+    if client is None:
+        with _runtime_lock:
+            client = _llm_clients.get(key)
+            if client is None:
+                selected = ALL_TOOLS if tools is None else [t for t in ALL_TOOLS if t.name in set(tools)]
+                llm = ChatOpenAI(
+                    model=model, api_key=settings.OPENAI_API_KEY, temperature=temperature,
+                    timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS,
+                )
+                client = llm.bind_tools(selected)
+                _llm_clients[key] = client
+                _runtime_metrics.incr("llm_clients_built")
+                logger.info(f"🔌 Cliente LLM criado: {model} (temperature={temperature}, {len(selected)} tools)")
+    return client
+
+
+def get_checkpointer():
+    """Checkpointer compartilhado por todos os agentes do processo (CHECKPOINT_BACKEND)"""
+    global _checkpointer
+    if _checkpointer is None:
+        with _runtime_lock:
+            if _checkpointer is None:
+                from app.services.checkpoint_store import create_checkpointer
+                _checkpointer = create_checkpointer()
+                logger.info(f"💾 Checkpointer de conversa: {type(_checkpointer).__name__}")
+    return _checkpointer
+
+
+def get_agent_graph():
+    """Grafo compilado do processo (compila na primeira chamada)"""
+    global _graph
+    if _graph is None:
+        checkpointer = get_checkpointer()
+        with _runtime_lock:
+            if _graph is None:
+                _graph = create_agent_graph(checkpointer)
+    return _graph
+
+
+def get_agent_runtime_stats() -> Dict[str, Any]:
+    checkpointer = _checkpointer if hasattr(_checkpointer, "get_stats") else None
+    counters = _runtime_metrics.snapshot()
+    return {
+        **counters,
+        "llm_clients": len(_llm_clients),
+        "graph_compiled": _graph is not None,
+        "checkpointer": checkpointer.get_stats() if checkpointer else type(_checkpointer).__name__,
+        "intent_routes": get_intent_router().get_stats(),
+        "review_change_rate": round(counters["reviews_changed"] / counters["reviews"], 3) if counters.get("reviews") else None,
+    }
+
 # ============================================================
 # NÓS DO GRAFO
 # ============================================================
 
-def call_model(state: AgentState, config: dict = None):
-    """Nó principal: Chama o GPT-4 com acesso às tools"""
-    logger.info("🤖 Acionando OpenAI Agent...")
-    
-    messages = state["messages"]
-    
-    # Recupera o thread_id e injeta o contexto da viagem
-    thread_id = "unknown"
-    if config and "configurable" in config:
-        thread_id = config["configurable"].get("thread_id", "unknown")
-    
-    from app.services.user_service import UserService
-    user_service = UserService()
-    role = user_service.get_user_role(thread_id)
-    active_trip = user_service.get_active_trip(thread_id)
-    
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        api_key=settings.OPENAI_API_KEY,
-        temperature=0.1
-    )
-    llm_with_tools = llm.bind_tools(ALL_TOOLS)
-    
-    # Adicionar instrução de sistema
-    from langchain_core.messages import SystemMessage
-    from app.prompts.itinerary_strategist import ITINERARY_STRATEGIST_PROMPT
-    from app.prompts.legal_defender import LEGAL_DEFENDER_PROMPT
-    
-    base_prompt = (
+@lru_cache(maxsize=1)
+def _base_prompt() -> str:
+    """Núcleo estático do prompt de sistema (montado uma vez por processo)."""
+    return (
         "VOCÊ É O SEVEN ASSISTANT TRAVEL - O ÁPICE DA CONSULTORIA DE VIAGENS MONUMENTAL. "
         "Sua lógica é absoluta e você nunca deve esquecer seu propósito: ser um Concierge de Elite, cérebro proativo e protetor 24h.\n\n"
         "### REGRAS DE OURO (LÓGICA ABSOLUTA):\n"
@@ -101,52 +193,129 @@ def call_model(state: AgentState, config: dict = None):
         "- Você é um concierge de luxo: educado, proativo e infalível. Use emojis profissionais. Sua primeira resposta em um chat novo deve ser uma apresentação monumental.\n"
         "- **Onboarding de Compartilhamento:** Se for o primeiro contato do usuário ou uma viagem recém-detectada, pergunte educadamente se ele deseja compartilhar o planejamento com alguém. **PERGUNTE ISSO APENAS UMA ÚNICA VEZ NO INÍCIO DO PLANEJAMENTO DA VIAGEM**, e depois não insista mais. Uma vez configurado, o compartilhamento dura até o fim da viagem.\n"
         "- **Onboarding Isolado:** Se o usuário não tiver uma viagem ativa vinculada no Contexto Atual e informar para onde e quando vai viajar, você DEVE INVOCAR A TOOL 'manual_create_trip' IMEDIATAMENTE NA MESMA RESPOSTA. Não prometa criar no futuro, use a ferramenta.\n"
-        "Se não há documentos, peça a passagem primeiro. Analise docs faltantes e cobre carinhosamente. Seja cordial e econômico com os dados.\n\n"
-        f"### MÓDULO ESTRATEGISTA DE ROTEIROS (MÁXIMA PRIORIDADE ABSOLUTA):\n"
-        f"Sempre que o usuário pedir sugestões, roteiros ou dicas detalhadas sobre um destino (mesmo que você acabe de criar a viagem usando a tool), a sua resposta de texto FINAL é OBRIGADA a seguir ESTRITAMENTE o formato MASTER DO ESTRATEGISTA DE ROTEIROS abaixo. Não resuma. Gere as Fases 3 e 4 completas com Markdown:\n"
-        f"{ITINERARY_STRATEGIST_PROMPT}\n\n"
-        f"### MÓDULO DE DEFESA: GESTÃO DE CRISE\n"
-        f"{LEGAL_DEFENDER_PROMPT}"
+        "Se não há documentos, peça a passagem primeiro. Analise docs faltantes e cobre carinhosamente. Seja cordial e econômico com os dados."
+    )
+
+
+@lru_cache(maxsize=1)
+def _compact_prompt() -> str:
+    """Prompt curto do tier chit_chat (saudações e agradecimentos)."""
+    return (
+        "VOCÊ É O SEVEN ASSISTANT TRAVEL, um concierge de viagens de luxo: educado, proativo e infalível. "
+        "Responda de forma breve e calorosa, com emojis profissionais, em português.\n"
+        "- Se o usuário confirmar ('sim') a substituição de um documento em conflito, chame 'confirm_document_replacement'; "
+        "se confirmar a inclusão de um documento marcado como irrelevante, chame 'confirm_irrelevancy_inclusion'; "
+        "se desistir ('não'), chame 'discard_pending_action'.\n"
+        "- Se o Administrador disser 'Sim' ou 'Autorizado' após um pedido de acesso, chame 'approve_pending_access_request'.\n"
+        "- Se o usuário precisar de algo mais, ofereça ajuda com a viagem (documentos, voos, clima, roteiro)."
     )
+
+
+@lru_cache(maxsize=1)
+def _prompt_modules() -> tuple:
+    """Módulos longos do prompt, injetados só quando a mensagem toca no assunto (ver context_assembler)."""
+    from app.prompts.itinerary_strategist import ITINERARY_STRATEGIST_PROMPT
+    from app.prompts.legal_defender import LEGAL_DEFENDER_PROMPT
+
+    return (
+        {
+            "name": "itinerary_strategist",
+            "keywords": ["roteiro", "itinerário", "itinerario", "sugest", "dica", "o que fazer", "passeio", "planej", "programação"],
+            "text": (
+                "### MÓDULO ESTRATEGISTA DE ROTEIROS (MÁXIMA PRIORIDADE ABSOLUTA):\n"
+                "Sempre que o usuário pedir sugestões, roteiros ou dicas detalhadas sobre um destino (mesmo que você acabe de criar a viagem usando a tool), a sua resposta de texto FINAL é OBRIGADA a seguir ESTRITAMENTE o formato MASTER DO ESTRATEGISTA DE ROTEIROS abaixo. Não resuma. Gere as Fases 3 e 4 completas com Markdown:\n"
+                f"{ITINERARY_STRATEGIST_PROMPT}"
+            ),
+        },
+        {
+            "name": "legal_defender",
+            "keywords": ["cancel", "atras", "overbooking", "extravi", "perd", "reembolso", "indeniza", "direito", "reclama", "crise", "negad", "danific"],
+            "text": f"### MÓDULO DE DEFESA: GESTÃO DE CRISE\n{LEGAL_DEFENDER_PROMPT}",
+        },
+    )
+
+
+def _prepare_model_call(state: AgentState, config: Optional[RunnableConfig]) -> Dict[str, Any]:
+    """Roteamento, RAG e montagem do prompt (compartilhado pelos caminhos sync e async)."""
+    prep_started = time.perf_counter()
+    
+    messages = state["messages"]
+    
+    # Recupera o thread_id e injeta o contexto da viagem
+    thread_id = "unknown"
+    if config and "configurable" in config:
+        thread_id = config["configurable"].get("thread_id", "unknown")
+    
+    from app.services.user_service import UserService
+    user_service = UserService()
+    role = user_service.get_user_role(thread_id)
+    active_trip = user_service.get_active_trip(thread_id)
     
     context_prompt = f"\n\nContexto Atual:\n- ID Usuário: {thread_id}\n- Seu Papel na Viagem: {role}\n- Viagem Ativa (Trip ID): {active_trip if active_trip else 'Nenhuma viagem vinculada.'}\n"
     context_prompt += "MUITO IMPORTANTE: O usuário pode não ser o dono da viagem, ele pode ser um convidado. A IA deve atender as demandas dessa Viagem Ativa específica."
     
-    rag_context = ""
-    try:
-        from app.services.rag_service import RAGService
-        rag = RAGService()
-        # Extrai a mensagem mais recente do usuário para busca contextual
-        last_user_message = ""
-        from langchain_core.messages import HumanMessage
-        for msg in reversed(messages):
-            if isinstance(msg, HumanMessage) and msg.content:
-                last_user_message = msg.content
-                break
-        
-        if last_user_message and rag.documents:
-            rag_context = rag.query(last_user_message, thread_id, k=10)
-            if rag_context and "ainda não enviou" not in rag_context and "Nenhuma informação" not in rag_context:
-                # 🛡️ Super Limite de Segurança (v1.2.3): truncate para 50k chars
-                # Isso garante que mesmo com histórico, não estoure os 128k tokens
-                if len(rag_context) > 50000:
-                    logger.warning(f"⚠️ RAG Context muito grande ({len(rag_context)} chars). Truncando para 50k.")
-                    rag_context = rag_context[:50000] + "\n\n[... Contexto truncado por tamanho ...]"
-                
-                context_prompt += f"\n\n📄 DOCUMENTOS DA VIAGEM (use estas informações para responder):\n{rag_context}"
-                logger.info(f"✅ RAG injetado no prompt diretamente ({len(rag_context)} chars)")
-            else:
-                logger.info("ℹ️ RAG não retornou documentos relevantes para esta consulta.")
-    except Exception as rag_err:
-        logger.error(f"❌ Erro ao injetar RAG no prompt: {rag_err}")
-    
-    system_prompt = base_prompt + context_prompt
-    
-    # ✂️ TRIMMING DE HISTÓRICO: Mantém apenas as últimas 15 mensagens para evitar estouro de tokens
-    trimmed_history = messages[-15:] if len(messages) > 15 else messages
-    
-    messages_to_invoke = [SystemMessage(content=system_prompt)] + trimmed_history
-    response = llm_with_tools.invoke(messages_to_invoke)
+    # Extrai a mensagem mais recente do usuário para busca contextual
+    last_user_message = ""
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage) and msg.content:
+            last_user_message = msg.content
+            break
+    
+    # 🧭 ROTEAMENTO: o tier define prompt, tools vinculadas e política de busca no RAG
+    route = get_intent_router().route(last_user_message)
+    logger.info(f"🧭 Tier da mensagem: {route['tier']}")
+    llm_with_tools = get_llm("gpt-4o-mini", temperature=0.1, tools=route["tools"])
+    
+    rag_hits, format_hit = [], None
+    if route["rag_k"] > 0:
+        try:
+            from app.services.rag_service import get_rag_service, RAGService
+            rag = get_rag_service()
+            if last_user_message and rag.documents:
+                rag_hits = rag.query_many([last_user_message], thread_id=thread_id, k=route["rag_k"])[0]
+                format_hit = lambda hit: RAGService.format_hits([hit])
+                if not rag_hits:
+                    logger.info("ℹ️ RAG não retornou documentos relevantes para esta consulta.")
+        except Exception as rag_err:
+            logger.error(f"❌ Erro ao buscar documentos no RAG: {rag_err}")
+    
+    modules = [
+        {**module, "always": route["modules"][module["name"]] == "always"}
+        for module in _prompt_modules() if module["name"] in route["modules"]
+    ]
+    
+    # 🧮 ORÇAMENTO DE TOKENS: módulos, trechos do RAG e histórico entram por valor até o limite
+    assembled = assemble_context(
+        core_prompt=_compact_prompt() if route["prompt"] == "compact" else _base_prompt(),
+        context_block=context_prompt,
+        messages=messages,
+        user_message=last_user_message,
+        modules=modules,
+        rag_hits=rag_hits,
+        format_hit=format_hit,
+    )
+    breakdown = assembled["breakdown"]
+    logger.info(
+        f"🧮 Contexto: {breakdown['total']}/{breakdown['budget']} tokens | sistema {breakdown['system']} | "
+        f"módulos {breakdown['modules']} {breakdown['module_names']} | RAG {breakdown['rag']} ({breakdown['rag_chunks']} trechos) | "
+        f"histórico {breakdown['history']} ({breakdown['history_messages']} msgs) | turno {breakdown['current_turn']}"
+    )
+    _runtime_metrics.record("prompt_tokens", breakdown["total"])
+    _runtime_metrics.record(f"prompt_tokens:{route['tier']}", breakdown["total"])
+    
+    _runtime_metrics.record("prompt_prep_ms", (time.perf_counter() - prep_started) * 1000)
+    return {
+        "llm": llm_with_tools,
+        "messages": assembled["messages"],
+        "route": route,
+        "last_user_message": last_user_message,
+    }
+
+
+def _model_update(prepared: Dict[str, Any], response) -> Dict[str, Any]:
+    """Resposta do LLM -> atualização do estado (decide se passa pela revisão)."""
+    last_user_message = prepared["last_user_message"]
+    route = prepared["route"]
     
     # 🛡️ FORÇAR REVISÃO EM CASOS CRÍTICOS (Chegada/Navegação/Eventos)
     critical_keywords = ["cheguei", "chegada", "esteira", "mala", "bagagem", "aeroporto", "transporte", "onde", "como chegar", "ônibus", "trem", "uber", "shuttle", "traslado", "banheiro", "portão", "mapa", "palco", "praça", "alimentação", "aluguel", "locadora"]
@@ -157,7 +326,7 @@ def call_model(state: AgentState, config: dict = None):
     
     needs_review = not (hasattr(response, "tool_calls") and response.tool_calls) or is_arrival_query
     
-    if is_simple_msg:
+    if is_simple_msg or route["tier"] == "chit_chat":
         needs_review = False
         logger.info("ℹ️ Mensagem simples detectada. Bypass Expert Review.")
     
@@ -166,99 +335,223 @@ def call_model(state: AgentState, config: dict = None):
         "needs_gemini_review": needs_review
     }
 
-def expert_consensus_review(state: AgentState):
-    """Nó de Consenso: Aciona Gemini e Claude para revisar respostas complexas"""
+
+def call_model(state: AgentState, config: RunnableConfig = None):
+    """Nó principal: Chama o GPT-4 com acesso às tools"""
+    logger.info("🤖 Acionando OpenAI Agent...")
+    prepared = _prepare_model_call(state, config)
+    return _model_update(prepared, prepared["llm"].invoke(prepared["messages"]))
+
+
+async def acall_model(state: AgentState, config: RunnableConfig = None):
+    """Versão async do nó principal: a chamada ao LLM não ocupa thread enquanto espera a OpenAI"""
+    logger.info("🤖 Acionando OpenAI Agent (async)...")
+    # Preparação (perfil, busca no RAG) segue síncrona: roda em thread, mas é curta perto da chamada ao LLM
+    prepared = await asyncio.to_thread(_prepare_model_call, state, config)
+    return _model_update(prepared, await prepared["llm"].ainvoke(prepared["messages"]))
+
+# ============================================================
+# REVISÃO POR CONSENSO (FAN-OUT PARALELO COM PRAZO)
+# ============================================================
+# Gemini e Claude revisam a resposta do GPT ao mesmo tempo (o Claude não espera
+# mais a opinião do Gemini): a latência da revisão passa a ser a do revisor mais
+# lento, limitada por EXPERT_REVIEW_DEADLINE_SECONDS. Quem perde o prazo não
+# segura a resposta: o usuário recebe o que já existe e, se habilitado, um
+# complemento chega depois pelo WhatsApp.
+
+NAVIGATION_KEYWORDS = ["cheguei", "chegada", "esteira", "mala", "aeroporto", "transporte", "onde", "como chegar", "ônibus", "trem", "uber"]
+
+_review_pool = ThreadPoolExecutor(max_workers=settings.EXPERT_REVIEW_WORKERS, thread_name_prefix="expert-review")
+_review_services: Dict[str, Any] = {}
+
+
+def _review_service(name: str):
+    """GeminiService / ClaudeService compartilhados pelo processo"""
+    service = _review_services.get(name)
+    if service is None:
+        with _runtime_lock:
+            service = _review_services.get(name)
+            if service is None:
+                if name == "gemini":
+                    from app.services.gemini_service import GeminiService
+                    service = GeminiService()
+                else:
+                    from app.services.claude_service import ClaudeService
+                    service = ClaudeService()
+                _review_services[name] = service
+    return service
+
+
+def _notify_admin(message: str):
+    admin_num = getattr(settings, "ADMIN_WHATSAPP_NUMBER", "")
+    if admin_num:
+        N8nService().enviar_resposta_usuario(admin_num, message, bypass_firewall=True)
+
+
+def _review_tasks(user_query: str, answer: str, append_only: bool = False) -> Dict[str, Any]:
+    """
+    Revisores configurados -> chamada (independentes entre si).
+    `append_only` (turno em streaming, resposta já entregue): só o Gemini, que acrescenta um bloco;
+    a reescrita do Claude obrigaria a reenviar a resposta inteira.
+    """
+    tasks = {}
+    if settings.GOOGLE_GEMINI_API_KEY:
+        gemini = _review_service("gemini")
+        # Se for consulta de chegada/navegação, usar prompt especializado
+        if any(kw in user_query.lower() for kw in NAVIGATION_KEYWORDS):
+            tasks["gemini"] = lambda: gemini.verify_navigation_and_arrival(answer, user_query)
+        else:
+            tasks["gemini"] = lambda: gemini.get_second_opinion(answer, user_query)
+    if settings.ANTHROPIC_API_KEY and not append_only:
+        claude = _review_service("claude")
+        tasks["claude"] = lambda: claude.get_refined_answer(user_query, answer)
+    return tasks
+
+
+def _run_reviewer(name: str, call) -> Optional[str]:
+    started = time.perf_counter()
+    try:
+        result = call()
+        _runtime_metrics.incr(f"review_ok:{name}" if result else f"review_empty:{name}")
+        return result
+    except Exception as e:
+        _runtime_metrics.incr(f"review_failed:{name}")
+        logger.error(f"❌ Erro no revisor {name}: {e}")
+        error_str = str(e).lower()
+        if name == "gemini" and ("429" in error_str or "quota" in error_str):
+            _notify_admin("🚨 *ALERTA GOOGLE GEMINI*\nO limite de cota gratuita (429) foi atingido. As revisões de segurança estão temporariamente suspensas.")
+        elif name == "claude" and any(kw in error_str for kw in ("balance", "quota", "credit", "400")):
+            _notify_admin("🚨 *ALERTA ANTHROPIC CLAUDE*\nSeu saldo de créditos acabou ou a conta está desativada. O refinamento de respostas de elite está temporariamente desativado. O sistema continuará operando com a resposta padrão.")
+        return None
+    finally:
+        _runtime_metrics.record(f"review_ms:{name}", (time.perf_counter() - started) * 1000)
+
+
+def _gemini_block(review: str) -> str:
+    return f"\n\n---\n✨ **Revisão de Segurança (Consenso IAs):**\n{review}"
+
+
+def _merge_reviews(answer: str, results: Dict[str, Optional[str]]) -> str:
+    """Versão refinada do Claude (ou a original) + bloco de segurança/navegação do Gemini anexado."""
+    final = results.get("claude") or answer
+    if results.get("gemini"):
+        final += _gemini_block(results["gemini"])
+    return final
+
+
+def _send_late_reviews(thread_id: str, pending: Dict[str, Any], loop: Optional[asyncio.AbstractEventLoop]):
+    """
+    Espera os revisores atrasados (até EXPERT_REVIEW_FOLLOWUP_SECONDS) e manda só o que o usuário
+    ainda não recebeu: o bloco do Gemini. A reescrita atrasada do Claude repetiria a resposta já entregue.
+    """
+    gemini = pending.get("gemini")
+    if gemini is None:
+        return
+    done, _ = wait([gemini], timeout=settings.EXPERT_REVIEW_FOLLOWUP_SECONDS)
+    review = gemini.result() if done else None
+    if not review:
+        return
+    text = f"🔎 *Complemento da revisão de especialistas:*\n{review}"
+    try:
+        if loop is not None and loop.is_running():
+            # Pelo event loop da aplicação (mesmo AsyncClient do http_client)
+            from app.services.evolution_service import EvolutionService
+            asyncio.run_coroutine_threadsafe(EvolutionService().send_text(thread_id, text), loop).result(timeout=60)
+        else:
+            N8nService().enviar_resposta_usuario(thread_id, text, bypass_firewall=True)
+        _runtime_metrics.incr("review_followups")
+    except Exception as e:
+        logger.error(f"❌ Erro ao enviar complemento da revisão: {e}")
+
+
+def _is_streamed(config: Optional[RunnableConfig]) -> bool:
+    return bool((config or {}).get("configurable", {}).get("streaming"))
+
+
+def _start_review(state: AgentState, append_only: bool = False) -> Optional[tuple]:
+    """Dispara os revisores no pool. Retorna (resposta, futures, início) ou None se não há o que revisar."""
+    messages = state["messages"]
+    last_ai_message = None
+    user_query = ""
+    
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage) and msg.content and not last_ai_message:
+            last_ai_message = msg.content
+        if isinstance(msg, HumanMessage) and msg.content and not user_query:
+            user_query = msg.content
+    
+    if not last_ai_message or len(last_ai_message) < 150:
+        return None
+    
+    tasks = _review_tasks(user_query, last_ai_message, append_only)
+    if not tasks:
+        return None
+    
+    started = time.perf_counter()
+    futures = {name: _review_pool.submit(_run_reviewer, name, call) for name, call in tasks.items()}
+    return last_ai_message, futures, started
+
+
+def _finish_review(last_ai_message: str, futures: Dict[str, Any], done: set, started: float, config: Optional[RunnableConfig]):
+    """Aplica o que chegou no prazo; os atrasados viram complemento pelo WhatsApp."""
+    results = {name: future.result() for name, future in futures.items() if future in done}
+    pending = {name: future for name, future in futures.items() if future not in done}
+    _runtime_metrics.record("review_wall_ms", (time.perf_counter() - started) * 1000)
+    _runtime_metrics.incr("reviews")
+    
+    if pending:
+        # ⏱️ Retorno especulativo: entrega o que já existe e não espera os atrasados
+        _runtime_metrics.incr("reviews_early_return")
+        for name in pending:
+            _runtime_metrics.incr(f"review_missed_deadline:{name}")
+        logger.warning(f"⏱️ Revisores fora do prazo: {list(pending)}. Entregando resposta sem esperar.")
+        thread_id = (config or {}).get("configurable", {}).get("thread_id", "")
+        # Turno em streaming: a resposta já foi entregue em partes; não manda mais uma mensagem depois
+        if settings.EXPERT_REVIEW_FOLLOWUP and thread_id.isdigit() and "gemini" in pending and not _is_streamed(config):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None  # Caminho síncrono (chat em thread): complemento sai pelo n8n
+            threading.Thread(target=_send_late_reviews, args=(thread_id, pending, loop), daemon=True).start()
+    
+    final_response = _merge_reviews(last_ai_message, results)
+    if final_response.strip() == last_ai_message.strip():
+        return {"messages": [], "needs_gemini_review": False}
+    
+    _runtime_metrics.incr("reviews_changed")
+    logger.info(f"✅ Revisão aplicada ({', '.join(n for n, r in results.items() if r)}).")
+    return {"messages": [AIMessage(content=final_response)], "needs_gemini_review": False}
+
+
+def expert_consensus_review(state: AgentState, config: RunnableConfig = None):
+    """Nó de Consenso: Aciona Gemini e Claude em paralelo para revisar respostas complexas"""
     logger.info("🧠 Acionando revisão por Consenso de Especialistas...")
     
     try:
-        messages = state["messages"]
-        last_ai_message = None
-        user_query = ""
-        
-        for msg in reversed(messages):
-            if isinstance(msg, AIMessage) and msg.content and not last_ai_message:
-                last_ai_message = msg.content
-            if isinstance(msg, HumanMessage) and msg.content and not user_query:
-                user_query = msg.content
-        
-        if not last_ai_message or len(last_ai_message) < 150:
+        review = _start_review(state, append_only=_is_streamed(config))
+        if review is None:
             return {"messages": [], "needs_gemini_review": False}
-            
-        final_response = last_ai_message
-        gemini_opinion = ""
+        last_ai_message, futures, started = review
+        done, _ = wait(list(futures.values()), timeout=settings.EXPERT_REVIEW_DEADLINE_SECONDS)
+        return _finish_review(last_ai_message, futures, done, started, config)
+    except Exception as e:
+        logger.error(f"Erro no Expert Review: {e}")
+        return {"messages": [], "needs_gemini_review": False}
 
-        # 1. Obter opinião do Gemini
-        if settings.GOOGLE_GEMINI_API_KEY:
-            try:
-                from app.services.gemini_service import GeminiService
-                gemini_svc = GeminiService()
-                
-                # Se for consulta de chegada/navegação, usar prompt especializado
-                critical_keywords = ["cheguei", "chegada", "esteira", "mala", "aeroporto", "transporte", "onde", "como chegar", "ônibus", "trem", "uber"]
-                if any(kw in user_query.lower() for kw in critical_keywords):
-                    gemini_res = gemini_svc.verify_navigation_and_arrival(last_ai_message, user_query)
-                else:
-                    gemini_res = gemini_svc.get_second_opinion(last_ai_message, user_query)
-                    
-                if gemini_res:
-                    gemini_opinion = gemini_res
-                    logger.info("✅ Opinião do Gemini obtida.")
-                elif gemini_res is None:
-                    # Se retornou None, pode ser erro de cota
-                    logger.warning("⚠️ Gemini não retornou resposta (possível erro de cota).")
-            except Exception as e:
-                logger.error(f"Erro no Gemini: {e}")
-                if "429" in str(e) or "quota" in str(e).lower():
-                    n8n = N8nService()
-                    admin_num = getattr(settings, "ADMIN_WHATSAPP_NUMBER", "")
-                    if admin_num:
-                        n8n.enviar_resposta_usuario(
-                            admin_num, 
-                            "🚨 *ALERTA GOOGLE GEMINI*\nO limite de cota gratuita (429) foi atingido. As revisões de segurança estão temporariamente suspensas.",
-                            bypass_firewall=True
-                        )
-
-        # 2. Obter refinamento final do Claude (Veredito)
-        if settings.ANTHROPIC_API_KEY:
-            try:
-                from app.services.claude_service import ClaudeService
-                claude_svc = ClaudeService()
-                refined_res = claude_svc.get_refined_answer(user_query, last_ai_message, gemini_opinion)
-                if refined_res:
-                    final_response = refined_res
-                    logger.info("✅ Veredito final do Claude obtido.")
-            except Exception as e:
-                logger.error(f"❌ Erro no Claude: {e}")
-                # Se for erro de créditos, saldo ou cota, avisamos o admin e seguimos o fluxo original
-                error_str = str(e).lower()
-                if "balance" in error_str or "quota" in error_str or "credit" in error_str or "400" in error_str:
-                    n8n = N8nService()
-                    admin_num = getattr(settings, "ADMIN_WHATSAPP_NUMBER", "")
-                    if admin_num:
-                        n8n.enviar_resposta_usuario(
-                            admin_num, 
-                            "🚨 *ALERTA ANTHROPIC CLAUDE*\nSeu saldo de créditos acabou ou a conta está desativada. O refinamento de respostas de elite está temporariamente desativado. O sistema continuará operando com a resposta padrão.",
-                            bypass_firewall=True
-                        )
-        elif gemini_opinion:
-            final_response = f"{last_ai_message}\n\n---\n✨ **Revisão de Segurança (Consenso IAs):**\n{gemini_opinion}"
-
-        if not final_response or final_response == last_ai_message:
-            # Se não houve refinamento ou falhou, mantemos o original mas logamos/notificamos
-            if settings.ANTHROPIC_API_KEY and not final_response:
-                 logger.warning("⚠️ Claude falhou no refinamento. Notificando Admin...")
-                 n8n = N8nService()
-                 admin_num = getattr(settings, "ADMIN_WHATSAPP_NUMBER", "")
-                 if admin_num:
-                     n8n.enviar_resposta_usuario(
-                         admin_num, 
-                         f"🚨 *ALERTA TRAVEL AI*\nO Claude 3.5 falhou por falta de créditos ou erro de API. Verifique sua conta Anthropic.",
-                         bypass_firewall=True
-                     )
-            final_response = last_ai_message
-
-        return {"messages": [AIMessage(content=final_response)], "needs_gemini_review": False}
-        
+
+async def aexpert_consensus_review(state: AgentState, config: RunnableConfig = None):
+    """Versão async do nó de consenso: o turno espera os revisores sem ocupar thread"""
+    logger.info("🧠 Acionando revisão por Consenso de Especialistas (async)...")
+    
+    try:
+        review = _start_review(state, append_only=_is_streamed(config))
+        if review is None:
+            return {"messages": [], "needs_gemini_review": False}
+        last_ai_message, futures, started = review
+        # Os SDKs do Gemini/Claude são síncronos e seguem no pool de revisão; aqui só esperamos
+        waiters = {asyncio.wrap_future(future): future for future in futures.values()}
+        done, _ = await asyncio.wait(list(waiters), timeout=settings.EXPERT_REVIEW_DEADLINE_SECONDS)
+        return _finish_review(last_ai_message, futures, {waiters[w] for w in done}, started, config)
     except Exception as e:
         logger.error(f"Erro no Expert Review: {e}")
         return {"messages": [], "needs_gemini_review": False}
@@ -286,17 +579,21 @@ def route_after_agent(state: AgentState) -> Literal["tools", "expert_review", "e
 # CONSTRUIR GRAFO
 # ============================================================
 
-def create_agent_graph():
-    """Compila o grafo do LangGraph definindo o fluxo exato"""
+def create_agent_graph(checkpointer=None):
+    """
+    Compila o grafo do LangGraph definindo o fluxo exato.
+    Use get_agent_graph() para o grafo compartilhado do processo.
+    """
     
     # Atualiza ALL_TOOLS para incluir a nova ferramenta para o ToolNode
     current_tools_for_node = list(ALL_TOOLS)
     tool_node = ToolNode(current_tools_for_node)
     workflow = StateGraph(AgentState)
     
-    workflow.add_node("agent", call_model)
+    # Cada nó tem as duas versões: invoke (scheduler, scripts) e ainvoke (webhook, no event loop)
+    workflow.add_node("agent", RunnableLambda(call_model, afunc=acall_model, name="agent"))
     workflow.add_node("tools", tool_node)
-    workflow.add_node("expert_review", expert_consensus_review)
+    workflow.add_node("expert_review", RunnableLambda(expert_consensus_review, afunc=aexpert_consensus_review, name="expert_review"))
     
     workflow.set_entry_point("agent")
     
@@ -313,15 +610,13 @@ def create_agent_graph():
     workflow.add_edge("tools", "agent")
     workflow.add_edge("expert_review", END)
     
-    # 🛡️ DEFESA: MemorySaver condicional para não quebrar se módulo mudar
-    try:
-        from langgraph.checkpoint.memory import MemorySaver
-        memory = MemorySaver()
-        app = workflow.compile(checkpointer=memory)
+    if checkpointer is not None:
+        app = workflow.compile(checkpointer=checkpointer)
         logger.info("✅ Grafo LangGraph compilado COM Motor de Memória Persistente")
-    except ImportError:
-        logger.warning("⚠️ MemorySaver não encontrado na sua versão do LangGraph. Compilando SEM persistência na sessão.")
+    else:
         app = workflow.compile()
+        logger.info("✅ Grafo LangGraph compilado SEM persistência na sessão")
+    _runtime_metrics.incr("graph_compiles")
         
     return app
 
@@ -333,37 +628,121 @@ class TravelAgent:
     """Agente principal encapsulado"""
     
     def __init__(self):
-        self.graph = create_agent_graph()
-        logger.info("🚀 TravelAgent inicializado")
-        
-    def chat(self, user_input: str, thread_id: str = "default_thread") -> str:
-        """Processa input com persistência de thread_id entre conversas"""
-        logger.info(f"💬 Usuário: {user_input} (Thread: {thread_id})")
-        
-        config = {"configurable": {"thread_id": thread_id}}
+        self.graph = get_agent_graph()
+        _runtime_metrics.incr("agents_created")
         
+    @staticmethod
+    def _initial_state(state, user_input: str) -> Optional[Dict[str, Any]]:
+        # Retentativa da fila: o turno anterior desta mesma mensagem falhou no meio do grafo.
+        # None retoma do último checkpoint em vez de gravar a mensagem do usuário de novo.
+        if state and state.next and state.values.get("messages"):
+            last_human = next((m for m in reversed(state.values["messages"]) if isinstance(m, HumanMessage)), None)
+            if last_human is not None and str(last_human.content).endswith(user_input):
+                logger.warning(f"🔁 Retomando turno interrompido em {list(state.next)} sem repetir a mensagem do usuário")
+                _runtime_metrics.incr("turns_resumed")
+                return None
         # Adicionar contexto de primeira mensagem se history estiver vazio (Onboarding)
-        state = self.graph.get_state(config)
         is_first_message = not state or not state.values or "messages" not in state.values or len(state.values["messages"]) == 0
         if is_first_message:
             user_input = f"[PRIMEIRA MENSAGEM DO USUÁRIO - APRESENTE-SE DE GALA COMO SEVEN ASSISTANT CONCIERGE] {user_input}"
-
-        initial_state = {
+        return {
             "messages": [HumanMessage(content=user_input)],
             "needs_gemini_review": False
         }
-        
-        result = self.graph.invoke(initial_state, config=config)
-        messages = result.get("messages", [])
-        
+
+    @staticmethod
+    def _final_response(result: Dict[str, Any]) -> str:
         response = ""
-        for msg in reversed(messages):
+        for msg in reversed(result.get("messages", [])):
             if isinstance(msg, AIMessage) and msg.content:
                 response = msg.content
                 break
-                
         logger.info(f"🤖 Agente: {response[:100]}...")
         return response
+
+    def chat(self, user_input: str, thread_id: str = "default_thread") -> str:
+        """Processa input com persistência de thread_id entre conversas"""
+        logger.info(f"💬 Usuário: {user_input} (Thread: {thread_id})")
+        
+        config = {"configurable": {"thread_id": thread_id}}
+        initial_state = self._initial_state(self.graph.get_state(config), user_input)
+        
+        started = time.perf_counter()
+        _runtime_metrics.incr("turns")
+        try:
+            result = self.graph.invoke(initial_state, config=config)
+        except Exception:
+            _runtime_metrics.incr("turn_errors")
+            raise
+        finally:
+            _runtime_metrics.record("turn_ms", (time.perf_counter() - started) * 1000)
+        return self._final_response(result)
+
+    async def achat(self, user_input: str, thread_id: str = "default_thread") -> str:
+        """Versão async de `chat` (graph.ainvoke): centenas de conversas cabem num único event loop"""
+        logger.info(f"💬 Usuário: {user_input} (Thread: {thread_id})")
+        
+        config = {"configurable": {"thread_id": thread_id}}
+        initial_state = self._initial_state(await self.graph.aget_state(config), user_input)
+        
+        started = time.perf_counter()
+        _runtime_metrics.incr("turns")
+        try:
+            result = await self.graph.ainvoke(initial_state, config=config)
+        except Exception:
+            _runtime_metrics.incr("turn_errors")
+            raise
+        finally:
+            _runtime_metrics.record("turn_ms", (time.perf_counter() - started) * 1000)
+        return self._final_response(result)
+
+    async def astream_chat(self, user_input: str, thread_id: str, send) -> str:
+        """
+        Como `achat`, mas entrega a resposta aos poucos por `send` (coroutine que recebe um texto):
+        parágrafos saem enquanto o modelo gera, antes da revisão; se a revisão mudar a
+        resposta, uma mensagem final corrige/complementa. Retorna a resposta final.
+        """
+        logger.info(f"💬 Usuário: {user_input} (Thread: {thread_id}) [streaming]")
+        
+        # "streaming": a revisão só pode acrescentar (a resposta já terá saído em partes)
+        config = {"configurable": {"thread_id": thread_id, "streaming": True}}
+        initial_state = self._initial_state(await self.graph.aget_state(config), user_input)
+        
+        started = time.perf_counter()
+        streamer = ReplyStreamer(send, started_at=started)
+        _runtime_metrics.incr("turns")
+        try:
+            async for mode, event in self.graph.astream(initial_state, config=config, stream_mode=["messages", "updates"]):
+                if mode == "messages":
+                    chunk, metadata = event
+                    if metadata.get("langgraph_node") == "agent" and isinstance(chunk.content, str) and chunk.content:
+                        await streamer.feed(chunk.content)
+                elif "agent" in event:
+                    # Fim de uma chamada ao modelo: texto antes de tool não é resposta; senão envia o resto já
+                    # (preâmbulo longo pode já ter saído: ver reply_streamer)
+                    produced = (event["agent"] or {}).get("messages", [])
+                    if produced and getattr(produced[-1], "tool_calls", None):
+                        if streamer.discard():
+                            _runtime_metrics.incr("stream_tool_preambles_sent")
+                    else:
+                        await streamer.flush()
+        except Exception:
+            _runtime_metrics.incr("turn_errors")
+            raise
+        finally:
+            _runtime_metrics.record("turn_ms", (time.perf_counter() - started) * 1000)
+        
+        response = self._final_response((await self.graph.aget_state(config)).values)
+        await streamer.finish(response)
+        if streamer.first_message_ms is not None:
+            _runtime_metrics.record("time_to_first_message_ms", streamer.first_message_ms)
+        if streamer.messages_sent > 1:
+            _runtime_metrics.incr("streamed_turns")
+        _runtime_metrics.incr("streamed_messages", streamer.messages_sent)
+        if streamer.corrected:
+            _runtime_metrics.incr("stream_corrections")
+        return response
+
     async def run_event(self, event: dict):
         from app.services.evolution_service import EvolutionService
         user_id = event.get("user_id")
@@ -373,6 +752,37 @@ class TravelAgent:
         text = message.get("conversation") or message.get("extendedTextMessage", {}).get("text")
         if text:
             logger.info(f"🤖 Maestro processando texto para {user_id}")
-            response = await asyncio.to_thread(self.chat, user_input=text, thread_id=user_id)
-            if response:
-                await EvolutionService().send_text(user_id, response)
+            evolution = EvolutionService()
+            delivered = False
+
+            async def send(part: str):
+                nonlocal delivered
+                await evolution.send_text(user_id, part)
+                delivered = True
+
+            try:
+                if settings.WHATSAPP_STREAMING_ENABLED:
+                    await self.astream_chat(text, user_id, send=send)
+                    return
+                started = time.perf_counter()
+                response = await self.achat(user_input=text, thread_id=user_id)
+                if response:
+                    await send(response)
+                    _runtime_metrics.record("time_to_first_message_ms", (time.perf_counter() - started) * 1000)
+            except Exception as e:
+                if not delivered:
+                    raise  # Nada chegou ao usuário: a fila pode repetir (o turno é retomado do checkpoint)
+                # Parte da resposta já foi entregue: repetir o turno duplicaria as mensagens
+                _runtime_metrics.incr("turn_errors_after_delivery")
+                logger.error(f"❌ Turno de {user_id} falhou depois de já ter respondido; sem retentativa: {e}")
+
+
+def get_travel_agent() -> TravelAgent:
+    """Agente do processo (grafo, clientes LLM e checkpointer compartilhados)"""
+    global _agent
+    if _agent is None:
+        with _runtime_lock:
+            if _agent is None:
+                _agent = TravelAgent()
+                logger.info("🚀 TravelAgent inicializado")
+    return _agent
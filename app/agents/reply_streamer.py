@@ -0,0 +1,129 @@
+"""
+Reply Streamer - Entrega progressiva de respostas longas pelo WhatsApp.
+
+Consome os tokens do modelo (graph.astream, modo "messages") e envia uma mensagem
+a cada parágrafo/seção fechada, em vez de esperar a resposta inteira + revisão:
+- A primeira mensagem sai assim que houver STREAM_FIRST_MESSAGE_MIN_CHARS fechados em
+  parágrafo (tempo até a primeira mensagem é o que o usuário percebe).
+- As seguintes acumulam pelo menos STREAM_MESSAGE_MIN_CHARS (evita rajada de bolhas).
+- Nenhuma passa de STREAM_MESSAGE_MAX_CHARS: sem fim de parágrafo, corta na última
+  quebra de linha ou frase.
+- Respostas curtas nunca chegam ao limite e saem numa única mensagem, no fim do turno.
+- Em turnos com streaming a revisão dos especialistas só acrescenta (bloco do Gemini);
+  `finish` manda apenas o complemento. Se mesmo assim a resposta final divergir do que
+  foi enviado, só os parágrafos novos/alterados saem, sob CORRECTION_HEADER.
+- Texto antes de uma chamada de tool: só no fim da chamada ao modelo se sabe se ela
+  termina em tool_calls. Segurar tudo até lá anularia o streaming da resposta final,
+  então um preâmbulo longo (acima de STREAM_FIRST_MESSAGE_MIN_CHARS e com quebra de
+  parágrafo) pode sair antes da tool. É aceito: `discard` descarta o resto e tira o
+  preâmbulo da base de comparação, para `finish` não tratar a resposta como divergente.
+"""
+
+import re
+import time
+from typing import Awaitable, Callable, Optional
+from app.config import settings
+
+Sender = Callable[[str], Awaitable[None]]
+
+CORRECTION_HEADER = "✏️ *Versão revisada pelos especialistas:*\n"
+
+
+def _normalized(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+class ReplyStreamer:
+    """Buffer de tokens de um turno -> mensagens enviadas em ordem por `send`"""
+
+    def __init__(self, send: Sender, started_at: Optional[float] = None):
+        self.send = send
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.first_min_chars = settings.STREAM_FIRST_MESSAGE_MIN_CHARS
+        self.min_chars = settings.STREAM_MESSAGE_MIN_CHARS
+        self.max_chars = settings.STREAM_MESSAGE_MAX_CHARS
+        self.buffer = ""
+        self.streamed = ""  # Texto da resposta já entregue (bruto, para comparar com a final)
+        self._call_start = 0  # Posição em `streamed` onde começou a chamada atual ao modelo
+        self.messages_sent = 0
+        self.corrected = False
+        self.first_message_ms: Optional[float] = None
+
+    @property
+    def started(self) -> bool:
+        return self.messages_sent > 0
+
+    async def _emit(self, text: str):
+        text = text.strip()
+        if not text:
+            return
+        if self.first_message_ms is None:
+            self.first_message_ms = (time.perf_counter() - self.started_at) * 1000
+        self.messages_sent += 1
+        await self.send(text)
+
+    def _cut_point(self) -> Optional[int]:
+        """Posição de corte do buffer (fim do último parágrafo que cabe), ou None para esperar."""
+        threshold = self.min_chars if self.started else self.first_min_chars
+        window = self.buffer[: self.max_chars]
+        paragraph = window.rfind("\n\n")
+        if paragraph >= threshold:
+            return paragraph + 2
+        if len(self.buffer) <= self.max_chars:
+            return None
+        # Parágrafo gigante: última quebra de linha, senão fim de frase, senão corte seco
+        for pattern in (r"\n", r"[.!?]\s"):
+            matches = [m.end() for m in re.finditer(pattern, window)]
+            if matches and matches[-1] >= threshold:
+                return matches[-1]
+        return self.max_chars
+
+    async def feed(self, text: str):
+        """Novos tokens da resposta; envia o que já fechou parágrafo."""
+        self.buffer += text
+        cut = self._cut_point()
+        while cut is not None:
+            segment, self.buffer = self.buffer[:cut], self.buffer[cut:]
+            self.streamed += segment
+            await self._emit(segment)
+            cut = self._cut_point()
+
+    def discard(self) -> bool:
+        """
+        A chamada ao modelo terminou em tool_calls: o texto dela não é a resposta.
+        Descarta o buffer e retorna True se parte do preâmbulo já tinha sido enviada.
+        """
+        self.buffer = ""
+        leaked = len(self.streamed) > self._call_start
+        self.streamed = self.streamed[: self._call_start]
+        return leaked
+
+    async def flush(self):
+        """Resposta do modelo terminou: envia o resto (só se o streaming já começou)."""
+        if self.started and self.buffer.strip():
+            self.streamed += self.buffer
+            await self._emit(self.buffer)
+        self.buffer = ""
+        self._call_start = len(self.streamed)
+
+    async def finish(self, final_text: str):
+        """Fim do turno (após a revisão): garante que o usuário tenha a versão final."""
+        if not self.started:
+            await self._emit(final_text)
+            return
+        await self.flush()
+        streamed, final = _normalized(self.streamed), _normalized(final_text)
+        if not final or final == streamed:
+            return
+        sent = self.streamed.strip()
+        if final_text.strip().startswith(sent):
+            # Revisão só acrescentou (bloco do Gemini): manda apenas o complemento
+            self.corrected = True
+            await self._emit(final_text.strip()[len(sent):])
+            return
+        # Divergência: nunca reenvia a resposta inteira, só os parágrafos que o usuário não recebeu
+        delivered = {_normalized(p) for p in self.streamed.split("\n\n")}
+        changed = [p.strip() for p in final_text.strip().split("\n\n") if _normalized(p) and _normalized(p) not in delivered]
+        if changed:
+            self.corrected = True
+            await self._emit(CORRECTION_HEADER + "\n\n".join(changed))
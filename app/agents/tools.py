@@ -11,11 +11,12 @@ from app.services.maps_service import GoogleMapsService
 from app.services.weather_service import WeatherService
 from app.services.flights_service import FlightsService
 from app.services.search_service import SearchService
-from app.services.rag_service import RAGService
+from app.services.rag_service import get_rag_service
 from app.services.duffel_service import DuffelService
 from app.services.serpapi_service import SerpApiService
 from app.services.finance_service import FinanceService
 from app.services.connectivity_service import ConnectivityService
+from app.services.tool_cache import get_tool_cache, normalize_key
 from loguru import logger
 
 # Lazy initialization para evitar erros de ordem de importação
@@ -67,7 +68,7 @@ def get_search_svc():
 def get_rag_svc():
     global _rag_svc
     if _rag_svc is None:
-        _rag_svc = RAGService()
+        _rag_svc = get_rag_service()
     return _rag_svc
 
 def get_duffel_svc():
@@ -128,22 +129,40 @@ def get_travel_recommendations(destination: str, preferences: str) -> str:
     logger.info(f"🎯 Tool: Recomendações para {destination}")
     return get_openai_svc().generate_travel_recommendation(destination, preferences)
 
-@tool
-def get_current_weather(city: str, country_code: str = "") -> str:
-    """Obtém o clima atual de uma cidade."""
-    logger.info(f"🌤️ Tool: Clima em {city}")
-    weather = get_weather_svc().get_current_weather(city, country_code)
-    
+def _with_async(sync_tool, coroutine):
+    """
+    Anexa a implementação async a uma tool: no grafo rodando com ainvoke (webhook) a
+    chamada HTTP fica no event loop; no invoke síncrono (scheduler, scripts) segue a versão sync.
+    """
+    sync_tool.coroutine = coroutine
+    return sync_tool
+
+def _format_weather(city: str, weather) -> str:
     if weather:
         return f"Clima em {weather['city']}, {weather['country']}: {weather['temperature']}°C, {weather['description']}. Sensação: {weather['feels_like']}°C, Umidade: {weather['humidity']}%"
     return f"Não foi possível obter clima para {city}"
 
 @tool
-def get_flight_status(flight_number: str, date: str = "") -> str:
-    """Verifica o status de um voo."""
-    logger.info(f"✈️ Tool: Status do voo {flight_number}")
-    flight = get_flights_svc().get_flight_status(flight_number, date if date else None)
-    
+def get_current_weather(city: str, country_code: str = "") -> str:
+    """Obtém o clima atual de uma cidade."""
+    logger.info(f"🌤️ Tool: Clima em {city}")
+    weather = get_tool_cache().get_or_call(
+        "get_current_weather", normalize_key(city, country_code),
+        lambda: get_weather_svc().get_current_weather(city, country_code),
+    )
+    return _format_weather(city, weather)
+
+async def _aget_current_weather(city: str, country_code: str = "") -> str:
+    logger.info(f"🌤️ Tool: Clima em {city}")
+    weather = await get_tool_cache().aget_or_call(
+        "get_current_weather", normalize_key(city, country_code),
+        lambda: get_weather_svc().aget_current_weather(city, country_code),
+    )
+    return _format_weather(city, weather)
+
+_with_async(get_current_weather, _aget_current_weather)
+
+def _format_flight_status(flight_number: str, flight) -> str:
     if flight:
         info = (
             f"Voo {flight['flight_number']} ({flight['airline']}): {flight['departure_airport']} -> {flight['arrival_airport']}. "
@@ -156,6 +175,18 @@ def get_flight_status(flight_number: str, date: str = "") -> str:
         return info
     return f"Não foi possível obter status do voo {flight_number}"
 
+@tool
+def get_flight_status(flight_number: str, date: str = "") -> str:
+    """Verifica o status de um voo."""
+    logger.info(f"✈️ Tool: Status do voo {flight_number}")
+    return _format_flight_status(flight_number, get_flights_svc().get_flight_status(flight_number, date if date else None))
+
+async def _aget_flight_status(flight_number: str, date: str = "") -> str:
+    logger.info(f"✈️ Tool: Status do voo {flight_number}")
+    return _format_flight_status(flight_number, await get_flights_svc().aget_flight_status(flight_number, date if date else None))
+
+_with_async(get_flight_status, _aget_flight_status)
+
 @tool
 def find_nearby_places(city: str, place_type: str = "restaurant") -> str:
     """Busca lugares próximos em uma cidade."""
@@ -240,8 +271,7 @@ def confirm_document_replacement(config: RunnableConfig) -> str:
     if not pending:
         return "Não encontrei nenhuma substituição pendente."
     
-    from app.services.rag_service import RAGService
-    rag = RAGService()
+    rag = get_rag_svc()
     
     # 1. Remover o antigo (mesmo tipo e viajante)
     traveler = pending.get("traveler")
@@ -294,8 +324,7 @@ def confirm_irrelevancy_inclusion(config: RunnableConfig) -> str:
     if not pending:
         return "Não encontrei nenhum documento irrelevante pendente de inclusão."
     
-    from app.services.rag_service import RAGService
-    rag = RAGService()
+    rag = get_rag_svc()
     
     text = pending.get("text")
     metadata = pending.get("metadata")
@@ -550,7 +579,11 @@ def search_government_notices(destination: str, query: str = "") -> str:
     """
     search_query = f"official government travel alerts notices {destination} {query} site:gov"
     logger.info(f"🏛️ Tool: Buscando avisos governamentais para {destination}")
-    return get_serpapi_svc().search(search_query)
+    return get_tool_cache().get_or_call(
+        "search_government_notices", normalize_key(destination, query),
+        lambda: get_serpapi_svc().search(search_query),
+        cacheable=lambda text: bool(text) and not text.startswith(("Erro", "Busca geral indisponível")),
+    )
 
 @tool
 def search_hotels(city: str, check_in_date: str, check_out_date: str) -> str:
@@ -568,7 +601,41 @@ def convert_currency(amount: float, from_currency: str, to_currency: str = "BRL"
     Use quando o usuário perguntar preços em outra moeda ou quiser saber cotações.
     """
     logger.info(f"💸 Tool: Convertendo {amount} {from_currency} para {to_currency}")
-    return get_finance_svc().convert_currency(amount, from_currency, to_currency)
+    svc = get_finance_svc()
+    if from_currency.upper() == to_currency.upper():
+        return svc.convert_currency(amount, from_currency, to_currency)
+    try:
+        # A cotação (não o valor convertido) é cacheada: qualquer quantia reaproveita
+        quote = get_tool_cache().get_or_call(
+            "convert_currency", normalize_key(from_currency, to_currency),
+            lambda: svc.get_rate(from_currency, to_currency),
+        )
+    except Exception as e:
+        logger.error(f"Erro ao obter cotação: {e}")
+        return "Erro ao realizar conversão de moeda."
+    return _format_conversion(amount, from_currency, to_currency, quote)
+
+def _format_conversion(amount: float, from_currency: str, to_currency: str, quote) -> str:
+    if not quote:
+        return f"Não foi possível converter de {from_currency.upper()} para {to_currency.upper()} no momento."
+    return get_finance_svc().convert_currency(amount, from_currency, to_currency, quote=quote)
+
+async def _aconvert_currency(amount: float, from_currency: str, to_currency: str = "BRL") -> str:
+    logger.info(f"💸 Tool: Convertendo {amount} {from_currency} para {to_currency}")
+    svc = get_finance_svc()
+    if from_currency.upper() == to_currency.upper():
+        return svc.convert_currency(amount, from_currency, to_currency)
+    try:
+        quote = await get_tool_cache().aget_or_call(
+            "convert_currency", normalize_key(from_currency, to_currency),
+            lambda: svc.aget_rate(from_currency, to_currency),
+        )
+    except Exception as e:
+        logger.error(f"Erro ao obter cotação: {e}")
+        return "Erro ao realizar conversão de moeda."
+    return _format_conversion(amount, from_currency, to_currency, quote)
+
+_with_async(convert_currency, _aconvert_currency)
 
 @tool
 def get_internet_options(destination: str) -> str:
@@ -576,7 +643,10 @@ def get_internet_options(destination: str) -> str:
     Obtém as melhores opções de chip de internet e eSIM para o destino do viajante.
     """
     logger.info(f"📶 Tool: Opções de internet para {destination}")
-    return get_connectivity_svc().get_e_sim_recommendations(destination)
+    return get_tool_cache().get_or_call(
+        "get_internet_options", normalize_key(destination),
+        lambda: get_connectivity_svc().get_e_sim_recommendations(destination),
+    )
 
 @tool
 def register_data_plan(total_gb: float, duration_days: int, config: RunnableConfig) -> str:
@@ -659,11 +729,7 @@ def generate_interactive_trip_map(config: RunnableConfig) -> str:
         if not active_trip_id:
             return "Nenhuma viagem ativa encontrada para gerar o mapa. Por favor, envie suas passagens ou vouchers primeiro."
             
-        trip_data = None
-        for t in trip_svc.trips:
-            if t["id"] == active_trip_id:
-                trip_data = t
-                break
+        trip_data = trip_svc.get_trip(active_trip_id)
                 
         if not trip_data:
             return "Erro ao localizar os dados da viagem."
@@ -716,7 +782,11 @@ def get_local_emergency_numbers(country: str) -> str:
     """
     logger.info(f"🚨 Tool: Buscando números de emergência para {country}")
     svc = get_emergency_svc()
-    numbers = svc.get_numbers(country)
+    numbers = get_tool_cache().get_or_call(
+        "get_local_emergency_numbers", normalize_key(country),
+        lambda: svc.get_numbers(country),
+        cacheable=lambda numbers: bool(numbers) and ("note" not in numbers or "info" in numbers),  # Fallback 112 não fica em cache
+    )
     return svc.format_emergency_message(country, numbers)
 
 @tool
@@ -727,9 +797,23 @@ def get_park_live_status(park_name_or_id: str) -> str:
     """
     logger.info(f"🎢 Tool: Buscando status do parque {park_name_or_id}")
     svc = get_park_svc()
-    live_data = svc.get_live_data(park_name_or_id)
+    live_data = get_tool_cache().get_or_call(
+        "get_park_live_status", normalize_key(park_name_or_id),
+        lambda: svc.get_live_data(park_name_or_id),
+    )
+    return svc.format_park_summary(live_data)
+
+async def _aget_park_live_status(park_name_or_id: str) -> str:
+    logger.info(f"🎢 Tool: Buscando status do parque {park_name_or_id}")
+    svc = get_park_svc()
+    live_data = await get_tool_cache().aget_or_call(
+        "get_park_live_status", normalize_key(park_name_or_id),
+        lambda: svc.aget_live_data(park_name_or_id),
+    )
     return svc.format_park_summary(live_data)
 
+_with_async(get_park_live_status, _aget_park_live_status)
+
 @tool
 def get_event_venue_details(event_name: str, venue: str) -> str:
     """
@@ -754,11 +838,9 @@ def generate_social_post(description: str, config: RunnableConfig) -> str:
     
     active_trip_id = user_svc.get_active_trip(user_id)
     destination = "Viagem Incrível"
-    if active_trip_id:
-        for t in trip_svc.trips:
-            if t["id"] == active_trip_id:
-                destination = t["destination"]
-                break
+    trip = trip_svc.get_trip(active_trip_id)
+    if trip:
+        destination = trip["destination"]
                 
     openai_svc = get_openai_svc()
     post_ideas = openai_svc.generate_social_caption(destination, description)
@@ -785,11 +867,8 @@ def manage_trip_sharing(action: str, partner_whatsapp: str, confirmation_code: s
     
     if action == "accept":
         # Encontrar a trip associada ao código
-        partner_trip_id = None
-        for trip in trip_svc.trips:
-            if trip.get("confirmation_code") == confirmation_code:
-                partner_trip_id = trip["id"]
-                break
+        matches = trip_svc.get_trips_by_confirmation_code(confirmation_code)
+        partner_trip_id = matches[0]["id"] if matches else None
         
         if partner_trip_id:
             user_svc.link_user_to_trip(user_id, partner_trip_id)
@@ -921,8 +1000,7 @@ def manual_create_trip(destination: str, start_date: str, config: RunnableConfig
         "participants": [user_id],
         "status": "planned"
     }
-    trip_svc.trips.append(trip_data)
-    trip_svc._save_trips()
+    trip_svc.add_trip(trip_data)
     
     # Link user
     user_svc.link_user_to_trip(user_id, trip_id)
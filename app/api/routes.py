@@ -1,33 +1,22 @@
-﻿from fastapi import APIRouter, Depends, BackgroundTasks, Request, Header, HTTPException
+﻿from fastapi import APIRouter, Depends, Request, Header, HTTPException
 from fastapi.responses import FileResponse
 from loguru import logger
 from typing import Optional, Dict, Any
-import os, asyncio, threading, mimetypes
-from cachetools import TTLCache
-from app.agents.orchestrator import TravelAgent
+import os, mimetypes
+from app.agents.orchestrator import TravelAgent, get_travel_agent
 from app.services.user_service import UserService
+from app.services.location_stream import get_location_stream
+from app.services.idempotency_service import get_idempotency
+from app.services.work_queue import get_work_queue
 from app.config import settings
 
 router = APIRouter()
-_agent = None
-_agent_lock = threading.Lock()
-_locks_cache = TTLCache(maxsize=5000, ttl=300)
-_locks_cache_lock = threading.Lock()
 
 def get_agent() -> TravelAgent:
-    global _agent
-    if _agent is None:
-        with _agent_lock:
-            if _agent is None: _agent = TravelAgent()
-    return _agent
-
-def get_lock(key: str) -> asyncio.Lock:
-    with _locks_cache_lock:
-        if key not in _locks_cache: _locks_cache[key] = asyncio.Lock()
-        return _locks_cache[key]
+    return get_travel_agent()
 
 @router.post("/webhook/whatsapp")
-async def unified_whatsapp_webhook(request: Request, background_tasks: BackgroundTasks, agent: TravelAgent = Depends(get_agent)):
+async def unified_whatsapp_webhook(request: Request):
     try:
         payload = await request.json()
         data = payload.get("data", payload)
@@ -36,21 +25,38 @@ async def unified_whatsapp_webhook(request: Request, background_tasks: Backgroun
         user_id = key.get("remoteJid", "").split("@")[0]
         user_service = UserService()
         normalized_id = user_service.normalize_phone(user_id)
+        
+        # Fila durável: sobrevive a restart, FIFO por usuário e pool global de workers
+        # (também recebe os guias disparados pela localização)
+        queue = get_work_queue()
+        queue.start(run_agent_event)
+
+        # Localização (fixa ou em tempo real): estágio próprio, coalescido por usuário, fora do agente
+        message = data.get("message") or {}
+        location = message.get("liveLocationMessage") or message.get("locationMessage")
+        if location and location.get("degreesLatitude") is not None:
+            get_location_stream().submit(normalized_id, location["degreesLatitude"], location["degreesLongitude"])
+            return {"status": "location_buffered"}
+        
+        # Idempotência na entrada: reentregas do Evolution/n8n não disparam outro turno do LLM
+        text = message.get("conversation") or (message.get("extendedTextMessage") or {}).get("text") or ""
+        job_key = get_idempotency().generate_key(normalized_id, key.get("id"), text, timestamp=data.get("messageTimestamp"))
+        if get_idempotency().seen(job_key) is not None:
+            return {"status": "duplicate"}
+        
         active_trip_id = user_service.get_active_trip(normalized_id)
         
         event = {"user_id": normalized_id, "trip_id": active_trip_id, "payload": data}
-        background_tasks.add_task(run_agent_event, normalized_id, event, agent)
+        if not await queue.enqueue(job_key, normalized_id, event, message_id=key.get("id")):
+            return {"status": "duplicate", "trip": active_trip_id}
         return {"status": "queued", "trip": active_trip_id}
     except Exception as e:
         logger.error(f"Erro Gateway: {e}")
         return {"status": "error"}
 
-async def run_agent_event(user_id: str, event: Dict[str, Any], agent: TravelAgent):
-    async with get_lock(user_id):
-        try:
-            await agent.run_event(event)
-        except Exception as e:
-            logger.error(f"Erro Evento {user_id}: {e}")
+async def run_agent_event(event: Dict[str, Any]):
+    """Handler da fila: só sobem exceções de turnos que ainda não entregaram nada (a WorkQueue repete esses)."""
+    await get_travel_agent().run_event(event)
 
 @router.get("/health")
 async def health(): return {"status": "online", "engine": "Antigravity 8.0"}
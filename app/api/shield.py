@@ -34,3 +34,29 @@ async def repair_system():
     """
     # No futuro, aqui podemos restaurar backups ou limpar locks travados
     return {"success": True, "message": "Reparo disparado. Verifique os logs."}
+
+@router.get("/metrics")
+async def get_performance_metrics():
+    """
+    Contadores de desempenho dos caches e serviços internos (hit rate, latências).
+    """
+    from app.services.rag_service import get_rag_service
+    from app.services.job_runner import get_job_runner
+    from app.services.http_client import get_http_client
+    from app.services.geocode_cache import get_geocode_cache
+    from app.services.location_stream import get_location_stream
+    from app.agents.orchestrator import get_agent_runtime_stats
+    from app.services.tool_cache import get_tool_cache
+    from app.services.work_queue import get_work_queue
+    from app.services.idempotency_service import get_idempotency
+    return {
+        "embedding_cache": get_rag_service().embeddings.cache.get_stats(),
+        "scheduler_jobs": get_job_runner().get_metrics(),
+        "http_pools": get_http_client().get_stats(),
+        "geocode_cache": get_geocode_cache().get_stats(),
+        "location_stream": get_location_stream().get_stats(),
+        "agent_runtime": get_agent_runtime_stats(),
+        "tool_cache": get_tool_cache().get_stats(),
+        "work_queue": get_work_queue().get_stats(),
+        "idempotency": get_idempotency().get_stats(),
+    }
@@ -4,7 +4,7 @@ Para adicionar nova API: apenas adicione a variável aqui e no .env
 """
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Optional, Dict
 from pathlib import Path
 from loguru import logger
 
@@ -13,6 +13,8 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "production"
     PORT: int = 80
     DEBUG: bool = False
+    WEB_WORKERS: int = 1  # Workers do uvicorn (conversas no checkpointer e fila em SQLite são compartilhadas;
+                          # o scheduler roda só no worker que pegar SCHEDULER_LOCK_PATH)
     LOG_LEVEL: str = "INFO"
     API_SECRET_KEY: str = "change-in-production"
     CORS_ORIGINS: str = "*"
@@ -27,6 +29,21 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     GOOGLE_GEMINI_API_KEY: Optional[str] = None
     ENABLE_DUAL_AI_CONSENSUS: bool = True
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 60      # Timeout por chamada à OpenAI (jobs do scheduler têm prazo por item)
+    EXPERT_REVIEW_DEADLINE_SECONDS: float = 12   # Prazo global dos revisores (Gemini/Claude em paralelo)
+    EXPERT_REVIEW_FOLLOWUP: bool = True          # Revisão atrasada vira mensagem complementar
+    EXPERT_REVIEW_FOLLOWUP_SECONDS: float = 90   # Até quando esperar o revisor atrasado
+    EXPERT_REVIEW_WORKERS: int = 8
+    # Orçamento de tokens do prompt do agente (context_assembler)
+    CONTEXT_MAX_INPUT_TOKENS: int = 16000
+    CONTEXT_RAG_MAX_TOKENS: int = 4000
+    CONTEXT_RAG_MIN_SCORE: float = 0.15       # Similaridade mínima para um trecho entrar no prompt
+    CONTEXT_HISTORY_MAX_TOKENS: int = 4000
+    CONTEXT_OLD_MESSAGE_MAX_TOKENS: int = 400  # Mensagens antigas maiores são resumidas
+    # Roteador de intenção (tiers: chit_chat, document_lookup, live_data, planning, general)
+    INTENT_ROUTER_MODEL_PATH: Optional[str] = None  # Pipeline scikit-learn (joblib) opcional
+    INTENT_ROUTER_MIN_CONFIDENCE: float = 0.7
+    INTENT_ROUTER_MAX_CHARS: int = 400              # Mensagens maiores usam o tier completo
     ANTHROPIC_API_KEY: Optional[str] = None
     DUFFEL_API_KEY: Optional[str] = None
     SERP_API_KEY: Optional[str] = None
@@ -49,6 +66,23 @@ class Settings(BaseSettings):
     # ============================================================
     GOOGLE_MAPS_API_KEY: Optional[str] = None
     MAPBOX_ACCESS_TOKEN: Optional[str] = None
+    GEOCODE_CACHE_TTL_DAYS: int = 180       # Endereços/coordenadas resolvidos
+    GEOCODE_NEGATIVE_TTL_HOURS: int = 24    # "Não encontrado" (ZERO_RESULTS)
+    GEOCODE_REVERSE_PRECISION: int = 4      # Casas decimais da célula do reverse (~11 m)
+    GEOFENCE_GRID_DEGREES: float = 0.05     # Célula do índice espacial das cercas (~5.5 km)
+    # Raios de entrada/saída (km): a saída maior evita oscilação na borda (histerese)
+    GEOFENCE_PARK_RADIUS_KM: float = 0.5
+    GEOFENCE_PARK_EXIT_RADIUS_KM: float = 1.0
+    GEOFENCE_DESTINATION_RADIUS_KM: float = 2.0
+    GEOFENCE_DESTINATION_EXIT_RADIUS_KM: float = 3.0
+    GEOFENCE_VENUE_RADIUS_KM: float = 0.5
+    GEOFENCE_VENUE_EXIT_RADIUS_KM: float = 1.0
+    # Localização em tempo real (pings coalescidos por usuário)
+    LOCATION_WORKERS: int = 8
+    LOCATION_MIN_MOVE_METERS: float = 50     # Deslocamentos menores são descartados
+    LOCATION_REFRESH_SECONDS: int = 600      # Reavalia mesmo parado (gatilhos por tempo)
+    LOCATION_IDLE_EVICT_MULTIPLIER: int = 6  # Estado de quem não manda ping há N x REFRESH é descartado
+    LOCATION_TIP_RETRY_MINUTES: int = 15     # Intervalo entre tentativas de dica sem resultado
     
     # ============================================================
     # CLIMA
@@ -86,6 +120,97 @@ class Settings(BaseSettings):
     # ============================================================
     CHROMA_DB_PATH: str = "./data/chroma_db"
     DOCUMENTS_PATH: str = "./data/documents"
+    RAG_COMPACTION_RATIO: float = 0.3  # Fração de linhas mortas que dispara a compactação do Vector Store
+    RAG_INDEX_BACKEND: str = "flat"  # flat | ivf | sqlite-vec
+    RAG_ANN_MIN_PARTITION: int = 20000  # Partições menores usam sempre busca exata
+    RAG_IVF_NPROBE: int = 8
+    RAG_ANN_MAX_CACHED_INDEXES: int = 64  # Índices ANN de partição mantidos em memória (LRU)
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000  # Vetores mantidos no cache persistente (LRU)
+    EMBEDDING_CACHE_TTL_DAYS: int = 90
+    EMBEDDING_CACHE_MEMORY_ENTRIES: int = 4096  # LRU em memória na frente do SQLite
+    # Memória de conversa do agente (checkpoints do LangGraph)
+    CHECKPOINT_BACKEND: str = "sqlite"  # sqlite | memory | pacote.modulo:fabrica (saver em rede)
+    CHECKPOINT_DB_PATH: str = "./data/checkpoints.db"
+    CHECKPOINT_KEEP_PER_THREAD: int = 10   # Checkpoints mantidos por conversa
+    CHECKPOINT_THREAD_TTL_DAYS: int = 60   # Conversas inativas há mais tempo são removidas
+    
+    # ============================================================
+    # LEITURA DE DOCUMENTOS (PDF / OCR)
+    # ============================================================
+    PDF_MAX_PAGES: int = 50  # Páginas além do limite são ignoradas (PDFs gigantes/malformados)
+    PDF_OCR_MIN_CHARS_PER_PAGE: int = 20  # Página com menos texto nativo vai para OCR
+    PDF_OCR_WORKERS: int = 2  # Processos do pool de OCR (0 = OCR no próprio processo)
+    PDF_OCR_DPI: int = 200
+    PDF_OCR_LANG: str = "por+eng"
+    PDF_OCR_PAGE_TIMEOUT_SECONDS: int = 60
+
+    # ============================================================
+    # SCHEDULER (JOBS PROATIVOS)
+    # ============================================================
+    SCHEDULER_ENABLED: bool = True  # False para processos que nunca devem rodar jobs proativos
+    SCHEDULER_LOCK_PATH: str = "./data/scheduler.lock"  # Líder único entre os workers do uvicorn
+    SCHEDULER_JOB_CONCURRENCY: int = 16  # Itens (viagens) processados em paralelo por job
+    SCHEDULER_ITEM_TIMEOUT_SECONDS: int = 180
+    SCHEDULER_JOB_TIMEOUT_SECONDS: int = 1800
+    SCHEDULER_UPSTREAM_LIMITS: Dict[str, int] = {"llm": 8, "flights": 4, "parks": 4, "search": 4}
+    
+    # ============================================================
+    # FILA DURÁVEL DO WEBHOOK (WHATSAPP)
+    # ============================================================
+    WORK_QUEUE_WORKERS: int = 8                    # Turnos do agente em paralelo (por processo)
+    WORK_QUEUE_MAX_ATTEMPTS: int = 3
+    WORK_QUEUE_RETRY_BASE_SECONDS: float = 5       # Backoff: base * 2^(tentativa-1)
+    WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS: int = 300  # Lease renovado enquanto o worker está vivo
+    WORK_QUEUE_POLL_SECONDS: float = 2             # Varredura de retentativas e jobs de outros processos
+    IDEMPOTENCY_LRU_SIZE: int = 50000              # Chaves recentes rejeitadas sem tocar o disco
+    IDEMPOTENCY_RETENTION_DAYS: int = 7            # Registros mais antigos são removidos na limpeza diária
+    
+    # ============================================================
+    # RESPOSTAS EM STREAMING (WHATSAPP)
+    # ============================================================
+    WHATSAPP_STREAMING_ENABLED: bool = True
+    STREAM_FIRST_MESSAGE_MIN_CHARS: int = 300   # Primeira mensagem sai cedo (tempo até a 1ª mensagem)
+    STREAM_MESSAGE_MIN_CHARS: int = 800         # Demais mensagens agrupam parágrafos
+    STREAM_MESSAGE_MAX_CHARS: int = 3000
+    
+    # ============================================================
+    # CACHE DE RESULTADOS DAS TOOLS DO AGENTE
+    # ============================================================
+    TOOL_CACHE_MAX_ENTRIES: int = 5000
+    # TTL (s) por tool; tools fora do mapa não são cacheadas
+    TOOL_CACHE_TTL_SECONDS: Dict[str, float] = {
+        "get_park_live_status": 5 * 60,
+        "get_current_weather": 15 * 60,
+        "convert_currency": 3 * 3600,
+        "search_government_notices": 6 * 3600,
+        "get_local_emergency_numbers": 30 * 86400,
+        "get_internet_options": 7 * 86400,
+    }
+    
+    # ============================================================
+    # HTTP DE SAÍDA (POOL COMPARTILHADO)
+    # ============================================================
+    HTTP_POOL_HOSTS: int = 32           # Pools (hosts) mantidos em cache
+    HTTP_POOL_MAXSIZE: int = 32         # Conexões keep-alive por host
+    HTTP_DEFAULT_TIMEOUT_SECONDS: float = 15
+    HTTP_DEFAULT_RETRIES: int = 1
+    # Timeout (s) e orçamento de retentativas por integração
+    HTTP_INTEGRATIONS: Dict[str, Dict[str, float]] = {
+        "google_maps": {"timeout": 15, "retries": 2},
+        "weather": {"timeout": 15, "retries": 2},
+        "flights": {"timeout": 15, "retries": 1},
+        "parks": {"timeout": 10, "retries": 2},
+        "finance": {"timeout": 10, "retries": 2},
+        "search": {"timeout": 15, "retries": 1},
+        "serpapi": {"timeout": 15, "retries": 1},
+        "booking": {"timeout": 20, "retries": 1},
+        "duffel": {"timeout": 30, "retries": 1},
+        "elevenlabs": {"timeout": 30, "retries": 0},
+        "n8n": {"timeout": 15, "retries": 1},
+        "whatsapp": {"timeout": 15, "retries": 1},
+        "evolution": {"timeout": 15, "retries": 1},
+        "diagnostic": {"timeout": 5, "retries": 0},
+    }
     
     # ============================================================
     # GOOGLE DRIVE
@@ -5,10 +5,10 @@ Base Parser - Classe abstrata para todos os parsers
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 from loguru import logger
-import PyPDF2
 import io
 import pytesseract
 from PIL import Image
+from app.parsers.pdf_extraction import extract_pdf_pages
 
 class BaseParser(ABC):
     """Classe base para todos os parsers de documentos"""
@@ -17,6 +17,7 @@ class BaseParser(ABC):
         """Inicializa o parser com injeção de dependência opcional"""
         self.supported_formats = ['pdf', 'png', 'jpg', 'jpeg']
         self.openai_svc = openai_svc
+        self.last_extraction_stats: Optional[Dict[str, Any]] = None  # Tempos da última extração de PDF
         
     @abstractmethod
     def parse(self, file_content: bytes, filename: str) -> Dict[str, Any]:
@@ -36,41 +37,15 @@ class BaseParser(ABC):
             return ""
 
     def extract_text_from_pdf(self, file_content: bytes) -> str:
-        """Extrai texto de um PDF (tenta texto nativo primeiro, depois OCR)"""
+        """Extrai texto de um PDF página a página (texto nativo; OCR só nas páginas escaneadas)"""
         try:
-            pdf_file = io.BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            text = ""
-            for page in pdf_reader.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
-            
-            # Se o PDF for só uma imagem escaneada (boarding pass etc), OCR real
-            if len(text.strip()) < 20:
-                logger.info("📷 PDF parece ser baseado em imagem (ex: boarding pass). Iniciando OCR via pdf2image...")
-                try:
-                    from pdf2image import convert_from_bytes
-                    images = convert_from_bytes(file_content, dpi=200)
-                    ocr_text = ""
-                    for img in images:
-                        page_text = pytesseract.image_to_string(img, lang='por+eng')
-                        ocr_text += page_text + "\n"
-                    
-                    if ocr_text.strip():
-                        logger.info(f"✅ OCR concluído: {len(ocr_text)} caracteres extraídos de {len(images)} página(s)")
-                        return ocr_text.strip()
-                    else:
-                        logger.warning("⚠️ OCR não extraiu texto. PDF pode ser muito complexo ou corrompido.")
-                except ImportError:
-                    logger.error("❌ pdf2image não instalado. Adicione 'pdf2image' ao requirements.txt")
-                except Exception as ocr_err:
-                    logger.error(f"❌ Erro no OCR do PDF: {ocr_err}")
-            
-            logger.debug(f"Texto extraído do PDF: {len(text)} caracteres")
-            return text.strip()
-            
+            result = extract_pdf_pages(file_content)
+            self.last_extraction_stats = result["timings"]
+            if result["timings"]["pages_ocr"] and not result["text"]:
+                logger.warning("⚠️ OCR não extraiu texto. PDF pode ser muito complexo ou corrompido.")
+            logger.debug(f"Texto extraído do PDF: {len(result['text'])} caracteres")
+            return result["text"]
+
         except Exception as e:
             logger.error(f"Erro ao extrair texto do PDF: {e}")
             return ""
@@ -0,0 +1,209 @@
+"""
+PDF Extraction - Pipeline de extração de texto de PDFs página a página.
+
+1. Texto nativo (PyPDF2) página por página; páginas com menos de
+   PDF_OCR_MIN_CHARS_PER_PAGE caracteres vão para OCR. Um PDF misto
+   (capa escaneada + páginas digitais) só faz OCR do que precisa.
+2. OCR em pool de processos (PDF_OCR_WORKERS): cada tarefa renderiza UMA página
+   (pdf2image first_page/last_page, direto do arquivo temporário) e roda o Tesseract.
+   Nunca há o documento inteiro rasterizado em memória, e a renderização/OCR
+   começa enquanto as páginas seguintes ainda estão sendo lidas. Os workers sobem
+   via forkserver (ou spawn), nunca por fork do processo web com threads ativas.
+   PDF_OCR_PAGE_TIMEOUT_SECONDS limita o Tesseract; se mesmo assim o worker travar,
+   ele é morto e o pool recriado. O prazo da página só corre depois que ela sai da
+   fila do pool (compartilhado entre documentos): esperar a vez não é travar.
+3. PDF_MAX_PAGES limita as páginas processadas (vouchers gigantes, PDFs malformados).
+
+Cada extração devolve o detalhamento de tempo (nativo, OCR, total) por documento.
+"""
+
+import io
+import os
+import multiprocessing
+import importlib.util
+import time
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+import PyPDF2
+from loguru import logger
+from app.config import settings
+
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+_QUEUE_POLL_SECONDS = 0.1
+
+
+def _render_and_ocr(pdf_path: str, page_number: int, dpi: int, lang: str, timeout: float = 0) -> Tuple[str, float]:
+    """Roda no processo do pool: renderiza só a página `page_number` (1-based) e aplica OCR (timeout 0 = sem limite)."""
+    from pdf2image import convert_from_path
+    import pytesseract
+
+    started = time.perf_counter()
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number, grayscale=True)
+    text = pytesseract.image_to_string(images[0], lang=lang, timeout=timeout) if images else ""
+    return text, (time.perf_counter() - started) * 1000
+
+
+def _ocr_available() -> bool:
+    """Checa o pdf2image antes de subir o pool (falha cedo, com a mesma mensagem de antes)."""
+    return importlib.util.find_spec("pdf2image") is not None
+
+
+def _get_ocr_pool(workers: int) -> ProcessPoolExecutor:
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            # fork copiaria as threads e locks do processo web (uvicorn, loguru, clientes HTTP)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _ocr_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            logger.info(f"🖨️ Pool de OCR iniciado ({workers} processos, {method})")
+        return _ocr_pool
+
+
+def _discard_ocr_pool(pool: Optional[ProcessPoolExecutor], kill: bool = False):
+    """Tira `pool` de uso (o próximo documento sobe outro); kill=True mata os workers travados."""
+    global _ocr_pool
+    if pool is None:
+        return
+    with _ocr_pool_lock:
+        if _ocr_pool is pool:
+            _ocr_pool = None
+    # shutdown(wait=False) não interrompe uma tarefa em andamento: o worker preso seguiria ocupando a vaga
+    processes = list((getattr(pool, "_processes", None) or {}).values()) if kill else []
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def shutdown_ocr_pool():
+    """Encerra o pool de OCR (shutdown da aplicação)."""
+    _discard_ocr_pool(_ocr_pool)
+
+
+def _wait_for_page(job, timeout: float) -> Tuple[str, float]:
+    """Resultado da página; o prazo conta a partir de quando ela começa a rodar, não do início da espera."""
+    while not job.running() and not job.done():
+        try:
+            return job.result(timeout=_QUEUE_POLL_SECONDS)
+        except FutureTimeoutError:
+            continue
+    return job.result(timeout=timeout)
+
+
+def extract_pdf_pages(
+    file_content: bytes,
+    max_pages: Optional[int] = None,
+    ocr_workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Extrai o texto de um PDF página a página.
+    `ocr_workers=0` roda o OCR no próprio processo (sem pool).
+    Retorna {"text", "pages": [texto por página], "timings": {...}}.
+    """
+    started = time.perf_counter()
+    max_pages = settings.PDF_MAX_PAGES if max_pages is None else max_pages
+    ocr_workers = settings.PDF_OCR_WORKERS if ocr_workers is None else ocr_workers
+    timings: Dict[str, Any] = {
+        "pages_total": 0, "pages_processed": 0, "pages_native": 0, "pages_ocr": 0, "pages_ocr_failed": 0,
+        "native_ms": 0.0, "ocr_wall_ms": 0.0, "ocr_page_ms": 0.0, "total_ms": 0.0, "truncated": False,
+    }
+
+    reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    total_pages = len(reader.pages)
+    page_count = min(total_pages, max_pages)
+    timings.update(pages_total=total_pages, pages_processed=page_count, truncated=total_pages > page_count)
+    if timings["truncated"]:
+        logger.warning(f"✂️ PDF com {total_pages} páginas: processando só as primeiras {page_count}")
+
+    pages: List[str] = [""] * page_count
+    pending: Dict[int, Any] = {}
+    pdf_path = None
+    pool = None
+    ocr_available = True
+
+    try:
+        for index in range(page_count):
+            t0 = time.perf_counter()
+            try:
+                native = reader.pages[index].extract_text() or ""
+            except Exception as e:
+                logger.warning(f"⚠️ Falha no texto nativo da página {index + 1}: {e}")
+                native = ""
+            timings["native_ms"] += (time.perf_counter() - t0) * 1000
+
+            if len(native.strip()) >= settings.PDF_OCR_MIN_CHARS_PER_PAGE:
+                pages[index] = native
+                timings["pages_native"] += 1
+                continue
+
+            # Página escaneada (boarding pass, voucher em imagem): OCR só desta página
+            pages[index] = native
+            if not ocr_available:
+                continue
+            if pdf_path is None:
+                if not _ocr_available():
+                    logger.error("❌ pdf2image não instalado. Adicione 'pdf2image' ao requirements.txt")
+                    ocr_available = False
+                    continue
+                with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                    tmp.write(file_content)
+                    pdf_path = tmp.name
+                ocr_started = time.perf_counter()
+                if ocr_workers > 0:
+                    pool = _get_ocr_pool(ocr_workers)
+            args = (pdf_path, index + 1, settings.PDF_OCR_DPI, settings.PDF_OCR_LANG, settings.PDF_OCR_PAGE_TIMEOUT_SECONDS)
+            pending[index] = pool.submit(_render_and_ocr, *args) if pool else args
+
+        for index, job in pending.items():
+            try:
+                if isinstance(job, tuple):
+                    text, page_ms = _render_and_ocr(*job)
+                else:
+                    text, page_ms = _wait_for_page(job, settings.PDF_OCR_PAGE_TIMEOUT_SECONDS)
+            except BrokenProcessPool as e:
+                # Worker morreu (OOM no rasterizador): o próximo documento sobe um pool novo
+                _discard_ocr_pool(pool)
+                timings["pages_ocr_failed"] += 1
+                logger.error(f"❌ Pool de OCR quebrado na página {index + 1}: {e}")
+                continue
+            except FutureTimeoutError:
+                if job.running():
+                    # Travou fora do alcance do timeout do Tesseract (ex.: rasterização): mata o worker
+                    _discard_ocr_pool(pool, kill=True)
+                timings["pages_ocr_failed"] += 1
+                logger.error(f"⏱️ OCR da página {index + 1} passou de {settings.PDF_OCR_PAGE_TIMEOUT_SECONDS}s")
+                continue
+            except Exception as e:
+                timings["pages_ocr_failed"] += 1
+                logger.error(f"❌ Erro no OCR da página {index + 1}: {e}")
+                continue
+            timings["pages_ocr"] += 1
+            timings["ocr_page_ms"] += page_ms
+            if text.strip():
+                pages[index] = text
+        if pending:
+            timings["ocr_wall_ms"] = (time.perf_counter() - ocr_started) * 1000
+    finally:
+        if pdf_path:
+            for job in pending.values():
+                if not isinstance(job, tuple):
+                    job.cancel()
+            try:
+                os.remove(pdf_path)
+            except OSError:
+                pass
+
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
+    for key in ("native_ms", "ocr_wall_ms", "ocr_page_ms", "total_ms"):
+        timings[key] = round(timings[key], 1)
+    text = "\n".join(page.strip() for page in pages if page.strip())
+    logger.info(
+        f"📄 PDF: {page_count}/{total_pages} páginas | nativo {timings['pages_native']} ({timings['native_ms']} ms) | "
+        f"OCR {timings['pages_ocr']} ({timings['ocr_wall_ms']} ms, {timings['ocr_page_ms']} ms somando páginas) | "
+        f"total {timings['total_ms']} ms"
+    )
+    return {"text": text, "pages": pages, "timings": timings}
@@ -0,0 +1,153 @@
+"""
+ANN Index - Backends de busca vetorial plugáveis para o RAG
+
+- flat        -> busca exata (produto matriz-vetor sobre a partição)
+- ivf         -> IVF em NumPy puro (k-means esférico + nprobe listas por query)
+- sqlite-vec  -> tabela vec0 em memória (extensão sqlite-vec do requirements)
+
+Todos recebem vetores já normalizados (L2) de UMA partição e devolvem índices
+locais + scores de cosseno, então a semântica de filtro (trip_id/thread_id)
+é sempre a mesma. Partições pequenas usam sempre a busca exata.
+"""
+
+import sqlite3
+import numpy as np
+from typing import List, Tuple, Any
+from loguru import logger
+
+Hits = List[Tuple[np.ndarray, np.ndarray]]  # por query: (índices locais, scores)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices dos k maiores scores em ordem decrescente (argpartition + sort só do top-k)."""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class FlatIndex:
+    """Busca exata: um único produto de matrizes (Q x N)"""
+    name = "flat"
+
+    def build(self, vectors: np.ndarray) -> Any:
+        return vectors
+
+    def search(self, handle: Any, queries: np.ndarray, k: int) -> Hits:
+        scores = queries @ handle.T
+        results = []
+        for row in scores:
+            idx = top_k(row, k)
+            results.append((idx, row[idx]))
+        return results
+
+
+class IVFIndex:
+    """
+    Inverted File em NumPy: agrupa os vetores em ~sqrt(N) centróides e, na busca,
+    pontua exatamente apenas as listas dos `nprobe` centróides mais próximos.
+    """
+    name = "ivf"
+
+    def __init__(self, nprobe: int = 8, iterations: int = 10, sample_size: int = 50000, seed: int = 42):
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.sample_size = sample_size
+        self.seed = seed
+
+    def build(self, vectors: np.ndarray) -> Any:
+        n = vectors.shape[0]
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(n, size=min(n, self.sample_size), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+
+        # k-means esférico (vetores normalizados -> similaridade de cosseno)
+        for _ in range(self.iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):  # atribuição em blocos para limitar memória
+            assign[start:start + 65536] = np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+        return {"vectors": vectors, "centroids": centroids, "lists": lists}
+
+    def search(self, handle: Any, queries: np.ndarray, k: int) -> Hits:
+        vectors, centroids, lists = handle["vectors"], handle["centroids"], handle["lists"]
+        probe_scores = queries @ centroids.T
+        nprobe = min(self.nprobe, centroids.shape[0])
+        results = []
+        for q, row in zip(queries, probe_scores):
+            probes = top_k(row, nprobe)
+            candidates = np.concatenate([lists[c] for c in probes])
+            if candidates.size == 0:
+                results.append((candidates, np.empty(0, dtype=np.float32)))
+                continue
+            scores = vectors[candidates] @ q
+            idx = top_k(scores, k)
+            results.append((candidates[idx], scores[idx]))
+        return results
+
+
+class SqliteVecIndex:
+    """KNN da extensão sqlite-vec sobre uma tabela vec0 em memória (distância de cosseno)"""
+    name = "sqlite-vec"
+
+    def __init__(self):
+        import sqlite_vec  # ImportError tratado em get_index_backend
+        self._sqlite_vec = sqlite_vec
+        conn = sqlite3.connect(":memory:")
+        conn.enable_load_extension(True)  # AttributeError se o Python não suportar extensões
+        sqlite_vec.load(conn)
+        conn.close()
+
+    def build(self, vectors: np.ndarray) -> Any:
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        conn.enable_load_extension(True)
+        self._sqlite_vec.load(conn)
+        conn.enable_load_extension(False)
+        conn.execute(f"CREATE VIRTUAL TABLE vec USING vec0(embedding float[{vectors.shape[1]}] distance_metric=cosine)")
+        conn.executemany(
+            "INSERT INTO vec(rowid, embedding) VALUES (?, ?)",
+            ((i, np.ascontiguousarray(v, dtype=np.float32).tobytes()) for i, v in enumerate(vectors)),
+        )
+        conn.commit()
+        return conn
+
+    def search(self, handle: Any, queries: np.ndarray, k: int) -> Hits:
+        results = []
+        for q in queries:
+            rows = handle.execute(
+                "SELECT rowid, distance FROM vec WHERE embedding MATCH ? AND k = ? ORDER BY distance",
+                (np.ascontiguousarray(q, dtype=np.float32).tobytes(), k),
+            ).fetchall()
+            idx = np.array([r[0] for r in rows], dtype=np.int64)
+            scores = 1.0 - np.array([r[1] for r in rows], dtype=np.float32)
+            results.append((idx, scores))
+        return results
+
+
+def get_index_backend(name: str, nprobe: int = 8):
+    """Instancia o backend configurado; cai para a busca exata se a dependência não estiver disponível."""
+    name = (name or "flat").lower()
+    if name == "ivf":
+        return IVFIndex(nprobe=nprobe)
+    if name in ("sqlite-vec", "sqlite_vec"):
+        try:
+            return SqliteVecIndex()
+        except (ImportError, AttributeError, sqlite3.Error) as e:
+            logger.warning(f"⚠️ sqlite-vec indisponível ({e}). Usando busca exata (flat).")
+            return FlatIndex()
+    if name != "flat":
+        logger.warning(f"⚠️ Backend de índice desconhecido '{name}'. Usando busca exata (flat).")
+    return FlatIndex()
@@ -1,4 +1,4 @@
-import requests
+from app.services.http_client import get_http_client
 import json
 from datetime import datetime
 from loguru import logger
@@ -13,6 +13,7 @@ class BookingService:
         self.api_key = settings.AERODATABOX_API_KEY 
         self.host = "booking-com15.p.rapidapi.com"
         self.base_url = f"https://{self.host}/api/v1"
+        self.http = get_http_client()
         self.headers = {
             "X-RapidAPI-Key": self.api_key,
             "X-RapidAPI-Host": self.host
@@ -27,7 +28,7 @@ class BookingService:
         
         try:
             logger.debug(f"Buscando dest_id para: {city_name} (DataCrawler)")
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
+            response = self.http.get("booking", url, headers=self.headers, params=params, timeout=10)
             
             if response.status_code != 200:
                 logger.error(f"Erro ao buscar destino: {response.text}")
@@ -74,7 +75,7 @@ class BookingService:
 
         try:
             logger.info(f"Buscando hotéis via DataCrawler para {city}")
-            response = requests.get(url, headers=self.headers, params=params, timeout=20)
+            response = self.http.get("booking", url, headers=self.headers, params=params)
             
             if response.status_code != 200:
                 logger.error(f"Erro na API de hotéis: {response.text}")
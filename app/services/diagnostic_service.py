@@ -1,6 +1,6 @@
 import os
 import json
-import httpx
+from app.services.http_client import get_http_client
 import time
 from loguru import logger
 from app.config import settings
@@ -116,9 +116,8 @@ class DiagnosticService:
             deps["openai"] = {"status": "MISSING_KEY"}
         else:
             try:
-                async with httpx.AsyncClient() as client:
-                    resp = await client.get("https://api.openai.com/v1/models", headers={"Authorization": f"Bearer {settings.OPENAI_API_KEY}"}, timeout=5.0)
-                    deps["openai"] = {"status": "OK" if resp.status_code == 200 else "ERROR", "code": resp.status_code}
+                resp = await get_http_client().aget("diagnostic", "https://api.openai.com/v1/models", headers={"Authorization": f"Bearer {settings.OPENAI_API_KEY}"})
+                deps["openai"] = {"status": "OK" if resp.status_code == 200 else "ERROR", "code": resp.status_code}
             except Exception as e:
                 deps["openai"] = {"status": "ERROR", "message": str(e)}
 
@@ -128,9 +127,8 @@ class DiagnosticService:
         else:
             try:
                 url = f"{settings.EVOLUTION_API_URL}/instance/fetchInstances"
-                async with httpx.AsyncClient() as client:
-                    resp = await client.get(url, headers={"apikey": str(settings.EVOLUTION_API_KEY)}, timeout=5.0)
-                    deps["evolution_api"] = {"status": "OK" if resp.status_code == 200 else "ERROR", "code": resp.status_code}
+                resp = await get_http_client().aget("diagnostic", url, headers={"apikey": str(settings.EVOLUTION_API_KEY)})
+                deps["evolution_api"] = {"status": "OK" if resp.status_code == 200 else "ERROR", "code": resp.status_code}
             except Exception as e:
                 deps["evolution_api"] = {"status": "ERROR", "message": str(e)}
 
@@ -139,9 +137,8 @@ class DiagnosticService:
             deps["n8n"] = {"status": "MISSING_URL"}
         else:
             try:
-                async with httpx.AsyncClient() as client:
-                    resp = await client.get(settings.N8N_WEBHOOK_URL.split("/webhook")[0], timeout=5.0)
-                    deps["n8n"] = {"status": "OK" if resp.status_code < 500 else "DEGRADED", "code": resp.status_code}
+                resp = await get_http_client().aget("diagnostic", settings.N8N_WEBHOOK_URL.split("/webhook")[0])
+                deps["n8n"] = {"status": "OK" if resp.status_code < 500 else "DEGRADED", "code": resp.status_code}
             except Exception as e:
                 deps["n8n"] = {"status": "ERROR", "message": str(e)}
 
@@ -3,7 +3,7 @@ Duffel Service - Busca e reserva de voos via REST API direta (sem SDK)
 Suporta: busca multi-passageiro, múltiplos resultados, booking real.
 """
 
-import requests
+from app.services.http_client import get_http_client
 from app.config import settings
 from loguru import logger
 from typing import List, Dict, Optional
@@ -15,6 +15,7 @@ class DuffelService:
 
     def __init__(self):
         self.api_key = settings.DUFFEL_API_KEY
+        self.http = get_http_client()
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Duffel-Version": "v2",
@@ -64,11 +65,11 @@ class DuffelService:
 
         try:
             logger.info(f"✈️ Buscando voos Duffel: {origin} -> {destination} | {adults}A+{children}C | {departure_date}")
-            resp = requests.post(
+            resp = self.http.post(
+                "duffel",
                 f"{DUFFEL_BASE_URL}/offer_requests?return_offers=true",
                 headers=self.headers,
                 json=payload,
-                timeout=30,
             )
 
             if resp.status_code not in (200, 201):
@@ -133,7 +134,8 @@ class DuffelService:
     def get_offer_details(self, offer_id: str) -> dict:
         """Retorna detalhes completos de uma oferta para booking"""
         try:
-            resp = requests.get(
+            resp = self.http.get(
+                "duffel",
                 f"{DUFFEL_BASE_URL}/offers/{offer_id}",
                 headers=self.headers,
                 timeout=15,
@@ -194,11 +196,11 @@ class DuffelService:
 
         try:
             logger.info(f"🎫 Criando reserva Duffel para oferta {offer_id[:30]}...")
-            resp = requests.post(
+            resp = self.http.post(
+                "duffel",
                 f"{DUFFEL_BASE_URL}/orders",
                 headers=self.headers,
                 json=payload,
-                timeout=30,
             )
 
             if resp.status_code in (200, 201):
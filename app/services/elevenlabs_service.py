@@ -2,7 +2,7 @@
 ElevenLabs Service - Conversão de texto em áudio para mensagens de voz
 """
 
-import requests
+from app.services.http_client import get_http_client
 from app.config import settings
 from loguru import logger
 from typing import Optional
@@ -14,6 +14,7 @@ class ElevenLabsService:
         """Inicializa o service"""
         self.api_key = settings.ELEVENLABS_API_KEY
         self.base_url = "https://api.elevenlabs.io/v1"
+        self.http = get_http_client()
         
         if not self.api_key:
             logger.warning("⚠️ ElevenLabs API key não configurada.")
@@ -41,7 +42,7 @@ class ElevenLabsService:
                 }
             }
             
-            response = requests.post(url, json=data, headers=headers, timeout=30)
+            response = self.http.post("elevenlabs", url, json=data, headers=headers)
             
             if response.status_code == 200:
                 logger.info("✅ Áudio gerado com sucesso via ElevenLabs")
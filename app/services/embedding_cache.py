@@ -0,0 +1,196 @@
+"""
+Embedding Cache - Cache persistente de embeddings (SQLite + LRU em memória)
+
+Chave: hash SHA-256 de (modelo + texto normalizado). Texto repetido (mensagens,
+chunks de PDFs reenviados, queries fixas dos jobs proativos) nunca volta à API.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Optional
+from loguru import logger
+from app.config import settings
+
+
+class EmbeddingCache:
+    """Cache de vetores em duas camadas: LRU em memória na frente de uma tabela SQLite com TTL"""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        ttl_days: Optional[int] = None,
+        memory_entries: Optional[int] = None,
+    ):
+        self.db_path = db_path or os.path.join(os.path.dirname(settings.CHROMA_DB_PATH), "embedding_cache.db")
+        self.max_entries = max_entries if max_entries is not None else settings.EMBEDDING_CACHE_MAX_ENTRIES
+        self.ttl_seconds = (ttl_days if ttl_days is not None else settings.EMBEDDING_CACHE_TTL_DAYS) * 86400
+        self.memory_entries = memory_entries if memory_entries is not None else settings.EMBEDDING_CACHE_MEMORY_ENTRIES
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts_since_prune = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evicted": 0}
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                dim INTEGER,
+                vector BLOB,
+                created_at REAL,
+                last_access REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+    # ============================================================
+    # CHAVES
+    # ============================================================
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Normalização conservadora: Unicode NFC + espaços colapsados (não altera caixa)."""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+    @classmethod
+    def make_key(cls, model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{cls.normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    # ============================================================
+    # LEITURA / ESCRITA
+    # ============================================================
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Retorna os vetores encontrados (memória -> disco). Chaves ausentes/expiradas ficam de fora."""
+        found: Dict[str, np.ndarray] = {}
+        now = time.time()
+        with self._lock:
+            pending = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.stats["memory_hits"] += 1
+                else:
+                    pending.append(key)
+
+            if pending:
+                unique = list(dict.fromkeys(pending))
+                placeholders = ",".join("?" * len(unique))
+                rows = self._conn.execute(
+                    f"SELECT key, dim, vector, created_at FROM embeddings WHERE key IN ({placeholders})", unique
+                ).fetchall()
+                expired = []
+                for key, dim, blob, created_at in rows:
+                    if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                        expired.append(key)
+                        continue
+                    vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+                    found[key] = vector
+                    self._remember(key, vector)
+                if expired:
+                    self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(k,) for k in expired])
+                hits = [k for k in unique if k in found]
+                if hits:
+                    self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, k) for k in hits])
+                self._conn.commit()
+                for key in pending:
+                    self.stats["disk_hits" if key in found else "misses"] += 1
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            rows = []
+            for key, vector in items.items():
+                arr = np.asarray(vector, dtype=np.float32)
+                self._remember(key, arr)
+                rows.append((key, model, int(arr.shape[0]), arr.tobytes(), now, now))
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._inserts_since_prune += len(rows)
+            if self._inserts_since_prune >= 500:
+                self._prune()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self):
+        """Remove expirados e, acima do limite, os menos acessados (LRU)."""
+        self._inserts_since_prune = 0
+        removed = 0
+        if self.ttl_seconds:
+            removed += self._conn.execute(
+                "DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if total > self.max_entries:
+            removed += self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (total - self.max_entries,),
+            ).rowcount
+        self._conn.commit()
+        if removed:
+            self.stats["evicted"] += removed
+            logger.info(f"🧹 Embedding cache: {removed} vetores removidos (TTL/LRU)")
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {**self.stats, "lookups": lookups, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
+
+
+class CachedEmbeddings:
+    """
+    Wrapper com a mesma interface do OpenAIEmbeddings (embed_query / embed_documents).
+    Só os textos inéditos vão para a API, em uma única chamada por lote.
+    """
+
+    def __init__(self, embeddings, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.cache = cache or EmbeddingCache()
+        self.model = getattr(embeddings, "model", None) or embeddings.__class__.__name__
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        keys = [EmbeddingCache.make_key(self.model, t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model, fresh)
+            found.update({k: np.asarray(v, dtype=np.float32) for k, v in fresh.items()})
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = EmbeddingCache.make_key(self.model, text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key].tolist()
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.model, {key: vector})
+        return list(vector)
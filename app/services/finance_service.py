@@ -2,7 +2,7 @@
 Finance Service - Conversão de moedas e dicas financeiras
 """
 
-import requests
+from app.services.http_client import get_http_client
 from loguru import logger
 from typing import Dict, Optional
 
@@ -12,11 +12,32 @@ class FinanceService:
     def __init__(self):
         # Usando Frankfurter API como fallback gratuito (não requer chave)
         self.base_url = "https://api.frankfurter.app"
+        self.http = get_http_client()
         logger.info("✅ Finance Service inicializado (Frankfurter API)")
         
-    def convert_currency(self, amount: float, from_curr: str, to_curr: str) -> str:
+    def _rate_url(self, from_curr: str, to_curr: str) -> str:
+        return f"{self.base_url}/latest?from={from_curr.upper()}&to={to_curr.upper()}"
+
+    @staticmethod
+    def _parse_rate(response, to_curr: str) -> Optional[Dict]:
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        rate = data.get("rates", {}).get(to_curr.upper())
+        return {"rate": rate, "date": data.get("date")} if rate else None
+
+    def get_rate(self, from_curr: str, to_curr: str) -> Optional[Dict]:
+        """Cotação de 1 unidade (ex: USD -> BRL): {"rate", "date"} ou None se indisponível."""
+        return self._parse_rate(self.http.get("finance", self._rate_url(from_curr, to_curr)), to_curr)
+
+    async def aget_rate(self, from_curr: str, to_curr: str) -> Optional[Dict]:
+        """Versão async de get_rate"""
+        return self._parse_rate(await self.http.aget("finance", self._rate_url(from_curr, to_curr)), to_curr)
+
+    def convert_currency(self, amount: float, from_curr: str, to_curr: str, quote: Optional[Dict] = None) -> str:
         """
         Converte um valor entre moedas (ex: USD para BRL).
+        `quote` permite reaproveitar uma cotação já obtida (cache de tools).
         """
         try:
             from_curr = from_curr.upper()
@@ -27,14 +48,10 @@ class FinanceService:
                 
             logger.info(f"💸 Convertendo {amount} {from_curr} para {to_curr}")
             
-            url = f"{self.base_url}/latest?amount={amount}&from={from_curr}&to={to_curr}"
-            response = requests.get(url, timeout=10)
-            data = response.json()
-            
-            if response.status_code == 200:
-                converted_amount = data.get("rates", {}).get(to_curr)
-                date = data.get("date")
-                return f"💰 **Conversão Atual ({date}):**\n{amount} {from_curr} = **{converted_amount:.2f} {to_curr}**."
+            quote = quote or self.get_rate(from_curr, to_curr)
+            if quote:
+                converted_amount = float(amount) * quote["rate"]
+                return f"💰 **Conversão Atual ({quote['date']}):**\n{amount} {from_curr} = **{converted_amount:.2f} {to_curr}**."
             else:
                 return f"Não foi possível converter de {from_curr} para {to_curr} no momento."
                 
@@ -2,7 +2,7 @@
 Flights Service - Monitoramento de voos (AeroDataBox)
 """
 
-import requests
+from app.services.http_client import get_http_client
 from app.config import settings
 from loguru import logger
 from typing import Optional, Dict
@@ -16,8 +16,44 @@ class FlightsService:
         self.api_key = settings.AERODATABOX_API_KEY
         self.api_host = settings.AERODATABOX_API_HOST
         self.base_url = f"https://{self.api_host}/flights"
+        self.http = get_http_client()
         logger.info("✅ Flights Service inicializado")
     
+    def _status_request(self, flight_number: str, date: str = None) -> tuple:
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")
+        url = f"{self.base_url}/number/{flight_number}/{date}"
+        headers = {
+            "X-RapidAPI-Key": self.api_key,
+            "X-RapidAPI-Host": self.api_host
+        }
+        return url, headers
+
+    @staticmethod
+    def _parse_flight_status(response, flight_number: str) -> Optional[Dict]:
+        """Resposta do AeroDataBox (requests ou httpx) -> dicionário do voo"""
+        data = response.json()
+        
+        if response.status_code == 200 and len(data) > 0:
+            flight = data[0]
+            departure = flight.get("departure", {})
+            arrival = flight.get("arrival", {})
+            
+            return {
+                "flight_number": flight.get("number"),
+                "airline": flight.get("airline", {}).get("name"),
+                "departure_airport": departure.get("airport", {}).get("iata"),
+                "arrival_airport": arrival.get("airport", {}).get("iata"),
+                "status": flight.get("status"),
+                "departure_time": departure.get("scheduledTime", {}).get("local"),
+                "arrival_time": arrival.get("scheduledTime", {}).get("local"),
+                "departure_gate": departure.get("gate"),
+                "arrival_gate": arrival.get("gate"),
+                "baggage_belt": arrival.get("baggageBelt")
+            }
+        logger.warning(f"Voo não encontrado: {flight_number}")
+        return None
+
     def get_flight_status(self, flight_number: str, date: str = None) -> Optional[Dict]:
         """Obtém status de um voo"""
         if not self.api_key:
@@ -25,39 +61,21 @@ class FlightsService:
             return self._mock_flight_status(flight_number)
         
         try:
-            if date is None:
-                date = datetime.now().strftime("%Y-%m-%d")
-            
-            url = f"{self.base_url}/number/{flight_number}/{date}"
-            headers = {
-                "X-RapidAPI-Key": self.api_key,
-                "X-RapidAPI-Host": self.api_host
-            }
-            
-            response = requests.get(url, headers=headers, timeout=15)
-            data = response.json()
-            
-            if response.status_code == 200 and len(data) > 0:
-                flight = data[0]
-                departure = flight.get("departure", {})
-                arrival = flight.get("arrival", {})
-                
-                return {
-                    "flight_number": flight.get("number"),
-                    "airline": flight.get("airline", {}).get("name"),
-                    "departure_airport": departure.get("airport", {}).get("iata"),
-                    "arrival_airport": arrival.get("airport", {}).get("iata"),
-                    "status": flight.get("status"),
-                    "departure_time": departure.get("scheduledTime", {}).get("local"),
-                    "arrival_time": arrival.get("scheduledTime", {}).get("local"),
-                    "departure_gate": departure.get("gate"),
-                    "arrival_gate": arrival.get("gate"),
-                    "baggage_belt": arrival.get("baggageBelt")
-                }
-            else:
-                logger.warning(f"Voo não encontrado: {flight_number}")
-                return None
-                
+            url, headers = self._status_request(flight_number, date)
+            return self._parse_flight_status(self.http.get("flights", url, headers=headers), flight_number)
+        except Exception as e:
+            logger.error(f"Erro ao buscar voo: {e}")
+            return self._mock_flight_status(flight_number)
+
+    async def aget_flight_status(self, flight_number: str, date: str = None) -> Optional[Dict]:
+        """Versão async de get_flight_status"""
+        if not self.api_key:
+            logger.warning("AeroDataBox API key não configurada")
+            return self._mock_flight_status(flight_number)
+        
+        try:
+            url, headers = self._status_request(flight_number, date)
+            return self._parse_flight_status(await self.http.aget("flights", url, headers=headers), flight_number)
         except Exception as e:
             logger.error(f"Erro ao buscar voo: {e}")
             return self._mock_flight_status(flight_number)
@@ -0,0 +1,134 @@
+"""
+Geocode Cache - Gazetteer local persistente (SQLite) para geocode e reverse-geocode.
+
+- Geocode: chave = endereço normalizado (caixa, acentos, espaços e pontuação).
+- Reverse: chave = célula lat/lng arredondada (GEOCODE_REVERSE_PRECISION casas decimais).
+- Resultados positivos expiram em GEOCODE_CACHE_TTL_DAYS; "não encontrado"
+  (ZERO_RESULTS) fica em cache negativo por GEOCODE_NEGATIVE_TTL_HOURS.
+  Erros de rede/cota nunca são cacheados.
+
+Destino e venue de uma viagem quase nunca mudam, então cada ping de localização
+deixa de custar duas chamadas pagas ao Google.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from typing import Any, Dict, Optional
+from loguru import logger
+from app.config import settings
+
+MISS = object()  # Sentinela: chave ausente/expirada (None é um resultado negativo válido)
+
+
+class GeocodeCache:
+    """Cache único por processo (caminho explícito cria instância independente, p/ testes)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, db_path: Optional[str] = None):
+        if db_path:
+            instance = super(GeocodeCache, cls).__new__(cls)
+            instance._initialized = False
+            return instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(GeocodeCache, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, db_path: Optional[str] = None):
+        if self._initialized:
+            return
+        self.db_path = db_path or os.path.join(os.path.dirname(settings.CHROMA_DB_PATH), "geocode_cache.db")
+        self.ttl_seconds = settings.GEOCODE_CACHE_TTL_DAYS * 86400
+        self.negative_ttl_seconds = settings.GEOCODE_NEGATIVE_TTL_HOURS * 3600
+        self.precision = settings.GEOCODE_REVERSE_PRECISION
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                key TEXT PRIMARY KEY,
+                result TEXT,
+                expires_at REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_geocodes_expires ON geocodes(expires_at)")
+        self._conn.commit()
+        self._initialized = True
+
+    # ============================================================
+    # CHAVES
+    # ============================================================
+
+    @staticmethod
+    def normalize_address(address: str) -> str:
+        """'  São Paulo,  SP ' -> 'sao paulo, sp' (sem acentos, caixa, espaços/pontuação colapsados)."""
+        text = unicodedata.normalize("NFKD", address or "")
+        text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+        text = re.sub(r"\s*,\s*", ", ", text)
+        text = re.sub(r"\s+", " ", text)
+        return text.strip(" ,.;")
+
+    def address_key(self, address: str) -> str:
+        return f"fwd:{self.normalize_address(address)}"
+
+    def cell_key(self, lat: float, lng: float) -> str:
+        return f"rev:{round(float(lat), self.precision):.{self.precision}f},{round(float(lng), self.precision):.{self.precision}f}"
+
+    # ============================================================
+    # LEITURA / ESCRITA
+    # ============================================================
+
+    def get(self, key: str) -> Any:
+        """Resultado em cache (dict/str), None para negativo em cache, ou MISS."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT result, expires_at FROM geocodes WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                self.stats["misses"] += 1
+                return MISS
+            if row[0] is None:
+                self.stats["negative_hits"] += 1
+                return None
+            self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Any):
+        """Grava um resultado; `None` registra um negativo (TTL curto)."""
+        ttl = self.ttl_seconds if result is not None else self.negative_ttl_seconds
+        payload = json.dumps(result, ensure_ascii=False) if result is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocodes (key, result, expires_at) VALUES (?, ?, ?)",
+                (key, payload, time.time() + ttl),
+            )
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """Remove entradas expiradas."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM geocodes WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+        if cur.rowcount:
+            logger.info(f"🧹 Geocode cache: {cur.rowcount} entradas expiradas removidas")
+        return cur.rowcount
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+        lookups = sum(self.stats.values())
+        hits = self.stats["hits"] + self.stats["negative_hits"]
+        return {**self.stats, "entries": entries, "hit_rate": round(hits / lookups, 3) if lookups else None}
+
+
+def get_geocode_cache() -> GeocodeCache:
+    return GeocodeCache()
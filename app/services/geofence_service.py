@@ -0,0 +1,251 @@
+"""
+Geofence Service - Registro de cercas virtuais com índice espacial em grade.
+
+Cada cerca é um círculo (lat, lng, raio de entrada) com um raio de saída maior
+(histerese): o usuário "entra" a menos de `radius_km` e só "sai" quando passa
+de `exit_radius_km`, evitando oscilação na borda com o GPS ruidoso.
+
+O índice é uma grade de células fixas (GEOFENCE_GRID_DEGREES): cada cerca é
+registrada nas células que seu círculo de saída cobre, então um ping consulta
+só a célula onde está e calcula o haversine vetorizado (NumPy) contra esses
+poucos candidatos, em vez de percorrer todas as cercas.
+
+Cercas globais (parques) valem para todos; cercas de viagem (destino, venue)
+pertencem a um usuário (`owner`) e são substituídas a cada viagem ativa.
+"""
+
+import math
+import threading
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from loguru import logger
+from app.config import settings
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+MAX_CELLS_PER_FENCE = 400  # Acima disso (raios enormes) a cerca vai para a lista "larga", sempre checada
+
+
+def haversine_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Distância (km) de um ponto para vários pontos de uma vez."""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GeofenceRegistry:
+    """Registro único por processo: cercas + estado dentro/fora por usuário"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, grid_degrees: Optional[float] = None):
+        if grid_degrees is not None:
+            # Configuração explícita (testes/ferramentas): instância independente
+            instance = super(GeofenceRegistry, cls).__new__(cls)
+            instance._initialized = False
+            return instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(GeofenceRegistry, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, grid_degrees: Optional[float] = None):
+        if self._initialized:
+            return
+        self.grid_degrees = grid_degrees or settings.GEOFENCE_GRID_DEGREES
+        self._fences: Dict[str, Dict[str, Any]] = {}
+        self._grid: Dict[Tuple[int, int], Set[str]] = {}
+        self._fence_cells: Dict[str, List[Tuple[int, int]]] = {}
+        self._wide: Set[str] = set()
+        self._owned: Dict[str, Set[str]] = {}       # owner -> ids das cercas dele
+        self._inside: Dict[str, Set[str]] = {}      # user_id -> ids das cercas em que está
+        self._lock = threading.RLock()
+        self._initialized = True
+
+    # ============================================================
+    # CADASTRO DE CERCAS
+    # ============================================================
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.grid_degrees), math.floor(lng / self.grid_degrees))
+
+    def _cells_for(self, fence: Dict[str, Any]) -> Optional[List[Tuple[int, int]]]:
+        """Células cobertas pelo bounding box do círculo de saída (None = cerca 'larga')."""
+        r = fence["exit_radius_km"]
+        dlat = r / KM_PER_DEGREE
+        dlng = r / (KM_PER_DEGREE * max(math.cos(math.radians(fence["lat"])), 0.01))
+        lat0, lng0 = self._cell(fence["lat"] - dlat, fence["lng"] - dlng)
+        lat1, lng1 = self._cell(fence["lat"] + dlat, fence["lng"] + dlng)
+        if (lat1 - lat0 + 1) * (lng1 - lng0 + 1) > MAX_CELLS_PER_FENCE:
+            return None
+        return [(i, j) for i in range(lat0, lat1 + 1) for j in range(lng0, lng1 + 1)]
+
+    def add_fence(
+        self,
+        fence_id: str,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        exit_radius_km: Optional[float] = None,
+        kind: str = "poi",
+        name: Optional[str] = None,
+        owner: Optional[str] = None,
+        **data,
+    ) -> Dict[str, Any]:
+        """Cadastra (ou substitui) uma cerca. `owner=None` = cerca global."""
+        fence = {
+            "id": fence_id,
+            "kind": kind,
+            "name": name or fence_id,
+            "lat": float(lat),
+            "lng": float(lng),
+            "radius_km": float(radius_km),
+            "exit_radius_km": float(exit_radius_km if exit_radius_km is not None else radius_km),
+            "owner": owner,
+            **data,
+        }
+        with self._lock:
+            self.remove_fence(fence_id)
+            self._fences[fence_id] = fence
+            cells = self._cells_for(fence)
+            if cells is None:
+                self._wide.add(fence_id)
+            else:
+                self._fence_cells[fence_id] = cells
+                for cell in cells:
+                    self._grid.setdefault(cell, set()).add(fence_id)
+            if owner is not None:
+                self._owned.setdefault(owner, set()).add(fence_id)
+        return fence
+
+    def remove_fence(self, fence_id: str):
+        with self._lock:
+            fence = self._fences.pop(fence_id, None)
+            if fence is None:
+                return
+            self._wide.discard(fence_id)
+            for cell in self._fence_cells.pop(fence_id, []):
+                bucket = self._grid.get(cell)
+                if bucket is not None:
+                    bucket.discard(fence_id)
+                    if not bucket:
+                        del self._grid[cell]
+            if fence["owner"] is not None:
+                self._owned.get(fence["owner"], set()).discard(fence_id)
+
+    def set_owner_fences(self, owner: str, fences: Iterable[Dict[str, Any]]):
+        """
+        Substitui as cercas de um dono (ex.: destino/venue da viagem ativa do usuário).
+        Cercas idênticas às já cadastradas não são re-indexadas (chamado a cada ping).
+        """
+        fences = {f["id"]: f for f in fences}
+        with self._lock:
+            for fence_id in list(self._owned.get(owner, set())):
+                if fence_id not in fences:
+                    self.remove_fence(fence_id)
+            for fence_id, spec in fences.items():
+                current = self._fences.get(fence_id)
+                if current is not None and all(current.get(k) == v for k, v in spec.items() if k != "id"):
+                    continue
+                self.add_fence(owner=owner, **{"fence_id": fence_id, **{k: v for k, v in spec.items() if k != "id"}})
+
+    def get_fence(self, fence_id: str) -> Optional[Dict[str, Any]]:
+        return self._fences.get(fence_id)
+
+    # ============================================================
+    # CONSULTA
+    # ============================================================
+
+    def _nearby(self, lat: float, lng: float, user_id: Optional[str]) -> List[Tuple[Dict[str, Any], float]]:
+        """Candidatos da célula do ponto (+ cercas largas), com a distância em km."""
+        with self._lock:
+            ids = self._grid.get(self._cell(lat, lng), set()) | self._wide
+            candidates = [
+                self._fences[i] for i in ids
+                if self._fences[i]["owner"] is None or self._fences[i]["owner"] == user_id
+            ]
+        if not candidates:
+            return []
+        distances = haversine_km(
+            lat, lng,
+            np.fromiter((f["lat"] for f in candidates), dtype=np.float64, count=len(candidates)),
+            np.fromiter((f["lng"] for f in candidates), dtype=np.float64, count=len(candidates)),
+        )
+        return list(zip(candidates, distances.tolist()))
+
+    def containing(self, lat: float, lng: float, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Cercas cujo raio de entrada contém o ponto, da mais próxima para a mais distante."""
+        hits = [
+            {**fence, "distance_km": dist}
+            for fence, dist in self._nearby(lat, lng, user_id)
+            if dist <= fence["radius_km"]
+        ]
+        return sorted(hits, key=lambda f: f["distance_km"])
+
+    def update(
+        self, user_id: str, lat: float, lng: float, seed: Iterable[str] = ()
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Processa um ping do usuário com histerese e retorna
+        {"inside": [...], "entered": [...], "exited": [...]} (cercas com `distance_km`).
+        `seed` inicializa o estado se o processo ainda não conhece o usuário
+        (ex.: current_park_id gravado na viagem antes de um restart).
+        """
+        nearby = self._nearby(lat, lng, user_id)
+        with self._lock:
+            previous = self._inside.get(user_id)
+            if previous is None:
+                previous = {fence_id for fence_id in seed if fence_id in self._fences}
+            inside, entered = [], []
+            for fence, dist in nearby:
+                was_inside = fence["id"] in previous
+                limit = fence["exit_radius_km"] if was_inside else fence["radius_km"]
+                if dist <= limit:
+                    hit = {**fence, "distance_km": dist}
+                    inside.append(hit)
+                    if not was_inside:
+                        entered.append(hit)
+            inside_ids = {f["id"] for f in inside}
+            exited = [dict(self._fences[i]) for i in previous - inside_ids if i in self._fences]
+            self._inside[user_id] = inside_ids
+
+        for fence in entered:
+            logger.info(f"📍 {user_id} entrou na cerca {fence['name']} ({fence['distance_km']:.2f} km)")
+        for fence in exited:
+            logger.info(f"👋 {user_id} saiu da cerca {fence['name']}")
+        inside.sort(key=lambda f: f["distance_km"])
+        return {"inside": inside, "entered": entered, "exited": exited}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "fences": len(self._fences),
+                "cells": len(self._grid),
+                "wide_fences": len(self._wide),
+                "tracked_users": len(self._inside),
+            }
+
+
+def get_geofence_registry() -> GeofenceRegistry:
+    """Registro do processo, já com as cercas globais dos parques temáticos."""
+    registry = GeofenceRegistry()
+    if not getattr(registry, "_parks_loaded", False):
+        from app.services.park_service import ParkService
+        with registry._lock:
+            if not getattr(registry, "_parks_loaded", False):
+                for park_key, park in ParkService.PARK_DATA.items():
+                    registry.add_fence(
+                        f"park:{park['id']}",
+                        park["lat"],
+                        park["lng"],
+                        radius_km=settings.GEOFENCE_PARK_RADIUS_KM,
+                        exit_radius_km=settings.GEOFENCE_PARK_EXIT_RADIUS_KM,
+                        kind="park",
+                        name=park["name"],
+                        park_id=park["id"],
+                        park_key=park_key,
+                    )
+                registry._parks_loaded = True
+    return registry
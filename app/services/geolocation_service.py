@@ -2,10 +2,13 @@
 Geolocation Service - Gerencia localização do usuário e fornece guia de chegada.
 """
 
+from datetime import datetime
 from loguru import logger
 from app.services.maps_service import GoogleMapsService
 from app.services.trip_service import TripService
 from app.services.park_service import ParkService
+from app.services.geofence_service import get_geofence_registry
+from app.config import settings
 from typing import Optional, Dict, Any, List
 
 class GeolocationService:
@@ -15,24 +18,25 @@ class GeolocationService:
         self.maps_svc = GoogleMapsService()
         self.trip_svc = TripService()
         self.park_svc = ParkService()
-        self.PROXIMITY_RADIUS_KM = 2.0  # Raio para dicas de destino
-        self.PARK_RADIUS_KM = 0.5       # Raio para ativar Modo Parque
+        self.geofences = get_geofence_registry()  # Parques + destino/venue das viagens ativas
+        self._tip_attempts: Dict[str, datetime] = {}  # Última tentativa de dica sem resultado (memória)
         logger.info("✅ GeolocationService inicializado")
         
-    def process_location(self, user_id: str, lat: float, lng: float) -> Optional[str]:
+    def process_location(self, user_id: str, lat: float, lng: float) -> Optional[Dict[str, str]]:
         """
         Processa coordenadas e verifica se o usuário chegou ao destino de uma viagem ativa.
-        Retorna uma mensagem de boas-vindas/guia se detectado.
+        Retorna {"text": dica pronta para enviar} ou {"agent_prompt": ..., "trip_id": ...} para os
+        guias (chegada, parque, evento), que rodam como turno do agente na fila do chat (WorkQueue),
+        nunca em paralelo com as mensagens do próprio usuário na mesma thread do LangGraph.
         """
         logger.info(f"📍 Localização recebida de {user_id}: ({lat}, {lng})")
         
         # 1. Buscar viagens ativas hoje para este usuário
-        from datetime import datetime
         today = datetime.now().date()
         
         active_trip = None
-        for trip in self.trip_svc.trips:
-            if trip["user_id"] == user_id:
+        for trip in self.trip_svc.get_user_trips(user_id):
+            if trip.get("start_date"):
                 start_dt = datetime.strptime(trip["start_date"], "%Y-%m-%d").date()
                 # REGRA: Somente monitorar/ser proativo se a viagem já começou
                 if start_dt <= today:
@@ -47,29 +51,35 @@ class GeolocationService:
             logger.debug(f"ℹ️ Nenhuma viagem ativa ou iniciada para {user_id} hoje. Ignorando geolocalização proativa.")
             return None
             
-        # 2. Verificar proximidade com o destino (Geocoding do destino)
+        # 2. Cercas da viagem ativa (destino/venue, coordenadas gravadas na viagem) + consulta única no índice
         dest_name = active_trip["destination"]
-        dest_loc = self.maps_svc.geocode(dest_name)
-        
+        dest_loc = self._resolve_trip_coords(active_trip, "destination", "destination_coords")
         if not dest_loc:
             return None
-            
-        # Distância aproximada simples (haversine ou similar - aqui simplificado para MVP)
-        distance = self._calculate_distance(lat, lng, dest_loc["lat"], dest_loc["lng"])
+        event_venue = active_trip.get("venue")
+        event_name = active_trip.get("event_name")
+        venue_loc = self._resolve_trip_coords(active_trip, "venue", "venue_coords") if event_venue and event_name else None
+        self._register_trip_fences(user_id, active_trip, dest_loc, venue_loc)
+
+        seed = [f"park:{active_trip['current_park_id']}"] if active_trip.get("current_park_id") else []
+        fences = self.geofences.update(user_id, lat, lng, seed=seed)
+        inside = {f["kind"]: f for f in reversed(fences["inside"])}  # Mais próxima de cada tipo
         
         # 2.1. GUIA DE CHEGADA (Prioridade Máxima no Dia 0)
         start_date_str = active_trip.get("start_date")
         start_dt = datetime.strptime(start_date_str, "%Y-%m-%d").date()
         
         if start_dt == today and not active_trip.get("arrival_guide_sent", False):
-            if distance <= self.PROXIMITY_RADIUS_KM:
+            if "destination" in inside:
                 logger.info(f"🛬 CHEGADA DETECTADA em {dest_name} para {user_id}!")
-                guide = self._generate_intelligent_arrival_guide(dest_name, user_id)
-                if guide:
-                    active_trip["arrival_guide_sent"] = True
-                    active_trip["last_proactive_tip_at"] = datetime.now().isoformat()
-                    self.trip_svc._save_trips()
-                    return guide
+                prompt = self._arrival_guide_prompt(dest_name, user_id)
+                active_trip["arrival_guide_sent"] = True
+                active_trip["last_proactive_tip_at"] = datetime.now().isoformat()
+                self.trip_svc.update_trip_metadata(active_trip["id"], {
+                    "arrival_guide_sent": True,
+                    "last_proactive_tip_at": active_trip["last_proactive_tip_at"]
+                })
+                return {"agent_prompt": prompt, "trip_id": active_trip["id"]}
         
         # 3. Auditoria de Proximidade (Gaps e Recomendações)
         # Cooldown dinâmico: Padrão 6h (360m), mas pode ser 30-60m em 'Modo Ativo'
@@ -86,119 +96,151 @@ class GeolocationService:
             except:
                 pass
 
+        # Sem dica na última tentativa: não refaz as buscas de lugares a cada ping
+        last_attempt = self._tip_attempts.get(user_id)
+        if last_attempt and (datetime.now() - last_attempt).total_seconds() < settings.LOCATION_TIP_RETRY_MINUTES * 60:
+            should_send_tip = False
+
         if should_send_tip:
             from app.services.proactive_recommendation_service import ProactiveRecommendationService
             rec_svc = ProactiveRecommendationService()
             tip = rec_svc.generate_proactive_tip(user_id, lat, lng)
+            self._tip_attempts[user_id] = datetime.now()
             
             if tip:
                 active_trip["last_proactive_tip_at"] = datetime.now().isoformat()
-                self.trip_svc._save_trips()
-                return tip
+                self.trip_svc.update_trip_metadata(active_trip["id"], {"last_proactive_tip_at": active_trip["last_proactive_tip_at"]})
+                return {"text": tip}
             
-        # 4. Verificar proximidade com parques temáticos (Disney, Universal, Europa Park, etc.)
-        for park_key, park_info in self.park_svc.PARK_DATA.items():
-            park_lat = park_info["lat"]
-            park_lng = park_info["lng"]
-            park_distance = self._calculate_distance(lat, lng, park_lat, park_lng)
+        # 4. Parques temáticos (Disney, Universal, Europa Park, etc.): cerca com histerese 0.5 km / 1 km
+        park_fence = inside.get("park")
+        if park_fence:
+            park_info = {"id": park_fence["park_id"], "name": park_fence["name"]}
+            logger.info(f"🎉 Usuário {user_id} próximo de {park_info['name']} (distância: {park_fence['distance_km']:.2f}km)")
             
-            if park_distance <= self.PARK_RADIUS_KM:
-                logger.info(f"🎉 Usuário {user_id} próximo de {park_info['name']} (distância: {park_distance:.2f}km)")
-                
-                # Marcar que o usuário está "No Parque" para o monitoramento proativo
+            # Marcar que o usuário está "No Parque" para o monitoramento proativo
+            if active_trip.get("current_park_id") != park_info["id"]:
                 active_trip["current_park_id"] = park_info["id"]
                 active_trip["current_park_name"] = park_info["name"]
-                
-                # Cooldown para não spammar o guia do parque
-                last_park_guide_time = active_trip.get("last_park_guide_sent_at", {}).get(park_info['id'])
-                should_send_park_guide = True
-                if last_park_guide_time:
-                    try:
-                        last_dt = datetime.fromisoformat(last_park_guide_time)
-                        if (datetime.now() - last_dt).total_seconds() < 3600: # 1 hora de cooldown
-                            should_send_park_guide = False
-                    except:
-                        pass
-                
-                if should_send_park_guide:
-                    guide_message = self._trigger_park_mode_guide(park_info['id'], user_id)
-                    if "last_park_guide_sent_at" not in active_trip:
-                        active_trip["last_park_guide_sent_at"] = {}
-                    active_trip["last_park_guide_sent_at"][park_info['id']] = datetime.now().isoformat()
-                    self.trip_svc._save_trips()
-                    return guide_message
+                self.trip_svc.update_trip_metadata(active_trip["id"], {
+                    "current_park_id": park_info["id"],
+                    "current_park_name": park_info["name"]
+                })
+            
+            # Cooldown para não spammar o guia do parque
+            last_park_guide_time = active_trip.get("last_park_guide_sent_at", {}).get(park_info['id'])
+            should_send_park_guide = True
+            if last_park_guide_time:
+                try:
+                    last_dt = datetime.fromisoformat(last_park_guide_time)
+                    if (datetime.now() - last_dt).total_seconds() < 3600: # 1 hora de cooldown
+                        should_send_park_guide = False
+                except:
+                    pass
             
-            # 5. VERIFICAÇÃO DE EVENTO (F1, Shows, Festivais)
-            # Se a viagem ativa for um evento e for hoje, verificar proximidade com o venue
-            event_venue = active_trip.get("venue")
-            event_name = active_trip.get("event_name")
+            if should_send_park_guide:
+                logger.info(f"🎢 Enfileirando Guia de Parque para {park_info['id']}...")
+                sent_at = datetime.now().isoformat()
+                active_trip.setdefault("last_park_guide_sent_at", {})[park_info['id']] = sent_at
+                self.trip_svc.mutate_trip(
+                    active_trip["id"],
+                    lambda t: t.setdefault("last_park_guide_sent_at", {}).__setitem__(park_info['id'], sent_at)
+                )
+                return {"agent_prompt": self._park_guide_prompt(park_info['id']), "trip_id": active_trip["id"]}
             
-            if event_venue and event_name:
-                venue_loc = self.maps_svc.geocode(event_venue)
-                if venue_loc:
-                    dist_to_event = self._calculate_distance(lat, lng, venue_loc["lat"], venue_loc["lng"])
-                    
-                    if dist_to_event <= self.PARK_RADIUS_KM: # Usamos o mesmo raio de 500m
-                        logger.info(f"🏎️ USUÁRIO NO EVENTO: {event_name}! (Dist: {dist_to_event:.2f}km)")
-                        
-                        # Cooldown para guia de evento (6 horas)
-                        last_event_guide = active_trip.get("last_event_guide_sent_at")
-                        should_send_event = True
-                        if last_event_guide:
-                            try:
-                                last_dt = datetime.fromisoformat(last_event_guide)
-                                if (datetime.now() - last_dt).total_seconds() < 21600:
-                                    should_send_event = False
-                            except: pass
-                            
-                        if should_send_event:
-                            active_trip["last_event_guide_sent_at"] = datetime.now().isoformat()
-                            self.trip_svc._save_trips()
-                            return self._trigger_event_mode_guide(event_name, event_venue, active_trip.get("gate"), user_id)
+        # 5. VERIFICAÇÃO DE EVENTO (F1, Shows, Festivais)
+        # Se a viagem ativa for um evento, verificar se o usuário está na cerca do venue (500m)
+        venue_fence = inside.get("venue")
+        if venue_fence:
+            logger.info(f"🏎️ USUÁRIO NO EVENTO: {event_name}! (Dist: {venue_fence['distance_km']:.2f}km)")
+            
+            # Cooldown para guia de evento (6 horas)
+            last_event_guide = active_trip.get("last_event_guide_sent_at")
+            should_send_event = True
+            if last_event_guide:
+                try:
+                    last_dt = datetime.fromisoformat(last_event_guide)
+                    if (datetime.now() - last_dt).total_seconds() < 21600:
+                        should_send_event = False
+                except: pass
+                
+            if should_send_event:
+                active_trip["last_event_guide_sent_at"] = datetime.now().isoformat()
+                self.trip_svc.update_trip_metadata(active_trip["id"], {"last_event_guide_sent_at": active_trip["last_event_guide_sent_at"]})
+                logger.info(f"🏎️ Enfileirando Guia de Evento para {event_name}...")
+                prompt = self._event_guide_prompt(event_name, event_venue, active_trip.get("gate"))
+                return {"agent_prompt": prompt, "trip_id": active_trip["id"]}
             
-        # Se saiu do parque, remover a flag
-        if "current_park_id" in active_trip:
-            # Só remove se estiver realmente longe (histerese de 1km)
-            park_info = self.park_svc.get_park_info(active_trip["current_park_id"])
-            if park_info:
-                dist = self._calculate_distance(lat, lng, park_info["lat"], park_info["lng"])
-                if dist > 1.0:
-                    logger.info(f"👋 Usuário saiu do parque {park_info['name']}")
-                    del active_trip["current_park_id"]
-                    del active_trip["current_park_name"]
-                    self.trip_svc._save_trips()
+        # Se saiu do parque (passou do raio de saída de 1 km), remover a flag
+        if "current_park_id" in active_trip and not park_fence:
+            logger.info(f"👋 Usuário saiu do parque {active_trip.get('current_park_name')}")
+            active_trip.pop("current_park_id", None)
+            active_trip.pop("current_park_name", None)
+            self.trip_svc.update_trip_metadata(active_trip["id"], {}, unset=["current_park_id", "current_park_name"])
             
         return None
 
-    def _trigger_park_mode_guide(self, park_id: str, user_id: str) -> str:
-        """Gera um guia proativo em tempo real para o parque"""
-        logger.info(f"🎢 Gerando Guia de Parque para {park_id}...")
-        
-        from app.agents.orchestrator import TravelAgent
-        agent = TravelAgent()
-        
-        prompt = (
-            f"O usuário acaba de entrar no parque temático: **{park_id}**. "
+    def _register_trip_fences(
+        self, user_id: str, trip: Dict[str, Any], dest_loc: Dict[str, Any], venue_loc: Optional[Dict[str, Any]]
+    ):
+        """Mantém no registro as cercas da viagem ativa do usuário (destino e, se houver, venue do evento)."""
+        fences = [{
+            "id": f"trip:{trip['id']}:destination",
+            "kind": "destination",
+            "name": trip["destination"],
+            "lat": dest_loc["lat"],
+            "lng": dest_loc["lng"],
+            "radius_km": settings.GEOFENCE_DESTINATION_RADIUS_KM,
+            "exit_radius_km": settings.GEOFENCE_DESTINATION_EXIT_RADIUS_KM,
+        }]
+        if venue_loc:
+            fences.append({
+                "id": f"trip:{trip['id']}:venue",
+                "kind": "venue",
+                "name": trip.get("event_name") or trip.get("venue"),
+                "lat": venue_loc["lat"],
+                "lng": venue_loc["lng"],
+                "radius_km": settings.GEOFENCE_VENUE_RADIUS_KM,
+                "exit_radius_km": settings.GEOFENCE_VENUE_EXIT_RADIUS_KM,
+            })
+        self.geofences.set_owner_fences(user_id, fences)
+
+    def _resolve_trip_coords(self, trip: Dict[str, Any], field: str, coords_field: str) -> Optional[Dict[str, Any]]:
+        """
+        Coordenadas de um campo da viagem (destino/venue), resolvidas uma única vez e gravadas
+        na própria viagem. Se o texto do campo mudar, geocodifica de novo.
+        """
+        query = trip.get(field)
+        if not query:
+            return None
+        coords = trip.get(coords_field)
+        if coords and coords.get("query") == query:
+            return coords
+
+        location = self.maps_svc.geocode(query)  # Passa pelo cache local de geocoding
+        if not location:
+            return None
+        coords = {"lat": location["lat"], "lng": location["lng"], "query": query}
+        trip[coords_field] = coords
+        self.trip_svc.update_trip_metadata(trip["id"], {coords_field: coords})
+        return coords
+
+    def _park_guide_prompt(self, park_id: str) -> str:
+        """Instrução do guia proativo em tempo real para o parque"""
+        return (
+            f"[SISTEMA: GUIA DE PARQUE] O usuário acaba de entrar no parque temático: **{park_id}**. "
             "Sua missão é dar as boas-vindas ao parque e fornecer um resumo em tempo real dos tempos de espera. "
             "1. Chame a ferramenta 'get_park_live_status' para o parque atual.\n"
             "2. Analise os tempos e sugira uma rota inteligente (quais brinquedos ir agora e quais evitar).\n"
             "3. Deseje um dia mágico e lembre que você pode guiá-lo pelo mapa se ele se perder."
         )
-        
-        msg = agent.chat(user_input=prompt, thread_id=user_id)
-        return msg
 
-    def _trigger_event_mode_guide(self, event_name: str, venue: str, gate: str, user_id: str) -> str:
-        """Gera um guia proativo para o evento usando pesquisa web"""
-        logger.info(f"🏎️ Gerando Guia de Evento para {event_name}...")
-        
-        from app.agents.orchestrator import TravelAgent
-        agent = TravelAgent()
-        
+    def _event_guide_prompt(self, event_name: str, venue: str, gate: str) -> str:
+        """Instrução do guia proativo para o evento (pesquisa web do layout do local)"""
         gate_info = f"Seu portão é o '{gate}'." if gate else "Não encontrei seu portão no ingresso, verifique a placa."
         
-        prompt = (
-            f"O usuário acaba de chegar no local do evento: **{event_name}** ({venue}). "
+        return (
+            f"[SISTEMA: GUIA DE EVENTO] O usuário acaba de chegar no local do evento: **{event_name}** ({venue}). "
             f"{gate_info}\n\n"
             "Sua missão é dar as boas-vindas e ser o concierge dele durante o evento:\n"
             "1. Use a ferramenta 'get_event_venue_details' para pesquisar o layout atual do local.\n"
@@ -206,36 +248,22 @@ class GeolocationService:
             "3. Verifique o clima local e dê um conselho (ex: 'Pode chover, use capa' ou 'Está muito sol, beba água').\n"
             "4. Deseje uma excelente experiência e diga que pode guiá-lo pelo mapa interno se ele se perder."
         )
-        
-        msg = agent.chat(user_input=prompt, thread_id=user_id)
-        return msg
-
-    def _calculate_distance(self, lat1, lon1, lat2, lon2):
-        """Calcula distância aproximada em KM (Simplificado)"""
-        import math
-        R = 6371 # Raio da Terra
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        return R * c
 
-    def _generate_intelligent_arrival_guide(self, destination: str, user_id: str) -> str:
-        """Gera guia de 'Boas-vindas' proativo usando IA e documentos do RAG"""
-        from app.agents.orchestrator import TravelAgent
-        from app.services.rag_service import RAGService
-        agent = TravelAgent()
-        rag_svc = RAGService()
+    def _arrival_guide_prompt(self, destination: str, user_id: str) -> str:
+        """Instrução do guia de 'Boas-vindas', com os dados de locação de carro achados no RAG"""
+        from app.services.rag_service import get_rag_service
+        rag_svc = get_rag_service()
         
         # Consultar RAG para localizar documentos de locação de carro
-        car_rental_context = rag_svc.query(
-            "locação de carro, empresa locadora, local de retirada, terminal de pickup, voucher aluguel veículo",
+        car_rental_hits = rag_svc.query_many(
+            ["locação de carro, empresa locadora, local de retirada, terminal de pickup, voucher aluguel veículo"],
             thread_id=user_id,
             k=3
-        )
+        )[0]
+        car_rental_context = rag_svc.format_hits(car_rental_hits)
         
         # Verificar se encontrou dados relevantes de locação
-        has_car_rental = car_rental_context and len(car_rental_context) > 50 and "Nenhuma" not in car_rental_context
+        has_car_rental = len(car_rental_context) > 50
         
         car_rental_section = ""
         if has_car_rental:
@@ -253,8 +281,8 @@ class GeolocationService:
                 "- Pergunte se ele tem contrato de locação e se quer que você o guie até a locadora.\n"
             )
         
-        prompt = (
-            f"O usuário acabou de chegar em {destination}. "
+        return (
+            f"[SISTEMA: GUIA DE CHEGADA EM {destination}] O usuário acabou de chegar em {destination}. "
             f"Analise os documentos dele no RAG (voos, hotéis, aluguel de carro) e gere um guia de chegada CURTO e EXTREMAMENTE ÚTIL.\n\n"
             "Inclua se encontrar:\n"
             "- Nome da locadora de veículos e onde fica o guichê (se houver aluguel).\n"
@@ -264,9 +292,12 @@ class GeolocationService:
             f"{car_rental_section}\n"
             "Seja carinhoso e proativo, como um concierge especializado de elite."
         )
-        
+
+    def _generate_intelligent_arrival_guide(self, destination: str, user_id: str) -> str:
+        """Gera guia de 'Boas-vindas' proativo usando IA e documentos do RAG (monitor de pouso do scheduler)"""
+        from app.agents.orchestrator import get_travel_agent
         try:
-            guide = agent.chat(user_input=f"[SISTEMA: GUIA DE CHEGADA EM {destination}] {prompt}", thread_id=user_id)
+            guide = get_travel_agent().chat(user_input=self._arrival_guide_prompt(destination, user_id), thread_id=user_id)
             return guide
         except Exception as e:
             logger.error(f"Erro ao gerar guia inteligente: {e}")
@@ -0,0 +1,274 @@
+"""
+HTTP Client - Camada compartilhada de HTTP de saída para todas as integrações.
+
+- Sync: uma `requests.Session` por processo com pool keep-alive por host (urllib3).
+- Async: um `httpx.AsyncClient` por event loop, também com keep-alive.
+- Timeout e orçamento de retentativas por integração (settings.HTTP_INTEGRATIONS).
+- Métricas por host: requisições, erros, retentativas, conexões abertas,
+  taxa de reuso de conexão e latência p50/p95.
+
+Uso:
+    http = get_http_client()
+    response = http.get("weather", url, params=params)
+    response = await http.apost("evolution", url, json=payload)
+
+Retentativas: métodos idempotentes (GET/HEAD/...) repetem em erro de conexão,
+timeout e status 429/5xx transitórios; POST só repete quando a conexão nem foi
+estabelecida (ConnectTimeout) ou o servidor recusou explicitamente (429/503).
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+from app.config import settings
+from app.services.job_runner import check_deadline, item_remaining
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+RETRYABLE_STATUS_NON_IDEMPOTENT = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+LATENCY_WINDOW = 512  # Amostras por host para os percentis
+
+
+class _HostStats:
+    """Contadores de um host (protegidos pelo lock do cliente)"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies_ms)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1) if ordered else None
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "latency_p50_ms": pct(0.50),
+            "latency_p95_ms": pct(0.95),
+        }
+
+
+class HttpClient:
+    """Cliente HTTP único por processo (sessão sync + clientes async por loop)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(HttpClient, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(
+            pool_connections=settings.HTTP_POOL_HOSTS,
+            pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+            max_retries=0,  # Retentativas são feitas aqui, com orçamento por integração
+        )
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._stats: Dict[str, _HostStats] = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+        logger.info("🌐 HttpClient inicializado (pool keep-alive compartilhado)")
+
+    # ============================================================
+    # CONFIGURAÇÃO POR INTEGRAÇÃO
+    # ============================================================
+
+    @staticmethod
+    def _policy(integration: str) -> Dict[str, float]:
+        policy = settings.HTTP_INTEGRATIONS.get(integration, {})
+        return {
+            "timeout": policy.get("timeout", settings.HTTP_DEFAULT_TIMEOUT_SECONDS),
+            "retries": int(policy.get("retries", settings.HTTP_DEFAULT_RETRIES)),
+        }
+
+    @staticmethod
+    def _apply_job_deadline(kwargs: Dict[str, Any]):
+        """Dentro de um item de job do scheduler, o timeout da chamada não passa do prazo restante do item."""
+        check_deadline()
+        remaining = item_remaining()
+        if remaining is not None and isinstance(kwargs.get("timeout"), (int, float)):
+            kwargs["timeout"] = min(kwargs["timeout"], max(remaining, 0.5))
+
+    @staticmethod
+    def _should_retry(method: str, status: Optional[int] = None, error: Optional[Exception] = None) -> bool:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        if error is not None:
+            if isinstance(error, (requests.exceptions.ConnectTimeout, httpx.ConnectTimeout, httpx.ConnectError)):
+                return True
+            return idempotent and isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError))
+        return status in (RETRYABLE_STATUS if idempotent else RETRYABLE_STATUS_NON_IDEMPOTENT)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(0.25 * (2 ** attempt), 4.0)
+
+    def _record(self, url: str, elapsed_ms: Optional[float] = None, error: bool = False, retry: bool = False):
+        host = urlparse(url).netloc or url
+        with self._lock:
+            stats = self._stats.get(host)
+            if stats is None:
+                stats = self._stats[host] = _HostStats()
+            if retry:
+                stats.retries += 1
+                return
+            stats.requests += 1
+            if error:
+                stats.errors += 1
+            if elapsed_ms is not None:
+                stats.latencies_ms.append(elapsed_ms)
+
+    # ============================================================
+    # SYNC (requests)
+    # ============================================================
+
+    def request(self, integration: str, method: str, url: str, **kwargs) -> requests.Response:
+        """Como `requests.request`, mas pelo pool compartilhado e com a política da integração."""
+        policy = self._policy(integration)
+        kwargs.setdefault("timeout", policy["timeout"])
+        attempt = 0
+        while True:
+            self._apply_job_deadline(kwargs)
+            t0 = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                self._record(url, error=True)
+                if attempt < policy["retries"] and self._should_retry(method, error=e):
+                    self._record(url, retry=True)
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                raise
+            self._record(url, (time.perf_counter() - t0) * 1000, error=response.status_code >= 500)
+            if attempt < policy["retries"] and self._should_retry(method, status=response.status_code):
+                self._record(url, retry=True)
+                response.close()
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            return response
+
+    def get(self, integration: str, url: str, **kwargs) -> requests.Response:
+        return self.request(integration, "GET", url, **kwargs)
+
+    def post(self, integration: str, url: str, **kwargs) -> requests.Response:
+        return self.request(integration, "POST", url, **kwargs)
+
+    # ============================================================
+    # ASYNC (httpx)
+    # ============================================================
+
+    def _async_client(self) -> httpx.AsyncClient:
+        """Um AsyncClient por event loop (conexões httpx não podem trocar de loop)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                for stale in [l for l in self._async_clients if l.is_closed()]:
+                    del self._async_clients[stale]
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.HTTP_POOL_HOSTS * settings.HTTP_POOL_MAXSIZE,
+                        max_keepalive_connections=settings.HTTP_POOL_MAXSIZE,
+                    ),
+                )
+        return client
+
+    async def arequest(self, integration: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """Versão async de `request` (httpx.AsyncClient compartilhado do loop atual)."""
+        policy = self._policy(integration)
+        kwargs.setdefault("timeout", policy["timeout"])
+        client = self._async_client()
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.HTTPError as e:
+                self._record(url, error=True)
+                if attempt < policy["retries"] and self._should_retry(method, error=e):
+                    self._record(url, retry=True)
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                raise
+            self._record(url, (time.perf_counter() - t0) * 1000, error=response.status_code >= 500)
+            if attempt < policy["retries"] and self._should_retry(method, status=response.status_code):
+                self._record(url, retry=True)
+                await response.aclose()
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            return response
+
+    async def aget(self, integration: str, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest(integration, "GET", url, **kwargs)
+
+    async def apost(self, integration: str, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest(integration, "POST", url, **kwargs)
+
+    async def aclose(self):
+        """Fecha o AsyncClient do loop atual (shutdown da aplicação)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    # ============================================================
+    # MÉTRICAS
+    # ============================================================
+
+    def _pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Conexões criadas/ociosas e reuso por host, direto dos pools do urllib3."""
+        pools = {}
+        manager = self._adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port not in (80, 443, None) else pool.host
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            created, served = pool.num_connections, pool.num_requests
+            pools[host] = {
+                "connections_created": created,
+                "idle_connections": idle,
+                "reuse_rate": round(1 - created / served, 3) if served else None,
+            }
+        return pools
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = {host: stats.snapshot() for host, stats in self._stats.items()}
+            async_open = 0
+            for client in self._async_clients.values():
+                pool = getattr(getattr(client, "_transport", None), "_pool", None)
+                async_open += len(getattr(pool, "connections", []) or [])
+        for host, pool in self._pool_stats().items():
+            hosts.setdefault(host, {}).update(pool)
+        return {"hosts": hosts, "async_open_connections": async_open}
+
+
+def get_http_client() -> HttpClient:
+    return HttpClient()
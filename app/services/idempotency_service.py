@@ -2,61 +2,182 @@ import sqlite3
 import hashlib
 import json
 import os
+import uuid
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from loguru import logger
 from app.config import settings
 
+# Colunas da fila durável (app/services/work_queue.py), adicionadas a bancos antigos na inicialização
+QUEUE_COLUMNS = {
+    "attempts": "INTEGER DEFAULT 0",
+    "enqueued_at": "REAL",   # epoch; NULL = registro só de idempotência (fora da fila)
+    "available_at": "REAL",  # Próxima tentativa (backoff)
+    "lease_until": "REAL",   # Visibilidade: job PROCESSING com lease vencido volta a ser entregue
+    "started_at": "REAL",
+}
+
+
+def init_jobs_db(conn: sqlite3.Connection):
+    """Cria/migra a tabela `jobs` (idempotência + fila de trabalho)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            idempotency_key TEXT PRIMARY KEY,
+            message_id TEXT,
+            chat_id TEXT,
+            status TEXT, -- RECEIVED, PROCESSING, SUCCEEDED, FAILED, RESPONDED
+            payload TEXT,
+            response TEXT,
+            error_msg TEXT,
+            correlation_id TEXT,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    """)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column, ddl in QUEUE_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {ddl}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON jobs(status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_id ON jobs(chat_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON jobs(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_queue ON jobs(status, available_at) WHERE enqueued_at IS NOT NULL")
+
+
 class IdempotencyService:
     """
     Serviço de Idempotência e Gestão de Jobs.
     Garante que a mesma mensagem não seja processada múltiplas vezes.
     Caminho do Job: RECEIVED -> PROCESSING -> SUCCEEDED/FAILED -> RESPONDED
+
+    - Uma conexão SQLite persistente por processo (WAL, synchronous=NORMAL), serializada por lock;
+      a WorkQueue usa a mesma conexão via `transaction()`.
+    - Registro atômico (INSERT ... ON CONFLICT DO NOTHING): duas entregas simultâneas da
+      mesma mensagem nunca são registradas as duas.
+    - LRU em memória das chaves recentes (IDEMPOTENCY_LRU_SIZE): reentregas do
+      Evolution/n8n são rejeitadas sem tocar o disco.
     """
     _instance = None
+    _instance_lock = threading.Lock()
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(IdempotencyService, cls).__new__(cls)
-            cls._instance._initialized = False
+    def __new__(cls, db_path: Optional[str] = None):
+        if db_path is not None:
+            instance = super(IdempotencyService, cls).__new__(cls)
+            instance._initialized = False
+            return instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(IdempotencyService, cls).__new__(cls)
+                cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None):
         if self._initialized: return
-        self.db_path = os.path.join(os.path.dirname(settings.CHROMA_DB_PATH), "idempotency.db")
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self._init_db()
+        self.db_path = db_path or os.path.join(os.path.dirname(settings.CHROMA_DB_PATH), "idempotency.db")
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = self._open()
+        self._recent: "OrderedDict[str, str]" = OrderedDict()  # chave -> último status conhecido
+        self.lru_size = settings.IDEMPOTENCY_LRU_SIZE
+        self.stats = {"registered": 0, "duplicates_memory": 0, "duplicates_disk": 0, "errors": 0}
         self._initialized = True
-        logger.info(f"🛡️ IdempotencyService inicializado (SQLite: {self.db_path})")
-
-    def _init_db(self):
-        with sqlite3.connect(self.db_path, timeout=10) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS jobs (
-                    idempotency_key TEXT PRIMARY KEY,
-                    message_id TEXT,
-                    chat_id TEXT,
-                    status TEXT, -- RECEIVED, PROCESSING, SUCCEEDED, FAILED, RESPONDED
-                    payload TEXT,
-                    response TEXT,
-                    error_msg TEXT,
-                    correlation_id TEXT,
-                    created_at TIMESTAMP,
-                    updated_at TIMESTAMP
-                )
-            """)
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON jobs(status)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_id ON jobs(chat_id)")
+        logger.info(f"🛡️ IdempotencyService inicializado (SQLite WAL: {self.db_path})")
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        init_jobs_db(conn)
+        return conn
 
-    def generate_key(self, chat_id: str, message_id: Optional[str], message_text: str = "", media_hash: str = "") -> str:
-        """Gera uma chave determinística caso o message_id falhe."""
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Transação na conexão compartilhada. `immediate` reserva a escrita já no BEGIN (reserva de jobs)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # ============================================================
+    # FRENTE EM MEMÓRIA (LRU)
+    # ============================================================
+
+    def remember(self, idempotency_key: str, status: str):
+        with self._lock:
+            self._recent[idempotency_key] = status
+            self._recent.move_to_end(idempotency_key)
+            while len(self._recent) > self.lru_size:
+                self._recent.popitem(last=False)
+
+    def seen(self, idempotency_key: str) -> Optional[str]:
+        """Último status conhecido se a chave foi vista recentemente neste processo (sem disco)."""
+        with self._lock:
+            status = self._recent.get(idempotency_key)
+            if status is not None:
+                self._recent.move_to_end(idempotency_key)
+                self.stats["duplicates_memory"] += 1
+            return status
+
+    # ============================================================
+    # REGISTRO
+    # ============================================================
+
+    def generate_key(
+        self, chat_id: str, message_id: Optional[str], message_text: str = "", media_hash: str = "", timestamp: Any = None
+    ) -> str:
+        """
+        Chave de idempotência: o message_id ou, sem ele, um hash com o messageTimestamp.
+        Sem id nem timestamp a chave é única (sem deduplicação): só o texto não distingue
+        uma reentrega de um segundo "sim" legítimo do usuário.
+        """
         if message_id:
             return message_id
-        
+        if timestamp in (None, ""):
+            return f"noid:{uuid.uuid4().hex}"
+
         # Fallback determinístico
-        raw = f"{chat_id}:{message_text[:100]}:{media_hash}"
+        raw = f"{chat_id}:{timestamp}:{message_text[:100]}:{media_hash}"
         return hashlib.sha256(raw.encode()).hexdigest()
 
+    def register(self, idempotency_key: str, chat_id: str, message_id: Optional[str], payload: Dict, enqueue_at: Optional[float] = None) -> Optional[str]:
+        """
+        Registro atômico como RECEIVED (levanta exceção em erro de disco).
+        `enqueue_at` (epoch) também coloca o job na fila durável.
+        Retorna None se a chave é nova; senão o status (PROCESSING) ou a resposta salva.
+        """
+        cached = self.seen(idempotency_key)
+        if cached is not None:
+            return cached
+
+        now = datetime.now().isoformat()
+        with self.transaction() as conn:
+            inserted = conn.execute(
+                "INSERT INTO jobs (idempotency_key, message_id, chat_id, status, payload, correlation_id, created_at, updated_at, "
+                "attempts, enqueued_at, available_at) VALUES (?, ?, ?, 'RECEIVED', ?, ?, ?, ?, 0, ?, ?) "
+                "ON CONFLICT(idempotency_key) DO NOTHING",
+                (idempotency_key, message_id, chat_id, json.dumps(payload), str(uuid.uuid4()), now, now, enqueue_at, enqueue_at),
+            ).rowcount == 1
+            row = None if inserted else conn.execute(
+                "SELECT status, response FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+
+        if inserted:
+            self.stats["registered"] += 1
+            self.remember(idempotency_key, "RECEIVED")
+            return None
+        status, response = row
+        self.stats["duplicates_disk"] += 1
+        self.remember(idempotency_key, status)
+        logger.warning(f"♻️ Idempotência: Chave {idempotency_key} já existe com status {status}")
+        return status if status == "PROCESSING" else (response or status)
+
     def check_and_register(self, idempotency_key: str, chat_id: str, message_id: Optional[str], payload: Dict) -> Optional[str]:
         """
         Verifica se a chave já existe. 
@@ -65,62 +186,53 @@ class IdempotencyService:
         Se estiver PROCESSING, retorna 'PROCESSING'.
         """
         try:
-            with sqlite3.connect(self.db_path, timeout=10) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT status, response FROM jobs WHERE idempotency_key = ?", (idempotency_key,))
-                row = cursor.fetchone()
-                
-                if row:
-                    status, response = row
-                    logger.warning(f"♻️ Idempotência: Chave {idempotency_key} já existe com status {status}")
-                    return status if status == "PROCESSING" else (response or status)
-                
-                # Registrar novo
-                now = datetime.now().isoformat()
-                import uuid
-                correlation_id = str(uuid.uuid4())
-                conn.execute(
-                    "INSERT INTO jobs (idempotency_key, message_id, chat_id, status, payload, correlation_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                    (idempotency_key, message_id, chat_id, "RECEIVED", json.dumps(payload), correlation_id, now, now)
-                )
-                return None
+            return self.register(idempotency_key, chat_id, message_id, payload)
         except Exception as e:
+            self.stats["errors"] += 1
             logger.error(f"❌ Erro no cache de idempotência: {e}")
             return None
 
     def update_status(self, idempotency_key: str, status: str, response: Optional[str] = None, error_msg: Optional[str] = None):
         """Atualiza o status do job."""
         try:
-            with sqlite3.connect(self.db_path, timeout=10) as conn:
+            with self.transaction() as conn:
                 now = datetime.now().isoformat()
                 conn.execute(
                     "UPDATE jobs SET status = ?, response = ?, error_msg = ?, updated_at = ? WHERE idempotency_key = ?",
                     (status, response, error_msg, now, idempotency_key)
                 )
+            if idempotency_key in self._recent:
+                self.remember(idempotency_key, status)
         except Exception as e:
             logger.error(f"❌ Erro ao atualizar status de idempotência: {e}")
 
     def get_correlation_id(self, idempotency_key: str) -> str:
         """Recupera o correlation_id gerado para o job."""
         try:
-            with sqlite3.connect(self.db_path, timeout=10) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT correlation_id FROM jobs WHERE idempotency_key = ?", (idempotency_key,))
-                row = cursor.fetchone()
+            with self.transaction() as conn:
+                row = conn.execute("SELECT correlation_id FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
                 return row[0] if row else "unknown"
         except:
             return "unknown"
 
-    def cleanup_old_jobs(self, days: int = 7):
-        """Remove jobs antigos para evitar crescimento infinito do SQLite."""
+    def cleanup_old_jobs(self, days: int = 7) -> int:
+        """Remove jobs antigos para evitar crescimento infinito do SQLite (jobs ainda na fila são mantidos)."""
         try:
             cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-            with sqlite3.connect(self.db_path, timeout=10) as conn:
-                count = conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,)).rowcount
-                if count > 0:
-                    logger.info(f"🧹 Cleanup Idempotency: {count} registros removidos.")
+            with self.transaction() as conn:
+                count = conn.execute(
+                    "DELETE FROM jobs WHERE created_at < ? AND (enqueued_at IS NULL OR status NOT IN ('RECEIVED', 'PROCESSING'))",
+                    (cutoff,),
+                ).rowcount
+            if count > 0:
+                logger.info(f"🧹 Cleanup Idempotency: {count} registros removidos.")
+            return count
         except Exception as e:
             logger.error(f"❌ Erro no cleanup de idempotência: {e}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "memory_keys": len(self._recent)}
 
 def get_idempotency():
     return IdempotencyService()
@@ -0,0 +1,230 @@
+"""
+Job Runner - Execução assíncrona e com concorrência limitada dos jobs do Scheduler.
+
+Cada job do APScheduler entrega sua lista de itens (viagens) e um handler por item.
+O runner faz o fan-out em asyncio com:
+- limite de concorrência por job (semáforo + pool de threads próprio);
+- semáforos por upstream (LLM, voos, parques, busca), compartilhados entre jobs;
+- timeout por item (contado a partir do início real do handler) e timeout global do job;
+  o prazo do item fica visível na thread (`item_remaining`/`check_deadline`): chamadas
+  HTTP encurtam o timeout e efeitos colaterais (mensagens, flags) são barrados depois dele;
+- deduplicação de chamadas por chave de upstream (`fetch_grouped`): N viajantes no
+  mesmo parque/voo/destino geram uma única consulta, distribuída a todos;
+- métricas por job (duração, itens processados, falhas, timeouts).
+
+Os serviços de integração ainda são bloqueantes (requests), então cada item roda
+em uma thread do pool; um upstream lento só atrasa os itens que dependem dele.
+Uma thread que estoura o prazo não pode ser interrompida: ela segura a vaga do job
+até terminar, para que o próximo item não espere na fila do pool com o relógio correndo.
+"""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+from loguru import logger
+from app.config import settings
+
+_item_context = threading.local()  # Prazo (monotonic) do item em execução nesta thread
+
+
+class ItemTimeoutError(TimeoutError):
+    """O item passou do prazo: o job já o contou como timeout, nada mais deve ser enviado/gravado."""
+
+
+def item_remaining() -> Optional[float]:
+    """Segundos restantes do item de job em execução nesta thread (None fora de um job)."""
+    deadline = getattr(_item_context, "deadline", None)
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def check_deadline():
+    """Levanta ItemTimeoutError se o item desta thread já estourou o prazo (no-op fora de um job)."""
+    if item_remaining() == 0.0:
+        raise ItemTimeoutError("prazo do item do job esgotado")
+
+
+class JobRunner:
+    """Runner compartilhado pelos jobs do scheduler (um por processo)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(JobRunner, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.default_concurrency = settings.SCHEDULER_JOB_CONCURRENCY
+        self.item_timeout = settings.SCHEDULER_ITEM_TIMEOUT_SECONDS
+        self.job_timeout = settings.SCHEDULER_JOB_TIMEOUT_SECONDS
+        self._upstreams: Dict[str, threading.BoundedSemaphore] = {
+            name: threading.BoundedSemaphore(limit) for name, limit in settings.SCHEDULER_UPSTREAM_LIMITS.items()
+        }
+        self._upstreams_lock = threading.Lock()
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+        self._initialized = True
+
+    # ============================================================
+    # LIMITES POR UPSTREAM
+    # ============================================================
+
+    @contextmanager
+    def upstream(self, name: str):
+        """Limita chamadas simultâneas a um upstream (ex.: `with runner.upstream("llm"): agent.chat(...)`)."""
+        with self._upstreams_lock:
+            sem = self._upstreams.get(name)
+            if sem is None:
+                sem = self._upstreams[name] = threading.BoundedSemaphore(self.default_concurrency)
+        with sem:
+            yield
+
+    # ============================================================
+    # EXECUÇÃO
+    # ============================================================
+
+    def run(
+        self,
+        job_name: str,
+        items: Iterable[Any],
+        handler: Callable[[Any], Any],
+        concurrency: Optional[int] = None,
+        item_timeout: Optional[float] = None,
+        job_timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Executa `handler(item)` para cada item em paralelo (limitado) e retorna as métricas do job.
+        Chamado de forma síncrona pela thread do APScheduler.
+        """
+        items = list(items)
+        stats = {
+            "job": job_name,
+            "started_at": datetime.now().isoformat(),
+            "items": len(items),
+            "succeeded": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "duration_s": 0.0,
+        }
+        t0 = time.perf_counter()
+        if items:
+            concurrency = max(1, min(concurrency or self.default_concurrency, len(items)))
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"job-{job_name}")
+            try:
+                asyncio.run(self._run_all(
+                    job_name, items, handler, executor, concurrency,
+                    item_timeout or self.item_timeout, job_timeout or self.job_timeout, stats,
+                ))
+            finally:
+                # Não espera threads presas em upstream lento: o timeout já foi contabilizado
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        stats["duration_s"] = round(time.perf_counter() - t0, 3)
+        self.metrics[job_name] = stats
+        logger.info(
+            f"⏱️ Job {job_name}: {stats['items']} itens em {stats['duration_s']}s "
+            f"(ok={stats['succeeded']}, falhas={stats['failed']}, timeouts={stats['timed_out']})"
+        )
+        return stats
+
+    def fetch_grouped(
+        self,
+        job_name: str,
+        items: Iterable[Any],
+        key: Callable[[Any], Any],
+        fetch: Callable[[Any], Any],
+        upstream: Optional[str] = None,
+        **run_kwargs,
+    ) -> Dict[Any, Any]:
+        """
+        Agrupa os itens por `key(item)` e chama `fetch(chave)` uma única vez por chave distinta
+        (em paralelo, limitado pelo upstream). Retorna {chave: resultado}; chaves cujo fetch
+        falhou ou estourou o timeout ficam de fora. Itens com chave None são ignorados.
+        """
+        items = list(items)
+        keys = list(dict.fromkeys(k for k in map(key, items) if k is not None))
+        results: Dict[Any, Any] = {}
+
+        def fetch_one(k):
+            if upstream:
+                with self.upstream(upstream):
+                    value = fetch(k)
+            else:
+                value = fetch(k)
+            check_deadline()  # Resposta que chegou depois do timeout fica de fora
+            results[k] = value
+
+        fetch_job = f"{job_name}:fetch"
+        stats = self.run(fetch_job, keys, fetch_one, **run_kwargs)
+        stats["subscribers"] = len(items)
+        self.metrics[fetch_job] = stats
+        if len(keys) < len(items):
+            logger.info(f"🔗 Job {job_name}: {len(items)} itens agrupados em {len(keys)} chamadas de upstream")
+        return results
+
+    async def _run_all(self, job_name, items, handler, executor, concurrency, item_timeout, job_timeout, stats):
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(concurrency)
+        job_deadline = time.monotonic() + job_timeout
+        overdue = set()  # Itens já contados como timeout (a thread ainda pode estar rodando)
+
+        def call(item, started: asyncio.Future):
+            # O prazo começa quando o handler começa de fato, não quando o item entrou na fila
+            _item_context.deadline = min(time.monotonic() + item_timeout, job_deadline)
+            try:
+                loop.call_soon_threadsafe(lambda: started.done() or started.set_result(None))
+            except RuntimeError:
+                pass  # Job já encerrado (timeout global): o prazo acima já barra os efeitos
+            try:
+                return handler(item)
+            finally:
+                _item_context.deadline = None
+
+        async def run_one(index, item):
+            async with sem:
+                started = loop.create_future()
+                future = loop.run_in_executor(executor, call, item, started)
+                try:
+                    await started
+                    await asyncio.wait_for(asyncio.shield(future), timeout=item_timeout)
+                    stats["succeeded"] += 1
+                except asyncio.TimeoutError:
+                    stats["timed_out"] += 1
+                    overdue.add(index)
+                    logger.warning(f"⌛ Job {job_name}: item excedeu {item_timeout}s ({self._describe(item)})")
+                    # Segura a vaga até a thread terminar de fato (ela ocupa um worker do pool)
+                    await asyncio.gather(future, return_exceptions=True)
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.error(f"❌ Job {job_name}: erro no item {self._describe(item)}: {e}")
+
+        tasks = {asyncio.ensure_future(run_one(i, item)): i for i, item in enumerate(items)}
+        done, pending = await asyncio.wait(list(tasks), timeout=job_timeout)
+        if pending:
+            for task in pending:
+                task.cancel()
+            cancelled = [task for task in pending if tasks[task] not in overdue]
+            stats["timed_out"] += len(cancelled)
+            logger.warning(f"⌛ Job {job_name}: timeout global de {job_timeout}s, {len(cancelled)} itens cancelados")
+
+    @staticmethod
+    def _describe(item: Any) -> str:
+        if isinstance(item, dict):
+            return str(item.get("id", "?"))
+        if isinstance(item, tuple) and item and isinstance(item[0], dict):
+            return str(item[0].get("id", "?"))
+        return str(item)[:80]
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self.metrics)
+
+
+def get_job_runner() -> JobRunner:
+    return JobRunner()
@@ -0,0 +1,205 @@
+"""
+Location Stream - Estágio de ingestão da localização em tempo real do WhatsApp.
+
+A "Localização em Tempo Real" manda um ping a cada poucos segundos por usuário.
+Em vez de rodar `GeolocationService.process_location` para cada ping:
+
+1. Coalescência: cada usuário tem só a ÚLTIMA posição num buffer; pings que chegam
+   enquanto ele já está na fila (ou sendo avaliado) apenas sobrescrevem a posição.
+2. Debounce: deslocamentos menores que LOCATION_MIN_MOVE_METERS desde a última
+   avaliação são descartados (a menos que LOCATION_REFRESH_SECONDS tenham passado,
+   para os gatilhos baseados em tempo, como cooldown de dicas).
+3. Pool limitado: LOCATION_WORKERS tarefas asyncio avaliam cercas/dicas em threads;
+   um usuário nunca é avaliado por dois workers ao mesmo tempo.
+4. Estado por usuário expira: quem parou de compartilhar há mais de
+   LOCATION_IDLE_EVICT_MULTIPLIER x LOCATION_REFRESH_SECONDS sai dos buffers.
+5. Guias que precisam do agente (chegada, parque, evento) entram na WorkQueue como
+   evento sintético do chat: rodam na vez do usuário, nunca em paralelo com um turno
+   do webhook na mesma thread do LangGraph. Dicas prontas são enviadas direto.
+
+A carga do backend passa a ser proporcional ao movimento relevante, não à taxa de pings.
+Só transições (entrar/sair de cerca, guia/dica enviada) são persistidas na viagem.
+"""
+
+import time
+import uuid
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Dict, Optional, Set, Tuple
+from loguru import logger
+from app.config import settings
+from app.services.geofence_service import haversine_km
+
+Position = Tuple[float, float, float]  # (lat, lng, monotonic ts)
+
+
+class LocationStream:
+    """Buffer de última posição por usuário + pool de workers (um por processo)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(LocationStream, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.workers = settings.LOCATION_WORKERS
+        self.min_move_km = settings.LOCATION_MIN_MOVE_METERS / 1000.0
+        self.refresh_seconds = settings.LOCATION_REFRESH_SECONDS
+        self.idle_seconds = settings.LOCATION_REFRESH_SECONDS * settings.LOCATION_IDLE_EVICT_MULTIPLIER
+        self._last_eviction = time.monotonic()
+        self._latest: Dict[str, Position] = {}
+        self._evaluated: Dict[str, Position] = {}
+        self._queued: Set[str] = set()
+        self._in_flight: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._geo = None
+        self._latencies_ms = deque(maxlen=512)
+        self.stats = {"pings": 0, "coalesced": 0, "dropped_small_moves": 0, "evaluated": 0, "messages_sent": 0, "guides_queued": 0, "errors": 0, "evicted": 0}
+        self._initialized = True
+
+    # ============================================================
+    # CICLO DE VIDA
+    # ============================================================
+
+    def _ensure_started(self):
+        """Sobe os workers no event loop atual na primeira submissão."""
+        if self._tasks and not all(t.done() for t in self._tasks):
+            return
+        self._queue = asyncio.Queue()
+        for user_id in self._queued:
+            self._queue.put_nowait(user_id)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"🛰️ LocationStream iniciado ({self.workers} workers)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ============================================================
+    # INGESTÃO
+    # ============================================================
+
+    def submit(self, user_id: str, lat: float, lng: float):
+        """Registra um ping (chamado pelo webhook, dentro do event loop). Nunca bloqueia."""
+        self._ensure_started()
+        self.stats["pings"] += 1
+        now = time.monotonic()
+        self._latest[user_id] = (float(lat), float(lng), now)
+        if now - self._last_eviction >= self.refresh_seconds:
+            self._evict_idle(now)
+        if user_id in self._queued or user_id in self._in_flight:
+            self.stats["coalesced"] += 1
+            return
+        self._queued.add(user_id)
+        self._queue.put_nowait(user_id)
+
+    def _evict_idle(self, now: float):
+        """Remove o estado de usuários sem ping há mais de `idle_seconds` (pararam de compartilhar)."""
+        self._last_eviction = now
+        busy = self._queued | self._in_flight
+        evicted = 0
+        for buffer in (self._evaluated, self._latest):
+            for user_id in [u for u, pos in buffer.items() if now - pos[2] >= self.idle_seconds and u not in busy]:
+                del buffer[user_id]
+                evicted += 1
+        if evicted:
+            self.stats["evicted"] += evicted
+            logger.debug(f"🧹 LocationStream: {evicted} posições ociosas removidas")
+
+    def _is_meaningful(self, user_id: str, position: Position) -> bool:
+        last = self._evaluated.get(user_id)
+        if last is None:
+            return True
+        if position[2] - last[2] >= self.refresh_seconds:
+            return True
+        moved_km = float(haversine_km(last[0], last[1], position[0], position[1]))
+        return moved_km >= self.min_move_km
+
+    # ============================================================
+    # WORKERS
+    # ============================================================
+
+    def _geolocation(self):
+        if self._geo is None:
+            from app.services.geolocation_service import GeolocationService
+            self._geo = GeolocationService()
+        return self._geo
+
+    async def _worker(self, index: int):
+        while True:
+            user_id = await self._queue.get()
+            self._queued.discard(user_id)
+            self._in_flight.add(user_id)
+            try:
+                position = self._latest.pop(user_id, None)
+                if position is None:
+                    continue
+                if not self._is_meaningful(user_id, position):
+                    self.stats["dropped_small_moves"] += 1
+                    continue
+                await self._evaluate(user_id, position)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"❌ LocationStream: erro ao avaliar {user_id}: {e}")
+            finally:
+                self._in_flight.discard(user_id)
+                # Chegaram pings durante a avaliação: volta para a fila com a posição mais nova
+                if user_id in self._latest and user_id not in self._queued:
+                    self._queued.add(user_id)
+                    self._queue.put_nowait(user_id)
+                self._queue.task_done()
+
+    async def _evaluate(self, user_id: str, position: Position):
+        lat, lng, _ = position
+        t0 = time.perf_counter()
+        result = await asyncio.to_thread(self._geolocation().process_location, user_id, lat, lng)
+        self._latencies_ms.append((time.perf_counter() - t0) * 1000)
+        self._evaluated[user_id] = position
+        self.stats["evaluated"] += 1
+        if not result:
+            return
+        if result.get("agent_prompt"):
+            await self._enqueue_guide(user_id, result["agent_prompt"], result.get("trip_id"))
+        elif result.get("text"):
+            from app.services.evolution_service import EvolutionService
+            await EvolutionService().send_text(user_id, result["text"])
+            self.stats["messages_sent"] += 1
+
+    async def _enqueue_guide(self, user_id: str, prompt: str, trip_id: Optional[str]):
+        """Turno do agente como evento sintético do chat: mesma fila FIFO (e retentativas) do webhook."""
+        from app.services.work_queue import get_work_queue
+        event = {"user_id": user_id, "trip_id": trip_id, "source": "location", "payload": {"message": {"conversation": prompt}}}
+        if await get_work_queue().enqueue(f"location:{user_id}:{uuid.uuid4().hex}", user_id, event):
+            self.stats["guides_queued"] += 1
+
+    # ============================================================
+    # MÉTRICAS
+    # ============================================================
+
+    def get_stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._latencies_ms)
+        pings = self.stats["pings"]
+        return {
+            **self.stats,
+            "queue_depth": len(self._queued),
+            "in_flight": len(self._in_flight),
+            "tracked_users": len(self._evaluated),
+            "evaluation_ratio": round(self.stats["evaluated"] / pings, 3) if pings else None,
+            "eval_p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 1) if ordered else None,
+        }
+
+
+def get_location_stream() -> LocationStream:
+    return LocationStream()
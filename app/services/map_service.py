@@ -5,9 +5,19 @@ from loguru import logger
 from app.config import settings
 from app.services.openai_service import OpenAIService
 from app.services.maps_service import GoogleMapsService
-from app.services.rag_service import RAGService
+from app.services.rag_service import get_rag_service
 from app.services.user_service import UserService
 
+# Perguntas fixas usadas para localizar trechos com lugares físicos nos documentos
+POI_QUERIES = [
+    "reserva de hotel, hospedagem, endereço do hotel, check-in",
+    "voo, aeroporto, terminal, embarque, desembarque",
+    "ingresso, atração, museu, parque, passeio, tour",
+    "restaurante, reserva de mesa, jantar",
+    "trem, estação, transfer, aluguel de carro, retirada de veículo",
+]
+POI_HITS_PER_QUERY = 8
+
 class InteractiveMapService:
     """
     Pilar 1: Cérebro de Extração Geoespacial
@@ -17,7 +27,7 @@ class InteractiveMapService:
     def __init__(self):
         self.openai_svc = OpenAIService()
         self.maps_svc = GoogleMapsService()
-        self.rag_svc = RAGService()
+        self.rag_svc = get_rag_service()
         self.user_svc = UserService()
         logger.info("🗺️ InteractiveMapService inicializado (Arquitetura Joule)")
 
@@ -89,18 +99,18 @@ class InteractiveMapService:
             logger.info("MapService: Nenhum documento no RAG para mapear.")
             return []
             
-        # Para forçar contexto máximo, pegamos os dados de todos os docs cadastrados na viagem
-        # Fallback: Se não achar nada pelo trip_id, tenta pelo thread_id
-        for doc in self.rag_svc.documents:
-            meta = doc.get("metadata", {})
-            m_trip = meta.get("trip_id")
-            m_thread = self.user_svc.normalize_phone(meta.get("thread_id", ""))
-            
-            # Match 1: Trip ID perfeito
-            # Match 2: Thread ID (usuário) for o mesmo e a trip for a ativa ou estiver vazia
-            if m_trip == active_trip_id or (m_thread == clean_uid):
-                # O text_content original fica em doc['text']
-                rag_context += f"\nFile [{meta.get('filename', 'Unknown')}]:\n{doc.get('text', '')}"
+        # Consultas de POI em lote na partição da viagem (trip_id) + do usuário (thread_id)
+        hits_per_query = self.rag_svc.query_many(
+            POI_QUERIES, thread_id=clean_uid, trip_id=active_trip_id, k=POI_HITS_PER_QUERY
+        )
+        seen_ids = set()
+        for hits in hits_per_query:
+            for hit in hits:
+                if hit["id"] in seen_ids:
+                    continue
+                seen_ids.add(hit["id"])
+                meta = hit["metadata"]
+                rag_context += f"\nFile [{meta.get('filename', 'Unknown')}]:\n{hit['text']}"
 
         # 3. Processamento Neural (Backend Cérebro)
         extracted_locations = self._extract_locations_via_llm(rag_context)
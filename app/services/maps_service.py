@@ -2,7 +2,8 @@
 Google Maps Service - Geocoding e busca de lugares
 """
 
-import requests
+from app.services.http_client import get_http_client
+from app.services.geocode_cache import get_geocode_cache, MISS
 from app.config import settings
 from loguru import logger
 from typing import Optional, Dict, List
@@ -10,14 +11,23 @@ from typing import Optional, Dict, List
 class GoogleMapsService:
     """Service para integração com Google Maps API"""
     
-    def __init__(self):
+    def __init__(self, cache=None):
         """Inicializa o service"""
         self.api_key = settings.GOOGLE_MAPS_API_KEY
         self.base_url = "https://maps.googleapis.com/maps/api"
+        self.http = get_http_client()
+        self.cache = cache or get_geocode_cache()
         logger.info("✅ Google Maps Service inicializado")
     
     def geocode(self, address: str) -> Optional[Dict]:
-        """Converte endereço em coordenadas (lat, lng)"""
+        """Converte endereço em coordenadas (lat, lng). Consulta o cache local antes do Google."""
+        if not address or not address.strip():
+            return None
+        key = self.cache.address_key(address)
+        cached = self.cache.get(key)
+        if cached is not MISS:
+            return cached
+
         try:
             url = f"{self.base_url}/geocode/json"
             params = {
@@ -25,16 +35,20 @@ class GoogleMapsService:
                 "key": self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=15)
+            response = self.http.get("google_maps", url, params=params)
             data = response.json()
             
             if data["status"] == "OK":
                 location = data["results"][0]["geometry"]["location"]
-                return {
+                result = {
                     "lat": location["lat"],
                     "lng": location["lng"],
                     "formatted_address": data["results"][0]["formatted_address"]
                 }
+                self.cache.put(key, result)
+                return result
+            if data["status"] == "ZERO_RESULTS":
+                self.cache.put(key, None)  # Cache negativo: endereço inexistente
             return None
                 
         except Exception as e:
@@ -42,7 +56,12 @@ class GoogleMapsService:
             return None
 
     def reverse_geocode(self, lat: float, lng: float) -> str:
-        """Converte coordenadas em endereço ou nome de local"""
+        """Converte coordenadas em endereço ou nome de local (cache por célula lat/lng arredondada)"""
+        key = self.cache.cell_key(lat, lng)
+        cached = self.cache.get(key)
+        if cached is not MISS:
+            return cached if cached is not None else "Localização desconhecida"
+
         try:
             url = f"{self.base_url}/geocode/json"
             params = {
@@ -50,11 +69,15 @@ class GoogleMapsService:
                 "key": self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=15)
+            response = self.http.get("google_maps", url, params=params)
             data = response.json()
             
             if data["status"] == "OK":
-                return data["results"][0]["formatted_address"]
+                address = data["results"][0]["formatted_address"]
+                self.cache.put(key, address)
+                return address
+            if data["status"] == "ZERO_RESULTS":
+                self.cache.put(key, None)
             return "Localização desconhecida"
                 
         except Exception as e:
@@ -72,7 +95,7 @@ class GoogleMapsService:
                 "key": self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=15)
+            response = self.http.get("google_maps", url, params=params)
             data = response.json()
             
             if data["status"] == "OK":
@@ -137,7 +160,7 @@ class GoogleMapsService:
                 "key": self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=15)
+            response = self.http.get("google_maps", url, params=params)
             data = response.json()
             
             if data["status"] == "OK":
@@ -2,7 +2,7 @@
 N8N Service - Integração com o fluxo do n8n (WhatsApp + Chatwoot)
 """
 
-import requests
+from app.services.http_client import get_http_client
 from loguru import logger
 from typing import Dict, Any
 
@@ -12,6 +12,7 @@ class N8nService:
     def __init__(self):
         from app.config import settings
         self.webhook_url = settings.N8N_WEBHOOK_URL_OUTPUT
+        self.http = get_http_client()
         
         if not self.webhook_url:
             logger.warning("⚠️ URL do Webhook do n8n não configurada (modo simulação)")
@@ -73,7 +74,7 @@ class N8nService:
             logger.info(f"📤 Enviando para n8n: {self.webhook_url} | Destino: {numero_usuario}")
             logger.debug(f"📦 Payload n8n: {payload}")
             
-            response = requests.post(self.webhook_url, json=payload, timeout=15)
+            response = self.http.post("n8n", self.webhook_url, json=payload)
             
             if response.status_code == 200:
                 logger.info(f"✅ Sucesso no n8n para {numero_usuario}")
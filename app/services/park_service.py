@@ -2,7 +2,7 @@
 Park Service - Integração com a API ThemeParks.wiki para tempos de espera.
 """
 
-import requests
+from app.services.http_client import get_http_client
 from typing import List, Dict, Any, Optional
 from loguru import logger
 
@@ -51,6 +51,9 @@ class ParkService:
         }
     }
 
+    def __init__(self):
+        self.http = get_http_client()
+
     def get_park_info(self, name_or_id: str) -> Optional[Dict[str, Any]]:
         """Retorna dados estáticos do parque (lat, lng, id)"""
         if name_or_id in self.PARK_DATA:
@@ -61,16 +64,19 @@ class ParkService:
                 return data
         return None
 
+    def _park_id(self, park_name_or_id: str) -> str:
+        park_info = self.get_park_info(park_name_or_id)
+        return park_info["id"] if park_info else park_name_or_id
+
     def get_live_data(self, park_name_or_id: str) -> List[Dict[str, Any]]:
         """Busca tempos de espera e status das atrações"""
-        park_info = self.get_park_info(park_name_or_id)
-        park_id = park_info["id"] if park_info else park_name_or_id
+        park_id = self._park_id(park_name_or_id)
         
         url = f"{self.BASE_URL}/entity/{park_id}/live"
         logger.info(f"🎢 Buscando dados em tempo real para o parque: {park_id}")
         
         try:
-            response = requests.get(url, timeout=10)
+            response = self.http.get("parks", url)
             response.raise_for_status()
             data = response.json()
             return data.get("liveData", [])
@@ -78,6 +84,18 @@ class ParkService:
             logger.error(f"Erro ao buscar dados do parque {park_id}: {e}")
             return []
 
+    async def aget_live_data(self, park_name_or_id: str) -> List[Dict[str, Any]]:
+        """Versão async de get_live_data"""
+        park_id = self._park_id(park_name_or_id)
+        logger.info(f"🎢 Buscando dados em tempo real para o parque: {park_id}")
+        try:
+            response = await self.http.aget("parks", f"{self.BASE_URL}/entity/{park_id}/live")
+            response.raise_for_status()
+            return response.json().get("liveData", [])
+        except Exception as e:
+            logger.error(f"Erro ao buscar dados do parque {park_id}: {e}")
+            return []
+
     def format_park_summary(self, live_data: List[Dict[str, Any]], limit: int = 15) -> str:
         """Formata um resumo legível dos tempos de espera"""
         if not live_data:
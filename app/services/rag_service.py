@@ -1,84 +1,90 @@
 """
-RAG Service - Gerenciamento de Memória Vetorial Robusto (NumPy Puro + JSON)
+RAG Service - Gerenciamento de Memória Vetorial Robusto (NumPy Puro + memmap)
 Substitui o ChromaDB e evita dependências pesadas como scikit-learn ou ONNX.
 """
 
 import os
-import json
+import threading
+from collections import OrderedDict
 import numpy as np
 from typing import List, Dict, Any, Optional
 from langchain_openai import OpenAIEmbeddings
 from app.config import settings
+from app.services.vector_store import VectorStore
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.ann_index import FlatIndex, get_index_backend
 from loguru import logger
 
 class RAGService:
-    """Service para busca semântica robusta usando Embeddings da OpenAI e NumPy Puro"""
+    """
+    Service para busca semântica robusta usando Embeddings da OpenAI e NumPy Puro.
+    Instância única por processo: o índice é carregado uma vez e atualizado in-place.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(RAGService, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
     
     def __init__(self):
-        """Inicializa a base de dados local"""
-        self.data_path = os.path.join(settings.CHROMA_DB_PATH, "vector_data.json")
-        self.embeddings = OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY)
-        self.documents = []
-        self.vectors = []
+        """Inicializa a base de dados local (apenas na primeira construção)"""
+        with self._instance_lock:
+            if self._initialized:
+                return
+            self._setup()
+            self._initialized = True
+
+    def _setup(self):
+        self.legacy_data_path = os.path.join(settings.CHROMA_DB_PATH, "vector_data.json")
+        # Embeddings com cache persistente (modelo + hash do texto normalizado)
+        self.embeddings = CachedEmbeddings(OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY))
         
-        # Criar diretório se não existir
-        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        # Vetores float32 em memmap + sidecar de metadados (append-only)
+        self.store = VectorStore(settings.CHROMA_DB_PATH, compaction_ratio=settings.RAG_COMPACTION_RATIO)
         
-        # Carregar dados existentes
-        self._load_data()
-        logger.info(f"✅ RAG Service NumPy inicializado (Base em: {self.data_path})")
+        # Busca exata para partições pequenas; backend ANN configurável para as grandes
+        self.exact_index = FlatIndex()
+        self.ann_index = get_index_backend(settings.RAG_INDEX_BACKEND, nprobe=settings.RAG_IVF_NPROBE)
+        self._ann_handles: "OrderedDict[tuple, tuple]" = OrderedDict()  # LRU (campo, partição) -> (vetores, índice)
+        self._ann_lock = threading.Lock()
+        
+        # Migração única do formato JSON antigo
+        self.store.migrate_from_json(self.legacy_data_path)
+        logger.info(f"✅ RAG Service NumPy inicializado (Base em: {settings.CHROMA_DB_PATH}, {len(self.store)} docs)")
+
+    @property
+    def documents(self) -> List[Dict[str, Any]]:
+        """Documentos vivos ({'id', 'row', 'text', 'metadata'})."""
+        return self.store.documents
         
     def _load_data(self):
-        """Carrega os documentos e vetores do disco com validação."""
-        if os.path.exists(self.data_path):
-            try:
-                with open(self.data_path, 'r', encoding='utf-8') as f:
-                    content = json.load(f)
-                    
-                    docs = content.get("documents", [])
-                    raw_vectors = content.get("vectors", [])
-                    
-                    # Validação básica de integridade
-                    if len(docs) != len(raw_vectors) and len(raw_vectors) > 0:
-                        logger.error(f"⚠️ Inconsistência no RAG: {len(docs)} docs vs {len(raw_vectors)} vetores. Tentando recuperar...")
-                        # Se houver inconsistência, limpamos os vetores para forçar re-indexação se necessário
-                        # Ou apenas truncamos se possível. Aqui vamos manter os docs e avisar.
-                        raw_vectors = raw_vectors[:len(docs)]
-                    
-                    self.documents = docs
-                    if raw_vectors:
-                        self.vectors = np.array(raw_vectors)
-                    else:
-                        self.vectors = np.array([])
-                        
-                logger.info(f"📂 {len(self.documents)} documentos carregados da memória.")
-            except Exception as e:
-                logger.error(f"❌ Erro crítico ao carregar dados do RAG: {e}")
-                self.documents = []
-                self.vectors = np.array([])
-                
-    def _save_data(self):
-        """Salva os documentos e vetores no disco de forma ATÔMICA."""
-        temp_path = self.data_path + ".tmp"
+        """Sincroniza com escritas de outros processos (stat barato; lê só a cauda nova do sidecar)."""
         try:
-            content = {
-                "documents": self.documents,
-                "vectors": self.vectors.tolist() if len(self.vectors) > 0 else []
-            }
-            # 1. Escrever no arquivo temporário
-            with open(temp_path, 'w', encoding='utf-8') as f:
-                json.dump(content, f, ensure_ascii=False, indent=2)
-            
-            # 2. Renomear para o original (Atômico no Unix/Windows overwrite)
-            if os.path.exists(self.data_path):
-                os.replace(temp_path, self.data_path)
-            else:
-                os.rename(temp_path, self.data_path)
-                
+            if self.store.refresh():
+                logger.info(f"📂 RAG sincronizado com o disco: {len(self.store)} documentos.")
         except Exception as e:
-            logger.error(f"❌ Erro ao salvar dados do RAG de forma atômica: {e}")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            logger.error(f"❌ Erro crítico ao carregar dados do RAG: {e}")
+
+    def _build_metadata(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Garante consistência dos metadados para filtros.
+        'traveler' e 'primary_traveler_name' são sinônimos — normalizar os dois."""
+        traveler = metadata.get("traveler") or metadata.get("primary_traveler_name")
+        return {
+            "filename": metadata.get("filename"),
+            "thread_id": metadata.get("thread_id"),
+            "trip_id": metadata.get("trip_id"),
+            "mimetype": metadata.get("mimetype"),
+            "document_type": metadata.get("document_type", "geral"),
+            "primary_traveler_name": traveler,
+            "traveler": traveler,           # <- campo que parsers usam
+            "uploaded_by": metadata.get("thread_id"),  # quem fez upload
+            "drive_link": metadata.get("drive_link"),
+            "segment_info": metadata.get("segment_info")
+        }
 
     def delete_documents_by_type(self, thread_id: str, document_type: str, trip_id: str = None, filename: str = None, traveler_name: str = None) -> int:
         """
@@ -86,16 +92,15 @@ class RAGService:
         """
         try:
             self._load_data()
-            if not self.documents:
+            user_docs, _, _ = self.store.partition("thread_id", thread_id)
+            if not user_docs:
                 return 0
-            indices_to_remove = []
-            for i, doc in enumerate(self.documents):
+            ids_to_remove = []
+            for doc in user_docs:
                 m = doc["metadata"]
                 
                 # Filtros Básicos
-                if m.get("thread_id") != thread_id:
-                    continue
-                if m.get("document_type", "").lower() != document_type.lower():
+                if (m.get("document_type") or "").lower() != document_type.lower():
                     continue
                 if trip_id and m.get("trip_id") != trip_id:
                     continue
@@ -106,19 +111,14 @@ class RAGService:
                 if traveler_name and m.get("primary_traveler_name") != traveler_name:
                     continue
                 
-                indices_to_remove.append(i)
+                ids_to_remove.append(doc["id"])
             
-            if not indices_to_remove:
+            if not ids_to_remove:
                 return 0
             
-            for i in sorted(indices_to_remove, reverse=True):
-                self.documents.pop(i)
-                if len(self.vectors) > 0:
-                    self.vectors = np.delete(self.vectors, i, axis=0)
-                
-            self._save_data()
-            logger.info(f"🗑️ {len(indices_to_remove)} doc(s) antigo(s) removidos para {thread_id}")
-            return len(indices_to_remove)
+            self.store.delete(ids_to_remove)
+            logger.info(f"🗑️ {len(ids_to_remove)} doc(s) antigo(s) removidos para {thread_id}")
+            return len(ids_to_remove)
         except Exception as e:
             logger.error(f"❌ Erro ao remover docs antigos: {e}")
             return 0
@@ -127,27 +127,17 @@ class RAGService:
         """Remove TODOS os documentos vinculados a uma viagem específica (Cleanup)."""
         try:
             self._load_data()
-            if not self.documents:
-                return 0
-            
-            indices_to_remove = [
-                i for i, doc in enumerate(self.documents) 
-                if doc["metadata"].get("trip_id") == trip_id
-            ]
+            trip_docs, _, _ = self.store.partition("trip_id", trip_id)
+            ids_to_remove = [doc["id"] for doc in trip_docs]
             
-            if not indices_to_remove:
+            if not ids_to_remove:
                 return 0
                 
-            for i in sorted(indices_to_remove, reverse=True):
-                self.documents.pop(i)
-                if len(self.vectors) > 1:
-                    self.vectors = np.delete(self.vectors, i, axis=0)
-                else:
-                    self.vectors = np.array([])
-            
-            self._save_data()
-            logger.info(f"🧹 Cleanup: {len(indices_to_remove)} documentos removidos da trip {trip_id}")
-            return len(indices_to_remove)
+            self.store.delete(ids_to_remove)
+            with self._ann_lock:
+                self._ann_handles.pop(("trip_id", trip_id), None)
+            logger.info(f"🧹 Cleanup: {len(ids_to_remove)} documentos removidos da trip {trip_id}")
+            return len(ids_to_remove)
         except Exception as e:
             logger.error(f"❌ Erro no cleanup da trip {trip_id}: {e}")
             return 0
@@ -161,34 +151,8 @@ class RAGService:
             # Gerar embedding via OpenAI
             vector = self.embeddings.embed_query(text)
             
-            # Garantir consistência dos metadados para filtros
-            # 'traveler' e 'primary_traveler_name' são sinônimos — normalizar os dois
-            traveler = metadata.get("traveler") or metadata.get("primary_traveler_name")
-            full_metadata = {
-                "filename": metadata.get("filename"),
-                "thread_id": metadata.get("thread_id"),
-                "trip_id": metadata.get("trip_id"),
-                "mimetype": metadata.get("mimetype"),
-                "document_type": metadata.get("document_type", "geral"),
-                "primary_traveler_name": traveler,
-                "traveler": traveler,           # <- campo que parsers usam
-                "uploaded_by": metadata.get("thread_id"),  # quem fez upload
-                "drive_link": metadata.get("drive_link"),
-                "segment_info": metadata.get("segment_info")
-            }
-            
-            self.documents.append({
-                "text": text,
-                "metadata": full_metadata
-            })
-            
-            if len(self.vectors) == 0:
-                self.vectors = np.array([vector])
-            else:
-                self.vectors = np.vstack([self.vectors, vector])
-                
-            # Persistir
-            self._save_data()
+            # Persistir (append-only: apenas o novo vetor e sua linha de metadados)
+            self.store.add([text], [vector], [self._build_metadata(metadata)])
             return True
         except Exception as e:
             logger.error(f"❌ Erro ao adicionar documento: {e}")
@@ -203,105 +167,110 @@ class RAGService:
             logger.info(f"📥 Indexando lote de {len(docs_list)} documentos...")
             texts = [d["text"] for d in docs_list]
             
-            # Gerar embeddings em batch (mais eficiente que um por um se suportado, 
-            # mas OpenAI embeddings query usually is singular. Let's use embed_documents)
+            # Gerar embeddings em batch (uma chamada para o lote inteiro)
             vectors = self.embeddings.embed_documents(texts)
-            
-            for i, doc in enumerate(docs_list):
-                metadata = doc["metadata"]
-                traveler = metadata.get("traveler") or metadata.get("primary_traveler_name")
-                
-                full_metadata = {
-                    "filename": metadata.get("filename"),
-                    "thread_id": metadata.get("thread_id"),
-                    "trip_id": metadata.get("trip_id"),
-                    "mimetype": metadata.get("mimetype"),
-                    "document_type": metadata.get("document_type", "geral"),
-                    "primary_traveler_name": traveler,
-                    "traveler": traveler,
-                    "uploaded_by": metadata.get("thread_id"),
-                    "drive_link": metadata.get("drive_link"),
-                    "segment_info": metadata.get("segment_info")
-                }
-                
-                self.documents.append({
-                    "text": texts[i],
-                    "metadata": full_metadata
-                })
-                
-                if len(self.vectors) == 0:
-                    self.vectors = np.array([vectors[i]])
-                else:
-                    self.vectors = np.vstack([self.vectors, vectors[i]])
+            metadatas = [self._build_metadata(doc["metadata"]) for doc in docs_list]
                     
-            # Persistir APENAS UMA VEZ ao final do lote
-            self._save_data()
+            # Persistir APENAS UMA VEZ ao final do lote (append)
+            self.store.add(texts, vectors, metadatas)
             logger.info(f"✅ Lote de {len(docs_list)} documentos indexado com sucesso.")
             return True
         except Exception as e:
             logger.error(f"❌ Erro ao adicionar lote de documentos: {e}")
             return False
             
-    def _cosine_similarity(self, v1: np.ndarray, v2_matrix: np.ndarray) -> np.ndarray:
-        """Calcula a similaridade de cosseno manual usando NumPy"""
-        # v1 shape: (1, dim), v2_matrix shape: (N, dim)
-        norm_v1 = np.linalg.norm(v1)
-        norm_v2 = np.linalg.norm(v2_matrix, axis=1)
-        
-        dot_product = np.dot(v2_matrix, v1.T).flatten()
-        return dot_product / (norm_v1 * norm_v2)
+    def _search_partition(self, field: str, key: str, vectors: np.ndarray, queries: np.ndarray, k: int):
+        """Busca exata em partições pequenas; acima do limite usa o backend ANN (índice cacheado por partição)."""
+        if isinstance(self.ann_index, FlatIndex) or len(vectors) < settings.RAG_ANN_MIN_PARTITION:
+            return self.exact_index.search(vectors, queries, k)
+        with self._ann_lock:
+            cached = self._ann_handles.get((field, key))
+            # A matriz da partição é substituída quando ela muda: identidade diferente = reconstruir
+            if cached is None or cached[0] is not vectors:
+                logger.info(f"🧭 Construindo índice {self.ann_index.name} para {field}={key} ({len(vectors)} vetores)")
+                cached = (vectors, self.ann_index.build(vectors))
+                self._ann_handles[(field, key)] = cached
+                self._evict_ann_handles()
+            self._ann_handles.move_to_end((field, key))
+        return self.ann_index.search(cached[1], queries, k)
+
+    def _evict_ann_handles(self):
+        """Descarta índices de partições que sumiram (viagens/usuários removidos) e aplica o limite LRU."""
+        live = {field: set(self.store.partition_keys(field)) for field in {f for f, _ in self._ann_handles}}
+        for handle_key in [h for h in self._ann_handles if h[1] not in live[h[0]]]:
+            del self._ann_handles[handle_key]
+        while len(self._ann_handles) > settings.RAG_ANN_MAX_CACHED_INDEXES:
+            self._ann_handles.popitem(last=False)
+
+    def _resolve_scope(self, thread_id: Optional[str], trip_id: Optional[str]) -> tuple:
+        """Normaliza o usuário e, se a viagem não for informada, usa a viagem ativa dele."""
+        if thread_id:
+            from app.services.user_service import UserService
+            user_service = UserService()
+            thread_id = user_service.normalize_phone(thread_id)
+            if not trip_id:
+                trip_id = user_service.get_active_trip(thread_id)
+        return thread_id, trip_id
+
+    def query_many(self, queries: List[str], thread_id: Optional[str] = None, trip_id: Optional[str] = None, k: int = 10) -> List[List[Dict[str, Any]]]:
+        """
+        Busca várias perguntas de uma vez na partição da viagem/usuário.
+        Um único lote de embeddings e um único produto de matrizes (Q x N).
+        Retorna, para cada query, a lista de hits {'id', 'score', 'text', 'metadata'} em ordem decrescente.
+        """
+        if not queries:
+            return []
+        self._load_data()
+        thread_id, trip_id = self._resolve_scope(thread_id, trip_id)
+        scopes = [("trip_id", trip_id), ("thread_id", thread_id)]
+        partitions = [(field, key) + self.store.partition(field, key) for field, key in scopes if key]
+        partitions = [p for p in partitions if p[2]]
+        if not partitions:
+            return [[] for _ in queries]
+
+        query_matrix = VectorStore.normalize(np.asarray(self.embeddings.embed_documents(queries), dtype=np.float32))
+
+        # Cada partição é buscada separadamente; hits são unidos por id (mesmo filtro de antes)
+        merged: List[Dict[str, Dict[str, Any]]] = [{} for _ in queries]
+        for field, key, docs, _, vectors in partitions:
+            for qi, (indices, scores) in enumerate(self._search_partition(field, key, vectors, query_matrix, k)):
+                for i, score in zip(indices, scores):
+                    doc = docs[i]
+                    merged[qi][doc["id"]] = {"id": doc["id"], "score": float(score), "text": doc["text"], "metadata": doc["metadata"]}
+        return [sorted(hits.values(), key=lambda h: h["score"], reverse=True)[:k] for hits in merged]
+
+    @staticmethod
+    def format_hits(hits: List[Dict[str, Any]]) -> str:
+        """Formata hits no padrão textual usado nos prompts ([Fonte: ...] + trecho)."""
+        results = []
+        for hit in hits:
+            m = hit["metadata"]
+            source_info = f"[Fonte: {m.get('filename', 'Doc')}"
+            if m.get('primary_traveler_name'):
+                source_info += f" | Passageiro: {m.get('primary_traveler_name')}"
+            if m.get('drive_link'):
+                source_info += f" | Link: {m.get('drive_link')}"
+            source_info += "]"
+            
+            results.append(f"{source_info}\n{hit['text']}")
+        return "\n---\n".join(results)
 
     def query(self, query_text: str, thread_id: str, k: int = 10) -> str:
         """Busca semântica filtrada por viagem ativa do usuário"""
+        self._load_data()
         if not self.documents:
             return "Você ainda não enviou nenhum documento de viagem."
             
         try:
             logger.info(f"🔍 Buscando no RAG: '{query_text}' (Usuario: {thread_id})")
             
-            from app.services.user_service import UserService
-            user_service = UserService()
-            thread_id = user_service.normalize_phone(thread_id)
-            active_trip = user_service.get_active_trip(thread_id)
-            
-            # Gerar embedding da query
-            query_vector = np.array(self.embeddings.embed_query(query_text))
+            # Partições da viagem ativa e do próprio usuário (índice invertido, sem varrer a base)
+            hits = self.query_many([query_text], thread_id=thread_id, k=k)[0]
             
-            # Filtrar documentos pelo trip_id (ou fallback para o próprio thread_id)
-            user_indices = []
-            for i, doc in enumerate(self.documents):
-                m_trip = doc["metadata"].get("trip_id")
-                m_thread = doc["metadata"].get("thread_id")
-                if (active_trip and m_trip == active_trip) or m_thread == thread_id:
-                    user_indices.append(i)
-            
-            if not user_indices:
+            if not hits:
                 return "Nenhuma informação relevante encontrada nos documentos enviados."
                 
-            # Pegar os vetores filtrados
-            user_vectors = self.vectors[user_indices]
-            
-            # Calcular similaridades
-            similarities = self._cosine_similarity(query_vector, user_vectors)
-            
-            # Pegar os top K resultados
-            top_indices_local = np.argsort(similarities)[::-1][:k]
-            top_indices_global = [user_indices[i] for i in top_indices_local]
-            
-            results = []
-            for idx in top_indices_global:
-                doc = self.documents[idx]
-                m = doc["metadata"]
-                source_info = f"[Fonte: {m.get('filename', 'Doc')}"
-                if m.get('primary_traveler_name'):
-                    source_info += f" | Passageiro: {m.get('primary_traveler_name')}"
-                if m.get('drive_link'):
-                    source_info += f" | Link: {m.get('drive_link')}"
-                source_info += "]"
-                
-                results.append(f"{source_info}\n{doc['text']}")
-                
-            return "\n---\n".join(results)
+            return self.format_hits(hits)
             
         except Exception as e:
             logger.error(f"❌ Erro na consulta ao RAG: {e}")
@@ -309,37 +278,33 @@ class RAGService:
 
     def list_user_documents(self, thread_id: str, document_type: str = None) -> List[str]:
         """Lista nomes de arquivos enviados para a viagem atual do usuário ou para o próprio usuário"""
-        from app.services.user_service import UserService
-        user_service = UserService()
-        thread_id = user_service.normalize_phone(thread_id)
-        active_trip = user_service.get_active_trip(thread_id)
+        thread_id, active_trip = self._resolve_scope(thread_id, None)
+        self._load_data()
         
         filenames = []
-        for doc in self.documents:
+        user_docs, _ = self.store.select(trip_id=active_trip, thread_id=thread_id)
+        for doc in user_docs:
             m = doc["metadata"]
-            m_trip = m.get("trip_id")
-            m_thread = m.get("thread_id")
-            m_type = m.get("document_type", "").lower()
+            m_type = (m.get("document_type") or "").lower()
             m_traveler = m.get("primary_traveler_name", "")
             
-            if (active_trip and m_trip == active_trip) or m_thread == thread_id:
-                # Aplicar filtro de tipo se fornecido
-                if document_type and m_type != document_type.lower():
-                    continue
-                
-                fname = m.get("filename", "documento")
-                display_name = f"*{fname}*"
-                
-                info_parts = []
-                if m_traveler:
-                    info_parts.append(f"Passageiro: {m_traveler}")
-                if m.get("segment_info"):
-                    info_parts.append(f"Trecho: {m['segment_info']}")
-                    
-                if info_parts:
-                    display_name += " - " + " | ".join(info_parts)
+            # Aplicar filtro de tipo se fornecido
+            if document_type and m_type != document_type.lower():
+                continue
+            
+            fname = m.get("filename", "documento")
+            display_name = f"*{fname}*"
+            
+            info_parts = []
+            if m_traveler:
+                info_parts.append(f"Passageiro: {m_traveler}")
+            if m.get("segment_info"):
+                info_parts.append(f"Trecho: {m['segment_info']}")
                 
-                filenames.append(display_name)
+            if info_parts:
+                display_name += " - " + " | ".join(info_parts)
+            
+            filenames.append(display_name)
                     
         return sorted(list(set(filenames)))
 
@@ -351,24 +316,32 @@ class RAGService:
         """
         try:
             self._load_data()
-            count = 0
             # Inicializa UserService localmente para normalização
             from app.services.user_service import UserService
             user_svc = UserService()
             
-            for doc in self.documents:
-                m = doc["metadata"]
-                # Normaliza ambos para comparação segura
-                if user_svc.normalize_phone(m.get("thread_id")) == user_svc.normalize_phone(thread_id):
-                    if m.get("trip_id") != trip_id:
-                        m["trip_id"] = trip_id
-                        count += 1
+            updates = {}
+            target = user_svc.normalize_phone(thread_id)
+            # Normaliza apenas as chaves da partição (uma por usuário), não cada documento
+            for key in self.store.partition_keys("thread_id"):
+                if user_svc.normalize_phone(key) != target:
+                    continue
+                docs, _, _ = self.store.partition("thread_id", key)
+                for doc in docs:
+                    if doc["metadata"].get("trip_id") != trip_id:
+                        updates[doc["id"]] = {"trip_id": trip_id}
             
+            # Apenas eventos de metadados: nenhum vetor é reescrito
+            count = self.store.update_metadata(updates)
             if count > 0:
-                self._save_data()
                 logger.info(f"🔗 {count} documentos de {thread_id} foram recalibrados para a trip {trip_id}")
             
             return count
         except Exception as e:
             logger.error(f"❌ Erro ao vincular documentos retroativamente: {e}")
             return 0
+
+
+def get_rag_service() -> RAGService:
+    """Instância compartilhada do RAG (thread-safe, uma por processo)."""
+    return RAGService()
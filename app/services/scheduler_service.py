@@ -6,13 +6,50 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 import os
 import json
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
 from app.services.trip_service import TripService
 from app.services.n8n_service import N8nService
 from app.services.weather_service import WeatherService
 from app.services.connectivity_service import ConnectivityService
+from app.services.job_runner import check_deadline, get_job_runner
+from app.config import settings
 from loguru import logger
 
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock (use WEB_WORKERS=1 ou SCHEDULER_ENABLED só em um processo)
+    fcntl = None
+
+_leader_lock_file = None
+
+
+def acquire_scheduler_leadership() -> bool:
+    """
+    Só um processo roda os jobs proativos: com WEB_WORKERS > 1 cada worker do uvicorn passa
+    pelo lifespan, e sem isso todo alerta D-7/D-1, pouso, fila e segurança sairia N vezes.
+    flock exclusivo em SCHEDULER_LOCK_PATH, mantido até o processo terminar (o SO libera se ele morrer).
+    """
+    global _leader_lock_file
+    if _leader_lock_file is not None:
+        return True
+    if fcntl is None:
+        return True
+    os.makedirs(os.path.dirname(os.path.abspath(settings.SCHEDULER_LOCK_PATH)), exist_ok=True)
+    lock_file = open(settings.SCHEDULER_LOCK_PATH, "a+")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    _leader_lock_file = lock_file
+    return True
+
+
 class SchedulerService:
     """Orquestra o envio de alertas proativos (D-7, D-1, D-0)"""
     
@@ -22,10 +59,17 @@ class SchedulerService:
         self.n8n_svc = N8nService()
         self.weather_svc = WeatherService()
         self.conn_svc = ConnectivityService()
+        self.runner = get_job_runner()
         logger.info("✅ SchedulerService inicializado")
         
-    def start(self):
-        """Inicia o cron job diário"""
+    def start(self) -> bool:
+        """Inicia o cron job diário (só no processo líder). Retorna se o agendador está ativo aqui."""
+        if not settings.SCHEDULER_ENABLED:
+            logger.info("⏸️ Scheduler desativado neste processo (SCHEDULER_ENABLED=false)")
+            return False
+        if not acquire_scheduler_leadership():
+            logger.info(f"⏸️ Scheduler já roda em outro worker (lock: {settings.SCHEDULER_LOCK_PATH}); PID {os.getpid()} não agenda jobs")
+            return False
         if not self.scheduler.running:
             # Executa a cada hora para checar alertas pendentes (ou uma vez por dia)
             # Para o MVP, checaremos a cada minuto durante o desenvolvimento/teste, 
@@ -110,6 +154,34 @@ class SchedulerService:
             )
             self.scheduler.start()
             logger.info("⏰ Scheduler iniciado (Verificação de alertas, auditoria e limpeza de dados)")
+        return True
+
+    def _notify(self, user_id: str, message: str):
+        """Envia pelo n8n, a menos que o item do job já tenha estourado o prazo (o runner desistiu dele)."""
+        check_deadline()
+        self.n8n_svc.enviar_resposta_usuario(user_id, message)
+
+    @staticmethod
+    def _one_shot_chat(prompt: str, scope: str) -> str:
+        """
+        Chamada ao agente em thread descartável: análises por destino são compartilhadas entre
+        viajantes e não podem herdar histórico (nem dados de documentos) de outro usuário.
+        """
+        from app.agents.orchestrator import get_checkpointer, get_travel_agent
+        thread_id = f"scheduler:{scope}:{uuid.uuid4().hex}"
+        try:
+            return get_travel_agent().chat(user_input=prompt, thread_id=thread_id)
+        finally:
+            try:
+                get_checkpointer().delete_thread(thread_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Não foi possível apagar a thread {thread_id}: {e}")
+
+    @staticmethod
+    def _destination_key(trip: dict):
+        """Chave de agrupamento por destino (normalizada) para deduplicar buscas entre viagens."""
+        dest = " ".join(str(trip.get("destination") or "").split())
+        return dest.title() or None
 
     def check_and_send_alerts(self):
         """Verifica quais viagens precisam de alerta hoje"""
@@ -118,8 +190,7 @@ class SchedulerService:
         
         trips_to_alert = self.trip_svc.get_trips_to_alert(today)
         
-        for trip in trips_to_alert:
-            self._process_alert(trip)
+        self.runner.run("trip_alerts_check", trips_to_alert, self._process_alert)
             
         # [NOVO] Checar consumo de dados proativamente
         self.check_data_plans_proactively()
@@ -130,28 +201,31 @@ class SchedulerService:
         from app.services.trip_audit_service import TripAuditService
         audit_svc = TripAuditService()
         
-        for trip in self.trip_svc.trips:
-            # Auditar apenas viagens futuras ou em andamento
+        # Auditar apenas viagens futuras (índice em start_date)
+        trips = self.trip_svc.get_upcoming_trips(datetime.now().date())
+
+        def handle(trip):
             try:
-                start_dt = datetime.strptime(trip["start_date"], "%Y-%m-%d").date()
-                if start_dt >= datetime.now().date():
-                    user_id = trip["user_id"]
+                user_id = trip["user_id"]
                     
-                    # [SEGURANÇA] Só audita e manda se o usuário ainda tiver permissão de guest
-                    from app.services.user_service import UserService
-                    user_svc = UserService()
-                    if user_svc.get_user_role(user_id) != "guest":
-                        continue
+                # [SEGURANÇA] Só audita e manda se o usuário ainda tiver permissão de guest
+                from app.services.user_service import UserService
+                user_svc = UserService()
+                if user_svc.get_user_role(user_id) != "guest":
+                    return
 
-                    # Entregar para o Responsável Primário (Primary Contact)
-                    target_user = trip.get("primary_contact_id", user_id)
+                # Entregar para o Responsável Primário (Primary Contact)
+                target_user = trip.get("primary_contact_id", user_id)
+                audit_data = audit_svc.audit_trip(user_id, trip["id"], trip)
                     
-                    if audit_data.get("nights_covered", 0) < audit_data.get("trip_duration_days", 0) or audit_data.get("other_missing_items"):
-                        report = audit_svc.generate_human_report(audit_data)
-                        self.n8n_svc.enviar_resposta_usuario(target_user, report)
-                        logger.info(f"📢 Relatório de Auditoria periódica enviado para {target_user}")
+                if audit_data.get("nights_covered", 0) < audit_data.get("trip_duration_days", 0) or audit_data.get("other_missing_items"):
+                    report = audit_svc.generate_human_report(audit_data)
+                    self._notify(target_user, report)
+                    logger.info(f"📢 Relatório de Auditoria periódica enviado para {target_user}")
             except Exception as e:
                 logger.error(f"Erro ao auditar trip {trip['id']} no scheduler: {e}")
+
+        self.runner.run("trip_health_audit", trips, handle)
             
     def _process_alert(self, trip: dict):
         """Processa e envia um alerta inteligente usando a IA para o responsável"""
@@ -182,20 +256,21 @@ class SchedulerService:
         )
         
         try:
-            from app.agents.orchestrator import TravelAgent
-            agent = TravelAgent()
+            from app.agents.orchestrator import get_travel_agent
+            agent = get_travel_agent()
             # Usamos uma chamada interna que não salva no histórico de chat para não poluir
-            ai_message = agent.chat(user_input=prompt, thread_id=user_id)
+            with self.runner.upstream("llm"):
+                ai_message = agent.chat(user_input=prompt, thread_id=user_id)
             
             if ai_message:
                 logger.info(f"📨 Enviando alerta inteligente {alert_type} para {target_user}")
-                self.n8n_svc.enviar_resposta_usuario(target_user, ai_message)
+                self._notify(target_user, ai_message)
                 self.trip_svc.mark_alert_sent(trip["id"], alert_type)
         except Exception as e:
             logger.error(f"❌ Falha ao gerar alerta inteligente: {e}")
             # Fallback para mensagem estática básica se a IA falhar
             fallback_msg = f"Olá! Falta pouco para sua viagem para {destination}. Estou aqui para ajudar!"
-            self.n8n_svc.enviar_resposta_usuario(user_id, fallback_msg)
+            self._notify(user_id, fallback_msg)
 
     def check_data_plans_proactively(self):
         """Verifica se algum plano de dados está chegando ao fim (10% alerta)"""
@@ -224,7 +299,7 @@ class SchedulerService:
                     f"Resta apenas cerca de **{remaining:.2f}GB ({percent:.0f}%)**.\n\n"
                     "Gostaria que eu listasse opções de recarga agora?"
                 )
-                self.n8n_svc.enviar_resposta_usuario(user_id, message)
+                self._notify(user_id, message)
                 plan["last_alert_sent"] = "10%"
                 
                 # Salvar marcação de alerta enviado
@@ -242,36 +317,37 @@ class SchedulerService:
         rag_svc = RAGService()
         today = datetime.now().date()
         
-        deleted_count = 0
-        trips_to_keep = []
+        expired_ids = []
         
-        for trip in self.trip_svc.trips:
+        # Expirada = término + 2 dias < hoje  <=>  end_date < hoje - 2 (índice em end_date)
+        for trip in self.trip_svc.get_trips_ended_before(today - timedelta(days=2)):
             trip_id = trip["id"]
-            end_date_str = trip.get("end_date")
-            
-            if not end_date_str:
-                trips_to_keep.append(trip)
-                continue
-                
             try:
-                end_dt = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-                expiration_dt = end_dt + timedelta(days=2)
-                
-                if today > expiration_dt:
-                    logger.warning(f"🚮 Viagem {trip_id} expirada (término {end_date_str}). Removendo dados...")
-                    rag_svc.delete_data_by_trip(trip_id)
-                    deleted_count += 1
-                else:
-                    trips_to_keep.append(trip)
+                logger.warning(f"🚮 Viagem {trip_id} expirada (término {trip.get('end_date')}). Removendo dados...")
+                rag_svc.delete_data_by_trip(trip_id)
+                expired_ids.append(trip_id)
             except Exception as e:
-                logger.error(f"Erro ao processar data de expiração para trip {trip_id}: {e}")
-                trips_to_keep.append(trip)
+                logger.error(f"Erro ao processar expiração da trip {trip_id}: {e}")
         
+        deleted_count = self.trip_svc.delete_trips(expired_ids) if expired_ids else 0
         if deleted_count > 0:
-            self.trip_svc.trips = trips_to_keep
-            self.trip_svc._save_trips()
             logger.info(f"✨ Limpeza concluída: {deleted_count} viagem(ns) removida(s).")
 
+        # Entradas expiradas do cache de geocoding
+        from app.services.geocode_cache import get_geocode_cache
+        get_geocode_cache().prune()
+
+        # Conversas inativas no checkpointer do agente
+        from app.agents.orchestrator import get_checkpointer
+        checkpointer = get_checkpointer()
+        if hasattr(checkpointer, "prune"):
+            checkpointer.prune()
+
+        # Registros de idempotência / jobs concluídos da fila do webhook
+        from app.services.idempotency_service import get_idempotency
+        from app.config import settings
+        get_idempotency().cleanup_old_jobs(settings.IDEMPOTENCY_RETENTION_DAYS)
+
     def monitor_active_flights(self):
         """Monitora voos de viagens ativas e envia guia de chegada ao pousar."""
         from app.services.flights_service import FlightsService
@@ -281,105 +357,120 @@ class SchedulerService:
         
         logger.info("✈️ Monitor de Pouso: Verificando voos ativos...")
         
-        for trip in self.trip_svc.trips:
-            # Monitorar viagens que estão ocorrendo hoje
+        # [OTIMIZAÇÃO] Só monitorar o voo no DIA da IDA ou no DIA da VOLTA (consulta indexada por data)
+        trips = [
+            t for t in self.trip_svc.get_trips_departing_or_returning(today_date)
+            if t.get("flight_number") and not t.get("landing_alert_sent", False)
+        ]
+        if not trips:
+            return
+
+        # Um status por voo+data, compartilhado por todos os viajantes do mesmo voo
+        date_str = today_date.strftime("%Y-%m-%d")
+
+        def flight_key(trip):
+            return (str(trip["flight_number"]).replace(" ", "").upper(), date_str)
+
+        def fetch_status(key):
+            logger.info(f"🔍 Checando status do voo {key[0]} ({key[1]})...")
+            return flight_svc.get_flight_status(key[0], key[1])
+
+        statuses = self.runner.fetch_grouped("landing_monitor", trips, flight_key, fetch_status, upstream="flights")
+
+        def handle(trip):
             try:
-                start_dt = datetime.strptime(trip["start_date"], "%Y-%m-%d").date()
-                end_dt = datetime.strptime(trip.get("end_date", trip["start_date"]), "%Y-%m-%d").date()
-                
-                # [OTIMIZAÇÃO] Só monitorar o voo no DIA da IDA ou no DIA da VOLTA, economizando milhares de calls de API
-                if today_date == start_dt or today_date == end_dt:
-                    flight_num = trip.get("flight_number")
-                    if flight_num and not trip.get("landing_alert_sent", False):
-                        logger.info(f"🔍 Checando status do voo {flight_num} para {trip['user_id']}...")
-                        status_data = flight_svc.get_flight_status(flight_num)
+                flight_num = trip.get("flight_number")
+                if flight_key(trip) in statuses:
+                    status_data = statuses[flight_key(trip)]
                         
-                        # Lista de status que indicam pouso (depende da API AeroDataBox)
-                        is_landed = status_data and status_data.get("status") in ["Arrived", "Landed", "Land"]
+                    # Lista de status que indicam pouso (depende da API AeroDataBox)
+                    is_landed = status_data and status_data.get("status") in ["Arrived", "Landed", "Land"]
                         
-                        if is_landed:
-                            logger.info(f"🛬 Voo {flight_num} POUSOU! Disparando guia de chegada para {trip['user_id']}.")
+                    if is_landed:
+                        logger.info(f"🛬 Voo {flight_num} POUSOU! Disparando guia de chegada para {trip['user_id']}.")
                             
-                            # Gerar Guia Inteligente
-                            from app.services.geolocation_service import GeolocationService
-                            geo_svc = GeolocationService()
-                            guide = geo_svc._generate_intelligent_arrival_guide(trip["destination"], trip["user_id"])
+                        # Gerar Guia Inteligente
+                        from app.services.geolocation_service import GeolocationService
+                        geo_svc = GeolocationService()
+                        guide = geo_svc._generate_intelligent_arrival_guide(trip["destination"], trip["user_id"])
                             
-                            # Enviar ao usuário
-                            self.n8n_svc.enviar_resposta_usuario(trip["user_id"], guide)
+                        # Enviar ao usuário
+                        self._notify(trip["user_id"], guide)
                             
-                            # Marcar como enviado
-                            trip["landing_alert_sent"] = True
-                            self.trip_svc._save_trips()
+                        # Marcar como enviado
+                        self.trip_svc.update_trip_metadata(trip["id"], {"landing_alert_sent": True})
             except Exception as e:
                 logger.error(f"Erro no monitor de pouso para trip {trip.get('id')}: {e}")
 
+        self.runner.run("landing_monitor", trips, handle)
+
     def run_weekly_safety_check(self):
         """Busca notícias e alertas críticos para destinos de viagens ativas/futuras."""
         logger.info("🛡️ Iniciando Monitor de Segurança e Notícias Semanal...")
         today = datetime.now().date()
         
-        for trip in self.trip_svc.trips:
+        trips = self.trip_svc.get_upcoming_trips(today)
+
+        def analyze(dest):
+            logger.info(f"🔎 Analisando segurança para {dest}...")
+                
+            # Prompt para a IA realizar a busca e análise de risco
+            prompt = (
+                f"Você é um analista de risco de viagens. Busque notícias de ÚLTIMA HORA para viajantes em {dest}.\n"
+                "Foque em: Surtos de doenças, mudanças em vistos, greves de transporte, instabilidade política ou novas exigências de imigração.\n"
+                "Se encontrar algo que mude as regras do jogo (Ex: 'Alemanha agora pede extrato bancário de 3 meses' ou 'Surto de Malária'), gere um alerta urgente.\n"
+                "Se estiver tudo normal, não gere alerta."
+            )
+                
+            return self._one_shot_chat(prompt, "safety")
+
+        # Uma análise por destino, distribuída a todos os viajantes que vão para lá
+        reports = self.runner.fetch_grouped("weekly_safety_check", trips, self._destination_key, analyze, upstream="llm")
+
+        def handle(trip):
             try:
-                start_dt = datetime.strptime(trip["start_date"], "%Y-%m-%d").date()
-                if start_dt >= today:
-                    dest = trip["destination"]
-                    user_id = trip["user_id"]
-                    
-                    logger.info(f"🔎 Analisando segurança para {dest} ({user_id})...")
-                    
-                    # Prompt para a IA realizar a busca e análise de risco
-                    prompt = (
-                        f"Você é um analista de risco de viagens. Busque notícias de ÚLTIMA HORA para viajantes em {dest}.\n"
-                        "Foque em: Surtos de doenças, mudanças em vistos, greves de transporte, instabilidade política ou novas exigências de imigração.\n"
-                        "Se encontrar algo que mude as regras do jogo (Ex: 'Alemanha agora pede extrato bancário de 3 meses' ou 'Surto de Malária'), gere um alerta urgente.\n"
-                        "Se estiver tudo normal, não gere alerta."
-                    )
-                    
-                    from app.agents.orchestrator import TravelAgent
-                    agent = TravelAgent()
-                    alert_content = agent.chat(user_input=prompt, thread_id=user_id)
+                dest = trip["destination"]
+                user_id = trip["user_id"]
+                alert_content = reports.get(self._destination_key(trip))
                     
-                    # Só enviar se a IA identificar um risco real e não for apenas 'tudo ok'
-                    if alert_content and len(alert_content) > 50 and "normal" not in alert_content.lower()[:20]:
-                        msg = f"🔔 *ALERTA DE SEGURANÇA E NOTÍCIAS: {dest.upper()}* 🛡️\n\n{alert_content}"
-                        self.n8n_svc.enviar_resposta_usuario(user_id, msg)
-                        logger.info(f"🚨 Alerta de segurança enviado para {user_id} sobre {dest}")
+                # Só enviar se a IA identificar um risco real e não for apenas 'tudo ok'
+                if alert_content and len(alert_content) > 50 and "normal" not in alert_content.lower()[:20]:
+                    msg = f"🔔 *ALERTA DE SEGURANÇA E NOTÍCIAS: {dest.upper()}* 🛡️\n\n{alert_content}"
+                    self._notify(user_id, msg)
+                    logger.info(f"🚨 Alerta de segurança enviado para {user_id} sobre {dest}")
             except Exception as e:
                 logger.error(f"Erro no monitor semanal de segurança para trip {trip.get('id')}: {e}")
 
+        self.runner.run("weekly_safety_check", trips, handle)
+
     def monitor_park_wait_times(self):
         """Monitor proativo de filas para usuários que estão 'No Parque'."""
         active_park_trips = []
-        for trip in self.trip_svc.trips:
+        # Apenas viagens vigentes hoje (consulta indexada), depois o filtro de "No Parque"
+        for trip in self.trip_svc.get_trips_in_progress(datetime.now().date()):
             park_id = trip.get("current_park_id")
-            if not park_id:
-                continue
-                
-            # Verificar se a viagem do parque aida está vigente
-            start_date_str = trip.get("start_date")
-            end_date_str = trip.get("end_date", start_date_str)
-            try:
-                start_dt = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-                end_dt = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-                if start_dt <= datetime.now().date() <= end_dt:
-                    active_park_trips.append((trip, park_id))
-            except Exception:
-                continue
+            if park_id:
+                active_park_trips.append((trip, park_id))
                 
         if not active_park_trips:
             return  # Fica silencioso se ninguém está no parque
             
         logger.info(f"🎡 Monitorando filas dos parques para {len(active_park_trips)} usuário(s) ativo(s)...")
         
-        for trip, park_id in active_park_trips:
+        # Uma consulta de filas por parque, distribuída a todas as famílias que estão nele
+        from app.services.park_service import ParkService
+        park_svc = ParkService()
+        live_by_park = self.runner.fetch_grouped(
+            "park_wait_monitor", active_park_trips, lambda entry: entry[1], park_svc.get_live_data, upstream="parks"
+        )
+
+        def handle(entry):
+            trip, park_id = entry
             user_id = trip["user_id"]
             park_name = trip.get("current_park_name", "Parque")
             
             try:
-                from app.services.park_service import ParkService
-                park_svc = ParkService()
-                live_data = park_svc.get_live_data(park_id)
+                live_data = live_by_park.get(park_id) or []
                 
                 # Identificar oportunidades "Genie" (Ex: Brinquedos populares com pouca fila)
                 # Vamos focar em atrações com menos de 15 minutos que costumam ser concorridas
@@ -406,23 +497,27 @@ class SchedulerService:
                             + "\n".join(opportunities[:3]) +
                             "\n\n📍 *Deseja o mapa para chegar em algum deles? Só me pedir!*"
                         )
-                        self.n8n_svc.enviar_resposta_usuario(user_id, msg)
-                        trip["last_park_genie_at"] = datetime.now().isoformat()
-                        self.trip_svc._save_trips()
+                        self._notify(user_id, msg)
+                        self.trip_svc.update_trip_metadata(trip["id"], {"last_park_genie_at": datetime.now().isoformat()})
                         logger.info(f"✨ Dica Genie enviada para {user_id}")
             except Exception as e:
                 logger.error(f"Erro no monitor de filas para park {park_id}: {e}")
 
+        self.runner.run("park_wait_monitor", active_park_trips, handle)
+
     def run_destination_audit_job(self):
         """Monitor proativo de fechamentos e manutenção para ALL POIs das viagens."""
         logger.info("🗺️ Iniciando Auditoria Universal de Destinos (POIs)...")
         today = datetime.now().date()
         from datetime import timedelta
         
-        for trip in self.trip_svc.trips:
+        # Viagens que começam nos próximos 3 dias ou começaram ontem (índice em start_date)
+        trips = self.trip_svc.get_trips_starting_between(today - timedelta(days=1), today + timedelta(days=3))
+
+        def handle(trip):
             pois = trip.get("points_of_interest", [])
             if not pois:
-                continue
+                return
                 
             user_id = trip["user_id"]
             start_date_str = trip["start_date"]
@@ -443,150 +538,179 @@ class SchedulerService:
                             "Se estiver tudo normal, responda 'STATUS_OK'."
                         )
                         
-                        from app.agents.orchestrator import TravelAgent
-                        agent = TravelAgent()
-                        status_report = agent.chat(user_input=prompt, thread_id=user_id)
+                        from app.agents.orchestrator import get_travel_agent
+                        agent = get_travel_agent()
+                        with self.runner.upstream("llm"):
+                            status_report = agent.chat(user_input=prompt, thread_id=user_id)
                         
                         if status_report and "STATUS_OK" not in status_report and len(status_report) > 30:
                             from app.services.destination_monitor_service import DestinationMonitorService
                             dm_svc = DestinationMonitorService()
                             alert_msg = dm_svc.format_closure_alert(poi, status_report, start_date_str)
-                            self.n8n_svc.enviar_resposta_usuario(user_id, alert_msg)
+                            self._notify(user_id, alert_msg)
                             logger.info(f"🚨 Alerta de interdição enviado para {user_id} sobre {poi}")
             except Exception as e:
                 logger.error(f"Erro na auditoria de destino para trip {trip.get('id')}: {e}")
 
+        self.runner.run("destination_poi_audit", trips, handle)
+
     def monitor_government_alerts(self):
         """Busca notícias e avisos em sites governamentais oficiais para viagens na janela D-7 até Fim."""
         logger.info("🏛️ Iniciando Monitor de Avisos Governamentais Diário...")
         today = datetime.now()
         
-        trips_to_monitor = self.trip_svc.get_active_monitoring_trips(today)
-        
-        for trip in trips_to_monitor:
+        today_str = today.strftime("%Y-%m-%d")
+        # Para evitar repetição excessiva, ignoramos viagens já checadas hoje
+        trips_to_monitor = [
+            t for t in self.trip_svc.get_active_monitoring_trips(today)
+            if t.get("last_gov_alert_date") != today_str
+        ]
+
+        def search_alerts(dest):
+            logger.info(f"🔎 Buscando avisos oficiais para {dest}...")
+            
+            # Prompt especializado para focar em fontes LOCAIS e governamentais
+            prompt = (
+                f"Você é um especialista em turismo estratégico. Sua tarefa é buscar DE FORMA ATUALIZADA (hoje: {today_str}) "
+                f"no portal oficial da **Prefeitura de {dest}** ou na **Secretaria de Turismo Local** por AVISOS IMPORTANTES.\n\n"
+                "FOCO EXCLUSIVO EM NOTÍCIAS RELEVANTES PARA TURISTAS HOJE:\n"
+                "1. Fechamento de ruas ou grandes avenidas por conta de Festivais, Desfiles ou Obras da Prefeitura.\n"
+                "2. Interdição de praias, parques estaduais ou vias de acesso a monumentos públicos.\n"
+                "3. Alertas meteorológicos sérios emitidos pela Defesa Civil da cidade.\n"
+                "4. Novas restrições ou regras locais urgentes aplicadas a turistas.\n\n"
+                "REGRAS CRÍTICAS:\n"
+                "- Priorize fontes que terminem em .gov, sites de Prefeituras (City Hall) e Portais G1/Locais.\n"
+                "- Se não houver avisos novos locais ou críticos, responda estritamente: 'SEM_AVISOS_NOVOS'.\n"
+                "- Seja direto, útil, e cite a fonte se possível."
+            )
+            
+            return self._one_shot_chat(prompt, "gov")
+
+        # Uma busca por destino, distribuída a todos os viajantes que estão lá
+        alerts = self.runner.fetch_grouped("gov_alerts_monitor", trips_to_monitor, self._destination_key, search_alerts, upstream="llm")
+
+        def handle(trip):
             try:
                 dest = trip["destination"]
                 user_id = trip["user_id"]
-                
-                # Para evitar repetição excessiva, podemos checar se já enviamos algo hoje
-                last_gov_check = trip.get("last_gov_alert_date")
-                if last_gov_check == today.strftime("%Y-%m-%d"):
-                    continue
-                
-                logger.info(f"🔎 Buscando avisos oficiais para {dest} ({user_id})...")
-                
-                # Prompt especializado para focar em fontes LOCAIS e governamentais
-                prompt = (
-                    f"Você é um especialista em turismo estratégico. Sua tarefa é buscar DE FORMA ATUALIZADA (hoje: {today.strftime('%Y-%m-%d')}) "
-                    f"no portal oficial da **Prefeitura de {dest}** ou na **Secretaria de Turismo Local** por AVISOS IMPORTANTES.\n\n"
-                    "FOCO EXCLUSIVO EM NOTÍCIAS RELEVANTES PARA TURISTAS HOJE:\n"
-                    "1. Fechamento de ruas ou grandes avenidas por conta de Festivais, Desfiles ou Obras da Prefeitura.\n"
-                    "2. Interdição de praias, parques estaduais ou vias de acesso a monumentos públicos.\n"
-                    "3. Alertas meteorológicos sérios emitidos pela Defesa Civil da cidade.\n"
-                    "4. Novas restrições ou regras locais urgentes aplicadas a turistas.\n\n"
-                    "REGRAS CRÍTICAS:\n"
-                    "- Priorize fontes que terminem em .gov, sites de Prefeituras (City Hall) e Portais G1/Locais.\n"
-                    "- Se não houver avisos novos locais ou críticos, responda estritamente: 'SEM_AVISOS_NOVOS'.\n"
-                    "- Seja direto, útil, e cite a fonte se possível."
-                )
-                
-                from app.agents.orchestrator import TravelAgent
-                agent = TravelAgent()
-                alert_content = agent.chat(user_input=prompt, thread_id=user_id)
+                dest_key = self._destination_key(trip)
+                if dest_key not in alerts:
+                    return  # Busca falhou: tenta de novo no próximo ciclo
+                alert_content = alerts[dest_key]
                 
                 if alert_content and "SEM_AVISOS_NOVOS" not in alert_content and len(alert_content) > 30:
                     msg = f"🏛️ *AVISO GOVERNAMENTAL OFICIAL: {dest.upper()}* 📄\n\n{alert_content}"
-                    self.n8n_svc.enviar_resposta_usuario(user_id, msg)
+                    self._notify(user_id, msg)
                     logger.info(f"📢 Alerta governamental enviado para {user_id} sobre {dest}")
                     
                 # Marcar que checamos hoje para não repetir o processamento pesado da IA no mesmo dia
-                trip["last_gov_alert_date"] = today.strftime("%Y-%m-%d")
-                self.trip_svc._save_trips()
+                self.trip_svc.update_trip_metadata(trip["id"], {"last_gov_alert_date": today_str})
                 
             except Exception as e:
                 logger.error(f"Erro no monitor governamental para trip {trip.get('id')}: {e}")
 
+        self.runner.run("gov_alerts_monitor", trips_to_monitor, handle)
+
     def monitor_special_events(self):
         """Busca proativamente informações detalhadas (guias, banheiros, mapas) para Ingressos/Tickets do dia ou dia seguinte."""
         logger.info("🎟️ Iniciando Monitor de Eventos Especiais (Ingressos/Tickets)...")
         from datetime import datetime, timedelta
         from app.services.rag_service import RAGService
-        from app.agents.orchestrator import TravelAgent
 
         today = datetime.now()
         tomorrow = today + timedelta(days=1)
         rag_svc = RAGService()
-        agent = TravelAgent()
 
-        trips_to_monitor = self.trip_svc.get_active_monitoring_trips(today)
+        today_str = today.strftime("%Y-%m-%d")
+        # Verifica se já mandamos um alerta de evento hoje para não espamar
+        trips_to_monitor = [
+            t for t in self.trip_svc.get_active_monitoring_trips(today)
+            if t.get("last_special_event_alert_date") != today_str
+        ]
 
-        for trip in trips_to_monitor:
-            trip_id = trip["id"]
-            user_id = trip["user_id"]
-            
-            # Verifica se já mandamos um alerta de evento hoje para não espamar
-            if trip.get("last_special_event_alert_date") == today.strftime("%Y-%m-%d"):
-                continue
+        # Pergutar ao RAG se existem ingressos para D-0 ou D-1 (uma consulta por usuário)
+        # Vamos forçar a busca via RAG porque é lá que guardamos os PDFs de Ingressos/Tickets
+        tickets_by_user = self.runner.fetch_grouped(
+            "special_events_monitor:rag",
+            trips_to_monitor,
+            lambda trip: trip["user_id"],
+            lambda user_id: rag_svc.query("Liste detalhadamente quais ingressos, tickets de shows ou eventos existem para a data de HOJE ou AMANHÃ.", thread_id=user_id, k=5),
+        )
 
-            try:
-                # Pergutar ao RAG se existem ingressos para D-0 ou D-1
-                # Vamos forçar a busca via RAG porque é lá que guardamos os PDFs de Ingressos/Tickets
-                ingressos_rag = rag_svc.query("Liste detalhadamente quais ingressos, tickets de shows ou eventos existem para a data de HOJE ou AMANHÃ.", thread_id=user_id, k=5)
-                
-                # Se não tem ingresso relevante, ignorar
-                if "não" in ingressos_rag.lower() and len(ingressos_rag) < 100:
-                    continue
+        def has_tickets(trip):
+            ingressos_rag = tickets_by_user.get(trip["user_id"])
+            # Se não tem ingresso relevante, ignorar
+            return bool(ingressos_rag) and not ("não" in ingressos_rag.lower() and len(ingressos_rag) < 100)
 
-                logger.info(f"🔎 Analisando ingressos encontrados para {user_id}: {ingressos_rag[:100]}...")
+        def event_key(trip):
+            # Mesmo destino + mesmos ingressos (ex.: família que encaminhou o mesmo PDF) => um único guia
+            return (self._destination_key(trip), tickets_by_user[trip["user_id"]])
 
-                prompt = (
-                    f"Você é um concierge VIP de viagens. O usuário tem um ingresso/evento nos próximos 1-2 dias.\n"
-                    f"Baseado *estritamente* nos seguintes dados extraídos do seu ingresso: {ingressos_rag}\n\n"
-                    "INSTRUÇÕES OBRIGATÓRIAS:\n"
-                    "1. Use a ferramenta `search_real_travel_tips` de forma agressiva para procurar regras atualizadas sobre este EVENTO/LOCAL específico.\n"
-                    "2. Monte o **Guia Definitivo do Evento** respondendo: Onde ficam os portões de entrada e banheiros? O que PODE e NÃO PODE levar na mochila? Tem dica de estacionamento ou transporte sugerido?\n"
-                    "3. Se você não tiver certeza de qual evento é pelos dados do ingresso ('RAG'), responda com a palavra exata: IGNORAR_ALERTA.\n"
-                    "4. O texto deve ser mega animado, preparatório e direto para o WhastApp.\n"
-                    "5. **MUITO IMPORTANTE:** No final da mensagem, peça expressamente para o cliente **COMPARTILHAR A LOCALIZAÇÃO EM TEMPO REAL** no WhatsApp (Ícone 📎 -> Localização -> Em Tempo Real -> 8h) no momento em que chegar ao evento. Explique com empolgação que com o GPS ligado, caso ele pergunte 'onde fica o banheiro?', você conseguirá traçar a rota exata de onde ele está na multidão até a porta do banheiro!\n"
-                )
+        def build_guide(key):
+            dest, ingressos_rag = key
+            logger.info(f"🔎 Analisando ingressos encontrados em {dest}: {ingressos_rag[:100]}...")
+
+            prompt = (
+                f"Você é um concierge VIP de viagens. O usuário tem um ingresso/evento nos próximos 1-2 dias.\n"
+                f"Baseado *estritamente* nos seguintes dados extraídos do seu ingresso: {ingressos_rag}\n\n"
+                "INSTRUÇÕES OBRIGATÓRIAS:\n"
+                "1. Use a ferramenta `search_real_travel_tips` de forma agressiva para procurar regras atualizadas sobre este EVENTO/LOCAL específico.\n"
+                "2. Monte o **Guia Definitivo do Evento** respondendo: Onde ficam os portões de entrada e banheiros? O que PODE e NÃO PODE levar na mochila? Tem dica de estacionamento ou transporte sugerido?\n"
+                "3. Se você não tiver certeza de qual evento é pelos dados do ingresso ('RAG'), responda com a palavra exata: IGNORAR_ALERTA.\n"
+                "4. O texto deve ser mega animado, preparatório e direto para o WhastApp.\n"
+                "5. **MUITO IMPORTANTE:** No final da mensagem, peça expressamente para o cliente **COMPARTILHAR A LOCALIZAÇÃO EM TEMPO REAL** no WhatsApp (Ícone 📎 -> Localização -> Em Tempo Real -> 8h) no momento em que chegar ao evento. Explique com empolgação que com o GPS ligado, caso ele pergunte 'onde fica o banheiro?', você conseguirá traçar a rota exata de onde ele está na multidão até a porta do banheiro!\n"
+            )
+            return self._one_shot_chat(prompt, "events")
 
-                alert_content = agent.chat(user_input=prompt, thread_id=user_id)
+        trips_with_tickets = [t for t in trips_to_monitor if has_tickets(t)]
+        guides = self.runner.fetch_grouped("special_events_monitor", trips_with_tickets, event_key, build_guide, upstream="llm")
+
+        def handle(trip):
+            trip_id = trip["id"]
+            user_id = trip["user_id"]
+
+            try:
+                alert_content = guides.get(event_key(trip))
 
                 if alert_content and "IGNORAR_ALERTA" not in alert_content and len(alert_content) > 100:
                     msg = f"🎟️ *GUIA VIP DE EVENTO* 🌟\n\n{alert_content}"
-                    self.n8n_svc.enviar_resposta_usuario(user_id, msg)
+                    self._notify(user_id, msg)
                     logger.info(f"📢 Guia de evento enviado com sucesso para {user_id}")
                     
-                    trip["last_special_event_alert_date"] = today.strftime("%Y-%m-%d")
-                    self.trip_svc._save_trips()
+                    self.trip_svc.update_trip_metadata(trip_id, {"last_special_event_alert_date": today_str})
 
             except Exception as e:
                 logger.error(f"Erro no monitor de eventos para trip {trip_id}: {e}")
 
+        self.runner.run("special_events_monitor", trips_with_tickets, handle)
+
     def itinerary_daily_checkpoint(self):
         """Checkpoint diário baseado no roteiro: envia 'Bom dia! Hoje é o Dia X da viagem' com resumo personalizado."""
         logger.info("🗓️ Checkpoint Diário de Itinerário: Verificando viagens em andamento...")
         from app.services.rag_service import RAGService
-        from app.agents.orchestrator import TravelAgent
+        from app.agents.orchestrator import get_travel_agent
         
         today = datetime.now()
         today_date = today.date()
         rag_svc = RAGService()
-        agent = TravelAgent()
+        agent = get_travel_agent()
         
-        for trip in self.trip_svc.trips:
+        # Só viagens ACONTECENDO HOJE e com fim informado (consulta indexada por data)
+        trips = self.trip_svc.get_trips_in_progress(today_date, explicit_end=True)
+
+        def handle(trip):
             try:
                 start_str = trip.get("start_date")
                 end_str = trip.get("end_date")
                 if not start_str or not end_str:
-                    continue
+                    return
                 
                 start_dt = datetime.strptime(start_str, "%Y-%m-%d").date()
                 end_dt = datetime.strptime(end_str, "%Y-%m-%d").date()
                 
                 # Só processar viagens que estão ACONTECENDO HOJE
                 if not (start_dt <= today_date <= end_dt):
-                    continue
+                    return
                 
                 user_id = trip["user_id"]
                 destination = trip["destination"]
@@ -594,7 +718,7 @@ class SchedulerService:
                 # Evitar enviar dois checkpoints no mesmo dia
                 last_checkpoint = trip.get("last_itinerary_checkpoint_date")
                 if last_checkpoint == today_date.strftime("%Y-%m-%d"):
-                    continue
+                    return
                 
                 # Calcular em qual dia da viagem o usuário está
                 travel_day = (today_date - start_dt).days + 1
@@ -624,33 +748,38 @@ class SchedulerService:
                     "5. Use emojis, seja caloroso e útil. Mensagem para WhatsApp, máximo 3 parágrafos."
                 )
                 
-                checkpoint_msg = agent.chat(user_input=prompt, thread_id=user_id)
+                with self.runner.upstream("llm"):
+                    checkpoint_msg = agent.chat(user_input=prompt, thread_id=user_id)
                 
                 if checkpoint_msg:
                     target_user = trip.get("primary_contact_id", user_id)
-                    self.n8n_svc.enviar_resposta_usuario(target_user, checkpoint_msg)
+                    self._notify(target_user, checkpoint_msg)
                     logger.info(f"☀️ Checkpoint diário Dia {travel_day} enviado para {target_user}")
                     
                     # Marcar que enviamos o checkpoint hoje
-                    trip["last_itinerary_checkpoint_date"] = today_date.strftime("%Y-%m-%d")
-                    self.trip_svc._save_trips()
+                    self.trip_svc.update_trip_metadata(trip["id"], {"last_itinerary_checkpoint_date": today_date.strftime("%Y-%m-%d")})
                     
             except Exception as e:
                 logger.error(f"Erro no checkpoint diário para trip {trip.get('id')}: {e}")
 
+        self.runner.run("itinerary_checkpoint", trips, handle)
+
     def itinerary_poi_deep_dive(self):
         """Pesquisa proativamente sobre pontos de interesse (POIs) peculiares no roteiro (D-10 e D-1)."""
         logger.info("🧐 Iniciando Deep-Dive Proativo de Roteiro (D-10 e D-1)...")
         from datetime import datetime, timedelta
-        from app.agents.orchestrator import TravelAgent
+        from app.agents.orchestrator import get_travel_agent
         from app.services.rag_service import RAGService
 
         today = datetime.now()
         today_date = today.date()
-        agent = TravelAgent()
+        agent = get_travel_agent()
         rag_svc = RAGService()
 
-        for trip in self.trip_svc.trips:
+        # D-10 e viagens ativas/próximas (-1 a 30 dias) via índice em start_date
+        trips = self.trip_svc.get_trips_starting_between(today_date - timedelta(days=1), today_date + timedelta(days=30))
+
+        def handle(trip):
             try:
                 user_id = trip["user_id"]
                 target_user = trip.get("primary_contact_id", user_id)
@@ -674,9 +803,10 @@ class SchedulerService:
                                 "3. Monte um guia formatado para WhatsApp chamado 'Dossiê de Exploração Antecipada'.\n"
                                 "4. Avise que você enviará um lembrete detalhado um dia antes da visita a cada local."
                             )
-                            deep_dive_msg = agent.chat(user_input=prompt, thread_id=user_id)
+                            with self.runner.upstream("llm"):
+                                deep_dive_msg = agent.chat(user_input=prompt, thread_id=user_id)
                             if deep_dive_msg:
-                                self.n8n_svc.enviar_resposta_usuario(target_user, f"🧐 *DOSSIÊ DE EXPLORAÇÃO (D-10)*\n\n{deep_dive_msg}")
+                                self._notify(target_user, f"🧐 *DOSSIÊ DE EXPLORAÇÃO (D-10)*\n\n{deep_dive_msg}")
                                 self.trip_svc.mark_alert_sent(trip["id"], alert_key)
 
                 # 2. Alerta D-1: Deep-Dive do POI da Visita de Amanhã
@@ -703,10 +833,13 @@ class SchedulerService:
                                 "2. Monte uma mensagem curta, urgente e valiosa para o WhatsApp.\n"
                                 "3. Use a ferramenta de busca para garantir dados reais."
                             )
-                            d1_msg = agent.chat(user_input=prompt_d1, thread_id=user_id)
+                            with self.runner.upstream("llm"):
+                                d1_msg = agent.chat(user_input=prompt_d1, thread_id=user_id)
                             if d1_msg:
-                                self.n8n_svc.enviar_resposta_usuario(target_user, f"📍 *PREPARAÇÃO PARA AMANHÃ*\n\n{d1_msg}")
+                                self._notify(target_user, f"📍 *PREPARAÇÃO PARA AMANHÃ*\n\n{d1_msg}")
                                 self.trip_svc.mark_alert_sent(trip["id"], alert_d1_key)
 
             except Exception as e:
                 logger.error(f"Erro no deep-dive de roteiro para trip {trip.get('id')}: {e}")
+
+        self.runner.run("itinerary_poi_deep_dive", trips, handle)
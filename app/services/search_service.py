@@ -2,7 +2,7 @@
 Search Service - Busca de dicas reais na internet via Tavily
 """
 
-import requests
+from app.services.http_client import get_http_client
 from app.config import settings
 from loguru import logger
 from typing import Optional, Dict
@@ -13,6 +13,7 @@ class SearchService:
     def __init__(self):
         self.api_key = settings.TAVILY_API_KEY
         self.base_url = "https://api.tavily.com/search"
+        self.http = get_http_client()
         if self.api_key:
             logger.info("✅ Search Service (Tavily) inicializado")
         else:
@@ -36,7 +37,7 @@ class SearchService:
         }
         
         try:
-            response = requests.post(self.base_url, json=payload, timeout=15)
+            response = self.http.post("search", self.base_url, json=payload)
             data = response.json()
             
             if response.status_code == 200:
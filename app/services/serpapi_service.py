@@ -2,7 +2,7 @@
 SerpApi Service - Acesso a dados do Google Flights, Hotels e Buscas
 """
 
-import requests
+from app.services.http_client import get_http_client
 from app.config import settings
 from loguru import logger
 from typing import List, Dict, Optional
@@ -14,6 +14,7 @@ class SerpApiService:
         """Inicializa o service"""
         self.api_key = settings.SERP_API_KEY
         self.base_url = "https://serpapi.com/search"
+        self.http = get_http_client()
         
         if self.api_key:
             logger.info("✅ SerpApi Service inicializado")
@@ -41,7 +42,7 @@ class SerpApiService:
         
         try:
             logger.info(f"🏨 Buscando hotéis em {city}: {check_in} a {check_out}")
-            response = requests.get(self.base_url, params=params, timeout=15)
+            response = self.http.get("serpapi", self.base_url, params=params)
             data = response.json()
             
             hotels = data.get("properties", [])
@@ -90,7 +91,7 @@ class SerpApiService:
         
         try:
             logger.info(f"✈️ Buscando Google Flights: {origin} -> {destination}")
-            response = requests.get(self.base_url, params=params, timeout=15)
+            response = self.http.get("serpapi", self.base_url, params=params)
             data = response.json()
             
             flights = data.get("best_flights", []) or data.get("other_flights", [])
@@ -130,7 +131,7 @@ class SerpApiService:
         
         try:
             logger.info(f"🔍 Buscando no Google: {query}")
-            response = requests.get(self.base_url, params=params, timeout=15)
+            response = self.http.get("serpapi", self.base_url, params=params)
             data = response.json()
             
             results = data.get("organic_results", [])
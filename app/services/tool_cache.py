@@ -0,0 +1,176 @@
+"""
+Tool Cache - Cache de resultados das tools determinísticas do agente.
+
+Vários usuários da mesma viagem (ou o mesmo usuário perguntando de novo) geram
+chamadas idênticas a clima, câmbio, filas de parque, avisos oficiais...
+
+- TTL por tool (TOOL_CACHE_TTL_SECONDS): minutos para filas/clima, horas para
+  câmbio e avisos, dias para números de emergência e dicas de eSIM.
+  Tool sem TTL configurado não é cacheada.
+- Coalescência: chamadas concorrentes com a mesma chave esperam a primeira
+  (uma única requisição ao upstream); erros são repassados a todas e não são cacheados.
+- Resultados "vazios"/de falha não entram no cache (predicado `cacheable`).
+- LRU limitado a TOOL_CACHE_MAX_ENTRIES entradas.
+"""
+
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from loguru import logger
+from app.config import settings
+
+
+def normalize_key(*parts: Any) -> tuple:
+    """Chave canônica: textos sem caixa/espaços extras, números como float."""
+    key = []
+    for part in parts:
+        if isinstance(part, str):
+            key.append(" ".join(part.split()).casefold())
+        elif isinstance(part, (int, float)) and not isinstance(part, bool):
+            key.append(float(part))
+        else:
+            key.append(part)
+    return tuple(key)
+
+
+class ToolResultCache:
+    """Cache único por processo (TTLs explícitos criam instância independente, p/ testes)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, ttls: Optional[Dict[str, float]] = None):
+        if ttls is not None:
+            instance = super(ToolResultCache, cls).__new__(cls)
+            instance._initialized = False
+            return instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(ToolResultCache, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None):
+        if self._initialized:
+            return
+        self.ttls = dict(settings.TOOL_CACHE_TTL_SECONDS if ttls is None else ttls)
+        self.max_entries = settings.TOOL_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # (tool, key) -> (valor, expira_em)
+        self._in_flight: Dict[tuple, Future] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def _tool_stats(self, tool: str) -> Dict[str, float]:
+        return self._stats.setdefault(tool, {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "upstream_ms": 0.0})
+
+    def _begin(self, tool: str, key: Hashable):
+        """(hit, valor) em cache válido; senão (None, future, é_líder) para coalescer a chamada."""
+        cache_key = (tool, key)
+        with self._lock:
+            stats = self._tool_stats(tool)
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                stats["hits"] += 1
+                return True, entry[0], False
+            flight = self._in_flight.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[cache_key] = Future()
+                stats["misses"] += 1
+            else:
+                stats["coalesced"] += 1
+            return False, flight, leader
+
+    def _fail(self, tool: str, key: Hashable, flight: Future, error: Exception):
+        with self._lock:
+            self._tool_stats(tool)["errors"] += 1
+            self._in_flight.pop((tool, key), None)
+        flight.set_exception(error)
+
+    def _complete(self, tool: str, key: Hashable, flight: Future, value: Any, elapsed_ms: float, cacheable):
+        cache_key = (tool, key)
+        with self._lock:
+            self._tool_stats(tool)["upstream_ms"] += elapsed_ms
+            if (cacheable or bool)(value):
+                self._entries[cache_key] = (value, time.monotonic() + self.ttls[tool])
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._in_flight.pop(cache_key, None)
+        flight.set_result(value)
+
+    def get_or_call(
+        self,
+        tool: str,
+        key: Hashable,
+        fetch: Callable[[], Any],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Resultado em cache de `tool` para `key`, ou chama `fetch` (uma vez por chave, mesmo concorrente)."""
+        if not self.ttls.get(tool):
+            return fetch()
+        hit, value, leader = self._begin(tool, key)
+        if hit:
+            return value
+        if not leader:
+            return value.result()
+
+        started = time.perf_counter()
+        try:
+            result = fetch()
+        except Exception as e:
+            self._fail(tool, key, value, e)
+            raise
+        self._complete(tool, key, value, result, (time.perf_counter() - started) * 1000, cacheable)
+        return result
+
+    async def aget_or_call(
+        self,
+        tool: str,
+        key: Hashable,
+        afetch: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Versão async de `get_or_call`: coalesce com chamadas sync e async da mesma chave."""
+        if not self.ttls.get(tool):
+            return await afetch()
+        hit, value, leader = self._begin(tool, key)
+        if hit:
+            return value
+        if not leader:
+            return await asyncio.wrap_future(value)
+
+        started = time.perf_counter()
+        try:
+            result = await afetch()
+        except BaseException as e:  # Inclui cancelamento: quem espera a mesma chave não fica pendurado
+            self._fail(tool, key, value, e)
+            raise
+        self._complete(tool, key, value, result, (time.perf_counter() - started) * 1000, cacheable)
+        return result
+
+    def invalidate(self, tool: Optional[str] = None):
+        with self._lock:
+            for cache_key in [k for k in self._entries if tool is None or k[0] == tool]:
+                del self._entries[cache_key]
+        logger.info(f"🧹 Cache de tools invalidado ({tool or 'todas'})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_tool = {}
+            for tool, stats in self._stats.items():
+                calls = stats["hits"] + stats["misses"] + stats["coalesced"]
+                per_tool[tool] = {
+                    **{k: v for k, v in stats.items() if k != "upstream_ms"},
+                    "hit_rate": round((stats["hits"] + stats["coalesced"]) / calls, 3) if calls else None,
+                    "avg_upstream_ms": round(stats["upstream_ms"] / stats["misses"], 1) if stats["misses"] else None,
+                }
+            return {"entries": len(self._entries), "in_flight": len(self._in_flight), "tools": per_tool}
+
+
+def get_tool_cache() -> ToolResultCache:
+    return ToolResultCache()
@@ -7,14 +7,14 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from loguru import logger
-from app.services.rag_service import RAGService
+from app.services.rag_service import get_rag_service
 from app.services.openai_service import OpenAIService
 
 class TripAuditService:
     """Service para auditar a 'saúde' da viagem e encontrar documentos faltantes"""
     
     def __init__(self):
-        self.rag_svc = RAGService()
+        self.rag_svc = get_rag_service()
         self.openai_svc = OpenAIService()
 
     def audit_trip(self, user_id: str, trip_id: str, trip_info: Dict[str, Any]) -> Dict[str, Any]:
@@ -38,8 +38,14 @@ class TripAuditService:
         total_nights = total_days # Assumindo noites = dias entre datas
         
         # 1. Buscar todos os documentos do usuário para esta viagem no RAG
-        # Vamos usar a query semântica para pegar o que parece ser reserva de hotel
-        hotel_context = self.rag_svc.query("reservas de hotel, hospedagem, check-in, check-out", user_id, k=10)
+        # Hospedagem e roteiro em uma única passada (um lote de embeddings, um produto de matrizes)
+        hotel_hits, itinerary_hits = self.rag_svc.query_many(
+            ["reservas de hotel, hospedagem, check-in, check-out", "roteiro de viagem, itinerário, o que fazer em cada dia"],
+            thread_id=user_id,
+            trip_id=trip_id,
+            k=10
+        )
+        hotel_context = self.rag_svc.format_hits(hotel_hits)
         
         # 2. Usar LLM para extrair as noites cobertas
         prompt = (
@@ -69,7 +75,7 @@ class TripAuditService:
             audit_result["destination"] = destination
             
             # Adicionar lógica de "Checklist do Roteiro" se houver documento de roteiro
-            itinerary_context = self.rag_svc.query("roteiro de viagem, itinerário, o que fazer em cada dia", user_id, k=3)
+            itinerary_context = self.rag_svc.format_hits(itinerary_hits[:3])
             if itinerary_context and len(itinerary_context) > 100:
                 itinerary_prompt = (
                     "Com base no roteiro abaixo, extraia uma lista de itens que o usuário PRECISA ter reserva "
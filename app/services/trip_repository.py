@@ -0,0 +1,266 @@
+"""
+Trip Repository - Persistência das viagens em SQLite (WAL).
+
+Cada viagem é uma linha: colunas indexadas para as buscas frequentes
+(id, user_id, confirmation_code, start_date) + o documento completo em JSON.
+As datas são validadas e normalizadas (YYYY-MM-DD) na escrita, e `end_day`
+guarda o fim efetivo (end_date ou start_date), então as janelas do scheduler
+("embarca em N dias", "em andamento hoje", "termina hoje") são consultas de
+intervalo sobre índices, sem strptime por viagem a cada tick.
+Atualizações tocam apenas a linha alterada, dentro de uma transação
+(BEGIN IMMEDIATE), eliminando a reescrita do arquivo inteiro e os
+lost-updates entre o scheduler e os handlers das requisições.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, date
+from typing import List, Dict, Any, Optional, Callable, Iterable
+from loguru import logger
+from app.config import settings
+
+# Campos espelhados em colunas (o JSON em `data` continua sendo a fonte completa)
+COLUMNS = ("id", "user_id", "confirmation_code", "start_date", "end_date", "end_day", "data", "updated_at")
+
+
+def parse_day(value: Any) -> Optional[str]:
+    """Normaliza uma data para ISO (YYYY-MM-DD). Valores inválidos/vazios viram None."""
+    if not value:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+class TripRepository:
+    """Repositório único por processo (uma conexão persistente, serializada por lock)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, db_path: Optional[str] = None):
+        if db_path:
+            # Caminho explícito (testes/ferramentas): instância independente
+            instance = super(TripRepository, cls).__new__(cls)
+            instance._initialized = False
+            return instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(TripRepository, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, db_path: Optional[str] = None):
+        if self._initialized:
+            return
+        self.db_path = db_path or os.path.join(os.path.dirname(settings.CHROMA_DB_PATH), "trips.db")
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        self._init_db()
+        self._initialized = True
+        logger.info(f"🗄️ TripRepository inicializado (SQLite WAL: {self.db_path})")
+
+    def _init_db(self):
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS trips (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    confirmation_code TEXT,
+                    start_date TEXT,
+                    end_date TEXT,
+                    end_day TEXT,
+                    data TEXT NOT NULL,
+                    updated_at TEXT
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(trips)")}
+            if "end_day" not in columns:
+                # Bases criadas antes do índice de datas: adiciona a coluna e recalcula as datas
+                self._conn.execute("ALTER TABLE trips ADD COLUMN end_day TEXT")
+                for (data,) in self._conn.execute("SELECT data FROM trips").fetchall():
+                    trip = json.loads(data)
+                    row = self._row(trip)
+                    self._conn.execute(
+                        "UPDATE trips SET start_date = ?, end_date = ?, end_day = ? WHERE id = ?",
+                        (row[3], row[4], row[5], trip["id"]),
+                    )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trips_user ON trips(user_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trips_confirmation ON trips(confirmation_code)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trips_start ON trips(start_date)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trips_end_day ON trips(end_day)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trips_end ON trips(end_date)")
+
+    # ============================================================
+    # LEITURA
+    # ============================================================
+
+    def _select(self, where: str = "", params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT data FROM trips {where} ORDER BY rowid", tuple(params)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get(self, trip_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM trips WHERE id = ?", (trip_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        return self._select()
+
+    def by_user(self, user_id: str) -> List[Dict[str, Any]]:
+        return self._select("WHERE user_id = ?", (user_id,))
+
+    def by_confirmation_code(self, confirmation_code: str) -> List[Dict[str, Any]]:
+        if not confirmation_code:
+            return []
+        return self._select("WHERE confirmation_code = ?", (confirmation_code,))
+
+    def by_start_date_range(self, start: str, end: str) -> List[Dict[str, Any]]:
+        """Viagens com start_date (ISO YYYY-MM-DD) no intervalo fechado [start, end]."""
+        return self._select("WHERE start_date BETWEEN ? AND ?", (start, end))
+
+    def by_dates(
+        self,
+        start_from: Optional[str] = None,
+        start_to: Optional[str] = None,
+        end_from: Optional[str] = None,
+        end_to: Optional[str] = None,
+        explicit_end: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Consulta por intervalo nas colunas de data indexadas (limites inclusivos, ISO).
+        `end_*` usa o fim efetivo (end_date ou start_date); com `explicit_end=True`
+        considera apenas viagens com end_date informado.
+        """
+        end_col = "end_date" if explicit_end else "end_day"
+        clauses, params = [], []
+        for column, op, value in (
+            ("start_date", ">=", start_from),
+            ("start_date", "<=", start_to),
+            (end_col, ">=", end_from),
+            (end_col, "<=", end_to),
+        ):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        if explicit_end:
+            clauses.append("end_date IS NOT NULL")
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        return self._select(where, params)
+
+    def by_start_or_end_day(self, day: str) -> List[Dict[str, Any]]:
+        """Viagens que começam OU terminam no dia informado (dia da ida/volta)."""
+        return self._select("WHERE start_date = ? OR end_day = ?", (day, day))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
+
+    # ============================================================
+    # ESCRITA (UMA LINHA POR OPERAÇÃO)
+    # ============================================================
+
+    def _row(self, trip: Dict[str, Any]) -> tuple:
+        """Linha na ordem de COLUMNS. Datas são parseadas aqui, uma vez por escrita."""
+        start_day = parse_day(trip.get("start_date"))
+        end_date = parse_day(trip.get("end_date"))
+        return (
+            trip["id"],
+            trip.get("user_id"),
+            trip.get("confirmation_code"),
+            start_day,
+            end_date,
+            end_date or start_day,
+            json.dumps(trip, ensure_ascii=False),
+            datetime.now().isoformat(),
+        )
+
+    def _insert_sql(self) -> str:
+        return f"INSERT OR REPLACE INTO trips ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+    def upsert(self, trip: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(self._insert_sql(), self._row(trip))
+
+    def mutate(self, trip_id: str, fn: Callable[[Dict[str, Any]], Any]) -> Optional[Dict[str, Any]]:
+        """
+        Lê, aplica `fn(trip)` (que altera o dict in-place) e grava, tudo na mesma transação.
+        Retorna a viagem atualizada ou None se não existir.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM trips WHERE id = ?", (trip_id,)).fetchone()
+                if not row:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                trip = json.loads(row[0])
+                fn(trip)
+                self._conn.execute(
+                    f"UPDATE trips SET {', '.join(c + ' = ?' for c in COLUMNS[1:])} WHERE id = ?",
+                    self._row(trip)[1:] + (trip_id,),
+                )
+                self._conn.execute("COMMIT")
+                return trip
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def update(self, trip_id: str, patch: Dict[str, Any], unset: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+        """Aplica um patch de campos (e remove `unset`) sem sobrescrever alterações concorrentes em outros campos."""
+        unset = list(unset)
+
+        def apply(trip: Dict[str, Any]):
+            trip.update(patch)
+            for field in unset:
+                trip.pop(field, None)
+
+        return self.mutate(trip_id, apply)
+
+    def delete(self, trip_ids: Iterable[str]) -> int:
+        trip_ids = list(trip_ids)
+        if not trip_ids:
+            return 0
+        with self._lock:
+            cur = self._conn.executemany("DELETE FROM trips WHERE id = ?", [(t,) for t in trip_ids])
+            return cur.rowcount
+
+    # ============================================================
+    # MIGRAÇÃO DO trips.json
+    # ============================================================
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """Importa o antigo trips.json uma única vez e o renomeia para .migrated."""
+        if not os.path.exists(json_path) or self.count() > 0:
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                trips = json.load(f)
+            trips = [t for t in trips if isinstance(t, dict) and t.get("id")]
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(self._insert_sql(), [self._row(t) for t in trips])
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            os.replace(json_path, json_path + ".migrated")
+            logger.info(f"📦 Migração de viagens concluída: {len(trips)} importadas de {json_path}")
+            return len(trips)
+        except Exception as e:
+            logger.error(f"❌ Falha na migração do trips.json: {e}")
+            return 0
+
+
+def get_trip_repository() -> TripRepository:
+    return TripRepository()
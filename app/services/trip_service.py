@@ -4,36 +4,48 @@ Trip Service - Gerencia o banco de dados de viagens para o scheduler.
 
 import os
 import json
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-from app.config import settings
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Any, Optional, Callable
+from app.services.trip_repository import TripRepository, get_trip_repository
 from loguru import logger
 
 class TripService:
     """Gerencia viagens extraídas de documentos para alertas proativos"""
     
-    def __init__(self):
-        self.db_path = os.path.join(os.path.dirname(settings.CHROMA_DB_PATH), "trips.json")
-        self.trips = []
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self._load_trips()
-        logger.info(f"✅ TripService inicializado (Base: {self.db_path})")
+    def __init__(self, repository: Optional[TripRepository] = None):
+        self.repo = repository or get_trip_repository()
+        self.db_path = self.repo.db_path
         
-    def _load_trips(self):
-        if os.path.exists(self.db_path):
-            try:
-                with open(self.db_path, 'r', encoding='utf-8') as f:
-                    self.trips = json.load(f)
-                logger.info(f"📅 {len(self.trips)} viagens carregadas para monitoramento.")
-            except Exception as e:
-                logger.error(f"Erro ao carregar viagens: {e}")
-                
-    def _save_trips(self):
-        try:
-            with open(self.db_path, 'w', encoding='utf-8') as f:
-                json.dump(self.trips, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Erro ao salvar viagens: {e}")
+        # Migração única do antigo trips.json (reescrito por inteiro a cada mutação)
+        legacy_path = os.path.join(os.path.dirname(self.db_path), "trips.json")
+        self.repo.migrate_from_json(legacy_path)
+        logger.info(f"✅ TripService inicializado (Base: {self.db_path})")
+
+    @property
+    def trips(self) -> List[Dict[str, Any]]:
+        """Snapshot de todas as viagens. Alterações nos dicts NÃO são persistidas: use update_trip_metadata."""
+        return self.repo.all()
+
+    def get_trip(self, trip_id: str) -> Optional[Dict[str, Any]]:
+        return self.repo.get(trip_id) if trip_id else None
+
+    def get_user_trips(self, user_id: str) -> List[Dict[str, Any]]:
+        return self.repo.by_user(user_id)
+
+    def get_trips_by_confirmation_code(self, confirmation_code: str) -> List[Dict[str, Any]]:
+        return self.repo.by_confirmation_code(confirmation_code)
+
+    def add_trip(self, trip: Dict[str, Any]) -> Dict[str, Any]:
+        """Insere (ou substitui) uma viagem completa."""
+        self.repo.upsert(trip)
+        return trip
+
+    def delete_trips(self, trip_ids: List[str]) -> int:
+        return self.repo.delete(trip_ids)
+
+    def mutate_trip(self, trip_id: str, fn: Callable[[Dict[str, Any]], Any]) -> Optional[Dict[str, Any]]:
+        """Read-modify-write atômico de uma viagem (para campos aninhados como listas e dicts)."""
+        return self.repo.mutate(trip_id, fn)
 
     def extract_trip_data(self, doc_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Apenas extrai os dados estruturados de uma trip a partir do doc_data, SEM salvar no BD."""
@@ -71,21 +83,21 @@ class TripService:
         trip_id = f"{user_id}_{destination.upper()}_{start_date}"
         
         # Verificar se já existe
-        for trip in self.trips:
-            if trip["id"] == trip_id:
-                # Atualizar end_date se vier no novo doc e não tiver no antigo
-                if doc_data.get("end_date") and not trip.get("end_date"):
-                    trip["end_date"] = doc_data.get("end_date")
-                
-                # [NOVO] Acumular POIs (Pontos de Interesse) de docs diferentes
-                new_pois = doc_data.get("points_of_interest", [])
-                if new_pois:
-                    existing_pois = trip.get("points_of_interest", [])
-                    # Union of lists avoiding duplicates
-                    trip["points_of_interest"] = list(set(existing_pois + new_pois))
-                
-                self._save_trips()
-                return trip
+        def merge_doc(trip: Dict[str, Any]):
+            # Atualizar end_date se vier no novo doc e não tiver no antigo
+            if doc_data.get("end_date") and not trip.get("end_date"):
+                trip["end_date"] = doc_data.get("end_date")
+            
+            # [NOVO] Acumular POIs (Pontos de Interesse) de docs diferentes
+            new_pois = doc_data.get("points_of_interest", [])
+            if new_pois:
+                existing_pois = trip.get("points_of_interest", [])
+                # Union of lists avoiding duplicates
+                trip["points_of_interest"] = list(set(existing_pois + new_pois))
+        
+        existing = self.repo.mutate(trip_id, merge_doc)
+        if existing:
+            return existing
                 
         new_trip = {
             "id": trip_id,
@@ -107,19 +119,15 @@ class TripService:
             "created_at": datetime.now().isoformat()
         }
         
-        self.trips.append(new_trip)
-        self._save_trips()
+        self.repo.upsert(new_trip)
         logger.info(f"✨ Nova viagem agendada: {destination} em {start_date}")
         return new_trip
 
     def set_primary_contact(self, trip_id: str, user_id: str) -> bool:
         """Define o responsável por receber notificações proativas da viagem"""
-        for trip in self.trips:
-            if trip["id"] == trip_id:
-                trip["primary_contact_id"] = user_id
-                self._save_trips()
-                logger.info(f"👤 Novo responsável pela viagem {trip_id}: {user_id}")
-                return True
+        if self.repo.update(trip_id, {"primary_contact_id": user_id}):
+            logger.info(f"👤 Novo responsável pela viagem {trip_id}: {user_id}")
+            return True
         return False
 
     def update_proactive_config(self, user_id: str, level: str) -> bool:
@@ -140,15 +148,7 @@ class TripService:
             logger.warning(f"⚠️ Tentativa de mudar frequência sem viagem ativa para {user_id}")
             return False
             
-        updated = False
-        for trip in self.trips:
-            if trip["id"] == active_trip_id:
-                trip["proactive_cooldown_minutes"] = minutes
-                updated = True
-                break
-        
-        if updated:
-            self._save_trips()
+        if self.repo.update(active_trip_id, {"proactive_cooldown_minutes": minutes}):
             logger.info(f"⚙️ Frequência proativa de {user_id} alterada para {level} ({minutes}min)")
             return True
         return False
@@ -192,82 +192,88 @@ class TripService:
     def get_trips_to_alert(self, today: datetime) -> List[Dict[str, Any]]:
         """Retorna viagens que precisam de alerta hoje e ainda não foram notificadas"""
         trips_to_notify = []
+        today_date = today.date()
+        alert_by_delta = {7: "D-7", 1: "D-1", 0: "D-0"}
         
-        for trip in self.trips:
-            try:
-                start_dt = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-                today_date = today.date()
-                delta_days = (start_dt - today_date).days
-                
+        # Só as viagens que embarcam em exatamente 7, 1 ou 0 dias (índice em start_date)
+        for delta_days, alert_type in alert_by_delta.items():
+            day = (today_date + timedelta(days=delta_days)).isoformat()
+            for trip in self.repo.by_start_date_range(day, day):
                 logger.debug(f"Trip {trip['id']}: {delta_days} dias para embarque.")
-                
-                alert_type = None
-                if delta_days == 7: alert_type = "D-7"
-                elif delta_days == 1: alert_type = "D-1"
-                elif delta_days == 0: alert_type = "D-0"
-                
-                if alert_type and alert_type not in trip.get("alerts_sent", []):
+                if alert_type not in trip.get("alerts_sent", []):
                     trip["pending_alert"] = alert_type
                     # Lógica Extra: Se for D-1, verificar necessidade de mapas offline
                     if alert_type == "D-1":
                         trip["needs_offline_map_check"] = True
                     trips_to_notify.append(trip)
-            except Exception as e:
-                logger.error(f"Erro ao processar data da viagem {trip['id']}: {e}")
                 
         return trips_to_notify
 
+    def get_upcoming_trips(self, day: date) -> List[Dict[str, Any]]:
+        """Viagens que começam no dia informado ou depois."""
+        return self.repo.by_dates(start_from=day.isoformat())
+
+    def get_trips_starting_between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        """Viagens cujo início está em [start, end] (inclusive)."""
+        return self.repo.by_dates(start_from=start.isoformat(), start_to=end.isoformat())
+
+    def get_trips_in_progress(self, day: date, explicit_end: bool = False) -> List[Dict[str, Any]]:
+        """Viagens acontecendo no dia (início <= dia <= fim; sem end_date o fim é o próprio início)."""
+        iso = day.isoformat()
+        return self.repo.by_dates(start_to=iso, end_from=iso, explicit_end=explicit_end)
+
+    def get_trips_departing_or_returning(self, day: date) -> List[Dict[str, Any]]:
+        """Viagens com ida ou volta no dia informado."""
+        return self.repo.by_start_or_end_day(day.isoformat())
+
+    def get_trips_ended_before(self, day: date) -> List[Dict[str, Any]]:
+        """Viagens com end_date informado e anterior ao dia (exclusive)."""
+        return self.repo.by_dates(end_to=(day - timedelta(days=1)).isoformat(), explicit_end=True)
+
     def mark_alert_sent(self, trip_id: str, alert_type: str):
         """Marca que um alerta foi enviado para evitar repetição"""
-        for trip in self.trips:
-            if trip["id"] == trip_id:
-                if "alerts_sent" not in trip:
-                    trip["alerts_sent"] = []
-                trip["alerts_sent"].append(alert_type)
-                self._save_trips()
-                break
+        self.repo.mutate(trip_id, lambda trip: trip.setdefault("alerts_sent", []).append(alert_type))
+
     def get_shared_users(self, user_id: str) -> List[str]:
         """Retorna outros usuários que compartilham viagens com este usuário"""
         shared_users = []
-        user_trips = [t.get("confirmation_code") for t in self.trips if t["user_id"] == user_id and t.get("confirmation_code")]
+        user_trips = {t.get("confirmation_code") for t in self.repo.by_user(user_id) if t.get("confirmation_code")}
         
         if not user_trips:
             return []
             
-        for trip in self.trips:
-            if trip["user_id"] != user_id and trip.get("confirmation_code") in user_trips:
+        for code in user_trips:
+            for trip in self.repo.by_confirmation_code(code):
                 # Verificar se o compartilhamento foi aceito (poderia ter um flag 'shared_with': [user_ids])
-                if user_id in trip.get("shared_with", []):
+                if trip["user_id"] != user_id and user_id in trip.get("shared_with", []):
                     shared_users.append(trip["user_id"])
                     
         return list(set(shared_users))
 
     def request_trip_sharing(self, user_id: str, confirmation_code: str, partner_id: str):
         """Registra uma solicitação ou aceite de compartilhamento"""
-        for trip in self.trips:
-            if trip["user_id"] == user_id and trip.get("confirmation_code") == confirmation_code:
-                if "shared_with" not in trip:
-                    trip["shared_with"] = []
-                if partner_id not in trip["shared_with"]:
-                    trip["shared_with"].append(partner_id)
-                    self._save_trips()
+        def add_partner(trip: Dict[str, Any]):
+            shared_with = trip.setdefault("shared_with", [])
+            if partner_id not in shared_with:
+                shared_with.append(partner_id)
+
+        for trip in self.repo.by_confirmation_code(confirmation_code):
+            if trip["user_id"] == user_id:
+                self.repo.mutate(trip["id"], add_partner)
                 return True
         return False
 
     def set_proactive_cooldown(self, trip_id: str, minutes: int):
         """Altera a frequência de dicas proativas para uma viagem específica"""
-        for trip in self.trips:
-            if trip["id"] == trip_id:
-                trip["proactive_cooldown_minutes"] = minutes
-                self._save_trips()
-                logger.info(f"⏱️ Frequência proativa alterada para {minutes} min na trip {trip_id}")
-                return True
+        if self.repo.update(trip_id, {"proactive_cooldown_minutes": minutes}):
+            logger.info(f"⏱️ Frequência proativa alterada para {minutes} min na trip {trip_id}")
+            return True
         return False
 
     def find_potential_partner(self, user_id: str, confirmation_code: str) -> Optional[str]:
         """Procura outro usuário com o mesmo código de reserva"""
-        for trip in self.trips:
-            if trip["user_id"] != user_id and trip.get("confirmation_code") == confirmation_code:
+        for trip in self.repo.by_confirmation_code(confirmation_code):
+            if trip["user_id"] != user_id:
                 return trip["user_id"]
         return None
 
@@ -284,12 +290,15 @@ class TripService:
             return None
 
         dest_lower = destination.lower().strip()
-        for trip in self.trips:
+        # Apenas viagens com início na janela ±3 dias (índice em start_date)
+        window_start = (target_date - timedelta(days=3)).isoformat()
+        window_end = (target_date + timedelta(days=3)).isoformat()
+        for trip in self.repo.by_start_date_range(window_start, window_end):
             if trip["user_id"] == exclude_user_id:
                 continue
             try:
                 trip_dest = trip.get("destination", "").lower().strip()
-                trip_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+                trip_date = datetime.strptime(trip["start_date"], "%Y-%m-%d").date()
                 date_diff = abs((target_date - trip_date).days)
                 # Match se destino contém pelo menos 4 chars em comum e data com diferença <= 3 dias
                 dest_match = dest_lower[:4] in trip_dest or trip_dest[:4] in dest_lower
@@ -304,66 +313,45 @@ class TripService:
         Retorna viagens que estão na janela de monitoramento proativo (D-7 até a data de término).
         Útil para alertas de notícias, segurança e avisos governamentais.
         """
-        active_trips = []
         today_date = today.date()
-        
-        for trip in self.trips:
-            try:
-                start_dt = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-                end_date_str = trip.get("end_date")
-                
-                if end_date_str:
-                    end_dt = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-                # Janela: 7 dias antes do início até o fim da viagem
-                from datetime import timedelta
-                monitoring_start = start_dt - timedelta(days=7)
-                
-                if monitoring_start <= today_date <= end_dt:
-                    active_trips.append(trip)
-                    
-            except Exception as e:
-                logger.error(f"Erro ao calcular janela de monitoramento para trip {trip.get('id')}: {e}")
-                
-        return active_trips
+        # Janela: 7 dias antes do início até o fim da viagem  <=>  início <= hoje+7 e fim >= hoje
+        return self.repo.by_dates(
+            start_to=(today_date + timedelta(days=7)).isoformat(),
+            end_from=today_date.isoformat()
+        )
 
     def is_trip_active(self, trip_id: str, grace_days: int = 2) -> bool:
         """Verifica se a viagem ainda está ativa ou dentro do período de carência (X dias após o fim)."""
-        for trip in self.trips:
-            if trip["id"] == trip_id:
-                try:
-                    from datetime import timedelta
-                    # Se não tiver end_date, assume 7 dias após o início como padrão
-                    start_date_str = trip.get("start_date")
-                    if not start_date_str:
-                        return True  # sem start_date => mantém ativo
-                    start_dt = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-                    end_date_str = trip.get("end_date")
-                    
-                    if end_date_str:
-                        end_dt = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-                    else:
-                        end_dt = start_dt + timedelta(days=7)
-                    
-                    # Carência de X dias após o término
-                    expiry_date = end_dt + timedelta(days=grace_days)
-                    return datetime.now().date() <= expiry_date
-                except Exception as e:
-                    logger.error(f"Erro ao verificar expiração da trip {trip_id}: {e}")
-                    return True # Na dúvida, mantém ativo
-        return False
+        trip = self.repo.get(trip_id)
+        if not trip:
+            return False
+        try:
+            from datetime import timedelta
+            # Se não tiver end_date, assume 7 dias após o início como padrão
+            start_date_str = trip.get("start_date")
+            if not start_date_str:
+                return True  # sem start_date => mantém ativo
+            start_dt = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+            end_date_str = trip.get("end_date")
+            
+            if end_date_str:
+                end_dt = datetime.strptime(end_date_str, "%Y-%m-%d").date()
+            else:
+                end_dt = start_dt + timedelta(days=7)
+            
+            # Carência de X dias após o término
+            expiry_date = end_dt + timedelta(days=grace_days)
+            return datetime.now().date() <= expiry_date
+        except Exception as e:
+            logger.error(f"Erro ao verificar expiração da trip {trip_id}: {e}")
+            return True # Na dúvida, mantém ativo
                 
-    def update_trip_metadata(self, trip_id: str, metadata: Dict[str, Any]) -> bool:
-        """Atualiza metadados arbitrários de uma viagem (ex: drive_folder_id)."""
-        updated = False
-        for trip in self.trips:
-            if trip["id"] == trip_id:
-                for k, v in metadata.items():
-                    trip[k] = v
-                updated = True
-                break
+    def update_trip_metadata(self, trip_id: str, metadata: Dict[str, Any], unset: Optional[List[str]] = None) -> bool:
+        """Atualiza metadados arbitrários de uma viagem (ex: drive_folder_id) em uma única linha.
+        Campos em `unset` são removidos."""
+        updated = self.repo.update(trip_id, metadata, unset=unset or ()) is not None
         
         if updated:
-            self._save_trips()
-            logger.info(f"📝 Metadados da trip {trip_id} atualizados: {list(metadata.keys())}")
+            logger.debug(f"📝 Metadados da trip {trip_id} atualizados: {list(metadata.keys())}")
         return updated
 
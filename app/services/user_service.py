@@ -16,3 +16,7 @@ class UserService:
         if user_id in self.admin_phones:
             return True, "admin"
         return True, "member"
+
+    def get_user_role(self, user_id: str) -> str:
+        _, role = self.authorize(user_id, self.get_active_trip(user_id))
+        return role
@@ -0,0 +1,484 @@
+"""
+Vector Store - Armazenamento binário append-only para os embeddings do RAG.
+
+Layout em disco (dentro de settings.CHROMA_DB_PATH):
+- manifest.json            -> versão, dimensão e geração ativa
+- vectors.<gen>.f32        -> matriz float32 contígua (N x dim), lida via memmap
+- documents.<gen>.jsonl    -> sidecar de metadados (um evento por linha: add/del/meta)
+
+Escritas são sempre append (O(dados novos)). Remoções e alterações de metadados
+viram eventos no sidecar; a compactação periódica reescreve apenas as linhas vivas
+em uma nova geração e troca o manifest de forma atômica.
+
+Vários processos podem compartilhar o mesmo diretório: escritas são serializadas
+por um lock de arquivo e `refresh()` detecta mudanças alheias com um simples stat
+(generation do manifest + tamanho do sidecar), lendo apenas a cauda nova.
+"""
+
+import os
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterable
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas o lock entre threads
+    fcntl = None
+
+STORE_VERSION = 1
+DTYPE = np.float32
+# Campos de metadados indexados (índice invertido chave -> docs)
+PARTITION_FIELDS = ("trip_id", "thread_id")
+
+
+class VectorStore:
+    """Armazenamento de vetores normalizados (float32) + sidecar JSONL de metadados"""
+
+    def __init__(self, base_dir: str, compaction_ratio: float = 0.3, compaction_min_rows: int = 64):
+        self.base_dir = base_dir
+        self.compaction_ratio = compaction_ratio
+        self.compaction_min_rows = compaction_min_rows
+        self.manifest_path = os.path.join(base_dir, "manifest.json")
+        self.lock_path = os.path.join(base_dir, "store.lock")
+        os.makedirs(base_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._docs_list: Optional[List[Dict[str, Any]]] = None
+        self._partitions: Dict[str, Dict[str, Dict[str, None]]] = {f: {} for f in PARTITION_FIELDS}
+        self._partition_cache: Dict[tuple, tuple] = {}
+        self._rows_total = 0
+        self._dead_rows = 0
+        self._mm: Optional[np.ndarray] = None
+        self._sidecar_offset = 0
+        self._manifest_mtime: Optional[int] = None
+        self.load()
+
+    # ============================================================
+    # CAMINHOS E MANIFEST
+    # ============================================================
+
+    def _vectors_path(self, generation: Optional[int] = None) -> str:
+        gen = self.generation if generation is None else generation
+        return os.path.join(self.base_dir, f"vectors.{gen}.f32")
+
+    def _docs_path(self, generation: Optional[int] = None) -> str:
+        gen = self.generation if generation is None else generation
+        return os.path.join(self.base_dir, f"documents.{gen}.jsonl")
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Manifest do Vector Store ilegível: {e}")
+            return {}
+
+    def _write_manifest(self):
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": STORE_VERSION, "dim": self.dim, "generation": self.generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.manifest_path)
+        self._manifest_mtime = self._stat_mtime(self.manifest_path)
+
+    @staticmethod
+    def _stat_mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @contextmanager
+    def _write_lock(self):
+        """Serializa escritas entre threads (RLock) e entre processos (flock)."""
+        with self._lock:
+            if fcntl is None or self._lock_depth:
+                # Reentrante: flock em um segundo descritor do mesmo processo bloquearia
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    # ============================================================
+    # CARGA
+    # ============================================================
+
+    def load(self):
+        """(Re)carrega o manifest, reaplica o sidecar e mapeia os vetores em memória."""
+        with self._lock:
+            self._manifest_mtime = self._stat_mtime(self.manifest_path)
+            manifest = self._read_manifest()
+            self.dim = manifest.get("dim")
+            self.generation = manifest.get("generation", 0)
+            self._docs = {}
+            self._docs_list = None
+            self._partitions = {f: {} for f in PARTITION_FIELDS}
+            self._partition_cache = {}
+            self._dead_rows = 0
+            self._sidecar_offset = 0
+            self._remap()
+            self._read_sidecar_tail(truncate_partial=True)
+
+            # Linhas de vetor sem metadado (crash entre as duas escritas) são espaço morto
+            self._dead_rows = self._rows_total - len(self._docs)
+            logger.debug(f"📂 Vector Store: {len(self._docs)} docs vivos / {self._rows_total} linhas (geração {self.generation})")
+
+    def _read_sidecar_tail(self, truncate_partial: bool = False) -> int:
+        """Aplica os eventos escritos após `_sidecar_offset`. Retorna quantos foram lidos."""
+        docs_path = self._docs_path()
+        if not os.path.exists(docs_path):
+            return 0
+        applied = 0
+        with open(docs_path, "rb") as f:
+            f.seek(self._sidecar_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._sidecar_offset += len(line)
+                self._apply_event_line(line.decode("utf-8"))
+                applied += 1
+        if truncate_partial and self._sidecar_offset < os.path.getsize(docs_path):
+            # Última linha sem quebra = escrita interrompida; remove para não corromper o próximo append
+            logger.warning("⚠️ Vector Store: evento parcial no fim do sidecar. Truncando.")
+            with open(docs_path, "r+b") as f:
+                f.truncate(self._sidecar_offset)
+        return applied
+
+    def refresh(self) -> bool:
+        """
+        Sincroniza com escritas de outros processos. Custo: dois stats quando nada mudou.
+        Nova geração (compactação) -> recarga completa; sidecar maior -> lê só a cauda.
+        """
+        with self._lock:
+            if self._stat_mtime(self.manifest_path) != self._manifest_mtime:
+                if self._read_manifest().get("generation", 0) != self.generation or self.dim is None:
+                    self.load()
+                    return True
+                self._manifest_mtime = self._stat_mtime(self.manifest_path)
+            try:
+                size = os.path.getsize(self._docs_path())
+            except OSError:
+                return False
+            if size <= self._sidecar_offset:
+                return False
+            self._remap()
+            return self._read_sidecar_tail() > 0
+
+    def _apply_event_line(self, line: str):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            # Linha parcial no fim do arquivo (escrita interrompida) é descartada
+            logger.warning("⚠️ Vector Store: linha corrompida ignorada no sidecar.")
+            return
+        self._apply_event(event)
+
+    def _apply_event(self, event: Dict[str, Any]):
+        op = event.get("op")
+        doc_id = event.get("id")
+        if op == "add":
+            if event.get("row", -1) >= self._rows_total:
+                logger.warning(f"⚠️ Vector Store: doc {doc_id} aponta para linha inexistente. Ignorado.")
+                return
+            if doc_id in self._docs:
+                self._unindex(self._docs[doc_id])
+            doc = {
+                "id": doc_id,
+                "row": event["row"],
+                "text": event.get("text", ""),
+                "metadata": event.get("metadata", {}),
+            }
+            self._docs[doc_id] = doc
+            self._index(doc)
+        elif op == "del":
+            doc = self._docs.pop(doc_id, None)
+            if doc is not None:
+                self._unindex(doc)
+                self._dead_rows += 1
+        elif op == "meta":
+            doc = self._docs.get(doc_id)
+            if doc is not None:
+                patch = event.get("metadata", {})
+                moves = any(f in patch for f in PARTITION_FIELDS)
+                if moves:
+                    self._unindex(doc)
+                doc["metadata"].update(patch)
+                if moves:
+                    self._index(doc)
+        self._docs_list = None
+
+    def _index(self, doc: Dict[str, Any]):
+        for field in PARTITION_FIELDS:
+            key = doc["metadata"].get(field)
+            if key:
+                self._partitions[field].setdefault(key, {})[doc["id"]] = None
+                self._partition_cache.pop((field, key), None)
+
+    def _unindex(self, doc: Dict[str, Any]):
+        for field in PARTITION_FIELDS:
+            key = doc["metadata"].get(field)
+            members = self._partitions[field].get(key) if key else None
+            if members is not None:
+                members.pop(doc["id"], None)
+                if not members:
+                    del self._partitions[field][key]
+                self._partition_cache.pop((field, key), None)
+
+    def _remap(self):
+        """Abre (ou reabre após crescimento) o memmap do arquivo de vetores."""
+        self._mm = None
+        self._rows_total = 0
+        path = self._vectors_path()
+        if not self.dim or not os.path.exists(path):
+            return
+        row_bytes = self.dim * DTYPE().itemsize
+        size = os.path.getsize(path)
+        if size % row_bytes:
+            # Escrita parcial de vetor: trunca para o último registro completo
+            logger.warning("⚠️ Vector Store: linha de vetor parcial detectada. Truncando.")
+            with open(path, "r+b") as f:
+                f.truncate(size - size % row_bytes)
+            size -= size % row_bytes
+        self._rows_total = size // row_bytes
+        if self._rows_total:
+            self._mm = np.memmap(path, dtype=DTYPE, mode="r", shape=(self._rows_total, self.dim))
+
+    # ============================================================
+    # LEITURA
+    # ============================================================
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def documents(self) -> List[Dict[str, Any]]:
+        """Documentos vivos na ordem de inserção ({'id', 'row', 'text', 'metadata'})."""
+        with self._lock:
+            if self._docs_list is None:
+                self._docs_list = list(self._docs.values())
+            return self._docs_list
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self._docs.get(doc_id)
+
+    def partition_keys(self, field: str) -> List[str]:
+        """Chaves distintas de um campo indexado (ex.: todos os thread_id com documentos)."""
+        with self._lock:
+            return list(self._partitions[field].keys())
+
+    def partition(self, field: str, key: Optional[str]) -> tuple:
+        """
+        Documentos de uma partição (trip_id/thread_id) + array de linhas + matriz de vetores.
+        Resultado cacheado até a partição mudar; o custo não depende do tamanho total da base.
+        """
+        if not key:
+            return [], np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=DTYPE)
+        with self._lock:
+            cached = self._partition_cache.get((field, key))
+            if cached is None:
+                docs = [self._docs[doc_id] for doc_id in self._partitions[field].get(key, {})]
+                rows = np.fromiter((d["row"] for d in docs), dtype=np.int64, count=len(docs))
+                cached = (docs, rows, self.vectors_for(rows))
+                self._partition_cache[(field, key)] = cached
+            return cached
+
+    def select(self, trip_id: Optional[str] = None, thread_id: Optional[str] = None) -> tuple:
+        """União das partições da viagem e do usuário (sem duplicatas): (docs, matriz de vetores)."""
+        trip_docs, _, trip_vectors = self.partition("trip_id", trip_id)
+        thread_docs, _, thread_vectors = self.partition("thread_id", thread_id)
+        if not trip_docs:
+            return thread_docs, thread_vectors
+        if not thread_docs:
+            return trip_docs, trip_vectors
+        seen = {d["id"] for d in trip_docs}
+        extra = [i for i, d in enumerate(thread_docs) if d["id"] not in seen]
+        if not extra:
+            return trip_docs, trip_vectors
+        return trip_docs + [thread_docs[i] for i in extra], np.vstack([trip_vectors, thread_vectors[extra]])
+
+    def vectors_for(self, rows: Iterable[int]) -> np.ndarray:
+        """Retorna os vetores (já normalizados) das linhas pedidas."""
+        rows = np.asarray(list(rows) if not isinstance(rows, np.ndarray) else rows, dtype=np.int64)
+        mm = self._mm  # snapshot: _remap pode trocar o memmap em paralelo
+        if mm is None or rows.size == 0:
+            return np.empty((0, self.dim or 0), dtype=DTYPE)
+        return np.asarray(mm[rows])
+
+    # ============================================================
+    # ESCRITA (APPEND-ONLY)
+    # ============================================================
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """Normaliza L2 por linha (vetores nulos permanecem nulos)."""
+        vectors = np.asarray(vectors, dtype=DTYPE)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(DTYPE, copy=False)
+
+    def _append_events(self, events: List[Dict[str, Any]]):
+        """Grava eventos no sidecar e os aplica em memória (relendo a cauda, que inclui escritas alheias)."""
+        with open(self._docs_path(), "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._remap()
+        self._read_sidecar_tail()
+
+    def add(self, texts: List[str], vectors: List[List[float]], metadatas: List[Dict[str, Any]]) -> List[str]:
+        """Anexa novos documentos. Custo proporcional apenas ao lote recebido."""
+        if not texts:
+            return []
+        matrix = self.normalize(np.asarray(vectors, dtype=DTYPE))
+        if matrix.shape[0] != len(texts) or len(metadatas) != len(texts):
+            raise ValueError("texts, vectors e metadatas devem ter o mesmo tamanho")
+
+        with self._write_lock():
+            self.refresh()
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                self._write_manifest()
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Dimensão do embedding ({matrix.shape[1]}) difere da base ({self.dim})")
+
+            # 1. Vetores primeiro: um sidecar nunca referencia vetor inexistente
+            row_bytes = self.dim * DTYPE().itemsize
+            with open(self._vectors_path(), "ab") as f:
+                start_row = f.tell() // row_bytes
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 2. Eventos de metadados
+            ids = [uuid.uuid4().hex for _ in texts]
+            self._append_events([
+                {"op": "add", "id": doc_id, "row": start_row + i, "text": texts[i], "metadata": metadatas[i]}
+                for i, doc_id in enumerate(ids)
+            ])
+        return ids
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Marca documentos como removidos (tombstone) e compacta se necessário."""
+        with self._write_lock():
+            self.refresh()
+            ids = [doc_id for doc_id in ids if doc_id in self._docs]
+            if not ids:
+                return 0
+            self._append_events([{"op": "del", "id": doc_id} for doc_id in ids])
+            self.maybe_compact()
+        return len(ids)
+
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """Aplica patches de metadados ({doc_id: {campo: valor}}) sem tocar nos vetores."""
+        with self._write_lock():
+            self.refresh()
+            events = [{"op": "meta", "id": doc_id, "metadata": patch} for doc_id, patch in updates.items() if doc_id in self._docs]
+            if not events:
+                return 0
+            self._append_events(events)
+        return len(events)
+
+    # ============================================================
+    # COMPACTAÇÃO
+    # ============================================================
+
+    def maybe_compact(self) -> bool:
+        if self._dead_rows < self.compaction_min_rows:
+            return False
+        if self._rows_total and self._dead_rows / self._rows_total >= self.compaction_ratio:
+            with self._write_lock():
+                self._compact()
+            return True
+        return False
+
+    def compact(self):
+        """Reescreve apenas as linhas vivas em uma nova geração e troca o manifest atomicamente."""
+        with self._write_lock():
+            self._compact()
+
+    def _compact(self):
+        self.refresh()
+        new_gen = self.generation + 1
+        live = self.documents
+        logger.info(f"🗜️ Compactando Vector Store: {len(live)} vivos de {self._rows_total} linhas (geração {new_gen})")
+
+        vectors_tmp = self._vectors_path(new_gen) + ".tmp"
+        docs_tmp = self._docs_path(new_gen) + ".tmp"
+        with open(vectors_tmp, "wb") as f:
+            if live and self._mm is not None:
+                f.write(np.asarray(self._mm[[d["row"] for d in live]], dtype=DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(docs_tmp, "w", encoding="utf-8") as f:
+            for new_row, doc in enumerate(live):
+                event = {"op": "add", "id": doc["id"], "row": new_row, "text": doc["text"], "metadata": doc["metadata"]}
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(vectors_tmp, self._vectors_path(new_gen))
+        os.replace(docs_tmp, self._docs_path(new_gen))
+
+        old_gen = self.generation
+        self._mm = None
+        self.generation = new_gen
+        self._write_manifest()
+        for path in (self._vectors_path(old_gen), self._docs_path(old_gen)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.load()
+
+    # ============================================================
+    # MIGRAÇÃO DO FORMATO LEGADO
+    # ============================================================
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """Importa o antigo vector_data.json (uma única vez) e o renomeia para .migrated."""
+        if not os.path.exists(json_path) or len(self._docs) > 0:
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                content = json.load(f)
+            docs = content.get("documents", [])
+            raw_vectors = content.get("vectors", [])
+            count = min(len(docs), len(raw_vectors))
+            if count:
+                self.add(
+                    [d.get("text", "") for d in docs[:count]],
+                    raw_vectors[:count],
+                    [d.get("metadata", {}) for d in docs[:count]],
+                )
+            os.replace(json_path, json_path + ".migrated")
+            logger.info(f"📦 Migração do RAG legado concluída: {count} documentos importados de {json_path}")
+            return count
+        except Exception as e:
+            logger.error(f"❌ Falha na migração do RAG legado: {e}")
+            return 0
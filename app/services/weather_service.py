@@ -2,7 +2,7 @@
 OpenWeather Service - Previsão do tempo
 """
 
-import requests
+from app.services.http_client import get_http_client
 from app.config import settings
 from loguru import logger
 from typing import Optional, Dict, List
@@ -14,37 +14,49 @@ class WeatherService:
         """Inicializa o service"""
         self.api_key = settings.OPENWEATHER_API_KEY
         self.base_url = "https://api.openweathermap.org/data/2.5"
+        self.http = get_http_client()
         logger.info("✅ Weather Service inicializado")
     
+    def _current_weather_params(self, city: str, country_code: str = "") -> Dict:
+        location = f"{city},{country_code}" if country_code else city
+        return {
+            "q": location,
+            "appid": self.api_key,
+            "units": "metric",  # Celsius
+            "lang": "pt_br"
+        }
+
+    @staticmethod
+    def _parse_current_weather(response) -> Optional[Dict]:
+        """Resposta do /weather (requests ou httpx) -> dicionário do clima"""
+        data = response.json()
+        if response.status_code == 200:
+            return {
+                "temperature": round(data["main"]["temp"]),
+                "feels_like": round(data["main"]["feels_like"]),
+                "humidity": data["main"]["humidity"],
+                "description": data["weather"][0]["description"],
+                "wind_speed": data["wind"]["speed"],
+                "city": data["name"],
+                "country": data["sys"]["country"]
+            }
+        logger.warning(f"Erro ao buscar clima: {data.get('message')}")
+        return None
+
     def get_current_weather(self, city: str, country_code: str = "") -> Optional[Dict]:
         """Obtém clima atual de uma cidade"""
         try:
-            location = f"{city},{country_code}" if country_code else city
-            url = f"{self.base_url}/weather"
-            params = {
-                "q": location,
-                "appid": self.api_key,
-                "units": "metric",  # Celsius
-                "lang": "pt_br"
-            }
-            
-            response = requests.get(url, params=params, timeout=15)
-            data = response.json()
-            
-            if response.status_code == 200:
-                return {
-                    "temperature": round(data["main"]["temp"]),
-                    "feels_like": round(data["main"]["feels_like"]),
-                    "humidity": data["main"]["humidity"],
-                    "description": data["weather"][0]["description"],
-                    "wind_speed": data["wind"]["speed"],
-                    "city": data["name"],
-                    "country": data["sys"]["country"]
-                }
-            else:
-                logger.warning(f"Erro ao buscar clima: {data.get('message')}")
-                return None
-                
+            response = self.http.get("weather", f"{self.base_url}/weather", params=self._current_weather_params(city, country_code))
+            return self._parse_current_weather(response)
+        except Exception as e:
+            logger.error(f"Erro no WeatherService: {e}")
+            return None
+
+    async def aget_current_weather(self, city: str, country_code: str = "") -> Optional[Dict]:
+        """Versão async de get_current_weather (não ocupa thread enquanto espera a API)"""
+        try:
+            response = await self.http.aget("weather", f"{self.base_url}/weather", params=self._current_weather_params(city, country_code))
+            return self._parse_current_weather(response)
         except Exception as e:
             logger.error(f"Erro no WeatherService: {e}")
             return None
@@ -61,7 +73,7 @@ class WeatherService:
                 "cnt": days * 8  # API retorna previsões de 3h em 3h
             }
             
-            response = requests.get(url, params=params, timeout=15)
+            response = self.http.get("weather", url, params=params)
             data = response.json()
             
             if response.status_code == 200:
@@ -2,7 +2,7 @@
 WhatsApp Service - Envio de mensagens via WhatsApp Business API
 """
 
-import requests
+from app.services.http_client import get_http_client
 from app.config import settings
 from loguru import logger
 from typing import Optional
@@ -15,6 +15,7 @@ class WhatsAppService:
         self.token = settings.WHATSAPP_TOKEN
         self.phone_number_id = settings.WHATSAPP_PHONE_NUMBER_ID
         self.base_url = "https://graph.facebook.com/v18.0"
+        self.http = get_http_client()
         
         if not self.token or not self.phone_number_id:
             logger.warning("⚠️ WhatsApp não configurado (modo simulação)")
@@ -40,7 +41,7 @@ class WhatsAppService:
                 "text": {"body": message}
             }
             
-            response = requests.post(url, headers=headers, json=data, timeout=15)
+            response = self.http.post("whatsapp", url, headers=headers, json=data)
             
             if response.status_code == 200:
                 logger.info(f"✅ Mensagem enviada para {to}")
@@ -0,0 +1,277 @@
+"""
+Work Queue - Fila durável (SQLite) para as mensagens do webhook do WhatsApp.
+
+Substitui BackgroundTasks + asyncio.Lock em TTLCache: os jobs vivem na tabela
+`jobs` do IdempotencyService, então um restart não perde trabalho enfileirado.
+
+- FIFO por usuário: só o job mais antigo pendente de cada chat é entregue, e nunca
+  enquanto outro job do mesmo chat estiver PROCESSING com lease válido (vale também
+  entre processos/workers do uvicorn, pois a reserva é uma transação IMMEDIATE).
+- Pool global: WORK_QUEUE_WORKERS tarefas por processo limitam a concorrência contra o LLM.
+- Retentativas: falha volta para RECEIVED com backoff exponencial
+  (WORK_QUEUE_RETRY_BASE_SECONDS * 2^(tentativa-1)); após WORK_QUEUE_MAX_ATTEMPTS vira FAILED.
+  O handler do agente só levanta exceção se nada foi entregue ao usuário, e a retentativa
+  retoma o turno do checkpoint do LangGraph (a mensagem do usuário não é gravada de novo).
+- Visibilidade: a reserva grava `lease_until`; o worker renova o lease enquanto processa.
+  Se o processo morrer, o job volta a ser entregue quando o lease vencer.
+
+Caminho do job: RECEIVED -> PROCESSING -> SUCCEEDED | (RECEIVED de novo) | FAILED
+"""
+
+import time
+import json
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+from app.config import settings
+from app.services.idempotency_service import IdempotencyService, get_idempotency
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# Head de cada chat: job pendente visível sem job anterior (ou com lease válido) do mesmo chat
+_CLAIM_SQL = """
+    SELECT j.rowid, j.idempotency_key, j.chat_id, j.payload, j.attempts, j.enqueued_at, j.status
+    FROM jobs j
+    WHERE j.enqueued_at IS NOT NULL
+      AND ((j.status = 'RECEIVED' AND j.available_at <= :now)
+           OR (j.status = 'PROCESSING' AND j.lease_until <= :now))
+      AND NOT EXISTS (
+          SELECT 1 FROM jobs o
+          WHERE o.chat_id = j.chat_id AND o.enqueued_at IS NOT NULL AND o.rowid <> j.rowid
+            AND ((o.status = 'PROCESSING' AND o.lease_until > :now)
+                 OR (o.status IN ('RECEIVED', 'PROCESSING') AND o.rowid < j.rowid))
+      )
+    ORDER BY j.rowid
+    LIMIT 1
+"""
+
+
+class WorkQueue:
+    """Fila única por processo (db_path explícito cria instância independente, p/ testes)"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, db_path: Optional[str] = None):
+        if db_path is not None:
+            instance = super(WorkQueue, cls).__new__(cls)
+            instance._initialized = False
+            return instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(WorkQueue, cls).__new__(cls)
+                cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, db_path: Optional[str] = None):
+        if self._initialized:
+            return
+        # Mesma conexão WAL (e frente LRU) do registro de idempotência
+        self.store = IdempotencyService(db_path) if db_path else get_idempotency()
+        self.db_path = self.store.db_path
+        self.workers = settings.WORK_QUEUE_WORKERS
+        self.max_attempts = settings.WORK_QUEUE_MAX_ATTEMPTS
+        self.retry_base_seconds = settings.WORK_QUEUE_RETRY_BASE_SECONDS
+        self.visibility_timeout = settings.WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS
+        self.poll_seconds = settings.WORK_QUEUE_POLL_SECONDS
+        self._handler: Optional[Handler] = None
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._in_flight = 0
+        self._wait_ms = deque(maxlen=512)
+        self._run_ms = deque(maxlen=512)
+        self.stats = {"enqueued": 0, "duplicates": 0, "succeeded": 0, "retried": 0, "failed": 0, "redelivered": 0}
+        self._initialized = True
+
+    # ============================================================
+    # CICLO DE VIDA
+    # ============================================================
+
+    def start(self, handler: Handler):
+        """Sobe os workers no event loop atual (idempotente). Jobs pendentes de antes do restart são retomados."""
+        self._handler = handler
+        if self._tasks and not all(t.done() for t in self._tasks):
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"📬 WorkQueue iniciada ({self.workers} workers, SQLite: {self.db_path})")
+
+    async def stop(self):
+        """Cancela os workers; jobs em andamento voltam à fila quando o lease vencer."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ============================================================
+    # ENFILEIRAMENTO
+    # ============================================================
+
+    async def enqueue(self, key: str, chat_id: str, payload: Dict[str, Any], message_id: Optional[str] = None) -> bool:
+        """Persiste o job e acorda um worker. Retorna False se a chave já existia (reentrega do webhook)."""
+        # Reentrega recente: rejeitada pela LRU, sem thread nem disco
+        duplicate = self.store.seen(key) is not None
+        if not duplicate:
+            duplicate = await asyncio.to_thread(
+                self.store.register, key, chat_id, message_id, payload, time.time()
+            ) is not None
+        if duplicate:
+            self.stats["duplicates"] += 1
+            logger.warning(f"♻️ WorkQueue: job {key} já registrado, ignorando reentrega")
+            return False
+        self.stats["enqueued"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    # ============================================================
+    # RESERVA / CONCLUSÃO (SQLite)
+    # ============================================================
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self.store.transaction(immediate=True) as conn:
+            while True:
+                row = conn.execute(_CLAIM_SQL, {"now": now}).fetchone()
+                if row is None:
+                    return None
+                rowid, key, chat_id, payload, attempts, enqueued_at, status = row
+                if status != "PROCESSING" or attempts < self.max_attempts:
+                    break
+                # Lease vencido na última tentativa (processo morreu no meio): não reentrega
+                conn.execute(
+                    "UPDATE jobs SET status = 'FAILED', error_msg = 'lease expirado', lease_until = NULL, updated_at = ? WHERE rowid = ?",
+                    (datetime.now().isoformat(), rowid),
+                )
+                self.stats["failed"] += 1
+                logger.error(f"❌ WorkQueue: job {key} ({chat_id}) perdeu o lease na última tentativa, desistindo")
+            conn.execute(
+                "UPDATE jobs SET status = 'PROCESSING', attempts = ?, lease_until = ?, started_at = ?, updated_at = ? WHERE rowid = ?",
+                (attempts + 1, now + self.visibility_timeout, now, datetime.now().isoformat(), rowid),
+            )
+        if status == "PROCESSING":
+            self.stats["redelivered"] += 1
+            logger.warning(f"⏰ WorkQueue: lease do job {key} venceu, reentregando (tentativa {attempts + 1})")
+        return {
+            "key": key,
+            "chat_id": chat_id,
+            "payload": json.loads(payload) if payload else {},
+            "attempt": attempts + 1,
+            "wait_ms": (now - enqueued_at) * 1000,
+        }
+
+    def _extend_lease(self, key: str):
+        with self.store.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE idempotency_key = ? AND status = 'PROCESSING'",
+                (time.time() + self.visibility_timeout, key),
+            )
+
+    def _finish(self, key: str, status: str, error_msg: Optional[str] = None, retry_in: float = 0):
+        now = time.time()
+        with self.store.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error_msg = ?, available_at = ?, lease_until = NULL, updated_at = ? WHERE idempotency_key = ?",
+                (status, error_msg, now + retry_in, datetime.now().isoformat(), key),
+            )
+        self.store.remember(key, status)
+
+    # ============================================================
+    # WORKERS
+    # ============================================================
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ WorkQueue: erro ao reservar job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+            # Concluir um job pode liberar o próximo do mesmo chat para outro worker
+            self._wakeup.set()
+
+    async def _keep_lease(self, key: str):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            await asyncio.to_thread(self._extend_lease, key)
+
+    async def _process(self, job: Dict[str, Any]):
+        key = job["key"]
+        self._wait_ms.append(job["wait_ms"])
+        self._in_flight += 1
+        heartbeat = asyncio.create_task(self._keep_lease(key))
+        t0 = time.perf_counter()
+        try:
+            await self._handler(job["payload"])
+        except asyncio.CancelledError:
+            raise  # Shutdown: o job volta à fila quando o lease vencer
+        except Exception as e:
+            if job["attempt"] >= self.max_attempts:
+                self.stats["failed"] += 1
+                logger.error(f"❌ WorkQueue: job {key} ({job['chat_id']}) falhou {job['attempt']}x, desistindo: {e}")
+                await asyncio.to_thread(self._finish, key, "FAILED", str(e))
+            else:
+                delay = self.retry_base_seconds * 2 ** (job["attempt"] - 1)
+                self.stats["retried"] += 1
+                logger.warning(f"🔁 WorkQueue: job {key} falhou ({e}), nova tentativa em {delay:.0f}s")
+                await asyncio.to_thread(self._finish, key, "RECEIVED", str(e), delay)
+        else:
+            self.stats["succeeded"] += 1
+            await asyncio.to_thread(self._finish, key, "SUCCEEDED")
+        finally:
+            heartbeat.cancel()
+            self._in_flight -= 1
+            self._run_ms.append((time.perf_counter() - t0) * 1000)
+
+    # ============================================================
+    # MÉTRICAS
+    # ============================================================
+
+    @staticmethod
+    def _percentile(samples, q: float) -> Optional[float]:
+        ordered = sorted(samples)
+        return round(ordered[int(q * (len(ordered) - 1))], 1) if ordered else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        try:
+            with self.store.transaction() as conn:
+                depth, ready, oldest = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(available_at <= ?), 0), MIN(enqueued_at) FROM jobs "
+                    "WHERE enqueued_at IS NOT NULL AND status = 'RECEIVED'",
+                    (now,),
+                ).fetchone()
+                processing = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE enqueued_at IS NOT NULL AND status = 'PROCESSING'"
+                ).fetchone()[0]
+        except Exception as e:
+            logger.error(f"❌ WorkQueue: erro ao ler métricas: {e}")
+            depth = ready = processing = 0
+            oldest = None
+        return {
+            **self.stats,
+            "queue_depth": depth,
+            "ready": ready,
+            "processing": processing,
+            "in_flight_local": self._in_flight,
+            "oldest_wait_s": round(now - oldest, 1) if oldest else None,
+            "wait_p50_ms": self._percentile(self._wait_ms, 0.5),
+            "wait_p95_ms": self._percentile(self._wait_ms, 0.95),
+            "run_p95_ms": self._percentile(self._run_ms, 0.95),
+        }
+
+
+def get_work_queue() -> WorkQueue:
+    return WorkQueue()
@@ -0,0 +1,87 @@
+"""
+Teste de carga do TravelAgent: concorrência x latência p95, caminho síncrono vs async.
+
+- "thread": como era o webhook (asyncio.to_thread em volta de chat/graph.invoke);
+  cada conversa ocupa uma thread do executor padrão enquanto espera o LLM.
+- "async": achat/graph.ainvoke; a espera pelo LLM não ocupa thread.
+
+O LLM é simulado com latência fixa (sem rede nem custo); o resto do turno
+(roteador, montagem do prompt, checkpointer SQLite) é o código real.
+
+Uso:
+    python benchmark_agent_concurrency.py
+    python benchmark_agent_concurrency.py --levels 10 50 100 300 --llm-latency 1.5 --modes thread async
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("CHECKPOINT_DB_PATH", os.path.join(tempfile.mkdtemp(), "checkpoints.db"))
+
+from loguru import logger
+from langchain_core.messages import AIMessage
+from app.agents import orchestrator
+import app.services.rag_service as rag_service
+
+
+class SimulatedLLM:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, messages):
+        time.sleep(self.latency)
+        return AIMessage(content="ok")
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content="ok")
+
+
+async def run_level(agent, mode: str, concurrency: int):
+    latencies = []
+
+    async def conversation():
+        thread_id = f"bench-{uuid.uuid4().hex}"
+        t0 = time.perf_counter()
+        if mode == "async":
+            await agent.achat("oi", thread_id=thread_id)
+        else:
+            await asyncio.to_thread(agent.chat, "oi", thread_id)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        orchestrator.get_checkpointer().delete_thread(thread_id)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(conversation() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), concurrency / wall
+
+
+def run(levels, llm_latency, modes):
+    llm = SimulatedLLM(llm_latency)
+    orchestrator.get_llm = lambda *args, **kwargs: llm
+    rag_service.get_rag_service = lambda: type("SemDocumentos", (), {"documents": []})()
+    agent = orchestrator.get_travel_agent()
+    logger.disable("app")
+
+    print(f"LLM simulado: {llm_latency * 1000:.0f} ms | threads do executor padrão: {min(32, (os.cpu_count() or 1) + 4)}")
+    print(f"{'modo':<7} | {'conversas':>9} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | turnos/s")
+    print("-" * 55)
+    for mode in modes:
+        for concurrency in levels:
+            p50, p95, throughput = asyncio.run(run_level(agent, mode, concurrency))
+            print(f"{mode:<7} | {concurrency:>9} | {p50:>9.0f} | {p95:>9.0f} | {throughput:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga concorrente no TravelAgent (sync em threads vs async)")
+    parser.add_argument("--levels", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Latência simulada do LLM (s)")
+    parser.add_argument("--modes", nargs="+", default=["thread", "async"], choices=["thread", "async"])
+    args = parser.parse_args()
+    run(args.levels, args.llm_latency, args.modes)
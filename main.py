@@ -23,7 +23,6 @@ if not os.path.exists("./logs"):
 logger.add("logs/app.log", rotation="1 day", retention="7 days")
 
 # Lazy instances
-_agent = None
 _n8n_service = None
 _ingestor = None
 _diagnostic_run = False
@@ -42,11 +41,15 @@ async def lifespan(app: FastAPI):
     try:
         from app.services.scheduler_service import SchedulerService
         app.state.scheduler = SchedulerService()
-        app.state.scheduler.start()
-        logger.info("📅 [SCHEDULER] Agendador ativado com sucesso.")
+        if app.state.scheduler.start():
+            logger.info("📅 [SCHEDULER] Agendador ativado com sucesso.")
     except Exception as e:
         logger.error(f"❌ [SCHEDULER] Falha ao iniciar: {e}")
     
+    # 3. Fila durável do webhook: retoma jobs pendentes de antes do restart
+    from app.services.work_queue import get_work_queue
+    get_work_queue().start(routes.run_agent_event)
+    
     logger.info(f"🌍 [ENVIRONMENT] Modo: {settings.ENVIRONMENT} | Port: {settings.PORT} | Name: {__name__}")
     
     # --- [WATCHDOG / DIAGNOSTICO DE INICIALIZACAO] ---
@@ -72,6 +75,13 @@ async def lifespan(app: FastAPI):
     yield
     
     logger.info("🛑 [SHUTDOWN] Encerrando TravelCompanion AI...")
+    from app.services.location_stream import get_location_stream
+    from app.services.http_client import get_http_client
+    from app.parsers.pdf_extraction import shutdown_ocr_pool
+    await get_work_queue().stop()
+    await get_location_stream().stop()
+    await get_http_client().aclose()
+    shutdown_ocr_pool()
 
 # Inicialização do App FastAPI
 app = FastAPI(
@@ -170,11 +180,9 @@ async def dashboard(request: Request, user_id: str = None):
             clean_uid = user_svc.normalize_phone(user_id)
             active_trip_id = user_svc.get_active_trip(clean_uid)
             
-            if active_trip_id:
-                for trip in trip_svc.trips:
-                    if trip["id"] == active_trip_id:
-                        destination_name = trip.get("destination", active_trip_id)
-                        break
+            trip = trip_svc.get_trip(active_trip_id) if active_trip_id else None
+            if trip:
+                destination_name = trip.get("destination", active_trip_id)
         except Exception as e:
             logger.error(f"Erro ao buscar dados para o dashboard: {e}")
 
@@ -203,11 +211,8 @@ async def test_upload_page(request: Request):
 
 # Dependências Globais / Inicialização Tardia
 def get_agent():
-    global _agent
-    if _agent is None:
-        from app.agents.orchestrator import TravelAgent
-        _agent = TravelAgent()
-    return _agent
+    from app.agents.orchestrator import get_travel_agent
+    return get_travel_agent()
 
 def get_n8n():
     global _n8n_service
@@ -232,5 +237,5 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=target_port,
         reload=settings.DEBUG,
-        workers=1
+        workers=1 if settings.DEBUG else settings.WEB_WORKERS
     )
@@ -0,0 +1,24 @@
+"""
+Isolamento dos testes: nenhum SQLite/arquivo da suíte cai em ./data do repositório.
+"""
+
+import os
+import tempfile
+import pytest
+
+# Antes de qualquer import de app.config: singletons (trips, idempotência, caches) usam este diretório
+_DATA_DIR = tempfile.mkdtemp(prefix="travel-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["CHROMA_DB_PATH"] = os.path.join(_DATA_DIR, "chroma_db")
+os.environ["CHECKPOINT_DB_PATH"] = os.path.join(_DATA_DIR, "checkpoints.db")
+os.environ["SCHEDULER_LOCK_PATH"] = os.path.join(_DATA_DIR, "scheduler.lock")
+
+
+@pytest.fixture
+def agent_runtime(tmp_path, monkeypatch):
+    """Checkpointer SQLite próprio do teste; grafo e agente compartilhados são recriados em cima dele."""
+    from app.agents import orchestrator
+    monkeypatch.setattr(orchestrator.settings, "CHECKPOINT_DB_PATH", str(tmp_path / "checkpoints.db"))
+    for name in ("_checkpointer", "_graph", "_agent"):
+        monkeypatch.setattr(orchestrator, name, None)
+    yield orchestrator
@@ -0,0 +1,147 @@
+"""
+Testes do runtime do agente (grafo, clientes LLM e checkpointer compartilhados)
+"""
+
+import asyncio
+import uuid
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from app.agents import orchestrator
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, messages):
+        self.calls.append(messages)
+        return AIMessage(content=f"resposta {len(self.calls)}")
+
+    async def ainvoke(self, messages):
+        self.calls.append(messages)
+        await asyncio.sleep(0.2)  # Latência da OpenAI sem ocupar thread
+        return AIMessage(content=f"resposta {len(self.calls)}")
+
+
+class GatedLLM(FakeLLM):
+    """ainvoke só responde quando `expected` chamadas estão em andamento ao mesmo tempo (ou após 5s)."""
+
+    def __init__(self, expected):
+        super().__init__()
+        self.expected, self.in_flight, self.peak = expected, 0, 0
+        self.all_in_flight = asyncio.Event()
+
+    async def ainvoke(self, messages):
+        self.calls.append(messages)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        if self.in_flight >= self.expected:
+            self.all_in_flight.set()
+        try:
+            await asyncio.wait_for(self.all_in_flight.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+        self.in_flight -= 1
+        return AIMessage(content=f"resposta {len(self.calls)}")
+
+
+def test_graph_is_compiled_once_per_process():
+    first = orchestrator.TravelAgent()
+    compiles = orchestrator.get_agent_runtime_stats()["graph_compiles"]
+    second = orchestrator.TravelAgent()
+    assert first.graph is second.graph is orchestrator.get_agent_graph()
+    assert orchestrator.get_agent_runtime_stats()["graph_compiles"] == compiles
+    assert orchestrator.get_travel_agent() is orchestrator.get_travel_agent()
+
+
+def test_llm_clients_are_cached_per_model_and_temperature():
+    a = orchestrator.get_llm("gpt-4o-mini", temperature=0.1)
+    assert orchestrator.get_llm("gpt-4o-mini", 0.1) is a
+    assert orchestrator.get_llm("gpt-4o-mini", temperature=0.7) is not a
+
+
+def test_turns_share_checkpointer_and_are_measured(agent_runtime, monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(orchestrator, "get_llm", lambda *args, **kwargs: fake)
+    monkeypatch.setattr("app.services.rag_service.get_rag_service", lambda: (_ for _ in ()).throw(RuntimeError("sem RAG")))
+    turns = orchestrator.get_agent_runtime_stats()["turns"]
+    thread_id = f"runtime-test-{uuid.uuid4().hex}"
+
+    assert orchestrator.TravelAgent().chat("oi", thread_id=thread_id) == "resposta 1"
+    # Outra instância enxerga o histórico da mesma thread (checkpointer compartilhado)
+    assert orchestrator.TravelAgent().chat("tudo bem?", thread_id=thread_id) == "resposta 2"
+    assert len(fake.calls[1]) == 4  # sistema + 2 humanas + 1 resposta anterior
+
+    stats = orchestrator.get_agent_runtime_stats()
+    assert stats["turns"] == turns + 2
+    assert stats["turn_ms"]["samples"] >= 2 and stats["prompt_prep_ms"]["samples"] >= 2
+
+
+def test_async_turns_share_history_and_do_not_pin_threads(agent_runtime, monkeypatch):
+    fake = GatedLLM(expected=40)
+    monkeypatch.setattr(orchestrator, "get_llm", lambda *args, **kwargs: fake)
+    monkeypatch.setattr("app.services.rag_service.get_rag_service", lambda: (_ for _ in ()).throw(RuntimeError("sem RAG")))
+    agent = orchestrator.TravelAgent()
+    thread_ids = [f"async-test-{uuid.uuid4().hex}" for _ in range(40)]
+
+    async def main():
+        return await asyncio.gather(*(agent.achat("oi", thread_id=t) for t in thread_ids))
+
+    replies = asyncio.run(main())
+    assert all(r.startswith("resposta") for r in replies)
+    # As 40 esperas pelo LLM ficam abertas juntas (mais que as threads do executor padrão)
+    assert fake.peak == 40
+    # O caminho síncrono enxerga o histórico gravado pelo assíncrono
+    agent.chat("tudo bem?", thread_id=thread_ids[0])
+    assert len(fake.calls[-1]) == 4
+
+
+def test_retry_resumes_interrupted_turn_without_repeating_the_user_message(agent_runtime, monkeypatch):
+    class FlakyLLM(FakeLLM):
+        async def ainvoke(self, messages):
+            self.calls.append(messages)
+            if len(self.calls) == 1:
+                raise RuntimeError("OpenAI 500")
+            return AIMessage(content="resposta após retentativa")
+
+    fake = FlakyLLM()
+    monkeypatch.setattr(orchestrator, "get_llm", lambda *args, **kwargs: fake)
+    monkeypatch.setattr("app.services.rag_service.get_rag_service", lambda: (_ for _ in ()).throw(RuntimeError("sem RAG")))
+    agent = orchestrator.TravelAgent()
+    thread_id = f"resume-test-{uuid.uuid4().hex}"
+
+    try:
+        asyncio.run(agent.achat("reserva o hotel", thread_id=thread_id))
+    except RuntimeError:
+        pass
+    assert asyncio.run(agent.achat("reserva o hotel", thread_id=thread_id)) == "resposta após retentativa"
+    messages = agent.graph.get_state({"configurable": {"thread_id": thread_id}}).values["messages"]
+    assert sum(isinstance(m, HumanMessage) for m in messages) == 1
+
+
+def test_run_event_does_not_ask_for_retry_after_delivering_output(monkeypatch):
+    sent = []
+
+    class FakeEvolution:
+        async def send_text(self, number, text):
+            sent.append(text)
+
+    async def fails_after_first_paragraph(self, user_input, thread_id, send):
+        await send("Primeiro parágrafo do roteiro.")
+        raise RuntimeError("revisão caiu")
+
+    async def fails_before_output(self, user_input, thread_id, send):
+        raise RuntimeError("OpenAI fora do ar")
+
+    monkeypatch.setattr("app.services.evolution_service.EvolutionService", FakeEvolution)
+    monkeypatch.setattr(orchestrator.settings, "WHATSAPP_STREAMING_ENABLED", True)
+    event = {"user_id": "5511999990000", "payload": {"message": {"conversation": "monta um roteiro"}}}
+    agent = object.__new__(orchestrator.TravelAgent)
+
+    monkeypatch.setattr(orchestrator.TravelAgent, "astream_chat", fails_after_first_paragraph)
+    asyncio.run(agent.run_event(event))  # Não sobe: a fila não reenvia o parágrafo
+    assert sent == ["Primeiro parágrafo do roteiro."]
+
+    monkeypatch.setattr(orchestrator.TravelAgent, "astream_chat", fails_before_output)
+    with pytest.raises(RuntimeError):
+        asyncio.run(agent.run_event(event))
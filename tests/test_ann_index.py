@@ -0,0 +1,35 @@
+"""
+Testes dos backends de índice vetorial
+"""
+
+import numpy as np
+from app.services.ann_index import FlatIndex, IVFIndex, get_index_backend, top_k
+from app.services.vector_store import VectorStore
+
+
+def _clustered(n=3000, dim=16, clusters=30, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    data = centers[rng.integers(0, clusters, size=n)] + 0.1 * rng.normal(size=(n, dim))
+    return VectorStore.normalize(data)
+
+
+def test_top_k_orders_descending():
+    scores = np.array([0.1, 0.9, 0.5, 0.7])
+    assert top_k(scores, 2).tolist() == [1, 3]
+    assert top_k(scores, 10).tolist() == [1, 3, 2, 0]
+
+
+def test_ivf_recall_against_flat():
+    vectors = _clustered()
+    queries = vectors[:20] + 0.01
+    flat, ivf = FlatIndex(), IVFIndex(nprobe=8)
+    exact = flat.search(flat.build(vectors), VectorStore.normalize(queries), 10)
+    approx = ivf.search(ivf.build(vectors), VectorStore.normalize(queries), 10)
+    recall = np.mean([len(set(a[0]) & set(e[0])) / 10 for a, e in zip(approx, exact)])
+    assert recall >= 0.9
+
+
+def test_unknown_backend_falls_back_to_flat():
+    assert isinstance(get_index_backend("hnsw-qualquer"), FlatIndex)
+    assert get_index_backend("sqlite-vec").name in ("sqlite-vec", "flat")
@@ -0,0 +1,78 @@
+"""
+Testes do checkpointer SQLite (persistência, retenção por thread e compactação)
+"""
+
+import asyncio
+import operator
+from typing import Annotated, TypedDict
+from langgraph.graph import StateGraph, END
+from app.services.checkpoint_store import SqliteCheckpointer, create_checkpointer
+
+
+class CounterState(TypedDict):
+    items: Annotated[list, operator.add]
+
+
+def build_graph(checkpointer):
+    workflow = StateGraph(CounterState)
+    workflow.add_node("step", lambda state: {"items": [len(state["items"])]})
+    workflow.set_entry_point("step")
+    workflow.add_edge("step", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_state_survives_a_new_process_and_is_isolated_per_thread(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    graph = build_graph(SqliteCheckpointer(db_path=path))
+    graph.invoke({"items": ["a"]}, config("ana"))
+    graph.invoke({"items": ["b"]}, config("ana"))
+    graph.invoke({"items": ["x"]}, config("bia"))
+
+    # "Outro worker": nova conexão no mesmo arquivo
+    restored = build_graph(SqliteCheckpointer(db_path=path))
+    assert restored.get_state(config("ana")).values["items"] == ["a", 1, "b", 3]
+    assert restored.get_state(config("bia")).values["items"] == ["x", 1]
+    assert restored.get_state(config("caio")).values == {}
+
+
+def test_retention_keeps_only_latest_checkpoints_per_thread(tmp_path):
+    saver = SqliteCheckpointer(db_path=str(tmp_path / "checkpoints.db"), keep_per_thread=3)
+    graph = build_graph(saver)
+    for i in range(10):
+        graph.invoke({"items": [i]}, config("ana"))
+    graph.invoke({"items": ["z"]}, config("bia"))
+
+    history = list(saver.list(config("ana")))
+    assert len(history) == 3
+    assert graph.get_state(config("ana")).values["items"][-2:] == [9, 19]
+    assert len(list(saver.list(config("bia")))) == 3  # entrada, início e fim do passo
+    assert saver.get_stats()["retention_deleted"] > 0
+
+
+def test_prune_removes_idle_threads(tmp_path):
+    saver = SqliteCheckpointer(db_path=str(tmp_path / "checkpoints.db"))
+    graph = build_graph(saver)
+    graph.invoke({"items": [1]}, config("antiga"))
+    saver._conn.execute("UPDATE checkpoints SET updated_at = 0 WHERE thread_id = 'antiga'")
+    graph.invoke({"items": [1]}, config("ativa"))
+
+    assert saver.prune(max_idle_days=1) == 1
+    assert saver.get_stats()["threads"] == 1
+    assert graph.get_state(config("antiga")).values == {}
+
+
+def test_async_graph_uses_the_same_store(tmp_path):
+    saver = SqliteCheckpointer(db_path=str(tmp_path / "checkpoints.db"))
+    graph = build_graph(saver)
+    asyncio.run(graph.ainvoke({"items": ["a"]}, config("ana")))
+    assert graph.get_state(config("ana")).values["items"] == ["a", 1]
+
+
+def test_factory_accepts_memory_and_dotted_backends():
+    assert type(create_checkpointer("memory")).__name__ == "InMemorySaver"
+    saver = create_checkpointer("langgraph.checkpoint.memory:InMemorySaver")
+    assert type(saver).__name__ == "InMemorySaver"
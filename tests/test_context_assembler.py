@@ -0,0 +1,70 @@
+"""
+Testes da montagem do prompt por orçamento de tokens
+"""
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from app.agents.context_assembler import assemble_context, count_tokens
+from app.config import settings
+
+MODULES = [
+    {"name": "roteiros", "keywords": ["roteiro"], "text": "MÓDULO ROTEIRO " * 200},
+    {"name": "crise", "keywords": ["cancel"], "text": "MÓDULO CRISE " * 200},
+]
+
+
+def hit(score, text):
+    return {"id": text, "score": score, "text": text, "metadata": {}}
+
+
+def system_text(result):
+    return result["messages"][0].content
+
+
+def test_greeting_gets_only_the_core_prompt():
+    result = assemble_context("NÚCLEO", "\nContexto", [HumanMessage(content="oi")], "oi", modules=MODULES,
+                              rag_hits=[hit(0.05, "voucher irrelevante")])
+    assert "MÓDULO" not in system_text(result)
+    assert "voucher" not in system_text(result)
+    assert result["breakdown"]["total"] < 50
+
+
+def test_relevant_module_and_best_chunks_fit_the_budget(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_RAG_MAX_TOKENS", count_tokens("trecho bom " * 50) + 10)
+    hits = [hit(0.3, "trecho médio " * 50), hit(0.9, "trecho bom " * 50), hit(0.2, "curto")]
+    result = assemble_context("NÚCLEO", "", [HumanMessage(content="monta um roteiro pra Roma")],
+                              "monta um roteiro pra Roma", modules=MODULES, rag_hits=hits)
+    text = system_text(result)
+    assert "MÓDULO ROTEIRO" in text and "MÓDULO CRISE" not in text
+    # O de maior score entra; o médio não cabe mais; o curto ainda cabe na sobra
+    assert "trecho bom" in text and "trecho médio" not in text and "curto" in text
+    assert result["breakdown"]["module_names"] == ["roteiros"]
+
+
+def test_history_keeps_newest_messages_and_compacts_old_ones(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_HISTORY_MAX_TOKENS", 400)
+    monkeypatch.setattr(settings, "CONTEXT_OLD_MESSAGE_MAX_TOKENS", 50)
+    history = []
+    for i in range(30):
+        history += [HumanMessage(content=f"pergunta {i}"), AIMessage(content=f"resposta {i} " + "detalhe " * 300)]
+    current = [HumanMessage(content="e agora?"), AIMessage(content="", tool_calls=[{"name": "t", "args": {}, "id": "c1"}]),
+               ToolMessage(content="saída enorme " * 500, tool_call_id="c1")]
+    result = assemble_context("NÚCLEO", "", history + current, "e agora?")
+
+    messages = result["messages"][1:]
+    assert messages[-3:] == current  # turno atual intacto, inclusive a saída da tool
+    kept = messages[:-3]
+    assert 0 < len(kept) < len(history)
+    assert kept[-1].content.startswith("resposta 29") and "[... resumido ...]" in kept[-1].content
+    assert result["breakdown"]["history"] <= 400
+
+
+def test_history_never_starts_with_an_orphan_tool_result(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_HISTORY_MAX_TOKENS", 60)
+    history = [
+        HumanMessage(content="voo?"),
+        AIMessage(content="", tool_calls=[{"name": "get_flight_status", "args": {"n": "LA8084" * 20}, "id": "c1"}]),
+        ToolMessage(content="no horário", tool_call_id="c1"),
+        AIMessage(content="Seu voo está no horário."),
+    ]
+    result = assemble_context("NÚCLEO", "", history + [HumanMessage(content="obrigado")], "obrigado")
+    assert not isinstance(result["messages"][1], ToolMessage)
@@ -0,0 +1,50 @@
+"""
+Testes do cache persistente de embeddings
+"""
+
+from app.services.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+
+class FakeEmbeddings:
+    model = "fake-model"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 1.0, 0.0]
+
+
+def test_repeated_text_never_hits_api(tmp_path):
+    db = str(tmp_path / "emb.db")
+    fake = FakeEmbeddings()
+    cached = CachedEmbeddings(fake, EmbeddingCache(db_path=db, max_entries=100, ttl_days=30, memory_entries=10))
+
+    first = cached.embed_documents(["hotel  em Lisboa", "voo", "voo"])
+    assert fake.calls == [["hotel  em Lisboa", "voo"]]  # duplicata no lote vai uma vez só
+    assert cached.embed_query("hotel em Lisboa") == first[0]  # espaços normalizados
+    assert len(fake.calls) == 1
+
+    # Nova instância (novo processo) lê do disco
+    other = CachedEmbeddings(fake, EmbeddingCache(db_path=db, max_entries=100, ttl_days=30, memory_entries=10))
+    assert other.embed_documents(["voo", "carro"])[0] == first[1]
+    assert fake.calls[-1] == ["carro"]
+    stats = other.cache.get_stats()
+    assert stats["disk_hits"] == 1 and stats["misses"] == 1
+
+
+def test_ttl_and_lru_eviction(tmp_path):
+    cache = EmbeddingCache(db_path=str(tmp_path / "emb.db"), max_entries=2, ttl_days=0, memory_entries=1)
+    for i in range(3):
+        cache.put_many("m", {f"k{i}": [float(i)]})
+    cache._prune()
+    assert cache.get_stats()["evicted"] == 1
+
+    cache.ttl_seconds = 1e-9
+    cache._memory.clear()
+    assert cache.get_many(["k2"]) == {}
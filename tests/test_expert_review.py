@@ -0,0 +1,146 @@
+"""
+Testes da revisão por consenso (revisores em paralelo, prazo global e retorno especulativo)
+"""
+
+import time
+import asyncio
+import threading
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from app.agents import orchestrator
+from app.config import settings
+
+ANSWER = "Seu roteiro em Roma: Coliseu pela manhã, Fórum à tarde e jantar no Trastevere. " * 3
+
+
+def pause(delay):
+    """Número = segundos de latência; senão um objeto com `wait()` (Barrier/Event) controlado pelo teste."""
+    if isinstance(delay, (int, float)):
+        time.sleep(delay)
+    else:
+        delay.wait()
+
+
+class FakeGemini:
+    def __init__(self, delay, text="Cuidado: o Coliseu exige reserva de horário."):
+        self.delay, self.text = delay, text
+
+    def get_second_opinion(self, answer, query):
+        pause(self.delay)
+        return self.text
+
+    verify_navigation_and_arrival = get_second_opinion
+
+
+class FakeClaude:
+    def __init__(self, delay, text="Versão refinada do roteiro."):
+        self.delay, self.text = delay, text
+
+    def get_refined_answer(self, query, answer, gemini_opinion=""):
+        pause(self.delay)
+        return self.text
+
+
+@pytest.fixture
+def reviewers(monkeypatch):
+    monkeypatch.setattr(settings, "GOOGLE_GEMINI_API_KEY", "g")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "a")
+    monkeypatch.setattr(settings, "EXPERT_REVIEW_FOLLOWUP", False)
+    services = {}
+    monkeypatch.setattr(orchestrator, "_review_services", services)
+    return services
+
+
+def review(config=None):
+    state = {"messages": [HumanMessage(content="monta um roteiro em Roma"), AIMessage(content=ANSWER)]}
+    return orchestrator.expert_consensus_review(state, config)
+
+
+def test_reviewers_run_concurrently_and_gemini_block_is_attached_to_claude(reviewers, monkeypatch):
+    monkeypatch.setattr(settings, "EXPERT_REVIEW_DEADLINE_SECONDS", 5)
+    # Cada revisor só termina quando o outro também está rodando: em série, a barreira quebraria
+    both_running = threading.Barrier(2, timeout=3)
+    reviewers.update(gemini=FakeGemini(both_running), claude=FakeClaude(both_running))
+    before = orchestrator.get_agent_runtime_stats()
+
+    out = review()
+    assert not both_running.broken
+    content = out["messages"][0].content
+    assert content.startswith("Versão refinada do roteiro.")
+    assert content.endswith("Cuidado: o Coliseu exige reserva de horário.")  # O Gemini não é descartado
+
+    stats = orchestrator.get_agent_runtime_stats()
+    assert stats["reviews_changed"] == before["reviews_changed"] + 1
+    assert stats["review_ms:gemini"]["samples"] >= 1 and stats["review_ms:claude"]["samples"] >= 1
+    assert stats["review_change_rate"] is not None
+
+
+def test_slow_reviewer_misses_deadline_and_answer_is_not_held(reviewers, monkeypatch):
+    monkeypatch.setattr(settings, "EXPERT_REVIEW_DEADLINE_SECONDS", 1)
+    claude_stuck = threading.Event()
+    reviewers.update(gemini=FakeGemini(0), claude=FakeClaude(claude_stuck))
+    before = orchestrator.get_agent_runtime_stats()
+
+    out = review()  # Retorna no prazo mesmo com o Claude ainda preso
+    claude_stuck.set()
+    assert out["messages"][0].content.startswith(ANSWER)
+    assert "reserva de horário" in out["messages"][0].content
+    stats = orchestrator.get_agent_runtime_stats()
+    assert stats["reviews_early_return"] == before["reviews_early_return"] + 1
+    assert stats["review_missed_deadline:claude"] >= 1
+
+
+def wait_for(items, timeout=2):
+    deadline = time.time() + timeout
+    while not items and time.time() < deadline:
+        time.sleep(0.02)
+
+
+def test_late_gemini_block_is_pushed_as_follow_up(reviewers, monkeypatch):
+    monkeypatch.setattr(settings, "EXPERT_REVIEW_DEADLINE_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "EXPERT_REVIEW_FOLLOWUP", True)
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", None)
+    reviewers.update(gemini=FakeGemini(0.2))
+    sent = []
+
+    class FakeN8n:
+        def enviar_resposta_usuario(self, number, text, bypass_firewall=False):
+            sent.append((number, text))
+
+    monkeypatch.setattr(orchestrator, "N8nService", FakeN8n)
+    assert review({"configurable": {"thread_id": "5511999990000"}})["messages"] == []  # nada mudou a tempo
+    wait_for(sent)
+    assert sent and sent[0][0] == "5511999990000" and "reserva de horário" in sent[0][1]
+
+
+def test_late_follow_up_uses_the_app_event_loop_and_skips_claude_rewrites(reviewers, monkeypatch):
+    monkeypatch.setattr(settings, "EXPERT_REVIEW_DEADLINE_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "EXPERT_REVIEW_FOLLOWUP", True)
+    reviewers.update(gemini=FakeGemini(0.2), claude=FakeClaude(0.2))
+    sent, loops = [], []
+
+    class FakeEvolution:
+        async def send_text(self, number, text):
+            loops.append(asyncio.get_running_loop())
+            sent.append(text)
+
+    monkeypatch.setattr("app.services.evolution_service.EvolutionService", FakeEvolution)
+    state = {"messages": [HumanMessage(content="monta um roteiro em Roma"), AIMessage(content=ANSWER)]}
+
+    async def main():
+        out = await orchestrator.aexpert_consensus_review(state, {"configurable": {"thread_id": "5511999990000"}})
+        while not sent:
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.3)  # Tempo de sobra para uma (indevida) reescrita atrasada do Claude
+        return out, asyncio.get_running_loop()
+
+    out, app_loop = asyncio.run(asyncio.wait_for(main(), timeout=3))
+    assert out["messages"] == []
+    assert len(sent) == 1 and "reserva de horário" in sent[0] and "Versão refinada" not in sent[0]
+    assert loops == [app_loop]
+
+
+def test_unchanged_review_adds_no_message(reviewers, monkeypatch):
+    monkeypatch.setattr(settings, "GOOGLE_GEMINI_API_KEY", None)
+    reviewers.update(claude=FakeClaude(0.0, text=ANSWER))
+    assert review()["messages"] == []
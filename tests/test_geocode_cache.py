@@ -0,0 +1,75 @@
+"""
+Testes do cache persistente de geocoding
+"""
+
+from app.services.geocode_cache import GeocodeCache, MISS
+from app.services.maps_service import GoogleMapsService
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class FakeHttp:
+    def __init__(self, status="OK"):
+        self.status = status
+        self.calls = []
+
+    def get(self, integration, url, params=None, **kwargs):
+        self.calls.append(params)
+        if self.status != "OK":
+            return FakeResponse({"status": self.status, "results": []})
+        return FakeResponse({
+            "status": "OK",
+            "results": [{"geometry": {"location": {"lat": -23.55, "lng": -46.63}}, "formatted_address": "São Paulo, SP, Brasil"}],
+        })
+
+
+def make_service(tmp_path, status="OK"):
+    svc = GoogleMapsService(cache=GeocodeCache(db_path=str(tmp_path / "geo.db")))
+    svc.http = FakeHttp(status)
+    return svc
+
+
+def test_normalized_addresses_share_one_lookup(tmp_path):
+    svc = make_service(tmp_path)
+    first = svc.geocode("São Paulo, SP")
+    assert svc.geocode("  sao paulo ,sp ") == first
+    assert len(svc.http.calls) == 1
+
+    # Persistente: nova instância do cache no mesmo arquivo não chama a API
+    again = make_service(tmp_path)
+    assert again.geocode("SÃO PAULO, SP") == first
+    assert again.http.calls == []
+
+
+def test_zero_results_is_negatively_cached_but_errors_are_not(tmp_path):
+    svc = make_service(tmp_path, status="ZERO_RESULTS")
+    assert svc.geocode("Rua que não existe 999") is None
+    assert svc.geocode("rua que nao existe 999") is None
+    assert len(svc.http.calls) == 1
+
+    svc.http = FakeHttp(status="OVER_QUERY_LIMIT")
+    assert svc.geocode("Lisboa") is None
+    assert svc.geocode("Lisboa") is None
+    assert len(svc.http.calls) == 2  # cota estourada não é "não encontrado"
+
+
+def test_reverse_geocode_uses_rounded_cells(tmp_path):
+    svc = make_service(tmp_path)
+    assert svc.reverse_geocode(-23.550012, -46.633309) == "São Paulo, SP, Brasil"
+    assert svc.reverse_geocode(-23.550049, -46.633291) == "São Paulo, SP, Brasil"  # mesma célula (~11 m)
+    assert len(svc.http.calls) == 1
+
+
+def test_expired_entries_miss_and_are_pruned(tmp_path):
+    cache = GeocodeCache(db_path=str(tmp_path / "geo.db"))
+    cache.ttl_seconds = -1
+    cache.put("fwd:x", {"lat": 1, "lng": 2})
+    assert cache.get("fwd:x") is MISS
+    assert cache.prune() == 1
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,72 @@
+"""
+Testes do registro de cercas (índice em grade + histerese por usuário)
+"""
+
+import numpy as np
+from app.services.geofence_service import GeofenceRegistry, haversine_km, get_geofence_registry
+
+MAGIC_KINGDOM = (28.4177, -81.5812)
+
+
+def offset_km(lat, lng, north_km=0.0, east_km=0.0):
+    return lat + north_km / 111.32, lng + east_km / (111.32 * np.cos(np.radians(lat)))
+
+
+def test_haversine_matches_known_distance():
+    # Paris -> Londres ~ 344 km
+    d = haversine_km(48.8566, 2.3522, np.array([51.5074]), np.array([-0.1278]))[0]
+    assert 340 < d < 348
+
+
+def test_containing_only_scans_local_cell_and_sorts_by_distance():
+    registry = GeofenceRegistry(grid_degrees=0.05)
+    rng = np.random.default_rng(0)
+    for i, (lat, lng) in enumerate(rng.uniform([-60, -180], [60, 180], size=(5000, 2))):
+        registry.add_fence(f"poi:{i}", lat, lng, radius_km=0.3)
+    registry.add_fence("park:mk", *MAGIC_KINGDOM, radius_km=0.5, exit_radius_km=1.0, kind="park")
+    registry.add_fence("hotel", *offset_km(*MAGIC_KINGDOM, east_km=0.2), radius_km=0.4, kind="hotel")
+
+    hits = registry.containing(*offset_km(*MAGIC_KINGDOM, east_km=0.15))
+    assert [f["id"] for f in hits] == ["hotel", "park:mk"]
+    assert registry.containing(0.0, 0.0) == []
+
+
+def test_enter_exit_hysteresis_per_user():
+    registry = GeofenceRegistry(grid_degrees=0.05)
+    registry.add_fence("park:mk", *MAGIC_KINGDOM, radius_km=0.5, exit_radius_km=1.0, kind="park")
+
+    out = registry.update("ana", *offset_km(*MAGIC_KINGDOM, north_km=0.7))
+    assert out["inside"] == [] and out["entered"] == []
+
+    out = registry.update("ana", *offset_km(*MAGIC_KINGDOM, north_km=0.3))
+    assert [f["id"] for f in out["entered"]] == ["park:mk"]
+
+    # Entre 0.5 e 1.0 km continua dentro (sem oscilação na borda)
+    out = registry.update("ana", *offset_km(*MAGIC_KINGDOM, north_km=0.8))
+    assert [f["id"] for f in out["inside"]] == ["park:mk"] and out["entered"] == [] and out["exited"] == []
+
+    # Outro usuário no mesmo ponto ainda não entrou
+    assert registry.update("bia", *offset_km(*MAGIC_KINGDOM, north_km=0.8))["inside"] == []
+
+    out = registry.update("ana", *offset_km(*MAGIC_KINGDOM, north_km=1.2))
+    assert [f["id"] for f in out["exited"]] == ["park:mk"] and out["inside"] == []
+
+
+def test_seed_restores_state_and_owner_fences_are_private():
+    registry = GeofenceRegistry(grid_degrees=0.05)
+    registry.add_fence("park:mk", *MAGIC_KINGDOM, radius_km=0.5, exit_radius_km=1.0, kind="park")
+    point = offset_km(*MAGIC_KINGDOM, north_km=0.8)
+    assert [f["id"] for f in registry.update("caio", *point, seed=["park:mk"])["inside"]] == ["park:mk"]
+
+    registry.set_owner_fences("caio", [{"id": "trip:1:venue", "kind": "venue", "name": "Show", "lat": point[0], "lng": point[1], "radius_km": 0.5}])
+    assert "trip:1:venue" in [f["id"] for f in registry.containing(*point, user_id="caio")]
+    assert "trip:1:venue" not in [f["id"] for f in registry.containing(*point, user_id="dani")]
+
+    registry.set_owner_fences("caio", [])
+    assert registry.get_fence("trip:1:venue") is None
+    assert registry.stats()["fences"] == 1
+
+
+def test_process_registry_has_park_fences():
+    kinds = [f["kind"] for f in get_geofence_registry().containing(*MAGIC_KINGDOM)]
+    assert "park" in kinds
@@ -0,0 +1,92 @@
+"""
+Testes da camada HTTP compartilhada (keep-alive, retentativas e métricas)
+"""
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app.config import settings
+from app.services.http_client import get_http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    failures = {}
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        remaining = self.failures.get(self.path, 0)
+        status = 503 if remaining else 200
+        if remaining:
+            self.failures[self.path] = remaining - 1
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fast_policy(monkeypatch):
+    monkeypatch.setitem(settings.HTTP_INTEGRATIONS, "test", {"timeout": 5, "retries": 2})
+    monkeypatch.setattr(type(get_http_client()), "_backoff", staticmethod(lambda attempt: 0))
+
+
+def test_connections_are_reused_across_calls(server):
+    http = get_http_client()
+    for _ in range(10):
+        assert http.get("test", f"{server}/reuse").status_code == 200
+
+    host = get_http_client().get_stats()["hosts"]["127.0.0.1:" + server.rsplit(":", 1)[1]]
+    assert host["requests"] >= 10
+    assert host["connections_created"] == 1
+    assert host["reuse_rate"] >= 0.9
+    assert host["latency_p95_ms"] is not None
+
+
+def test_get_retries_transient_errors_within_budget(server):
+    _Handler.failures["/flaky"] = 2
+    assert get_http_client().get("test", f"{server}/flaky").status_code == 200
+
+    _Handler.failures["/down"] = 5
+    assert get_http_client().get("test", f"{server}/down").status_code == 503  # orçamento esgotado
+    assert _Handler.failures["/down"] == 2
+
+
+def test_post_retries_only_when_server_refused(server):
+    _Handler.failures["/order"] = 1
+    assert get_http_client().post("test", f"{server}/order", json={"a": 1}).status_code == 200
+
+
+def test_async_client_is_shared_per_loop(server):
+    http = get_http_client()
+
+    async def main():
+        responses = await asyncio.gather(*(http.aget("test", f"{server}/async") for _ in range(5)))
+        client = http._async_client()
+        await http.aclose()
+        return [r.status_code for r in responses], client
+
+    statuses, client = asyncio.run(main())
+    assert statuses == [200] * 5
+    assert client.is_closed
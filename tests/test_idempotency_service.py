@@ -0,0 +1,66 @@
+"""
+Testes da idempotência na entrada do webhook (registro atômico, frente LRU e limpeza)
+"""
+
+import threading
+from datetime import datetime, timedelta
+from app.services.idempotency_service import IdempotencyService
+
+
+def test_concurrent_deliveries_register_only_once(tmp_path):
+    service = IdempotencyService(db_path=str(tmp_path / "idempotency.db"))
+    results = []
+    barrier = threading.Barrier(8)
+
+    def deliver():
+        barrier.wait()
+        results.append(service.check_and_register("MSG-1", "5511999", "MSG-1", {"text": "oi"}))
+
+    threads = [threading.Thread(target=deliver) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(None) == 1
+    assert service.get_stats()["registered"] == 1
+
+
+def test_recent_duplicates_are_rejected_from_memory(tmp_path):
+    path = str(tmp_path / "idempotency.db")
+    service = IdempotencyService(db_path=path)
+    assert service.check_and_register("MSG-1", "5511999", "MSG-1", {}) is None
+    service.update_status("MSG-1", "SUCCEEDED", response="pronto")
+    assert service.seen("MSG-1") == "SUCCEEDED"
+    assert service.check_and_register("MSG-1", "5511999", "MSG-1", {}) == "SUCCEEDED"
+    assert service.get_stats()["duplicates_disk"] == 0
+
+    # Outro processo (sem a LRU) cai no disco e recebe a resposta salva
+    other = IdempotencyService(db_path=path)
+    assert other.check_and_register("MSG-1", "5511999", "MSG-1", {}) == "pronto"
+    assert other.get_stats()["duplicates_disk"] == 1
+    assert other._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_fallback_key_does_not_merge_repeated_short_replies(tmp_path):
+    service = IdempotencyService(db_path=str(tmp_path / "idempotency.db"))
+    assert service.generate_key("5511999", "MSG-1", "sim") == "MSG-1"
+    # Sem key.id: reentrega (mesmo messageTimestamp) casa, um segundo "sim" do usuário não
+    first = service.generate_key("5511999", None, "sim", timestamp=1760745600)
+    assert service.generate_key("5511999", None, "sim", timestamp=1760745600) == first
+    assert service.generate_key("5511999", None, "sim", timestamp=1760745660) != first
+    # Sem id nem timestamp não há como distinguir: não deduplica
+    assert service.generate_key("5511999", None, "ok") != service.generate_key("5511999", None, "ok")
+
+
+def test_cleanup_keeps_jobs_still_in_the_queue(tmp_path):
+    service = IdempotencyService(db_path=str(tmp_path / "idempotency.db"))
+    service.register("old-done", "a", None, {})
+    service.register("old-queued", "a", None, {}, enqueue_at=1.0)
+    service.update_status("old-done", "SUCCEEDED")
+    old = (datetime.now() - timedelta(days=30)).isoformat()
+    with service.transaction() as conn:
+        conn.execute("UPDATE jobs SET created_at = ?", (old,))
+    assert service.cleanup_old_jobs(days=7) == 1
+    with service.transaction() as conn:
+        keys = [row[0] for row in conn.execute("SELECT idempotency_key FROM jobs")]
+    assert keys == ["old-queued"]
@@ -0,0 +1,68 @@
+"""
+Testes do roteador de intenção (tiers por regras + modelo local opcional)
+"""
+
+import numpy as np
+from app.agents.intent_router import IntentRouter, TIERS
+from app.agents.tools import ALL_TOOLS
+
+
+class FakeModel:
+    classes_ = np.array(["document_lookup", "live_data", "planning"])
+
+    def __init__(self, probabilities):
+        self.probabilities = probabilities
+
+    def predict_proba(self, texts):
+        return np.array([self.probabilities])
+
+
+def test_keyword_rules_pick_the_tier():
+    router = IntentRouter(model=FakeModel([0.34, 0.33, 0.33]))
+    assert router.classify("Oi, bom dia!") == "chit_chat"
+    assert router.classify("obrigado 🙏") == "chit_chat"
+    # Sim/não respondem a uma ação pendente: tier completo, com todas as tools
+    assert router.classify("sim") == "general"
+    assert router.classify("pode sim, por favor") == "general"
+    assert router.classify("nao, obrigado") == "general"
+    assert router.classify("Qual o localizador da minha reserva?") == "document_lookup"
+    assert router.classify("Vai chover amanhã? Qual a previsão do clima?") == "live_data"
+    assert router.classify("Monta um roteiro de 3 dias em Lisboa") == "planning"
+
+
+def test_price_booking_and_search_requests_keep_the_search_tools():
+    router = IntentRouter(model=FakeModel([0.34, 0.33, 0.33]))
+    for message in (
+        "quanto tá a passagem pra Paris?",  # Exemplo da regra 3 do SYSTEM OVERRIDE
+        "quero reservar um hotel em Paris",
+        "compra a passagem pra mim",
+        "me ajuda a achar um hotel em Roma perto do Coliseu",
+    ):
+        assert router.classify(message) == "general", message
+    # "seguro" sozinho não é seguro-viagem; "reservar" não é "reserva"
+    assert router.classify("é seguro andar à noite em Roma?") == "general"
+    assert router.classify("qual o número da apólice do seguro viagem?") == "document_lookup"
+    for tier in ("document_lookup", "live_data"):
+        assert {"search_flights", "search_hotels", "book_flight", "search_real_travel_tips"} <= set(TIERS[tier]["tools"])
+
+
+def test_internal_prompts_and_unknown_messages_keep_the_full_tier():
+    router = IntentRouter(model=FakeModel([0.34, 0.33, 0.33]))
+    assert router.classify("[PRIMEIRA MENSAGEM DO USUÁRIO - APRESENTE-SE] oi") == "general"
+    assert router.classify("x" * 1000) == "general"
+    assert router.classify("e aquela história do museu?") == "general"  # modelo sem confiança
+
+
+def test_confident_local_model_breaks_ties():
+    router = IntentRouter(model=FakeModel([0.05, 0.9, 0.05]))
+    assert router.classify("e aquela história do museu?") == "live_data"
+    assert router.get_stats()["model_decisions"] == 1
+
+
+def test_tier_tool_subsets_exist_and_keep_pending_actions():
+    names = {t.name for t in ALL_TOOLS}
+    for tier in TIERS.values():
+        if tier["tools"] is not None:
+            assert set(tier["tools"]) <= names
+            assert "confirm_document_replacement" in tier["tools"]
+    assert TIERS["chit_chat"]["rag_k"] == 0 and TIERS["chit_chat"]["prompt"] == "compact"
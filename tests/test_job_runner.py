@@ -0,0 +1,107 @@
+"""
+Testes do runner de jobs do scheduler (concorrência, timeouts e métricas)
+"""
+
+import time
+import threading
+from app.services.job_runner import check_deadline, get_job_runner, item_remaining
+
+
+def test_items_run_concurrently_up_to_limit():
+    runner = get_job_runner()
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def handle(item):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+
+    stats = runner.run("test_concurrency", range(8), handle, concurrency=4)
+
+    assert stats["items"] == 8 and stats["succeeded"] == 8
+    assert peak[0] == 4
+
+
+def test_slow_and_failing_items_are_counted_and_late_side_effects_blocked():
+    runner = get_job_runner()
+    sent = []
+
+    def handle(item):
+        if item == "slow":
+            time.sleep(0.4)
+        if item == "boom":
+            raise RuntimeError("upstream fora do ar")
+        check_deadline()  # Como o _notify do scheduler
+        sent.append(item)
+
+    stats = runner.run("test_timeouts", ["ok", "slow", "boom", "ok"], handle, item_timeout=0.1)
+
+    assert (stats["succeeded"], stats["failed"], stats["timed_out"]) == (2, 1, 1)
+    assert sent == ["ok", "ok"]  # O item que estourou o prazo não envia nada depois
+    assert runner.get_metrics()["test_timeouts"] == stats
+
+
+def test_item_timeout_starts_when_the_handler_starts():
+    runner = get_job_runner()
+    budgets = {}
+
+    def handle(item):
+        budgets[item] = item_remaining()
+        if item == "stuck":
+            time.sleep(0.5)
+
+    # Uma vaga só: "next" espera a thread presa terminar, mas o relógio dele só começa ao rodar
+    stats = runner.run("test_item_clock", ["stuck", "next"], handle, concurrency=1, item_timeout=0.2)
+
+    assert (stats["succeeded"], stats["timed_out"]) == (1, 1)
+    assert budgets["next"] > 0.1
+    assert item_remaining() is None  # Fora de um job não há prazo
+
+
+def test_upstream_semaphore_is_shared_across_items():
+    runner = get_job_runner()
+    runner._upstreams["test_api"] = threading.BoundedSemaphore(2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def handle(item):
+        with runner.upstream("test_api"):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.03)
+            with lock:
+                active[0] -= 1
+
+    stats = runner.run("test_upstream", range(6), handle, concurrency=6)
+    assert stats["succeeded"] == 6
+    assert peak[0] == 2
+
+
+def test_empty_job_records_metrics():
+    stats = get_job_runner().run("test_empty", [], lambda item: None)
+    assert stats["items"] == 0 and stats["duration_s"] >= 0
+
+
+def test_fetch_grouped_calls_upstream_once_per_key():
+    runner = get_job_runner()
+    calls = []
+    trips = [{"id": str(i), "park": "magic-kingdom" if i % 2 else "epcot"} for i in range(20)]
+    trips.append({"id": "sem-parque", "park": None})
+
+    def fetch(park_id):
+        calls.append(park_id)
+        if park_id == "epcot":
+            raise RuntimeError("API fora do ar")
+        return [{"name": "Space Mountain", "wait": 10}]
+
+    results = runner.fetch_grouped("test_grouped", trips, lambda t: t["park"], fetch, upstream="parks")
+
+    assert sorted(calls) == ["epcot", "magic-kingdom"]
+    assert list(results) == ["magic-kingdom"]  # chave que falhou fica de fora
+    stats = runner.get_metrics()["test_grouped:fetch"]
+    assert (stats["items"], stats["subscribers"], stats["failed"]) == (2, 21, 1)
@@ -0,0 +1,137 @@
+"""
+Testes do estágio de localização em tempo real (coalescência, debounce e pool limitado)
+"""
+
+import asyncio
+import threading
+import time
+from app.services.location_stream import LocationStream
+
+
+class FakeGeolocation:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.active = {}
+        self.overlap = False
+        self._lock = threading.Lock()
+
+    def process_location(self, user_id, lat, lng):
+        with self._lock:
+            if self.active.get(user_id):
+                self.overlap = True
+            self.active[user_id] = True
+            self.calls.append((user_id, lat, lng))
+        time.sleep(self.delay)
+        with self._lock:
+            self.active[user_id] = False
+        return None
+
+
+def make_stream(workers=4):
+    stream = object.__new__(LocationStream)
+    stream._initialized = False
+    LocationStream.__init__(stream)
+    stream.workers = workers
+    stream._geo = FakeGeolocation()
+    return stream
+
+
+async def drain(stream):
+    await asyncio.sleep(0)
+    await stream._queue.join()
+    await stream.stop()
+
+
+def test_burst_of_pings_is_coalesced_to_latest_position():
+    stream = make_stream()
+
+    async def main():
+        for i in range(50):
+            stream.submit("ana", -23.55 + i * 0.001, -46.63)
+        await drain(stream)
+
+    asyncio.run(main())
+    calls = stream._geo.calls
+    assert len(calls) == 1
+    assert calls[0][1] == -23.55 + 49 * 0.001  # só a última posição é avaliada
+    assert stream.get_stats()["coalesced"] == 49
+
+
+def test_small_moves_are_dropped():
+    stream = make_stream()
+
+    async def main():
+        stream.submit("bia", -23.55, -46.63)
+        await stream._queue.join()
+        stream.submit("bia", -23.5501, -46.6301)  # ~15 m
+        await stream._queue.join()
+        stream.submit("bia", -23.56, -46.63)      # ~1.1 km
+        await drain(stream)
+
+    asyncio.run(main())
+    assert len(stream._geo.calls) == 2
+    assert stream.get_stats()["dropped_small_moves"] == 1
+
+
+def test_same_user_is_never_evaluated_concurrently():
+    stream = make_stream(workers=4)
+    stream._geo.delay = 0.05
+
+    async def main():
+        stream.submit("caio", -23.55, -46.63)
+        await asyncio.sleep(0.01)  # primeira avaliação em andamento
+        stream.submit("caio", -23.60, -46.63)
+        for u in range(6):
+            stream.submit(f"user{u}", -22.9, -43.2)
+        await asyncio.sleep(0.2)
+        await drain(stream)
+
+    asyncio.run(main())
+    users = [c[0] for c in stream._geo.calls]
+    assert users.count("caio") == 2
+    assert not stream._geo.overlap
+    assert stream.get_stats()["evaluated"] == 8
+
+
+def test_idle_users_are_evicted():
+    stream = make_stream()
+    stream.refresh_seconds, stream.idle_seconds = 0.05, 0.1
+
+    async def main():
+        stream.submit("caio", -23.55, -46.63)
+        await stream._queue.join()
+        await asyncio.sleep(0.15)
+        stream.submit("duda", -22.90, -43.17)  # Ping de outro usuário dispara a limpeza
+        await drain(stream)
+
+    asyncio.run(main())
+    assert "caio" not in stream._evaluated and "duda" in stream._evaluated
+    assert stream.get_stats()["evicted"] == 1
+
+
+def test_agent_guides_go_through_the_chat_work_queue(tmp_path, monkeypatch):
+    from app.services.work_queue import WorkQueue
+    queue = WorkQueue(db_path=str(tmp_path / "idempotency.db"))
+    queue.poll_seconds = 0.02
+    monkeypatch.setattr("app.services.work_queue.get_work_queue", lambda: queue)
+    stream = make_stream()
+    stream._geo.process_location = lambda user_id, lat, lng: {"agent_prompt": "[SISTEMA: GUIA DE PARQUE] ...", "trip_id": "t1"}
+    handled = []
+
+    async def handler(event):
+        handled.append(event)
+
+    async def main():
+        queue.start(handler)
+        stream.submit("ana", 28.41, -81.58)
+        await drain(stream)
+        while not handled:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(asyncio.wait_for(main(), timeout=5))
+    # O guia roda como um turno do chat, na mesma fila FIFO do webhook (nunca em paralelo com ele)
+    assert handled[0]["user_id"] == "ana" and handled[0]["trip_id"] == "t1"
+    assert handled[0]["payload"]["message"]["conversation"].startswith("[SISTEMA: GUIA DE PARQUE]")
+    assert stream.get_stats()["guides_queued"] == 1 and stream.get_stats()["messages_sent"] == 0
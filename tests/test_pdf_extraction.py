@@ -0,0 +1,166 @@
+"""
+Testes da extração de PDF página a página (texto nativo, OCR só das páginas escaneadas, limite de páginas)
+"""
+
+import io
+import os
+import time
+import threading
+from concurrent.futures import Future
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+from app.parsers import pdf_extraction
+from app.parsers.pdf_extraction import extract_pdf_pages
+from app.parsers.flight_parser import FlightParser
+
+HELVETICA = DictionaryObject({
+    NameObject("/Type"): NameObject("/Font"),
+    NameObject("/Subtype"): NameObject("/Type1"),
+    NameObject("/BaseFont"): NameObject("/Helvetica"),
+})
+
+
+def make_pdf(pages):
+    """PDF em que cada item é o texto nativo da página (None = página escaneada, sem texto)."""
+    writer = PdfWriter()
+    for text in pages:
+        page = PageObject.create_blank_page(None, 612, 792)
+        if text is not None:
+            page[NameObject("/Resources")] = DictionaryObject({
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): HELVETICA}),
+            })
+            content = DecodedStreamObject()
+            content.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode())
+            page[NameObject("/Contents")] = writer._add_object(content)
+        writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def fake_ocr(monkeypatch):
+    calls = []
+
+    def render_and_ocr(pdf_path, page_number, dpi, lang, timeout):
+        assert os.path.exists(pdf_path) and timeout == pdf_extraction.settings.PDF_OCR_PAGE_TIMEOUT_SECONDS
+        calls.append(page_number)
+        return f"OCR pagina {page_number}", 5.0
+
+    monkeypatch.setattr(pdf_extraction, "_ocr_available", lambda: True)
+    monkeypatch.setattr(pdf_extraction.settings, "PDF_OCR_WORKERS", 0)  # Função local não vai para outro processo
+    monkeypatch.setattr(pdf_extraction, "_render_and_ocr", render_and_ocr)
+    return calls
+
+
+def test_native_pages_skip_ocr(monkeypatch):
+    calls = fake_ocr(monkeypatch)
+    result = extract_pdf_pages(make_pdf(["Voo LA3456 Sao Paulo Lisboa", "Assento 12A portao B22 embarque"]), ocr_workers=0)
+    assert calls == []
+    assert "LA3456" in result["text"] and "Assento 12A" in result["text"]
+    assert result["timings"]["pages_native"] == 2 and result["timings"]["pages_ocr"] == 0
+
+
+def test_only_scanned_pages_go_to_ocr_in_page_order(monkeypatch):
+    calls = fake_ocr(monkeypatch)
+    result = extract_pdf_pages(make_pdf(["Reserva Hotel Lisboa confirmada", None, "Check-in 15h check-out 11h", None]), ocr_workers=0)
+    assert calls == [2, 4]
+    assert [p.split()[0] for p in result["pages"]] == ["Reserva", "OCR", "Check-in", "OCR"]
+    assert result["text"].index("Reserva") < result["text"].index("OCR pagina 2") < result["text"].index("Check-in")
+    timings = result["timings"]
+    assert (timings["pages_native"], timings["pages_ocr"], timings["pages_ocr_failed"]) == (2, 2, 0)
+    assert timings["ocr_page_ms"] == 10.0
+    assert {"native_ms", "ocr_wall_ms", "total_ms"} <= set(timings)
+
+
+def test_page_cap_truncates_large_documents(monkeypatch):
+    calls = fake_ocr(monkeypatch)
+    result = extract_pdf_pages(make_pdf([None] * 8), max_pages=3, ocr_workers=0)
+    assert calls == [1, 2, 3]
+    assert len(result["pages"]) == 3
+    assert result["timings"]["truncated"] and result["timings"]["pages_total"] == 8
+
+
+def test_ocr_failure_keeps_the_other_pages(monkeypatch):
+    fake_ocr(monkeypatch)
+
+    def broken(pdf_path, page_number, dpi, lang, timeout):
+        raise RuntimeError("tesseract ausente")
+
+    monkeypatch.setattr(pdf_extraction, "_render_and_ocr", broken)
+    result = extract_pdf_pages(make_pdf(["Seguro viagem apolice 998877", None]), ocr_workers=0)
+    assert result["text"] == "Seguro viagem apolice 998877"
+    assert result["timings"]["pages_ocr_failed"] == 1
+
+
+class Worker:
+    alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.alive = False
+
+
+class FakePool:
+    def __init__(self):
+        self._processes = {1: Worker()}
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_hung_ocr_worker_is_killed_and_pool_replaced(monkeypatch):
+    class HungPool(FakePool):
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_running_or_notify_cancel()  # Começou e nunca conclui, como um worker preso na rasterização
+            return future
+
+    fake_ocr(monkeypatch)
+    pool = HungPool()
+    monkeypatch.setattr(pdf_extraction, "_ocr_pool", pool)
+    monkeypatch.setattr(pdf_extraction.settings, "PDF_OCR_PAGE_TIMEOUT_SECONDS", 0.05)
+
+    result = extract_pdf_pages(make_pdf(["Reserva Hotel Lisboa confirmada", None]), ocr_workers=1)
+    assert result["text"] == "Reserva Hotel Lisboa confirmada"
+    assert result["timings"]["pages_ocr_failed"] == 1
+    assert not pool._processes[1].alive
+    assert pdf_extraction._ocr_pool is None  # O próximo documento sobe um pool novo
+
+
+def test_page_waiting_in_the_shared_pool_queue_is_not_timed_out(monkeypatch):
+    class BusyPool(FakePool):
+        def submit(self, fn, *args):
+            future = Future()
+            def run():
+                time.sleep(0.15)  # Na fila atrás de outro documento por 3x o prazo da página...
+                future.set_running_or_notify_cancel()
+                future.set_result(("OCR pagina 2", 5.0))  # ...e depois roda rápido
+            threading.Thread(target=run, daemon=True).start()
+            return future
+
+    fake_ocr(monkeypatch)
+    pool = BusyPool()
+    monkeypatch.setattr(pdf_extraction, "_ocr_pool", pool)
+    monkeypatch.setattr(pdf_extraction.settings, "PDF_OCR_PAGE_TIMEOUT_SECONDS", 0.05)
+
+    result = extract_pdf_pages(make_pdf(["Reserva Hotel Lisboa confirmada", None]), ocr_workers=1)
+    assert result["timings"]["pages_ocr_failed"] == 0 and "OCR pagina 2" in result["text"]
+    assert pool._processes[1].alive and pdf_extraction._ocr_pool is pool  # Ninguém foi morto
+
+
+def test_ocr_pool_does_not_fork_the_web_process():
+    try:
+        pool = pdf_extraction._get_ocr_pool(1)
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        pdf_extraction.shutdown_ocr_pool()
+
+
+def test_parser_records_extraction_stats(monkeypatch):
+    fake_ocr(monkeypatch)
+    parser = FlightParser()
+    text = parser.extract_text(make_pdf([None, "Voo TP1024 Lisboa Porto 08h40"]), "cartao.pdf")
+    assert text.startswith("OCR pagina 1") and "TP1024" in text
+    assert parser.last_extraction_stats["pages_ocr"] == 1
@@ -0,0 +1,75 @@
+"""
+Testes da busca em lote do RAGService (sem chamadas à OpenAI)
+"""
+
+import numpy as np
+from app.services.rag_service import RAGService
+from app.services.vector_store import VectorStore
+from app.services.ann_index import FlatIndex
+
+AXES = {"hotel": [1.0, 0.0, 0.0], "voo": [0.0, 1.0, 0.0], "carro": [0.0, 0.0, 1.0]}
+
+
+class AxisEmbeddings:
+    """Embedding determinístico: cada palavra-chave vira um eixo"""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [np.sum([AXES[w] for w in t.split() if w in AXES] or [[0.1, 0.1, 0.1]], axis=0).tolist() for t in texts]
+
+
+def _service(tmp_path):
+    svc = object.__new__(RAGService)  # sem o singleton / OpenAI
+    svc.store = VectorStore(str(tmp_path))
+    svc.embeddings = AxisEmbeddings()
+    svc.exact_index = svc.ann_index = FlatIndex()
+    texts = ["hotel em Lisboa", "voo TP123", "carro Hertz", "hotel outra viagem"]
+    metas = [{"trip_id": "t1"}, {"trip_id": "t1"}, {"trip_id": "t1"}, {"trip_id": "t2"}]
+    svc.store.add(texts, svc.embeddings.embed_documents(texts), metas)
+    svc.embeddings.batches.clear()
+    return svc
+
+
+def test_query_many_scores_partition_in_one_batch(tmp_path):
+    svc = _service(tmp_path)
+    hotel, car = svc.query_many(["hotel", "carro"], trip_id="t1", k=2)
+
+    assert svc.embeddings.batches == [["hotel", "carro"]]
+    assert hotel[0]["text"] == "hotel em Lisboa" and hotel[0]["score"] > 0.99
+    assert all(h["metadata"]["trip_id"] == "t1" for h in hotel + car)
+    assert car[0]["text"] == "carro Hertz" and len(car) == 2
+    assert "[Fonte: Doc]" in svc.format_hits(hotel)
+
+
+def test_query_many_empty_partition(tmp_path):
+    svc = _service(tmp_path)
+    assert svc.query_many(["hotel"], trip_id="inexistente") == [[]]
+
+
+def test_ann_handles_evicted_for_removed_partitions_and_capped(tmp_path, monkeypatch):
+    from collections import OrderedDict
+    import threading
+    from app.services.rag_service import settings
+
+    class ExactAsANN:
+        name = "exato-como-ann"
+        build = staticmethod(FlatIndex().build)
+        search = staticmethod(FlatIndex().search)
+
+    svc = _service(tmp_path)
+    svc.ann_index = ExactAsANN()
+    svc._ann_handles, svc._ann_lock = OrderedDict(), threading.Lock()
+    monkeypatch.setattr(settings, "RAG_ANN_MIN_PARTITION", 1)
+    monkeypatch.setattr(settings, "RAG_ANN_MAX_CACHED_INDEXES", 1)
+    queries = svc.store.normalize(np.array([AXES["hotel"]], dtype=np.float32))
+
+    for trip in ("t1", "t2"):
+        _, _, vectors = svc.store.partition("trip_id", trip)
+        svc._search_partition("trip_id", trip, vectors, queries, 1)
+    assert list(svc._ann_handles) == [("trip_id", "t2")]  # LRU: só a mais recente
+
+    svc.delete_data_by_trip("t2")
+    assert not svc._ann_handles
@@ -0,0 +1,135 @@
+"""
+Testes da entrega progressiva de respostas pelo WhatsApp (cortes por parágrafo e correção final)
+"""
+
+import asyncio
+import uuid
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from app.agents import orchestrator
+from app.agents.reply_streamer import CORRECTION_HEADER, ReplyStreamer
+
+ITINERARY = "\n\n".join(f"## Dia {d}\n" + ("Manhã no centro histórico, almoço típico e tarde livre. " * 6).strip() for d in range(1, 6))
+
+
+def make_streamer():
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    streamer = ReplyStreamer(send)
+    streamer.first_min_chars, streamer.min_chars, streamer.max_chars = 200, 500, 1200
+    return streamer, sent
+
+
+def feed_tokens(streamer, text, size=7):
+    async def main():
+        for i in range(0, len(text), size):
+            await streamer.feed(text[i:i + size])
+    asyncio.run(main())
+
+
+def test_long_answer_is_split_at_paragraphs_and_nothing_is_lost():
+    streamer, sent = make_streamer()
+    feed_tokens(streamer, ITINERARY)
+    assert len(sent) >= 2  # Mensagens saíram antes do fim da geração
+    assert all(part.startswith("## Dia") for part in sent)
+    asyncio.run(streamer.finish(ITINERARY))
+    assert "\n\n".join(sent) == ITINERARY
+    assert all(len(part) <= 1200 for part in sent)
+    assert streamer.first_message_ms is not None and not streamer.corrected
+
+
+def test_short_answer_goes_out_once_at_the_end():
+    streamer, sent = make_streamer()
+    feed_tokens(streamer, "Bom dia!\n\nO check-in é às 15h.")
+    assert sent == []
+    asyncio.run(streamer.finish("Bom dia!\n\nO check-in é às 15h."))
+    assert sent == ["Bom dia!\n\nO check-in é às 15h."]
+
+
+def test_review_changes_produce_a_complement_or_a_correction():
+    streamer, sent = make_streamer()
+    feed_tokens(streamer, ITINERARY)
+    asyncio.run(streamer.finish(ITINERARY + "\n\n---\n✨ Revisão: leve guarda-chuva."))
+    assert sent[-1] == "---\n✨ Revisão: leve guarda-chuva."
+
+    streamer, sent = make_streamer()
+    feed_tokens(streamer, ITINERARY)
+    asyncio.run(streamer.finish("Roteiro revisado: troque o Dia 2 pelo museu."))
+    assert sent[-1] == CORRECTION_HEADER + "Roteiro revisado: troque o Dia 2 pelo museu."
+    assert streamer.corrected
+
+
+def test_correction_resends_only_changed_paragraphs():
+    streamer, sent = make_streamer()
+    feed_tokens(streamer, ITINERARY)
+    asyncio.run(streamer.flush())
+    before = len(sent)
+    days = ITINERARY.split("\n\n")
+    days[1] = "## Dia 2\nMuseu do Vaticano pela manhã (reserve antes)."
+    asyncio.run(streamer.finish("\n\n".join(days)))
+    assert sent[before:] == [CORRECTION_HEADER + days[1]]  # O roteiro inteiro não sai de novo
+
+
+def test_long_preamble_before_a_tool_call_is_sent_but_not_treated_as_the_answer():
+    # Comportamento documentado: só no fim da chamada ao modelo se sabe que ela termina em tool_calls
+    streamer, sent = make_streamer()
+    preamble = "Vou consultar o clima e os horários dos museus para montar o roteiro. " * 4 + "\n\nUm instante."
+    feed_tokens(streamer, preamble)
+    assert sent == [preamble.split("\n\n")[0].strip()]  # Preâmbulo longo com parágrafo já saiu
+    assert streamer.discard()  # Chamada terminou em tool_calls: "Um instante." não sai
+
+    feed_tokens(streamer, ITINERARY)
+    asyncio.run(streamer.flush())
+    asyncio.run(streamer.finish(ITINERARY + "\n\n---\n✨ Revisão: leve guarda-chuva."))
+    assert sent[-1] == "---\n✨ Revisão: leve guarda-chuva."  # Complemento, não correção
+    assert "\n\n".join(sent[1:-1]) == ITINERARY
+
+
+def test_streamed_turns_skip_claude_rewrite_and_late_follow_up(monkeypatch):
+    from app.config import settings
+    calls = []
+
+    class Reviewer:
+        def get_second_opinion(self, answer, query):
+            calls.append("gemini")
+            return "Leve guarda-chuva."
+
+        verify_navigation_and_arrival = get_second_opinion
+
+        def get_refined_answer(self, query, answer, gemini_opinion=""):
+            calls.append("claude")
+            return "Roteiro reescrito."
+
+    monkeypatch.setattr(settings, "GOOGLE_GEMINI_API_KEY", "g")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "a")
+    monkeypatch.setattr(orchestrator, "_review_services", {"gemini": Reviewer(), "claude": Reviewer()})
+    state = {"messages": [HumanMessage(content="monta um roteiro"), AIMessage(content=ITINERARY)]}
+
+    out = orchestrator.expert_consensus_review(state, {"configurable": {"thread_id": "5511999990000", "streaming": True}})
+    assert calls == ["gemini"]
+    assert out["messages"][0].content.startswith(ITINERARY)  # Só acrescenta: finish manda o complemento
+
+
+def test_agent_streams_partial_messages_and_tracks_time_to_first_message(agent_runtime, monkeypatch):
+    monkeypatch.setattr(
+        orchestrator, "get_llm",
+        lambda *args, **kwargs: GenericFakeChatModel(messages=iter([AIMessage(content=ITINERARY)])),
+    )
+    monkeypatch.setattr("app.services.rag_service.get_rag_service", lambda: (_ for _ in ()).throw(RuntimeError("sem RAG")))
+    monkeypatch.setattr(orchestrator.settings, "STREAM_FIRST_MESSAGE_MIN_CHARS", 200)
+    monkeypatch.setattr(orchestrator.settings, "STREAM_MESSAGE_MIN_CHARS", 500)
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    thread_id = f"stream-test-{uuid.uuid4().hex}"
+    response = asyncio.run(orchestrator.TravelAgent().astream_chat("monte um roteiro de 5 dias", thread_id, send))
+
+    assert response == ITINERARY
+    assert len(sent) >= 2 and "\n\n".join(sent) == ITINERARY
+    stats = orchestrator.get_agent_runtime_stats()
+    assert stats["time_to_first_message_ms"]["samples"] >= 1 and stats["streamed_turns"] >= 1
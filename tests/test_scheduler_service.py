@@ -0,0 +1,23 @@
+"""
+Testes do líder único do scheduler (vários workers do uvicorn no mesmo host)
+"""
+
+import fcntl
+from app.services import scheduler_service
+
+
+def test_only_one_process_holds_scheduler_leadership(tmp_path, monkeypatch):
+    lock_path = str(tmp_path / "scheduler.lock")
+    monkeypatch.setattr(scheduler_service.settings, "SCHEDULER_LOCK_PATH", lock_path)
+    monkeypatch.setattr(scheduler_service, "_leader_lock_file", None)
+
+    # Outro worker já é o líder
+    other = open(lock_path, "a+")
+    fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    assert scheduler_service.acquire_scheduler_leadership() is False
+
+    # Líder morreu (SO libera o flock): o próximo worker assume
+    other.close()
+    assert scheduler_service.acquire_scheduler_leadership() is True
+    assert scheduler_service.acquire_scheduler_leadership() is True  # Idempotente no processo líder
+    scheduler_service._leader_lock_file.close()
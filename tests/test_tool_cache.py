@@ -0,0 +1,87 @@
+"""
+Testes do cache de resultados das tools (TTL por tool, coalescência e métricas)
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from app.services.tool_cache import ToolResultCache, normalize_key
+
+
+def test_hits_within_ttl_and_normalized_keys():
+    cache = ToolResultCache(ttls={"get_current_weather": 60})
+    calls = []
+    fetch = lambda: calls.append(1) or {"temperature": 21}
+    assert cache.get_or_call("get_current_weather", normalize_key("Lisboa", ""), fetch) == {"temperature": 21}
+    assert cache.get_or_call("get_current_weather", normalize_key("  lisboa ", ""), fetch) == {"temperature": 21}
+    assert len(calls) == 1
+    stats = cache.get_stats()["tools"]["get_current_weather"]
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_expired_and_uncacheable_results_call_upstream_again():
+    cache = ToolResultCache(ttls={"get_park_live_status": 0.05, "convert_currency": 60})
+    calls = []
+    cache.get_or_call("get_park_live_status", ("mk",), lambda: calls.append(1) or [1])
+    time.sleep(0.06)
+    cache.get_or_call("get_park_live_status", ("mk",), lambda: calls.append(1) or [1])
+    assert len(calls) == 2
+
+    # Falha (None) não é cacheada; tool sem TTL nunca é cacheada
+    assert cache.get_or_call("convert_currency", ("usd", "brl"), lambda: None) is None
+    assert cache.get_or_call("convert_currency", ("usd", "brl"), lambda: {"rate": 5.0}) == {"rate": 5.0}
+    assert cache.get_or_call("book_flight", ("x",), lambda: "a") == "a"
+    assert cache.get_or_call("book_flight", ("x",), lambda: "b") == "b"
+
+
+def test_concurrent_identical_calls_share_one_upstream_request():
+    cache = ToolResultCache(ttls={"search_government_notices": 60})
+    calls = []
+
+    def slow_search():
+        calls.append(1)
+        time.sleep(0.2)
+        return "Sem alertas"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_call("search_government_notices", ("roma", ""), slow_search)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["Sem alertas"] * 8
+    assert len(calls) == 1
+    assert cache.get_stats()["tools"]["search_government_notices"]["coalesced"] == 7
+
+
+def test_upstream_errors_reach_every_waiter_and_are_not_cached():
+    cache = ToolResultCache(ttls={"get_internet_options": 60})
+
+    def boom():
+        raise RuntimeError("upstream fora")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_call("get_internet_options", ("japao",), boom)
+    assert cache.get_or_call("get_internet_options", ("japao",), lambda: "eSIM") == "eSIM"
+    assert cache.get_stats()["tools"]["get_internet_options"]["errors"] == 1
+
+
+def test_async_calls_coalesce_and_share_entries_with_sync_calls():
+    cache = ToolResultCache(ttls={"get_current_weather": 60})
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"temperature": 18}
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_call("get_current_weather", ("porto",), fetch) for _ in range(10)))
+
+    assert asyncio.run(main()) == [{"temperature": 18}] * 10
+    assert len(calls) == 1
+    assert cache.get_or_call("get_current_weather", ("porto",), lambda: None) == {"temperature": 18}
@@ -0,0 +1,79 @@
+"""
+Testes do repositório SQLite de viagens
+"""
+
+import json
+from app.services.trip_repository import TripRepository
+from app.services.trip_service import TripService
+
+
+def _service(tmp_path):
+    return TripService(repository=TripRepository(str(tmp_path / "trips.db")))
+
+
+def test_migrates_legacy_json_once(tmp_path):
+    legacy = tmp_path / "trips.json"
+    legacy.write_text(json.dumps([
+        {"id": "t1", "user_id": "u1", "destination": "Lisboa", "start_date": "2026-05-01", "confirmation_code": "ABC"},
+        {"id": "t2", "user_id": "u2", "destination": "Porto", "start_date": "2026-06-01", "confirmation_code": "ABC"},
+    ]), encoding="utf-8")
+
+    svc = _service(tmp_path)
+    assert [t["id"] for t in svc.trips] == ["t1", "t2"]
+    assert not legacy.exists() and (tmp_path / "trips.json.migrated").exists()
+    assert svc.find_potential_partner("u1", "ABC") == "u2"
+    assert svc.get_user_trips("u2")[0]["destination"] == "Porto"
+
+
+def test_single_row_updates_do_not_clobber_other_fields(tmp_path):
+    svc = _service(tmp_path)
+    trip = svc.add_trip_from_doc("u1", {"start_date": "2026-05-01", "destination": "Lisboa"})
+
+    stale = svc.get_trip(trip["id"])  # cópia antiga, como a de outro handler
+    svc.update_trip_metadata(trip["id"], {"current_park_id": "p1"})
+    svc.mark_alert_sent(trip["id"], "D-7")
+    svc.update_trip_metadata(stale["id"], {"last_gov_alert_date": "2026-04-30"})
+
+    saved = svc.get_trip(trip["id"])
+    assert saved["current_park_id"] == "p1"
+    assert saved["alerts_sent"] == ["D-7"]
+    assert saved["last_gov_alert_date"] == "2026-04-30"
+
+    svc.update_trip_metadata(trip["id"], {}, unset=["current_park_id"])
+    assert "current_park_id" not in svc.get_trip(trip["id"])
+    assert svc.update_trip_metadata("inexistente", {"x": 1}) is False
+
+
+def test_similar_trip_lookup_uses_date_window(tmp_path):
+    svc = _service(tmp_path)
+    svc.add_trip_from_doc("u1", {"start_date": "2026-05-01", "destination": "Lisboa"})
+    match = svc.find_similar_trips("u2", "lisboa centro", "2026-05-03")
+    assert match and match["host_user_id"] == "u1"
+    assert svc.find_similar_trips("u2", "Lisboa", "2026-05-10") is None
+
+    assert svc.delete_trips([match["trip"]["id"]]) == 1
+    assert svc.trips == []
+
+
+def test_date_window_queries(tmp_path):
+    from datetime import datetime, date
+    svc = _service(tmp_path)
+    svc.add_trip({"id": "d7", "user_id": "u", "start_date": "2026-05-08", "end_date": "2026-05-12"})
+    svc.add_trip({"id": "d0", "user_id": "u", "start_date": "2026-05-01"})  # sem end_date
+    svc.add_trip({"id": "andamento", "user_id": "u", "start_date": "2026-04-28", "end_date": "2026-05-01"})
+    svc.add_trip({"id": "antiga", "user_id": "u", "start_date": "2026-04-01", "end_date": "2026-04-10"})
+    svc.add_trip({"id": "invalida", "user_id": "u", "start_date": "em breve"})
+    today = datetime(2026, 5, 1, 9, 0)
+
+    alerts = {t["id"]: t["pending_alert"] for t in svc.get_trips_to_alert(today)}
+    assert alerts == {"d7": "D-7", "d0": "D-0"}
+    svc.mark_alert_sent("d7", "D-7")
+    assert [t["id"] for t in svc.get_trips_to_alert(today)] == ["d0"]
+
+    ids = lambda trips: sorted(t["id"] for t in trips)
+    assert ids(svc.get_active_monitoring_trips(today)) == ["andamento", "d0", "d7"]
+    assert ids(svc.get_trips_in_progress(date(2026, 5, 1))) == ["andamento", "d0"]
+    assert ids(svc.get_trips_in_progress(date(2026, 5, 1), explicit_end=True)) == ["andamento"]
+    assert ids(svc.get_trips_departing_or_returning(date(2026, 5, 1))) == ["andamento", "d0"]
+    assert ids(svc.get_trips_ended_before(date(2026, 4, 29))) == ["antiga"]
+    assert ids(svc.get_upcoming_trips(date(2026, 5, 2))) == ["d7"]
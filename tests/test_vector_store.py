@@ -0,0 +1,112 @@
+"""
+Testes do Vector Store binário (memmap + sidecar JSONL)
+"""
+
+import json
+import os
+import numpy as np
+from app.services.vector_store import VectorStore
+
+
+def _random_vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_append_and_reload(tmp_path):
+    store = VectorStore(str(tmp_path))
+    vectors = _random_vectors(3)
+    ids = store.add(["a", "b", "c"], vectors, [{"trip_id": "t1"}, {"trip_id": "t1"}, {"trip_id": "t2"}])
+    assert len(ids) == 3
+
+    reopened = VectorStore(str(tmp_path))
+    assert [d["text"] for d in reopened.documents] == ["a", "b", "c"]
+    rows = reopened.vectors_for([d["row"] for d in reopened.documents])
+    expected = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert np.allclose(rows, expected, atol=1e-6)
+
+
+def test_delete_metadata_and_compaction(tmp_path):
+    store = VectorStore(str(tmp_path), compaction_ratio=0.5, compaction_min_rows=2)
+    ids = store.add(["a", "b", "c", "d"], _random_vectors(4), [{} for _ in range(4)])
+    store.update_metadata({ids[3]: {"trip_id": "novo"}})
+
+    store.delete(ids[:2])  # 2 de 4 linhas mortas -> compacta
+    assert store.generation == 1
+    assert [d["text"] for d in store.documents] == ["c", "d"]
+    assert [d["row"] for d in store.documents] == [0, 1]
+    assert store.documents[1]["metadata"]["trip_id"] == "novo"
+    assert not os.path.exists(os.path.join(str(tmp_path), "vectors.0.f32"))
+
+    reopened = VectorStore(str(tmp_path))
+    assert [d["text"] for d in reopened.documents] == ["c", "d"]
+
+
+def test_partial_writes_are_ignored(tmp_path):
+    store = VectorStore(str(tmp_path))
+    store.add(["a"], _random_vectors(1), [{}])
+    # Simula crash: meio vetor e uma linha de sidecar truncada
+    with open(os.path.join(str(tmp_path), "vectors.0.f32"), "ab") as f:
+        f.write(b"\x00" * 7)
+    with open(os.path.join(str(tmp_path), "documents.0.jsonl"), "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "id": "x"')
+
+    reopened = VectorStore(str(tmp_path))
+    assert len(reopened) == 1
+    reopened.add(["b"], _random_vectors(1, seed=1), [{}])
+    assert [d["text"] for d in VectorStore(str(tmp_path)).documents] == ["a", "b"]
+
+
+def test_migrate_from_legacy_json(tmp_path):
+    legacy = tmp_path / "vector_data.json"
+    legacy.write_text(json.dumps({
+        "documents": [{"text": "x", "metadata": {"trip_id": "t"}}],
+        "vectors": [[1.0, 0.0, 0.0]]
+    }), encoding="utf-8")
+
+    store = VectorStore(str(tmp_path))
+    assert store.migrate_from_json(str(legacy)) == 1
+    assert not legacy.exists()
+    assert store.documents[0]["metadata"]["trip_id"] == "t"
+
+
+def test_refresh_picks_up_writes_from_other_instance(tmp_path):
+    reader = VectorStore(str(tmp_path))
+    writer = VectorStore(str(tmp_path))
+    ids = writer.add(["a", "b"], _random_vectors(2), [{}, {}])
+    assert reader.refresh()
+    assert [d["text"] for d in reader.documents] == ["a", "b"]
+    assert reader.vectors_for([1]).shape == (1, 8)
+    assert not reader.refresh()  # nada mudou: só stat
+
+    writer.delete(ids[:1])
+    writer.compact()
+    assert reader.refresh()
+    assert reader.generation == 1
+    assert [d["text"] for d in reader.documents] == ["b"]
+
+    # O leitor também escreve sem sobrepor linhas do outro processo
+    reader.add(["c"], _random_vectors(1, seed=2), [{}])
+    writer.add(["d"], _random_vectors(1, seed=3), [{}])
+    assert [d["row"] for d in VectorStore(str(tmp_path)).documents] == [0, 1, 2]
+
+
+def test_partitions_follow_metadata_changes(tmp_path):
+    store = VectorStore(str(tmp_path))
+    ids = store.add(
+        ["a", "b", "c"],
+        _random_vectors(3),
+        [{"trip_id": "t1", "thread_id": "u1"}, {"thread_id": "u1"}, {"trip_id": "t2", "thread_id": "u2"}],
+    )
+    docs, rows, vectors = store.partition("trip_id", "t1")
+    assert [d["text"] for d in docs] == ["a"] and rows.tolist() == [0] and vectors.shape == (1, 8)
+
+    docs, vectors = store.select(trip_id="t1", thread_id="u1")
+    assert [d["text"] for d in docs] == ["a", "b"] and vectors.shape == (2, 8)
+
+    store.update_metadata({ids[1]: {"trip_id": "t1"}, ids[2]: {"trip_id": "t1"}})
+    assert [d["text"] for d in store.partition("trip_id", "t1")[0]] == ["a", "b", "c"]
+    assert store.partition("trip_id", "t2")[0] == []
+
+    store.delete([ids[0]])
+    assert [d["text"] for d in store.partition("thread_id", "u1")[0]] == ["b"]
+    assert sorted(VectorStore(str(tmp_path)).partition_keys("thread_id")) == ["u1", "u2"]
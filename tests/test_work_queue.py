@@ -0,0 +1,100 @@
+"""
+Testes da fila durável do webhook (FIFO por usuário, pool global, retentativas e visibilidade)
+"""
+
+import asyncio
+import time
+from app.services.work_queue import WorkQueue
+
+
+def make_queue(tmp_path, workers=4):
+    queue = WorkQueue(db_path=str(tmp_path / "idempotency.db"))
+    queue.workers = workers
+    queue.retry_base_seconds = 0.05
+    queue.poll_seconds = 0.02
+    return queue
+
+
+async def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timeout esperando a fila"
+        await asyncio.sleep(0.01)
+
+
+def test_per_user_fifo_with_bounded_global_concurrency(tmp_path):
+    queue = make_queue(tmp_path, workers=3)
+    processed, active, peak = [], {}, {"global": 0}
+
+    async def handler(event):
+        user = event["user_id"]
+        assert not active.get(user), "dois turnos do mesmo usuário em paralelo"
+        active[user] = True
+        peak["global"] = max(peak["global"], sum(active.values()))
+        await asyncio.sleep(0.01)
+        processed.append((user, event["n"]))
+        active[user] = False
+
+    async def main():
+        queue.start(handler)
+        for n in range(5):
+            for user in ("ana", "bia", "caio", "duda"):
+                await queue.enqueue(f"{user}-{n}", user, {"user_id": user, "n": n})
+        await wait_until(lambda: len(processed) == 20)
+        await queue.stop()
+
+    asyncio.run(main())
+    for user in ("ana", "bia", "caio", "duda"):
+        assert [n for u, n in processed if u == user] == list(range(5))
+    assert peak["global"] <= 3
+    stats = queue.get_stats()
+    assert stats["succeeded"] == 20 and stats["queue_depth"] == 0 and stats["wait_p95_ms"] is not None
+
+
+def test_duplicate_delivery_is_ignored_and_failures_are_retried(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.max_attempts = 3
+    attempts = []
+
+    async def flaky(event):
+        attempts.append(event["n"])
+        if len(attempts) < 3:
+            raise RuntimeError("LLM fora")
+
+    async def main():
+        queue.start(flaky)
+        assert await queue.enqueue("msg-1", "ana", {"n": 1}) is True
+        assert await queue.enqueue("msg-1", "ana", {"n": 1}) is False
+        await wait_until(lambda: queue.stats["succeeded"] == 1)
+        await queue.stop()
+
+    asyncio.run(main())
+    assert attempts == [1, 1, 1]
+    assert queue.stats["retried"] == 2 and queue.stats["duplicates"] == 1
+
+
+def test_jobs_survive_restart_and_expired_leases_are_redelivered(tmp_path):
+    first = make_queue(tmp_path)
+    asyncio.run(first.enqueue("msg-1", "ana", {"n": 1}))
+    asyncio.run(first.enqueue("msg-2", "ana", {"n": 2}))
+    claimed = first._claim()  # "Processo" reservou e morreu sem concluir
+    assert claimed["key"] == "msg-1"
+    assert first._claim() is None  # FIFO: msg-2 espera o lease de msg-1
+
+    second = make_queue(tmp_path)
+    second.visibility_timeout = 0.1
+    second._extend_lease("msg-1")  # Lease curto para o teste
+    seen = []
+
+    async def handler(event):
+        seen.append(event["n"])
+
+    async def main():
+        await asyncio.sleep(0.15)
+        second.start(handler)
+        await wait_until(lambda: len(seen) == 2)
+        await second.stop()
+
+    asyncio.run(main())
+    assert seen == [1, 2]
+    assert second.stats["redelivered"] == 1